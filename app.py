@@ -12,29 +12,12 @@ import pandas as pd
 from supabase import create_client, Client
 import time
 
-# Importar módulos del sistema
-from database.queries import DatabaseManager
-from ui.components import UIComponents
-from ui.tabs import TabRenderer
+# Importar módulos del sistema (los de cada pestaña se importan al abrirla, ver initialize_systems)
 from ui.theme_manager import ThemeManager
-from ui.modern_components import ModernComponents
-from business.calculations import ComisionCalculator, MetricsCalculator
-from business.ai_recommendations import AIRecommendations
-from business.client_classification import ClientClassifier
-from business.monthly_commission_calculator import MonthlyCommissionCalculator
-from business.invoice_alerts import InvoiceAlertsSystem
-from business.product_recommendations import ProductRecommendationSystem
 from utils.formatting import format_currency
+from utils.service_registry import ServiceRegistry
 from config.settings import AppConfig
 
-# Importar mÃ³dulos de anÃ¡lisis de clientes
-from database.client_purchases_manager import ClientPurchasesManager
-from ui.client_analysis_components import ClientAnalysisUI
-from database.catalog_manager import CatalogManager
-from database.sync_manager import SyncManager
-from business.client_analytics import ClientAnalytics
-from ui.client_analytics_components import ClientAnalyticsUI
-
 # ========================
 # CONFIGURACIÓN INICIAL
 # ========================
@@ -71,58 +54,56 @@ st.set_page_config(
 # INICIALIZACIÓN DE SISTEMAS
 # ========================
 @st.cache_resource
-def initialize_systems():
-    """Inicializa todos los sistemas del CRM"""
+def initialize_systems() -> ServiceRegistry:
+    """
+    Registra todos los sistemas del CRM sin construirlos
+
+    Cada sistema (y su módulo) se inicializa la primera vez que una pestaña lo
+    pide con systems["nombre"], así el Panel del Vendedor no espera por ML,
+    sincronización ni analytics. El tiempo de cada uno queda en systems.tiempos().
+    """
+    systems = ServiceRegistry(supabase=supabase)
+    
     # Sistema de base de datos
-    db_manager = DatabaseManager(supabase)
+    systems.registrar("db_manager", "database.queries:DatabaseManager", "supabase")
     
     # Sistemas de negocio
-    comision_calc = ComisionCalculator()
-    metrics_calc = MetricsCalculator()
-    ai_recommendations = AIRecommendations(db_manager)
+    systems.registrar("comision_calc", "business.calculations:ComisionCalculator")
+    systems.registrar("metrics_calc", "business.calculations:MetricsCalculator")
+    systems.registrar("ai_recommendations", "business.ai_recommendations:AIRecommendations", "db_manager")
     
     # Nuevos sistemas
-    client_classifier = ClientClassifier(db_manager)
-    monthly_calc = MonthlyCommissionCalculator(db_manager)
-    invoice_alerts = InvoiceAlertsSystem(db_manager)
-    product_recommendations = ProductRecommendationSystem(db_manager)
+    systems.registrar("client_classifier", "business.client_classification:ClientClassifier", "db_manager")
+    systems.registrar("monthly_calc", "business.monthly_commission_calculator:MonthlyCommissionCalculator", "db_manager")
+    systems.registrar("invoice_alerts", "business.invoice_alerts:InvoiceAlertsSystem", "db_manager")
+    systems.registrar("product_recommendations", "business.product_recommendations:ProductRecommendationSystem", "db_manager")
     
-    # Sistema de catÃ¡logo
-    catalog_manager = CatalogManager(supabase)
+    # Sistema de catálogo
+    systems.registrar("catalog_manager", "database.catalog_manager:CatalogManager", "supabase")
     
-    # Sistema de anÃ¡lisis de clientes
-    client_purchases_manager = ClientPurchasesManager(supabase)
-    sync_manager = SyncManager(supabase)
-    client_analysis_ui = ClientAnalysisUI(client_purchases_manager, catalog_manager, sync_manager)
+    # Sistema de análisis de clientes
+    systems.registrar("client_purchases_manager", "database.client_purchases_manager:ClientPurchasesManager", "supabase")
+    systems.registrar("sync_manager", "database.sync_manager:SyncManager", "supabase")
+    systems.registrar(
+        "client_analysis_ui", "ui.client_analysis_components:ClientAnalysisUI",
+        "client_purchases_manager", "catalog_manager", "sync_manager"
+    )
     
     # Sistema de analytics de clientes
-    client_analytics = ClientAnalytics(supabase)
-    client_analytics_ui = ClientAnalyticsUI(client_analytics)
+    systems.registrar("client_analytics", "business.client_analytics:ClientAnalytics", "supabase")
+    systems.registrar("client_analytics_ui", "ui.client_analytics_components:ClientAnalyticsUI", "client_analytics")
+    
+    # Sistema de UI (TabRenderer comparte este registro para sus propios sistemas)
+    systems.registrar("ui_components", "ui.components:UIComponents", "db_manager")
+    systems.registrar("modern_components", "ui.modern_components:ModernComponents")
+    
+    def crear_tab_renderer(db_manager, ui_components):
+        from ui.tabs import TabRenderer
+        return TabRenderer(db_manager, ui_components, servicios=systems)
     
-    # Sistema de UI
-    ui_components = UIComponents(db_manager)
-    modern_components = ModernComponents()
-    tab_renderer = TabRenderer(db_manager, ui_components)
+    systems.registrar("tab_renderer", crear_tab_renderer, "db_manager", "ui_components")
     
-    return {
-        "db_manager": db_manager,
-        "comision_calc": comision_calc,
-        "metrics_calc": metrics_calc,
-        "ai_recommendations": ai_recommendations,
-        "client_classifier": client_classifier,
-        "monthly_calc": monthly_calc,
-        "invoice_alerts": invoice_alerts,
-        "product_recommendations": product_recommendations,
-        "catalog_manager": catalog_manager,
-        "client_purchases_manager": client_purchases_manager,
-        "sync_manager": sync_manager,
-        "client_analysis_ui": client_analysis_ui,
-        "client_analytics": client_analytics,
-        "client_analytics_ui": client_analytics_ui,
-        "ui_components": ui_components,
-        "modern_components": modern_components,
-        "tab_renderer": tab_renderer
-    }
+    return systems
 
 # ========================
 # FUNCIONES DE UI ESPECÍFICAS
@@ -830,31 +811,32 @@ def main():
         
         # La página actual ya está definida arriba
         
-        # Mapeo de páginas a funciones de renderizado
+        # Mapeo de páginas a (sistema, método de renderizado): solo se construye el sistema de la página abierta
         paginas_funciones = {
             # ZONA 1: ASISTENTE PARA VENDEDORES
-            "🏠 Panel del Vendedor": systems["tab_renderer"].render_panel_vendedor,
-            "👥 Clientes": systems["tab_renderer"].render_clientes_vendedor,
-            "⚡ Nueva Venta Simple": systems["tab_renderer"].render_nueva_venta_simple,
-            "🛒 Catálogo": systems["tab_renderer"].render_catalog_store,
-            "💬 Mensajería": systems["tab_renderer"].render_mensajeria_comunicacion,
-            "💰 Mis Comisiones": systems["tab_renderer"].render_comisiones_vendedor,
+            "🏠 Panel del Vendedor": ("tab_renderer", "render_panel_vendedor"),
+            "👥 Clientes": ("tab_renderer", "render_clientes_vendedor"),
+            "⚡ Nueva Venta Simple": ("tab_renderer", "render_nueva_venta_simple"),
+            "🛒 Catálogo": ("tab_renderer", "render_catalog_store"),
+            "💬 Mensajería": ("tab_renderer", "render_mensajeria_comunicacion"),
+            "💰 Mis Comisiones": ("tab_renderer", "render_comisiones_vendedor"),
             
             # ZONA 2: PANEL ESTRATÉGICO PARA GERENCIA
-            "📊 Dashboard Ejecutivo": systems["tab_renderer"].render_executive_dashboard,
-            "🗺️ Análisis Geográfico": systems["tab_renderer"].render_analisis_geografico,
-            "📈 Análisis Comercial": systems["tab_renderer"].render_analisis_comercial_avanzado,
-            "💰 Comisiones": systems["tab_renderer"].render_comisiones,
-            "👔 Gestión Clientes B2B": systems["client_analysis_ui"].render_gestion_clientes,
-            "📦 Análisis Compras": systems["tab_renderer"].render_analisis_compras_comportamiento,
-            "↩️ Devoluciones": systems["tab_renderer"].render_devoluciones,
-            "📥 Importaciones y Stock": systems["tab_renderer"].render_importaciones_stock,
-            "📋 Reportes": systems["tab_renderer"].render_reportes_exportacion
+            "📊 Dashboard Ejecutivo": ("tab_renderer", "render_executive_dashboard"),
+            "🗺️ Análisis Geográfico": ("tab_renderer", "render_analisis_geografico"),
+            "📈 Análisis Comercial": ("tab_renderer", "render_analisis_comercial_avanzado"),
+            "💰 Comisiones": ("tab_renderer", "render_comisiones"),
+            "👔 Gestión Clientes B2B": ("client_analysis_ui", "render_gestion_clientes"),
+            "📦 Análisis Compras": ("tab_renderer", "render_analisis_compras_comportamiento"),
+            "↩️ Devoluciones": ("tab_renderer", "render_devoluciones"),
+            "📥 Importaciones y Stock": ("tab_renderer", "render_importaciones_stock"),
+            "📋 Reportes": ("tab_renderer", "render_reportes_exportacion")
         }
         
         # Renderizar la página seleccionada
         if pagina_actual in paginas_funciones:
-            render_page_safe(paginas_funciones[pagina_actual])
+            sistema, metodo = paginas_funciones[pagina_actual]
+            render_page_safe(lambda: getattr(systems[sistema], metodo)())
         else:
             st.error(f"Página '{pagina_actual}' no encontrada")
     
@@ -0,0 +1,7 @@
+"""
+Benchmarks fuera de línea del CRM
+
+- `datos_sinteticos`: datos reproducibles (semilla fija) de las tablas principales
+- `supabase_falso`: cliente en memoria con el subconjunto de supabase-py que usa el proyecto
+- `test_*.py`: casos de pytest-benchmark (ver benchmarks/README.md)
+"""
@@ -0,0 +1,374 @@
+"""
+Prueba de carga del API del CRM (en proceso, sobre ASGI)
+
+Simula vendedores usando el dashboard de React al mismo tiempo: cada usuario
+virtual repite solicitudes de una mezcla ponderada (bundle del dashboard,
+listado de facturas, búsqueda en el catálogo, detalle y compras de un cliente,
+mapa) con una pausa aleatoria entre ellas ("tiempo de lectura"). La app
+FastAPI corre en el mismo proceso con `httpx.ASGITransport` y Supabase lo
+reemplaza `SupabaseFalso` con datos sintéticos, opcionalmente con latencia de
+red simulada por consulta.
+
+Los endpoints `async def` que hacen trabajo bloqueante ocupan el event loop
+como en un worker de uvicorn, así que la latencia medida incluye la espera en
+cola, que es lo que se degrada al subir la concurrencia.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.carga --usuarios 1,5,10,25 --duracion 30 --pensar 2
+    python -m benchmarks.carga --escala 100k --latencia-db 0.03 --salida carga.json
+
+El reporte JSON trae, por etapa de concurrencia y por endpoint: solicitudes,
+errores, throughput, latencias p50/p95/p99 y RSS pico del proceso.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from unittest import mock
+
+from benchmarks.entorno import RESULTADOS, preparar
+
+preparar()
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.datos_sinteticos import SEMILLA, escala_filas, generar_datos
+from benchmarks.supabase_falso import SupabaseFalso
+
+# Peso relativo de cada tipo de solicitud en la sesión de un vendedor
+MEZCLA_PREDETERMINADA: Dict[str, int] = {
+    "dashboard_bundle": 30,
+    "facturas": 20,
+    "catalogo_busqueda": 20,
+    "cliente_detalle": 10,
+    "cliente_compras": 10,
+    "mapa": 10,
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+# ========================================
+# SOLICITUDES
+# ========================================
+
+class GeneradorSolicitudes:
+    """Solicitudes con parámetros tomados de los datos sintéticos (meses, clientes, productos reales)"""
+
+    def __init__(self, datos: Dict[str, List[Dict[str, Any]]], mezcla: Dict[str, int]):
+        desconocidos = [nombre for nombre in mezcla if nombre not in self._CONSTRUCTORES]
+        if desconocidos:
+            raise ValueError(f"Solicitudes desconocidas: {desconocidos}. Disponibles: {list(self._CONSTRUCTORES)}")
+        self.nombres = [nombre for nombre, peso in mezcla.items() if peso > 0]
+        self.pesos = [mezcla[nombre] for nombre in self.nombres]
+
+        # Los vendedores miran sobre todo los meses recientes
+        self.meses = sorted({f["fecha_factura"][:7] for f in datos["comisiones"] if f.get("fecha_factura")}, reverse=True)[:3]
+        self.clientes = sorted({f["cliente"] for f in datos["comisiones"] if f.get("cliente")})
+        self.ids_clientes = [c["id"] for c in datos["clientes_b2b"]]
+        productos = datos["catalogo_productos"]
+        self.busquedas = sorted({p["marca"] for p in productos} | {p["linea"] for p in productos}) + \
+            [p["referencia"][:8] for p in productos[:50]]
+        self.referencias = list(dict.fromkeys(c["cod_articulo"] for c in datos["compras_clientes"][:2000]))[:50]
+
+    def _dashboard_bundle(self, rng):
+        return "/api/dashboard/bundle", {"mes": rng.choice(self.meses), "secciones": "metricas,grafico_ventas,clientes_clave"}
+
+    def _facturas(self, rng):
+        return "/api/comisiones/facturas", {"mes": rng.choice(self.meses), "solo_propios": "false"}
+
+    def _catalogo_busqueda(self, rng):
+        return "/api/catalogo/productos", {"busqueda": rng.choice(self.busquedas), "limit": 50}
+
+    def _cliente_detalle(self, rng):
+        return "/api/clientes/detalle", {"nombre": rng.choice(self.clientes)}
+
+    def _cliente_compras(self, rng):
+        return f"/api/clientes/b2b/{rng.choice(self.ids_clientes)}/compras", {"limit": 100}
+
+    def _mapa(self, rng):
+        if self.referencias and rng.random() < 0.3:
+            return "/api/dashboard/mapa-interactivo", {"referencia": rng.choice(self.referencias)}
+        return "/api/dashboard/mapa-interactivo", {}
+
+    _CONSTRUCTORES = {
+        "dashboard_bundle": _dashboard_bundle,
+        "facturas": _facturas,
+        "catalogo_busqueda": _catalogo_busqueda,
+        "cliente_detalle": _cliente_detalle,
+        "cliente_compras": _cliente_compras,
+        "mapa": _mapa,
+    }
+
+    def construir(self, nombre: str, rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+        return self._CONSTRUCTORES[nombre](self, rng)
+
+    def siguiente(self, rng: random.Random) -> Tuple[str, str, Dict[str, Any]]:
+        nombre = rng.choices(self.nombres, weights=self.pesos)[0]
+        ruta, parametros = self.construir(nombre, rng)
+        return nombre, ruta, parametros
+
+
+# ========================================
+# MEDICIÓN
+# ========================================
+
+def rss_actual_mb() -> float:
+    """RSS actual del proceso en MB (/proc, psutil si está instalado o el pico histórico)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        return rss_pico_mb()
+
+
+def rss_pico_mb() -> float:
+    """RSS máximo que ha tenido el proceso en MB (0 si la plataforma no lo reporta)"""
+    if resource is None:
+        try:
+            import psutil
+            memoria = psutil.Process().memory_info()
+            return getattr(memoria, "peak_wset", memoria.rss) / 1024 ** 2
+        except ImportError:
+            return 0.0
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB y macOS en bytes
+    return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+
+
+def _resumen_latencias(segundos: Sequence[float]) -> Dict[str, float]:
+    if not segundos:
+        return {}
+    milisegundos = np.asarray(segundos) * 1000
+    resumen = {f"p{p}": round(float(np.percentile(milisegundos, p)), 2) for p in PERCENTILES}
+    resumen["media"] = round(float(milisegundos.mean()), 2)
+    resumen["max"] = round(float(milisegundos.max()), 2)
+    return resumen
+
+
+class Medidor:
+    """Latencias, errores y RSS observados por endpoint durante una etapa"""
+
+    def __init__(self):
+        self.latencias: Dict[str, List[float]] = defaultdict(list)
+        self.errores: Dict[str, int] = defaultdict(int)
+        self.estados: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.rss_mb: Dict[str, float] = defaultdict(float)
+
+    def registrar(self, nombre: str, segundos: float, estado: Optional[int]):
+        self.latencias[nombre].append(segundos)
+        if estado is None or estado >= 400:
+            self.errores[nombre] += 1
+        self.estados[nombre][estado or 0] += 1
+        self.rss_mb[nombre] = max(self.rss_mb[nombre], rss_actual_mb())
+
+    def resumen(self, duracion: float) -> Dict[str, Any]:
+        endpoints = {}
+        for nombre, segundos in sorted(self.latencias.items()):
+            endpoints[nombre] = {
+                "solicitudes": len(segundos),
+                "errores": self.errores[nombre],
+                "estados": {str(estado): cantidad for estado, cantidad in sorted(self.estados[nombre].items())},
+                "throughput_rps": round(len(segundos) / duracion, 3) if duracion > 0 else 0.0,
+                "latencia_ms": _resumen_latencias(segundos),
+                "rss_pico_mb": round(self.rss_mb[nombre], 1),
+            }
+        todas = [s for segundos in self.latencias.values() for s in segundos]
+        return {
+            "solicitudes": len(todas),
+            "errores": sum(self.errores.values()),
+            "throughput_rps": round(len(todas) / duracion, 3) if duracion > 0 else 0.0,
+            "latencia_ms": _resumen_latencias(todas),
+            "rss_pico_mb": round(max(self.rss_mb.values(), default=0.0), 1),
+            "endpoints": endpoints,
+        }
+
+
+# ========================================
+# EJECUCIÓN
+# ========================================
+
+async def _usuario(cliente, generador: GeneradorSolicitudes, medidor: Medidor, fin: float,
+                   pensar: float, rng: random.Random, timeout: float):
+    # Arranques escalonados para no mandar la primera ola al mismo instante
+    await asyncio.sleep(rng.uniform(0, pensar) if pensar > 0 else 0)
+    while time.perf_counter() < fin:
+        nombre, ruta, parametros = generador.siguiente(rng)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await asyncio.wait_for(cliente.get(ruta, params=parametros), timeout)
+            estado = respuesta.status_code
+        except Exception:
+            estado = None
+        medidor.registrar(nombre, time.perf_counter() - inicio, estado)
+        if pensar > 0:
+            await asyncio.sleep(rng.expovariate(1 / pensar))
+
+
+async def _correr_etapa(app, generador: GeneradorSolicitudes, usuarios: int, duracion: float,
+                        pensar: float, semilla: int, timeout: float) -> Dict[str, Any]:
+    import httpx
+
+    medidor = Medidor()
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://crm.local", timeout=timeout) as cliente:
+        inicio = time.perf_counter()
+        fin = inicio + duracion
+        await asyncio.gather(*(
+            _usuario(cliente, generador, medidor, fin, pensar, random.Random(semilla * 1000 + i), timeout)
+            for i in range(usuarios)
+        ))
+        transcurrido = time.perf_counter() - inicio
+    return {"usuarios": usuarios, "duracion_s": round(transcurrido, 2), **medidor.resumen(transcurrido)}
+
+
+async def _calentar(app, generador: GeneradorSolicitudes, semilla: int, timeout: float):
+    """Una solicitud de cada tipo (fuera de las mediciones): importaciones y cachés ya cargadas"""
+    import httpx
+
+    rng = random.Random(semilla)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://crm.local", timeout=timeout) as cliente:
+        for nombre in generador.nombres:
+            ruta, parametros = generador.construir(nombre, rng)
+            await cliente.get(ruta, params=parametros)
+
+
+@contextmanager
+def _supabase_falso(supabase: SupabaseFalso):
+    with mock.patch("supabase.create_client", lambda *args, **kwargs: supabase):
+        yield
+
+
+def correr(usuarios: Sequence[int], duracion: float, pensar: float, escala: Any = "1k",
+           semilla: int = SEMILLA, latencia_db: float = 0.0, mezcla: Optional[Dict[str, int]] = None,
+           timeout: float = 60.0, calentar: bool = True) -> Dict[str, Any]:
+    """
+    Corre una etapa por cada nivel de concurrencia y devuelve el reporte
+
+    Args:
+        usuarios: Usuarios simultáneos de cada etapa (p. ej. [1, 5, 10, 25])
+        duracion: Segundos por etapa
+        pensar: Pausa media entre solicitudes de un usuario (exponencial; 0 = sin pausa)
+        escala: Filas de comisiones y compras_clientes (ver datos_sinteticos.ESCALAS)
+        latencia_db: Segundos de latencia simulada por consulta a Supabase
+        mezcla: Peso por tipo de solicitud (MEZCLA_PREDETERMINADA si no se da)
+    """
+    from main import app
+
+    mezcla = dict(mezcla or MEZCLA_PREDETERMINADA)
+    filas = escala_filas(escala)
+    datos = generar_datos(filas, semilla)
+    generador = GeneradorSolicitudes(datos, mezcla)
+    supabase = SupabaseFalso(datos, latencia=latencia_db)
+
+    etapas = []
+    with _supabase_falso(supabase):
+        if calentar:
+            asyncio.run(_calentar(app, generador, semilla, timeout))
+        for cantidad in usuarios:
+            supabase.reiniciar_contadores()
+            etapa = asyncio.run(_correr_etapa(app, generador, cantidad, duracion, pensar, semilla, timeout))
+            etapa["consultas_supabase"] = sum(supabase.consultas.values())
+            etapas.append(etapa)
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "configuracion": {
+            "usuarios": list(usuarios),
+            "duracion_s": duracion,
+            "pensar_s": pensar,
+            "filas": filas,
+            "semilla": semilla,
+            "latencia_db_s": latencia_db,
+            "mezcla": mezcla,
+            "timeout_s": timeout,
+        },
+        "etapas": etapas,
+        "rss_pico_proceso_mb": round(rss_pico_mb(), 1),
+    }
+
+
+# ========================================
+# LÍNEA DE COMANDOS
+# ========================================
+
+def _lista_enteros(texto: str) -> List[int]:
+    return [int(parte) for parte in texto.split(",") if parte.strip()]
+
+
+def _mezcla(texto: str) -> Dict[str, int]:
+    """'dashboard_bundle=3,facturas=1' -> {'dashboard_bundle': 3, 'facturas': 1}"""
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        mezcla[nombre.strip()] = int(peso or 1)
+    return mezcla
+
+
+def _imprimir(reporte: Dict[str, Any]):
+    for etapa in reporte["etapas"]:
+        latencia = etapa["latencia_ms"]
+        print(f"\n👥 {etapa['usuarios']} usuarios · {etapa['solicitudes']} solicitudes · "
+              f"{etapa['throughput_rps']} req/s · errores {etapa['errores']} · "
+              f"p50 {latencia.get('p50', 0)} ms · p95 {latencia.get('p95', 0)} ms · p99 {latencia.get('p99', 0)} ms")
+        print(f"   {'endpoint':<20}{'n':>7}{'err':>6}{'req/s':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'RSS MB':>9}")
+        for nombre, datos in etapa["endpoints"].items():
+            latencia = datos["latencia_ms"]
+            print(f"   {nombre:<20}{datos['solicitudes']:>7}{datos['errores']:>6}{datos['throughput_rps']:>9}"
+                  f"{latencia.get('p50', 0):>10}{latencia.get('p95', 0):>10}{latencia.get('p99', 0):>10}"
+                  f"{datos['rss_pico_mb']:>9}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga del API del CRM con datos sintéticos")
+    parser.add_argument("--usuarios", type=_lista_enteros, default=[1, 5, 10, 25],
+                        help="Usuarios simultáneos por etapa, separados por coma (1,5,10,25)")
+    parser.add_argument("--duracion", type=float, default=30.0, help="Segundos por etapa")
+    parser.add_argument("--pensar", type=float, default=2.0, help="Pausa media entre solicitudes de un usuario (s)")
+    parser.add_argument("--escala", default=os.getenv("BENCH_ESCALA", "10k"), help="1k, 10k, 100k, 1m o un entero")
+    parser.add_argument("--semilla", type=int, default=SEMILLA)
+    parser.add_argument("--latencia-db", type=float, default=0.0, help="Latencia simulada por consulta a Supabase (s)")
+    parser.add_argument("--mezcla", type=_mezcla, default=None,
+                        help=f"Pesos por solicitud (p. ej. dashboard_bundle=3,facturas=1); tipos: {', '.join(MEZCLA_PREDETERMINADA)}")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Segundos máximos por solicitud")
+    parser.add_argument("--sin-calentamiento", action="store_true", help="No hacer la ronda inicial fuera de la medición")
+    parser.add_argument("--salida", default=None, help="Archivo JSON del reporte (por defecto en benchmarks/.resultados/)")
+    args = parser.parse_args(argv)
+
+    reporte = correr(
+        args.usuarios, args.duracion, args.pensar, escala=args.escala, semilla=args.semilla,
+        latencia_db=args.latencia_db, mezcla=args.mezcla, timeout=args.timeout,
+        calentar=not args.sin_calentamiento
+    )
+
+    salida = args.salida or os.path.join(RESULTADOS, f"carga_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(reporte, archivo, ensure_ascii=False, indent=2)
+
+    _imprimir(reporte)
+    print(f"\n📄 Reporte: {salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
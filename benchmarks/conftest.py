@@ -0,0 +1,75 @@
+"""
+Configuración de los benchmarks (ver benchmarks/README.md)
+
+El entorno (benchmarks/entorno.py) se prepara antes de importar el proyecto.
+"""
+
+import os
+
+from benchmarks.entorno import RESULTADOS, preparar
+
+preparar()
+
+import pytest
+
+from benchmarks.datos_sinteticos import SEMILLA, escala_filas, generar_datos
+from benchmarks.supabase_falso import SupabaseFalso
+
+
+def pytest_addoption(parser):
+    grupo = parser.getgroup("crm", "Benchmarks del CRM")
+    grupo.addoption(
+        "--escala", default=os.getenv("BENCH_ESCALA", "1k"),
+        help="Filas de comisiones y compras_clientes: 1k, 10k, 100k, 1m o un entero (BENCH_ESCALA)"
+    )
+    grupo.addoption(
+        "--semilla", type=int, default=int(os.getenv("BENCH_SEMILLA", SEMILLA)),
+        help="Semilla de los datos sintéticos (BENCH_SEMILLA)"
+    )
+
+
+def pytest_configure(config):
+    # Resultados guardados junto a los benchmarks, sin importar desde dónde se corra pytest
+    if getattr(config.option, "benchmark_storage", None) == "file://./.benchmarks":
+        config.option.benchmark_storage = "file://" + RESULTADOS
+
+
+@pytest.fixture(scope="session")
+def filas(request) -> int:
+    return escala_filas(request.config.getoption("--escala"))
+
+
+@pytest.fixture(scope="session")
+def datos(request, filas):
+    """Tablas sintéticas de la sesión (se generan una vez)"""
+    return generar_datos(filas, request.config.getoption("--semilla"))
+
+
+@pytest.fixture
+def nuevo_supabase(datos):
+    """
+    Fábrica de clientes en memoria con los datos de la sesión (cada uno con su
+    propia copia); `tablas` reemplaza tablas puntuales
+    """
+    def crear(tablas=None, **kwargs) -> SupabaseFalso:
+        return SupabaseFalso({**datos, **(tablas or {})}, **kwargs)
+    return crear
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    """Cada caso empieza sin entradas en la caché de datos del proceso"""
+    from database.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def anotar(filas):
+    """Guarda en el resultado la escala y las consultas hechas al doble en la última ronda"""
+    def guardar(benchmark, supabase: SupabaseFalso):
+        benchmark.extra_info["filas"] = filas
+        benchmark.extra_info["consultas"] = sum(supabase.consultas.values())
+        benchmark.extra_info["filas_entregadas"] = supabase.filas_entregadas
+    return guardar
@@ -0,0 +1,293 @@
+"""
+Datos sintéticos reproducibles para los benchmarks
+
+`generar_datos(filas)` arma las tablas comisiones, compras_clientes,
+clientes_b2b, catalogo_productos y devoluciones con las columnas que usa el
+código (mismos nombres y tipos que devuelve Supabase: fechas en texto ISO,
+números como int/float). `filas` es el tamaño de las tablas transaccionales
+(comisiones y compras_clientes); las demás se escalan en proporción. Con la
+misma semilla los datos son idénticos entre corridas, así que los resultados
+de dos versiones del código se pueden comparar.
+
+También genera los archivos Excel que leen los importadores
+(`excel_compras`, `excel_catalogo`).
+"""
+
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from business.gazetteer import ciudades
+
+SEMILLA = 20240601
+
+# Escalas con nombre para BENCH_ESCALA / --escala
+ESCALAS = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+TABLAS = ("comisiones", "compras_clientes", "clientes_b2b", "catalogo_productos", "devoluciones")
+
+IVA = 1.19
+
+# Días hacia atrás desde hoy que cubren las fechas generadas
+DIAS_HISTORIA = 540
+
+MARCAS = ("Bosch", "Mann", "Gates", "NGK", "SKF", "Valeo", "Monroe", "Denso")
+LINEAS = ("Filtros", "Correas", "Bujías", "Rodamientos", "Frenos", "Suspensión", "Eléctricos")
+GRUPOS = ("Motor", "Transmisión", "Frenos", "Suspensión", "Eléctrico")
+MOTIVOS = ("Producto defectuoso", "Error en pedido", "Referencia equivocada", "Sobrante")
+
+
+def escala_filas(escala: Any) -> int:
+    """Número de filas para una escala ("10k", "100k", ... o un entero)"""
+    clave = str(escala).strip().lower()
+    if clave in ESCALAS:
+        return ESCALAS[clave]
+    filas = int(clave)
+    if filas <= 0:
+        raise ValueError(f"Escala inválida: {escala}")
+    return filas
+
+
+def _fechas(rng: np.random.Generator, n: int, hasta: date) -> pd.Series:
+    dias = rng.integers(0, DIAS_HISTORIA, size=n)
+    return pd.Series(pd.Timestamp(hasta) - pd.to_timedelta(dias, unit="D"))
+
+
+def _texto_fecha(fechas: pd.Series, formato: str = "%Y-%m-%d") -> List[Any]:
+    return fechas.dt.strftime(formato).where(fechas.notna(), None).tolist()
+
+
+def _registros(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # Tipos nativos de Python, como los que entrega el JSON de PostgREST
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+
+# ========================================
+# TABLAS
+# ========================================
+
+def generar_clientes(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    nombres_ciudad = np.array([c.nombre for c in ciudades()])
+    # Algunas ciudades en las variantes que llegan de los Excel
+    variantes = np.array([c.nombre.upper() for c in ciudades()])
+    ciudad = np.where(rng.random(n) < 0.2, variantes[rng.integers(0, len(variantes), n)],
+                      nombres_ciudad[rng.integers(0, len(nombres_ciudad), n)])
+    cupo_total = rng.integers(5, 200, n) * 1_000_000.0
+    cupo_utilizado = np.round(cupo_total * rng.random(n), 2)
+    fecha_registro = pd.Timestamp(date.today()) - pd.to_timedelta(rng.integers(0, 1500, n), unit="D")
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "nombre": [f"Distribuidora {i:05d} SAS" for i in range(1, n + 1)],
+        "nit": [str(900_000_000 + i) for i in range(1, n + 1)],
+        "cupo_total": cupo_total,
+        "cupo_utilizado": cupo_utilizado,
+        "cupo_disponible": cupo_total - cupo_utilizado,
+        "plazo_pago": rng.choice([30, 45, 60], n),
+        "descuento_predeterminado": rng.choice([0.0, 5.0, 10.0, 15.0], n),
+        "ciudad": ciudad,
+        "direccion": [f"Calle {i % 120} # {i % 80}-{i % 60}" for i in range(n)],
+        "telefono": [f"60{rng_tel}" for rng_tel in rng.integers(10_000_000, 99_999_999, n)],
+        "email": [f"compras{i}@cliente.co" for i in range(1, n + 1)],
+        "vendedor": "Vendedor Benchmark",
+        "cliente_propio": rng.random(n) < 0.7,
+        "activo": rng.random(n) < 0.95,
+        "fecha_registro": _texto_fecha(pd.Series(fecha_registro), "%Y-%m-%dT%H:%M:%S"),
+        "fecha_actualizacion": _texto_fecha(pd.Series(fecha_registro), "%Y-%m-%dT%H:%M:%S"),
+    })
+
+
+def generar_catalogo(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "cod_ur": [f"UR{i:06d}" for i in range(1, n + 1)],
+        "referencia": [f"REF-{i:06d}" for i in range(1, n + 1)],
+        "equivalencia": [f"EQ{i * 7 % 99_991:05d}" for i in range(1, n + 1)],
+        "descripcion": [f"{LINEAS[i % len(LINEAS)]} referencia {i}" for i in range(1, n + 1)],
+        "marca": np.array(MARCAS)[rng.integers(0, len(MARCAS), n)],
+        "linea": np.array(LINEAS)[rng.integers(0, len(LINEAS), n)],
+        "precio": np.round(rng.lognormal(11, 0.8, n), -2),
+        "detalle_descuento": np.where(rng.random(n) < 0.3, "10+5", ""),
+        "activo": rng.random(n) < 0.97,
+    })
+
+
+def generar_comisiones(rng: np.random.Generator, n: int, clientes: pd.DataFrame) -> pd.DataFrame:
+    hoy = date.today()
+    posicion = rng.integers(0, len(clientes), n)
+    fecha_factura = _fechas(rng, n, hoy)
+    valor_flete = np.where(rng.random(n) < 0.3, rng.integers(10, 60, n) * 1000.0, 0.0)
+    valor_neto = np.round(rng.lognormal(14.5, 1.0, n), 2)
+    iva = np.round(valor_neto * (IVA - 1), 2)
+    condicion_especial = rng.random(n) < 0.15
+    descuento_pie = rng.random(n) < 0.25
+    cliente_propio = clientes["cliente_propio"].to_numpy()[posicion]
+
+    pagado = (fecha_factura < pd.Timestamp(hoy - timedelta(days=20))).to_numpy() & (rng.random(n) < 0.85)
+    dias_pago = np.where(pagado, rng.integers(5, 100, n), np.nan)
+    fecha_pago_real = fecha_factura + pd.to_timedelta(np.nan_to_num(dias_pago), unit="D")
+    fecha_pago_max = fecha_factura + pd.to_timedelta(np.where(condicion_especial, 60, 45), unit="D")
+
+    base_comision = np.where(descuento_pie, valor_neto, valor_neto * 0.85)
+    porcentaje = np.where(cliente_propio, 2.5, 1.0)
+    comision_perdida = np.nan_to_num(dias_pago) > 80
+
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "pedido": [f"PED-{i:07d}" for i in range(1, n + 1)],
+        "cliente": clientes["nombre"].to_numpy()[posicion],
+        "factura": [f"FE{i:08d}" for i in range(1, n + 1)],
+        "fecha_factura": _texto_fecha(fecha_factura),
+        "valor": np.round(valor_neto + iva + valor_flete, 2),
+        "valor_neto": valor_neto,
+        "iva": iva,
+        "valor_flete": valor_flete,
+        "base_comision": np.round(base_comision, 2),
+        "porcentaje": porcentaje,
+        "comision": np.where(comision_perdida, 0.0, np.round(base_comision * porcentaje / 100, 2)),
+        "cliente_propio": cliente_propio,
+        "descuento_pie_factura": descuento_pie,
+        "descuento_adicional": np.where(rng.random(n) < 0.1, 5.0, 0.0),
+        "valor_descuento_pesos": 0.0,
+        "valor_devuelto": 0.0,
+        "condicion_especial": condicion_especial,
+        "ciudad_destino": np.array(["Medellín", "Bogotá", "Resto"])[rng.integers(0, 3, n)],
+        "recogida_local": rng.random(n) < 0.1,
+        "fecha_pago_est": _texto_fecha(fecha_factura + pd.to_timedelta(np.where(condicion_especial, 45, 30), unit="D")),
+        "fecha_pago_max": _texto_fecha(fecha_pago_max),
+        "pagado": pagado,
+        "fecha_pago_real": _texto_fecha(fecha_pago_real.where(pagado)),
+        "dias_pago_real": pd.array(dias_pago, dtype="Int64"),
+        "comision_perdida": comision_perdida,
+        "compra_cliente_id": None,
+        "sincronizado_compras": False,
+        "created_at": _texto_fecha(fecha_factura, "%Y-%m-%dT%H:%M:%S"),
+        "updated_at": _texto_fecha(fecha_factura, "%Y-%m-%dT%H:%M:%S"),
+    })
+
+
+def generar_compras(rng: np.random.Generator, n: int, clientes: pd.DataFrame, catalogo: pd.DataFrame) -> pd.DataFrame:
+    posicion = rng.integers(0, len(clientes), n)
+    # Pocos productos concentran la mayoría de compras (como en los datos reales)
+    producto = np.minimum((rng.pareto(1.2, n) * len(catalogo) / 20).astype(int), len(catalogo) - 1)
+    es_devolucion = rng.random(n) < 0.04
+    cantidad = rng.integers(1, 24, n)
+    valor_unitario = catalogo["precio"].to_numpy()[producto]
+    descuento = rng.choice([0.0, 5.0, 10.0, 15.0], n)
+    total = np.round(cantidad * valor_unitario * (1 - descuento / 100), 2)
+    fecha = _fechas(rng, n, date.today())
+    # Varias líneas por documento
+    num_documento = posicion * 10_000 + rng.integers(0, max(n // max(len(clientes), 1) // 3, 1) + 1, n)
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "cliente_id": clientes["id"].to_numpy()[posicion],
+        "nit_cliente": clientes["nit"].to_numpy()[posicion],
+        "fuente": np.where(es_devolucion, "DV", "FE"),
+        "num_documento": num_documento.astype(str),
+        "fecha": _texto_fecha(fecha, "%Y-%m-%dT%H:%M:%S"),
+        "cod_articulo": catalogo["cod_ur"].to_numpy()[producto],
+        "detalle": catalogo["descripcion"].to_numpy()[producto],
+        "cantidad": cantidad,
+        "valor_unitario": valor_unitario,
+        "descuento": descuento,
+        "total": np.where(es_devolucion, -total, total),
+        "familia": catalogo["linea"].to_numpy()[producto],
+        "marca": catalogo["marca"].to_numpy()[producto],
+        "subgrupo": catalogo["linea"].to_numpy()[producto],
+        "grupo": np.array(GRUPOS)[producto % len(GRUPOS)],
+        "es_devolucion": es_devolucion,
+        "factura_id": None,
+        "sincronizado": False,
+        "fecha_sincronizacion": None,
+        "fecha_carga": _texto_fecha(fecha, "%Y-%m-%dT%H:%M:%S"),
+    })
+
+
+def generar_devoluciones(rng: np.random.Generator, n: int, comisiones: pd.DataFrame) -> pd.DataFrame:
+    posicion = rng.choice(len(comisiones), size=min(n, len(comisiones)), replace=False)
+    n = len(posicion)
+    fecha_factura = pd.to_datetime(comisiones["fecha_factura"].to_numpy()[posicion])
+    fecha_devolucion = pd.Series(fecha_factura + pd.to_timedelta(rng.integers(1, 60, n), unit="D"))
+    valor_devuelto = np.round(comisiones["valor"].to_numpy()[posicion] * rng.uniform(0.05, 0.6, n), 2)
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "factura_id": comisiones["id"].to_numpy()[posicion],
+        "valor_devuelto": valor_devuelto,
+        "fecha_devolucion": _texto_fecha(fecha_devolucion),
+        "motivo": np.array(MOTIVOS)[rng.integers(0, len(MOTIVOS), n)],
+        "afecta_comision": rng.random(n) < 0.9,
+        "created_at": _texto_fecha(fecha_devolucion, "%Y-%m-%dT%H:%M:%S"),
+    })
+
+
+def generar_datos(filas: int, semilla: int = SEMILLA) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Tablas sintéticas listas para SupabaseFalso
+
+    Args:
+        filas: Filas de comisiones y de compras_clientes (1k a 1M)
+        semilla: Semilla del generador; la misma semilla da los mismos datos
+
+    Returns:
+        Diccionario tabla -> lista de registros
+    """
+    rng = np.random.default_rng(semilla)
+    clientes = generar_clientes(rng, max(filas // 50, 20))
+    catalogo = generar_catalogo(rng, max(filas // 20, 50))
+    comisiones = generar_comisiones(rng, filas, clientes)
+    compras = generar_compras(rng, filas, clientes, catalogo)
+    devoluciones = generar_devoluciones(rng, max(filas // 20, 5), comisiones)
+    return {
+        "clientes_b2b": _registros(clientes),
+        "catalogo_productos": _registros(catalogo),
+        "comisiones": _registros(comisiones),
+        "compras_clientes": _registros(compras),
+        "devoluciones": _registros(devoluciones),
+    }
+
+
+# ========================================
+# ARCHIVOS EXCEL DE LOS IMPORTADORES
+# ========================================
+
+def excel_compras(ruta: str, filas: int, cod_articulos: List[str], semilla: int = SEMILLA) -> str:
+    """Excel de compras de un cliente (formato de ClientPurchasesManager.cargar_compras_desde_excel)"""
+    rng = np.random.default_rng(semilla)
+    es_devolucion = rng.random(filas) < 0.05
+    cantidad = rng.integers(1, 24, filas)
+    valor_unitario = np.round(rng.lognormal(11, 0.8, filas), -2)
+    total = cantidad * valor_unitario
+    pd.DataFrame({
+        "FUENTE": np.where(es_devolucion, "DV", "FE"),
+        "NUM_DCTO": rng.integers(100_000, 100_000 + max(filas // 4, 1), filas),
+        "FECHA": _fechas(rng, filas, date.today()),
+        "COD_ARTICULO": np.array(cod_articulos)[rng.integers(0, len(cod_articulos), filas)],
+        "DETALLE": [f"Producto {i}" for i in range(filas)],
+        "CANTIDAD": cantidad,
+        "valor_Unitario": valor_unitario,
+        "dcto": rng.choice([0, 5, 10], filas),
+        "Total": np.where(es_devolucion, -total, total),
+        "FAMILIA": np.array(LINEAS)[rng.integers(0, len(LINEAS), filas)],
+        "Marca": np.array(MARCAS)[rng.integers(0, len(MARCAS), filas)],
+        "SUBGRUPO": "General",
+        "GRUPO": np.array(GRUPOS)[rng.integers(0, len(GRUPOS), filas)],
+    }).to_excel(ruta, index=False)
+    return ruta
+
+
+def excel_catalogo(ruta: str, filas: int, semilla: int = SEMILLA) -> str:
+    """Excel del catálogo (formato de CatalogManager.cargar_catalogo_desde_excel)"""
+    catalogo = generar_catalogo(np.random.default_rng(semilla), filas)
+    catalogo.rename(columns={
+        "cod_ur": "Cod_UR", "referencia": "Referencia", "equivalencia": "Equivalencia",
+        "descripcion": "Descripcion", "marca": "Marca", "linea": "Linea",
+        "precio": "Precio", "detalle_descuento": "DetalleDescuento",
+    }).drop(columns=["id", "activo"]).to_excel(ruta, index=False)
+    return ruta
@@ -0,0 +1,27 @@
+"""
+Entorno común de los benchmarks y la prueba de carga
+
+Debe llamarse antes de importar el proyecto: fija credenciales de mentira
+(nunca se contacta Supabase), versiones de caché solo en memoria y agregados
+por RPC, que en el doble fallan y se calculan localmente como en una base sin
+crear_funciones_agregacion.sql.
+"""
+
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(RAIZ, "crm-react", "backend")
+RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".resultados")
+
+
+def preparar():
+    os.environ.setdefault("SUPABASE_URL", "http://supabase-falso.local")
+    os.environ.setdefault("SUPABASE_KEY", "clave-benchmark")
+    os.environ.setdefault("CACHE_VERSIONS_DB_PATH", ":memory:")
+    os.environ.setdefault("AGGREGATION_BACKEND", "supabase")
+
+    # El backend va antes que la raíz: `app/` del backend colisiona con el app.py de Streamlit
+    for ruta in (RAIZ, BACKEND):
+        if ruta not in sys.path:
+            sys.path.insert(0, ruta)
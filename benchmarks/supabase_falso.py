@@ -0,0 +1,491 @@
+"""
+Cliente de Supabase en memoria para los benchmarks
+
+Implementa el subconjunto de supabase-py (postgrest) que usa el proyecto:
+
+- table(nombre) con select(columnas, count=), insert, update, upsert y delete
+- filtros eq, neq, gt, gte, lt, lte, in_, ilike, like, is_ y or_ (sintaxis
+  de PostgREST: "nombre.ilike.%x%,nit.eq.123")
+- order, range y limit; execute() devuelve un objeto con `data` y `count`
+- recursos embebidos en select ("*, comisiones!devoluciones_factura_id_fkey(pedido, cliente)")
+  según las relaciones de RELACIONES
+- rpc(funcion, parametros): las funciones registradas en `funciones`; las
+  demás fallan como una función inexistente (PGRST202), igual que una base
+  sin crear_funciones_agregacion.sql
+
+Como PostgREST, cada respuesta trae a lo sumo `max_filas` filas (1000 por
+defecto en Supabase) y los valores se comparan como texto cuando los tipos no
+coinciden ("5" encuentra id 5). Cada lectura entrega copias de las filas. Las
+búsquedas por igualdad usan índices por columna armados al primer uso, para
+que el costo del doble no tape el del código medido. Las columnas de
+DEFAULT_AHORA se llenan al insertar con la hora UTC, como `DEFAULT NOW()`.
+"""
+
+import itertools
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Filas máximas por respuesta (db-max-rows de PostgREST en Supabase)
+MAX_FILAS = 1000
+
+# Tabla -> columnas con DEFAULT NOW() que el cliente no envía
+DEFAULT_AHORA: Dict[str, Tuple[str, ...]] = {
+    "cubo_compras": ("actualizado_en",),
+}
+
+# (tabla, recurso embebido) -> (columna local, columna del recurso)
+RELACIONES: Dict[Tuple[str, str], Tuple[str, str]] = {
+    ("devoluciones", "comisiones"): ("factura_id", "id"),
+    ("compras_clientes", "clientes_b2b"): ("cliente_id", "id"),
+    ("compras_clientes", "comisiones"): ("factura_id", "id"),
+    ("comisiones", "compras_clientes"): ("compra_cliente_id", "id"),
+}
+
+
+class ErrorPostgrest(Exception):
+    """Error con el formato de los que lanza postgrest-py"""
+
+    def __init__(self, mensaje: str, codigo: str):
+        super().__init__({"message": mensaje, "code": codigo})
+        self.code = codigo
+
+
+class RespuestaFalsa:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _texto(valor: Any) -> str:
+    """Representación de un valor como la ve PostgREST en la URL"""
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _coincide(valor: Any, objetivo: Any) -> bool:
+    if valor is None or objetivo is None:
+        return False
+    return valor == objetivo or _texto(valor) == _texto(objetivo)
+
+
+def _comparar(valor: Any, objetivo: Any) -> Optional[int]:
+    """-1, 0 o 1 al estilo de Postgres; None si alguno es nulo"""
+    if valor is None or objetivo is None:
+        return None
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool) and isinstance(objetivo, str):
+        try:
+            objetivo = float(objetivo)
+        except ValueError:
+            valor = str(valor)
+    elif isinstance(valor, str) and not isinstance(objetivo, str):
+        objetivo = _texto(objetivo)
+    return (valor > objetivo) - (valor < objetivo)
+
+
+def _patron(patron: str, sin_mayusculas: bool) -> "re.Pattern":
+    expresion = "".join(
+        ".*" if c in "%*" else "." if c == "_" else re.escape(c) for c in str(patron)
+    )
+    return re.compile(f"^{expresion}$", re.IGNORECASE | re.DOTALL if sin_mayusculas else re.DOTALL)
+
+
+def _partir(texto: str) -> List[str]:
+    """Separa por comas de primer nivel (las de dentro de paréntesis no cuentan)"""
+    partes, nivel, actual = [], 0, []
+    for c in texto:
+        if c == "," and nivel == 0:
+            partes.append("".join(actual).strip())
+            actual = []
+            continue
+        nivel += (c == "(") - (c == ")")
+        actual.append(c)
+    partes.append("".join(actual).strip())
+    return [p for p in partes if p]
+
+
+# ========================================
+# FILTROS
+# ========================================
+
+def _filtro(columna: str, operador: str, objetivo: Any) -> Callable[[Dict[str, Any]], bool]:
+    if operador == "eq":
+        return lambda fila: _coincide(fila.get(columna), objetivo)
+    if operador == "neq":
+        return lambda fila: fila.get(columna) is not None and not _coincide(fila.get(columna), objetivo)
+    if operador in ("gt", "gte", "lt", "lte"):
+        aceptados = {"gt": (1,), "gte": (0, 1), "lt": (-1,), "lte": (-1, 0)}[operador]
+        return lambda fila: _comparar(fila.get(columna), objetivo) in aceptados
+    if operador in ("like", "ilike"):
+        patron = _patron(objetivo, operador == "ilike")
+        return lambda fila: fila.get(columna) is not None and bool(patron.match(str(fila.get(columna))))
+    if operador == "in":
+        textos = {_texto(v) for v in objetivo}
+        return lambda fila: fila.get(columna) is not None and _texto(fila.get(columna)) in textos
+    if operador == "is":
+        esperado = {"null": None, "true": True, "false": False}.get(_texto(objetivo).lower(), objetivo)
+        return lambda fila: fila.get(columna) is esperado
+    raise ErrorPostgrest(f"Operador no soportado por el doble: {operador}", "PGRST100")
+
+
+def _filtro_or(expresion: str) -> Callable[[Dict[str, Any]], bool]:
+    """Filtro de or_("col.op.valor,col.op.valor")"""
+    condiciones = []
+    for parte in _partir(expresion):
+        columna, operador, valor = parte.split(".", 2)
+        if operador == "in":
+            valor = [v.strip() for v in valor.strip("()").split(",")]
+        condiciones.append(_filtro(columna, operador, valor))
+    return lambda fila: any(condicion(fila) for condicion in condiciones)
+
+
+# ========================================
+# CONSULTAS
+# ========================================
+
+class ConsultaFalsa:
+    """Constructor de consultas de una tabla (equivalente a los builders de postgrest-py)"""
+
+    def __init__(self, cliente: "SupabaseFalso", tabla: str):
+        self._cliente = cliente
+        self._tabla = tabla
+        self._operacion = "select"
+        self._columnas = "*"
+        self._contar = False
+        self._datos: Any = None
+        self._conflicto = "id"
+        self._filtros: List[Callable[[Dict[str, Any]], bool]] = []
+        self._igualdades: List[Tuple[str, Any]] = []
+        self._orden: List[Tuple[str, bool]] = []
+        self._desde = 0
+        self._hasta: Optional[int] = None
+        self._limite: Optional[int] = None
+
+    # Operaciones
+    def select(self, columnas: str = "*", count: Optional[str] = None, **_):
+        self._columnas = columnas
+        self._contar = count is not None
+        return self
+
+    def insert(self, datos, **_):
+        self._operacion, self._datos = "insert", datos
+        return self
+
+    def upsert(self, datos, on_conflict: str = "id", **_):
+        self._operacion, self._datos, self._conflicto = "upsert", datos, on_conflict or "id"
+        return self
+
+    def update(self, datos: Dict[str, Any], **_):
+        self._operacion, self._datos = "update", datos
+        return self
+
+    def delete(self, **_):
+        self._operacion = "delete"
+        return self
+
+    # Filtros
+    def eq(self, columna: str, valor: Any):
+        self._igualdades.append((columna, valor))
+        return self
+
+    def neq(self, columna: str, valor: Any):
+        return self._agregar(columna, "neq", valor)
+
+    def gt(self, columna: str, valor: Any):
+        return self._agregar(columna, "gt", valor)
+
+    def gte(self, columna: str, valor: Any):
+        return self._agregar(columna, "gte", valor)
+
+    def lt(self, columna: str, valor: Any):
+        return self._agregar(columna, "lt", valor)
+
+    def lte(self, columna: str, valor: Any):
+        return self._agregar(columna, "lte", valor)
+
+    def like(self, columna: str, patron: str):
+        return self._agregar(columna, "like", patron)
+
+    def ilike(self, columna: str, patron: str):
+        return self._agregar(columna, "ilike", patron)
+
+    def in_(self, columna: str, valores: Iterable[Any]):
+        return self._agregar(columna, "in", list(valores))
+
+    def is_(self, columna: str, valor: Any):
+        return self._agregar(columna, "is", valor)
+
+    def or_(self, expresion: str, **_):
+        self._filtros.append(_filtro_or(expresion))
+        return self
+
+    def _agregar(self, columna: str, operador: str, valor: Any):
+        self._filtros.append(_filtro(columna, operador, valor))
+        return self
+
+    # Modificadores
+    def order(self, columna: str, desc: bool = False, **_):
+        self._orden.append((columna, desc))
+        return self
+
+    def range(self, desde: int, hasta: int):
+        self._desde, self._hasta = desde, hasta
+        return self
+
+    def limit(self, cantidad: int, **_):
+        self._limite = cantidad
+        return self
+
+    def execute(self) -> RespuestaFalsa:
+        return self._cliente._ejecutar(self)
+
+
+class RpcFalsa:
+    """Llamada a una función de Postgres (rpc)"""
+
+    def __init__(self, cliente: "SupabaseFalso", funcion: str, parametros: Dict[str, Any]):
+        self._cliente = cliente
+        self._funcion = funcion
+        self._parametros = parametros or {}
+        self._desde = 0
+        self._hasta: Optional[int] = None
+
+    def range(self, desde: int, hasta: int):
+        self._desde, self._hasta = desde, hasta
+        return self
+
+    def execute(self) -> RespuestaFalsa:
+        return self._cliente._ejecutar_rpc(self)
+
+
+# ========================================
+# CLIENTE
+# ========================================
+
+class SupabaseFalso:
+    """
+    Cliente en memoria con la interfaz de supabase.Client que usa el proyecto
+
+    Args:
+        tablas: Tabla -> registros iniciales (se copian)
+        max_filas: Filas máximas por respuesta (None = sin tope)
+        funciones: Funciones rpc disponibles (nombre -> callable(parametros) -> registros)
+        latencia: Segundos de espera por consulta (ida y vuelta de red simulada)
+    """
+
+    _instancias = itertools.count(1)
+
+    def __init__(self, tablas: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 max_filas: Optional[int] = MAX_FILAS,
+                 funciones: Optional[Dict[str, Callable[[Dict[str, Any]], List[Dict[str, Any]]]]] = None,
+                 latencia: float = 0.0):
+        # URL propia por instancia: los singletons por URL (cubo de compras) no se comparten entre pruebas
+        self.supabase_url = f"http://supabase-falso-{next(self._instancias)}.local"
+        self.max_filas = max_filas
+        self.latencia = latencia
+        self.funciones = dict(funciones or {})
+        self._lock = threading.RLock()
+        self._tablas: Dict[str, List[Dict[str, Any]]] = {
+            nombre: [dict(fila) for fila in filas] for nombre, filas in (tablas or {}).items()
+        }
+        self._siguiente_id: Dict[str, int] = {}
+        # (tabla, columna) -> texto del valor -> filas
+        self._indices: Dict[Tuple[str, str], Dict[str, List[Dict[str, Any]]]] = {}
+        # Consultas ejecutadas por (tabla o rpc, operación) y filas entregadas
+        self.consultas: Counter = Counter()
+        self.filas_entregadas = 0
+
+    def table(self, nombre: str) -> ConsultaFalsa:
+        return ConsultaFalsa(self, nombre)
+
+    from_ = table
+
+    def rpc(self, funcion: str, parametros: Optional[Dict[str, Any]] = None) -> RpcFalsa:
+        return RpcFalsa(self, funcion, parametros)
+
+    def filas(self, tabla: str) -> List[Dict[str, Any]]:
+        """Contenido actual de una tabla (copias)"""
+        with self._lock:
+            return [dict(fila) for fila in self._tablas.get(tabla, [])]
+
+    def reiniciar_contadores(self):
+        self.consultas.clear()
+        self.filas_entregadas = 0
+
+    # ========================================
+    # EJECUCIÓN
+    # ========================================
+
+    def _esperar_red(self):
+        # Fuera del lock: las consultas de hilos distintos esperan en paralelo, como por HTTP
+        if self.latencia > 0:
+            time.sleep(self.latencia)
+
+    def _ejecutar(self, consulta: ConsultaFalsa) -> RespuestaFalsa:
+        self._esperar_red()
+        with self._lock:
+            self.consultas[(consulta._tabla, consulta._operacion)] += 1
+            filas = self._tablas.setdefault(consulta._tabla, [])
+            if consulta._operacion == "insert":
+                return RespuestaFalsa(self._insertar(consulta._tabla, consulta._datos))
+            if consulta._operacion == "upsert":
+                return RespuestaFalsa(self._upsert(consulta._tabla, consulta._datos, consulta._conflicto))
+
+            seleccionadas = self._filtrar(consulta, filas)
+            if consulta._operacion == "update":
+                return RespuestaFalsa(self._actualizar(consulta._tabla, seleccionadas, consulta._datos))
+            if consulta._operacion == "delete":
+                return RespuestaFalsa(self._borrar(consulta._tabla, seleccionadas))
+
+            total = len(seleccionadas) if consulta._contar else None
+            for columna, desc in reversed(consulta._orden):
+                # Nulos al final en orden ascendente y al inicio en descendente (como Postgres)
+                seleccionadas = sorted(
+                    seleccionadas,
+                    key=lambda fila: (fila.get(columna) is None, fila.get(columna) if fila.get(columna) is not None else 0),
+                    reverse=desc
+                )
+            pagina = self._paginar(seleccionadas, consulta._desde, consulta._hasta, consulta._limite)
+            resultado = [self._proyectar(consulta._tabla, fila, consulta._columnas) for fila in pagina]
+            self.filas_entregadas += len(resultado)
+            return RespuestaFalsa(resultado, total)
+
+    def _ejecutar_rpc(self, llamada: RpcFalsa) -> RespuestaFalsa:
+        self._esperar_red()
+        with self._lock:
+            self.consultas[(f"rpc:{llamada._funcion}", "rpc")] += 1
+        funcion = self.funciones.get(llamada._funcion)
+        if funcion is None:
+            raise ErrorPostgrest(
+                f"Could not find the function public.{llamada._funcion} in the schema cache", "PGRST202"
+            )
+        filas = self._paginar(list(funcion(dict(llamada._parametros))), llamada._desde, llamada._hasta, None)
+        self.filas_entregadas += len(filas)
+        return RespuestaFalsa([dict(fila) for fila in filas])
+
+    def _paginar(self, filas: List[Dict[str, Any]], desde: int, hasta: Optional[int], limite: Optional[int]):
+        fin = len(filas) if hasta is None else hasta + 1
+        if limite is not None:
+            fin = min(fin, desde + limite)
+        if self.max_filas is not None:
+            fin = min(fin, desde + self.max_filas)
+        return filas[desde:fin]
+
+    def _filtrar(self, consulta: ConsultaFalsa, filas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        candidatas = filas
+        condiciones = list(consulta._filtros)
+        for posicion, (columna, valor) in enumerate(consulta._igualdades):
+            if posicion == 0:
+                candidatas = self._indice(consulta._tabla, columna).get(_texto(valor), []) if valor is not None else []
+            else:
+                condiciones.append(_filtro(columna, "eq", valor))
+        if not condiciones:
+            return list(candidatas)
+        return [fila for fila in candidatas if all(condicion(fila) for condicion in condiciones)]
+
+    def _indice(self, tabla: str, columna: str) -> Dict[str, List[Dict[str, Any]]]:
+        indice = self._indices.get((tabla, columna))
+        if indice is None:
+            indice = defaultdict(list)
+            for fila in self._tablas.get(tabla, []):
+                if fila.get(columna) is not None:
+                    indice[_texto(fila[columna])].append(fila)
+            self._indices[(tabla, columna)] = indice
+        return indice
+
+    def _proyectar(self, tabla: str, fila: Dict[str, Any], columnas: str) -> Dict[str, Any]:
+        resultado: Dict[str, Any] = {}
+        for parte in _partir(" ".join(columnas.split())):
+            if parte == "*":
+                resultado.update(fila)
+            elif "(" in parte:
+                recurso, internas = parte.split("(", 1)
+                nombre = recurso.split("!")[0].split(":")[-1].strip()
+                alias = recurso.split(":")[0].strip() if ":" in recurso else nombre
+                resultado[alias] = self._embebido(tabla, nombre, fila, internas.rstrip(")"))
+            else:
+                alias, _, columna = parte.rpartition(":")
+                resultado[alias.strip() or columna.strip()] = fila.get(columna.strip())
+        return resultado
+
+    def _embebido(self, tabla: str, recurso: str, fila: Dict[str, Any], columnas: str) -> Optional[Dict[str, Any]]:
+        relacion = RELACIONES.get((tabla, recurso))
+        if relacion is None:
+            raise ErrorPostgrest(
+                f"Could not find a relationship between '{tabla}' and '{recurso}' in the schema cache", "PGRST200"
+            )
+        local, remota = relacion
+        if fila.get(local) is None:
+            return None
+        relacionadas = self._indice(recurso, remota).get(_texto(fila[local]), [])
+        return self._proyectar(recurso, relacionadas[0], columnas) if relacionadas else None
+
+    # ========================================
+    # ESCRITURAS
+    # ========================================
+
+    def _nuevo_id(self, tabla: str) -> int:
+        if tabla not in self._siguiente_id:
+            ids = [f["id"] for f in self._tablas.get(tabla, []) if isinstance(f.get("id"), int)]
+            self._siguiente_id[tabla] = max(ids, default=0) + 1
+        nuevo = self._siguiente_id[tabla]
+        self._siguiente_id[tabla] += 1
+        return nuevo
+
+    def _insertar(self, tabla: str, datos) -> List[Dict[str, Any]]:
+        registros = datos if isinstance(datos, list) else [datos]
+        insertadas = []
+        for registro in registros:
+            fila = dict(registro)
+            if fila.get("id") is None:
+                fila["id"] = self._nuevo_id(tabla)
+            for columna in DEFAULT_AHORA.get(tabla, ()):
+                if fila.get(columna) is None:
+                    fila[columna] = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+            self._tablas[tabla].append(fila)
+            for (tabla_indice, columna), indice in self._indices.items():
+                if tabla_indice == tabla and fila.get(columna) is not None:
+                    indice[_texto(fila[columna])].append(fila)
+            insertadas.append(dict(fila))
+        return insertadas
+
+    def _upsert(self, tabla: str, datos, conflicto: str) -> List[Dict[str, Any]]:
+        columnas = [c.strip() for c in conflicto.split(",")]
+        resultado = []
+        for registro in (datos if isinstance(datos, list) else [datos]):
+            existentes = self._tablas[tabla]
+            if all(registro.get(c) is not None for c in columnas):
+                existentes = self._indice(tabla, columnas[0]).get(_texto(registro[columnas[0]]), [])
+                existentes = [f for f in existentes if all(_coincide(f.get(c), registro.get(c)) for c in columnas)]
+            else:
+                existentes = []
+            if existentes:
+                resultado.extend(self._actualizar(tabla, existentes[:1], registro))
+            else:
+                resultado.extend(self._insertar(tabla, registro))
+        return resultado
+
+    def _actualizar(self, tabla: str, filas: List[Dict[str, Any]], datos: Dict[str, Any]) -> List[Dict[str, Any]]:
+        cambiadas = {
+            columna for columna, valor in datos.items()
+            if any(not _coincide(fila.get(columna), valor) for fila in filas)
+        }
+        for fila in filas:
+            fila.update(datos)
+        # Los índices de las columnas que cambiaron se rearman en el próximo uso
+        for columna in cambiadas:
+            self._indices.pop((tabla, columna), None)
+        return [dict(fila) for fila in filas]
+
+    def _borrar(self, tabla: str, filas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        borrar = {id(fila) for fila in filas}
+        self._tablas[tabla] = [fila for fila in self._tablas[tabla] if id(fila) not in borrar]
+        for clave in [clave for clave in self._indices if clave[0] == tabla]:
+            del self._indices[clave]
+        return [dict(fila) for fila in filas]
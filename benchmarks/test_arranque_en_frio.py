@@ -0,0 +1,80 @@
+"""
+Arranque en frío del backend: `import main` y el primer /api/health en un intérprete nuevo
+
+En Vercel cada instancia nueva paga la importación completa de la app. Los
+routers no deben cargar librerías pesadas al importarse: pandas, scikit-learn,
+supabase, etc. se importan dentro del endpoint que las usa.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.entorno import BACKEND
+
+RONDAS = 3
+
+# Segundos que puede tardar `import main` (BENCH_PRESUPUESTO_IMPORTACION)
+PRESUPUESTO_IMPORTACION = float(os.getenv("BENCH_PRESUPUESTO_IMPORTACION", "1.0"))
+
+# Ninguna de estas debe quedar cargada tras importar la app y responder /api/health
+PESADOS = ("pandas", "numpy", "sklearn", "scipy", "joblib", "supabase", "streamlit", "plotly")
+
+_SCRIPT = f"""
+import asyncio, json, sys
+from time import perf_counter
+
+inicio = perf_counter()
+import main
+importacion = perf_counter() - inicio
+tras_importar = [m for m in {PESADOS!r} if m in sys.modules]
+
+import httpx
+
+async def pedir():
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://crm") as cliente:
+        return (await cliente.get("/api/health")).status_code
+
+inicio = perf_counter()
+estado = asyncio.run(pedir())
+print(json.dumps({{
+    "importacion": importacion,
+    "health": perf_counter() - inicio,
+    "estado": estado,
+    "tras_importar": tras_importar,
+    "tras_health": [m for m in {PESADOS!r} if m in sys.modules],
+}}))
+"""
+
+
+def _arrancar() -> dict:
+    salida = subprocess.run(
+        [sys.executable, "-c", _SCRIPT], cwd=BACKEND, env=dict(os.environ),
+        capture_output=True, text=True, check=True
+    ).stdout
+    # main.py imprime la configuración de CORS antes del resultado
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def test_arranque_en_frio(benchmark):
+    medidas = []
+
+    def arrancar():
+        medidas.append(_arrancar())
+
+    benchmark.pedantic(arrancar, rounds=RONDAS, iterations=1)
+
+    importacion = min(m["importacion"] for m in medidas)
+    benchmark.extra_info["importacion_s"] = round(importacion, 4)
+    benchmark.extra_info["health_s"] = round(min(m["health"] for m in medidas), 4)
+
+    ultima = medidas[-1]
+    assert ultima["estado"] == 200
+    assert ultima["tras_importar"] == [], f"Importados al cargar main: {ultima['tras_importar']}"
+    assert ultima["tras_health"] == [], f"Importados al responder /api/health: {ultima['tras_health']}"
+    assert importacion <= PRESUPUESTO_IMPORTACION, (
+        f"import main tardó {importacion:.2f} s (presupuesto {PRESUPUESTO_IMPORTACION:.2f} s); "
+        f"revisar con: python -X importtime -c 'import main'"
+    )
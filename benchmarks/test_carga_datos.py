@@ -0,0 +1,68 @@
+"""Carga de tablas completas (DatabaseManager y repositorios), sin caché y con caché caliente"""
+
+import pytest
+
+from database.cache import cache
+from database.queries import DatabaseManager
+
+RONDAS = 5
+
+
+def _en_frio(benchmark, supabase, funcion):
+    """Mide `funcion` con la caché vacía en cada ronda (incluye la lectura de Supabase)"""
+    def preparar():
+        cache.clear()
+        supabase.reiniciar_contadores()
+    return benchmark.pedantic(funcion, setup=preparar, rounds=RONDAS, iterations=1)
+
+
+def test_cargar_datos_comisiones(benchmark, nuevo_supabase, anotar):
+    supabase = nuevo_supabase()
+    db_manager = DatabaseManager(supabase)
+
+    df = _en_frio(benchmark, supabase, db_manager.cargar_datos)
+
+    anotar(benchmark, supabase)
+    assert not df.empty
+
+
+def test_cargar_datos_comisiones_cacheado(benchmark, nuevo_supabase, anotar):
+    supabase = nuevo_supabase()
+    db_manager = DatabaseManager(supabase)
+    db_manager.cargar_datos()
+    supabase.reiniciar_contadores()
+
+    df = benchmark(db_manager.cargar_datos)
+
+    anotar(benchmark, supabase)
+    assert supabase.consultas == {}
+    assert not df.empty
+
+
+def test_cargar_devoluciones(benchmark, nuevo_supabase, anotar):
+    supabase = nuevo_supabase()
+    db_manager = DatabaseManager(supabase)
+
+    df = _en_frio(benchmark, supabase, db_manager.cargar_devoluciones)
+
+    anotar(benchmark, supabase)
+    assert 'factura_cliente' in df.columns
+
+
+@pytest.mark.parametrize("cargador", ["clientes", "compras", "catalogo"])
+def test_cargar_tablas_paginadas(benchmark, nuevo_supabase, anotar, cargador):
+    from database.catalog_manager import CatalogManager
+    from database.client_purchases_manager import ClientPurchasesManager
+    from database.client_repository import get_client_repository
+
+    supabase = nuevo_supabase()
+    funcion = {
+        "clientes": lambda: get_client_repository(supabase).listar(solo_activos=False),
+        "compras": ClientPurchasesManager(supabase).cargar_compras,
+        "catalogo": CatalogManager(supabase).cargar_catalogo,
+    }[cargador]
+
+    df = _en_frio(benchmark, supabase, funcion)
+
+    anotar(benchmark, supabase)
+    assert not df.empty
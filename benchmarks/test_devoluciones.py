@@ -0,0 +1,74 @@
+"""Libro de devoluciones: registro por lotes con ajuste de comisión, totales por mes y cliente por llamada"""
+
+from database.return_ledger import comision_ajustada, get_return_ledger
+
+RONDAS = 3
+
+# Devoluciones por lote registrado
+LOTE = 200
+
+
+def _lote(supabase, n: int = LOTE):
+    facturas = supabase.filas("comisiones")[:n]
+    return [
+        {
+            "factura_id": factura["id"],
+            "valor_devuelto": round(float(factura["valor"]) * 0.1, 2),
+            "fecha_devolucion": factura["fecha_factura"],
+            "afecta_comision": True,
+        }
+        for factura in facturas
+    ]
+
+
+def test_registrar_lote_devoluciones(benchmark, nuevo_supabase, anotar):
+    # Cada ronda escribe: se parte de una copia nueva de las tablas
+    estado = {}
+
+    def preparar():
+        estado["supabase"] = nuevo_supabase()
+        return (get_return_ledger(estado["supabase"]), _lote(estado["supabase"])), {}
+
+    insertadas = benchmark.pedantic(
+        lambda libro, lote: libro.registrar(lote), setup=preparar, rounds=RONDAS, iterations=1
+    )
+
+    supabase = estado["supabase"]
+    anotar(benchmark, supabase)
+    assert len(insertadas) == LOTE
+
+    # La comisión de cada factura refleja todas sus devoluciones (previas y nuevas)
+    factura = next(f for f in supabase.filas("comisiones") if f["id"] == insertadas[0]["factura_id"])
+    devuelto = sum(
+        d["valor_devuelto"] for d in supabase.filas("devoluciones")
+        if d["factura_id"] == factura["id"] and d.get("afecta_comision", True) is not False
+    )
+    assert abs(factura["valor_devuelto"] - devuelto) < 0.01
+    assert abs(factura["comision_ajustada"] - comision_ajustada(factura, devuelto)) < 0.01
+
+
+def test_totales_devoluciones_por_mes(benchmark, nuevo_supabase, anotar):
+    supabase = nuevo_supabase()
+    libro = get_return_ledger(supabase)
+    libro.totales_por_mes()
+    supabase.reiniciar_contadores()
+
+    por_mes = benchmark(libro.totales_por_mes)
+
+    anotar(benchmark, supabase)
+    assert supabase.consultas == {}
+    assert por_mes['num_devoluciones'].sum() == len(supabase.filas("devoluciones"))
+
+
+def test_libro_escribe_con_el_cliente_de_cada_llamada(nuevo_supabase):
+    # Dos requests del mismo proyecto: comparten el libro en memoria, no el cliente
+    primero, segundo = nuevo_supabase(), nuevo_supabase()
+    segundo.supabase_url = primero.supabase_url
+    get_return_ledger(primero).totales_por_mes()
+
+    antes = len(primero.filas("devoluciones"))
+    insertadas = get_return_ledger(segundo).registrar(_lote(segundo, 1))
+
+    assert len(insertadas) == 1
+    assert len(primero.filas("devoluciones")) == antes
+    assert len(segundo.filas("devoluciones")) == antes + 1
@@ -0,0 +1,52 @@
+"""Endpoints analíticos del backend (FastAPI) sobre el doble de Supabase, sin caché"""
+
+from datetime import date
+from unittest import mock
+
+import pytest
+
+from database.cache import cache
+
+RONDAS = 5
+
+# Las fechas sintéticas llegan hasta hoy: el mes en curso siempre tiene facturas
+MES = date.today().strftime("%Y-%m")
+
+ENDPOINTS = (
+    "/api/analytics/geografico",
+    "/api/analytics/comercial",
+    "/api/analytics/comisiones-mensuales",
+    "/api/analytics/comisiones-gerencia",
+    "/api/analytics/compras",
+    "/api/dashboard/bundle",
+    "/api/dashboard/colombia-map",
+    "/api/dashboard/referencias-por-ciudad",
+    "/api/dashboard/mapa-interactivo",
+    f"/api/comisiones/facturas?mes={MES}",
+    f"/api/dashboard/clientes-clave?mes={MES}",
+)
+
+
+@pytest.fixture(scope="module")
+def cliente_api():
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("ruta", ENDPOINTS)
+def test_endpoint(benchmark, cliente_api, nuevo_supabase, anotar, ruta):
+    supabase = nuevo_supabase()
+
+    def preparar():
+        cache.clear()
+        supabase.reiniciar_contadores()
+
+    with mock.patch("supabase.create_client", lambda *args, **kwargs: supabase):
+        respuesta = benchmark.pedantic(
+            cliente_api.get, args=(ruta,), setup=preparar, rounds=RONDAS, iterations=1
+        )
+
+    anotar(benchmark, supabase)
+    benchmark.extra_info["bytes_respuesta"] = len(respuesta.content)
+    assert respuesta.status_code == 200, respuesta.text[:500]
@@ -0,0 +1,57 @@
+"""Importadores de Excel: compras de un cliente y catálogo de productos"""
+
+import pytest
+
+from benchmarks.datos_sinteticos import excel_catalogo, excel_compras
+
+RONDAS = 3
+
+# Filas de los archivos: una décima parte de la escala, entre 100 y 50.000
+FILAS_MINIMAS = 100
+FILAS_MAXIMAS = 50_000
+
+
+@pytest.fixture(scope="module")
+def filas_excel(filas) -> int:
+    return max(min(filas // 10, FILAS_MAXIMAS), FILAS_MINIMAS)
+
+
+def test_cargar_compras_desde_excel(benchmark, tmp_path, datos, filas_excel, nuevo_supabase, anotar):
+    from database.client_purchases_manager import ClientPurchasesManager
+
+    nit = datos["clientes_b2b"][0]["nit"]
+    codigos = [p["cod_ur"] for p in datos["catalogo_productos"]]
+    ruta = excel_compras(str(tmp_path / "compras.xlsx"), filas_excel, codigos)
+    estado = {}
+
+    def preparar():
+        estado["supabase"] = nuevo_supabase()
+        return (ClientPurchasesManager(estado["supabase"]),), {}
+
+    resultado = benchmark.pedantic(
+        lambda manager: manager.cargar_compras_desde_excel(ruta, nit), setup=preparar, rounds=RONDAS, iterations=1
+    )
+
+    anotar(benchmark, estado["supabase"])
+    benchmark.extra_info["filas_excel"] = filas_excel
+    assert resultado.get("success"), resultado
+
+
+def test_cargar_catalogo_desde_excel(benchmark, tmp_path, filas_excel, nuevo_supabase, anotar):
+    from database.catalog_manager import CatalogManager
+
+    ruta = excel_catalogo(str(tmp_path / "catalogo.xlsx"), filas_excel)
+    estado = {}
+
+    def preparar():
+        # Con 10 o más productos el importador no recarga: se parte de un catálogo vacío
+        estado["supabase"] = nuevo_supabase(tablas={"catalogo_productos": []})
+        return (CatalogManager(estado["supabase"]),), {}
+
+    resultado = benchmark.pedantic(
+        lambda manager: manager.cargar_catalogo_desde_excel(ruta), setup=preparar, rounds=RONDAS, iterations=1
+    )
+
+    anotar(benchmark, estado["supabase"])
+    benchmark.extra_info["filas_excel"] = filas_excel
+    assert "error" not in resultado, resultado
@@ -0,0 +1,33 @@
+"""SyncManager: análisis de coincidencias compras ↔ facturas y sincronización automática"""
+
+from database.sync_manager import SyncManager
+
+RONDAS = 3
+
+
+def test_analizar_sincronizacion(benchmark, nuevo_supabase, anotar):
+    supabase = nuevo_supabase()
+    sync = SyncManager(supabase)
+
+    resultado = benchmark.pedantic(
+        sync.analizar_sincronizacion, setup=supabase.reiniciar_contadores, rounds=RONDAS, iterations=1
+    )
+
+    anotar(benchmark, supabase)
+    assert "error" not in resultado
+
+
+def test_sincronizar_todas_automaticas(benchmark, nuevo_supabase, anotar):
+    # Cada ronda escribe: se parte de una copia nueva de las tablas
+    estado = {}
+
+    def preparar():
+        estado["supabase"] = nuevo_supabase()
+        return (SyncManager(estado["supabase"]),), {}
+
+    resultado = benchmark.pedantic(
+        lambda sync: sync.sincronizar_todas_automaticas(), setup=preparar, rounds=RONDAS, iterations=1
+    )
+
+    anotar(benchmark, estado["supabase"])
+    assert "error" not in resultado
@@ -1,29 +1,84 @@
 import pandas as pd
 import numpy as np
+import os
+import json
+import hashlib
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Any, Tuple
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
+from typing import TYPE_CHECKING, Dict, List, Any, Tuple, Optional, Union
 import warnings
 warnings.filterwarnings('ignore')
 
+# scikit-learn y joblib se importan al entrenar o cargar un artefacto, no al importar el módulo
+if TYPE_CHECKING:
+    from sklearn.cluster import MiniBatchKMeans
+
+# Directorio de artefactos del modelo (versionados por datos de entrenamiento)
+MODEL_DIR = os.getenv(
+    "CLIENT_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "modelos")
+)
+
 class ClientClassifier:
     """Sistema de clasificación de clientes con Machine Learning"""
     
-    def __init__(self, db_manager):
+    # Cambiar al modificar features o algoritmo: invalida los artefactos guardados
+    MODEL_SCHEMA_VERSION = 1
+    N_CLUSTERS = 4
+    
+    # Features en el orden que espera el modelo
+    ML_FEATURES = [
+        'frecuencia_compras', 'ticket_promedio', 'volumen_total',
+        'puntualidad_pago', 'variabilidad_pago', 'antiguedad_cliente',
+        'ultima_compra_dias', 'es_cliente_propio', 'descuento_promedio'
+    ]
+    
+    # Columnas que determinan la versión de los datos
+    DATA_VERSION_COLUMNS = [
+        'cliente', 'valor', 'comision', 'dias_pago_real', 'fecha_factura',
+        'cliente_propio', 'descuento_adicional'
+    ]
+    
+    # Reentrenar desde cero (con arranque en caliente) pasado este tiempo
+    MAX_DIAS_INCREMENTAL = 30
+    
+    # Artefactos que se conservan en model_dir (los más recientes)
+    MAX_ARTEFACTOS = 5
+    
+    def __init__(self, db_manager, model_dir: Optional[str] = None):
         self.db_manager = db_manager
-        self.scaler = StandardScaler()
-        self.kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
-        self.pca = PCA(n_components=2)
+        self.model_dir = model_dir or MODEL_DIR
+        # Estimadores de scikit-learn: se crean al entrenar o cargar un artefacto
+        self.scaler = None
+        self.kmeans = None
+        self.pca = None
         self.is_trained = False
+        self.metadata: Dict[str, Any] = {}
         
-    def entrenar_modelo(self, meses_historial: int = 12) -> Dict[str, Any]:
+        # Arranque en caliente: reutilizar el último modelo guardado
+        self._cargar_ultimo_modelo()
+    
+    def _nuevo_kmeans(self, init: Union[str, np.ndarray] = "k-means++") -> "MiniBatchKMeans":
+        from sklearn.cluster import MiniBatchKMeans
+
+        return MiniBatchKMeans(
+            n_clusters=self.N_CLUSTERS,
+            init=init,
+            n_init=10 if isinstance(init, str) else 1,
+            batch_size=1024,
+            random_state=42
+        )
+    
+    def entrenar_modelo(self, meses_historial: int = 12, forzar: bool = False) -> Dict[str, Any]:
         """
         Entrena el modelo de clasificación de clientes
         
+        Si ya existe un artefacto para la misma versión de datos se reutiliza; si
+        solo llegaron facturas nuevas (las anteriores no cambiaron) se actualiza con
+        `partial_fit`; en otro caso se reentrena partiendo de los centroides anteriores.
+        
         Args:
             meses_historial: Meses de datos históricos para entrenar (recomendado: 12-18 meses)
+            forzar: Ignorar artefactos guardados y reentrenar desde cero
         """
         try:
             # Obtener datos históricos
@@ -36,15 +91,55 @@ class ClientClassifier:
                     "recomendacion": "Esperar a tener más datos históricos o reducir meses_historial"
                 }
             
+            version = self._calcular_version_datos(df, meses_historial)
+            
+            # 1. Mismo conjunto de datos: cargar artefacto sin reentrenar
+            if not forzar and self._cargar_modelo(version):
+                return {**self.metadata["resultado"], "modo": "cache", "version_datos": version}
+            
             # Preparar features para ML
             features_df = self._preparar_features(df)
             
-            # Entrenar modelo
-            X_scaled = self.scaler.fit_transform(features_df)
-            clusters = self.kmeans.fit_predict(X_scaled)
+            fecha_max = df['fecha_factura'].max()
+            hash_por_dia = self._hash_por_dia(df)
+            modo = "completo"
+            if not forzar and self._puede_actualizar_incremental(meses_historial):
+                # 2. Solo facturas nuevas: actualizar con los clientes afectados
+                ultima = pd.Timestamp(self.metadata["fecha_max_factura"])
+                clientes_nuevos = df.loc[df['fecha_factura'] > ultima, 'cliente'].unique()
+                X_nuevos = features_df.loc[features_df.index.isin(clientes_nuevos)]
+                if not X_nuevos.empty and self._solo_facturas_nuevas(hash_por_dia, ultima, meses_historial):
+                    # Las medias y varianzas solo suman clientes que no estaban en el ajuste
+                    X_no_vistos = X_nuevos.loc[~X_nuevos.index.isin(self.metadata["clientes"])]
+                    if not X_no_vistos.empty:
+                        self.scaler.partial_fit(X_no_vistos)
+                    X_nuevos_scaled = self.scaler.transform(X_nuevos)
+                    self.kmeans.partial_fit(X_nuevos_scaled)
+                    if len(X_no_vistos) >= self.pca.n_components:
+                        self.pca.partial_fit(self.scaler.transform(X_no_vistos))
+                    modo = "incremental"
+                    X_scaled = self.scaler.transform(features_df)
+            
+            if modo == "completo":
+                # 3. Reentrenamiento completo, arrancando en caliente si hay modelo previo
+                from sklearn.decomposition import IncrementalPCA
+                from sklearn.preprocessing import StandardScaler
+
+                centros_previos = None
+                if self.is_trained:
+                    centros_previos = self.scaler.inverse_transform(self.kmeans.cluster_centers_)
+                
+                self.scaler = StandardScaler()
+                X_scaled = self.scaler.fit_transform(features_df)
+                init = self.scaler.transform(centros_previos) if centros_previos is not None else "k-means++"
+                self.kmeans = self._nuevo_kmeans(init)
+                self.kmeans.fit(X_scaled)
+                
+                # Reducir dimensionalidad para visualización
+                self.pca = IncrementalPCA(n_components=2)
+                self.pca.fit(X_scaled)
             
-            # Reducir dimensionalidad para visualización
-            X_pca = self.pca.fit_transform(X_scaled)
+            clusters = self._predecir_scaled(X_scaled)[0]
             
             # Analizar clusters
             cluster_analysis = self._analizar_clusters(df, clusters, features_df)
@@ -52,7 +147,7 @@ class ClientClassifier:
             # Guardar modelo entrenado
             self.is_trained = True
             
-            return {
+            resultado = {
                 "success": True,
                 "clientes_entrenados": len(df),
                 "meses_analizados": meses_historial,
@@ -61,6 +156,28 @@ class ClientClassifier:
                 "recomendacion_tiempo": self._recomendar_tiempo_entrenamiento(len(df))
             }
             
+            entrenado_en = datetime.now().isoformat()
+            if modo == "completo":
+                entrenado_completo_en = entrenado_en
+            else:
+                entrenado_completo_en = self.metadata.get("entrenado_completo_en", entrenado_en)
+            
+            self.metadata = {
+                "schema": self.MODEL_SCHEMA_VERSION,
+                "version_datos": version,
+                "meses_historial": meses_historial,
+                "fecha_max_factura": pd.Timestamp(fecha_max).isoformat(),
+                "hash_por_dia": hash_por_dia,
+                "clientes": [str(c) for c in features_df.index],
+                "entrenado_en": entrenado_en,
+                "entrenado_completo_en": entrenado_completo_en,
+                "modo": modo,
+                "resultado": resultado
+            }
+            self._guardar_modelo()
+            
+            return {**resultado, "modo": modo, "version_datos": version}
+            
         except Exception as e:
             return {
                 "success": False,
@@ -68,6 +185,120 @@ class ClientClassifier:
                 "recomendacion": "Verificar datos y configuración"
             }
     
+    # ========================================
+    # PERSISTENCIA DE ARTEFACTOS
+    # ========================================
+    
+    def _calcular_version_datos(self, df: pd.DataFrame, meses_historial: int) -> str:
+        """Hash estable del contenido de entrenamiento (mismas facturas -> misma versión)"""
+        columnas = [c for c in self.DATA_VERSION_COLUMNS if c in df.columns]
+        hash_filas = pd.util.hash_pandas_object(
+            df[columnas].sort_values(columnas[:2]).reset_index(drop=True), index=False
+        ).values
+        h = hashlib.sha1(hash_filas.tobytes())
+        h.update(f"{self.MODEL_SCHEMA_VERSION}:{meses_historial}".encode())
+        return h.hexdigest()[:16]
+    
+    def _hash_por_dia(self, df: pd.DataFrame) -> Dict[str, str]:
+        """Hash de las facturas de cada día (sin depender del orden de las filas)"""
+        columnas = [c for c in self.DATA_VERSION_COLUMNS if c in df.columns]
+        hashes = pd.util.hash_pandas_object(df[columnas], index=False)
+        dias = pd.to_datetime(df['fecha_factura']).dt.strftime('%Y-%m-%d').fillna('')
+        return {
+            dia: hashlib.sha1(np.sort(grupo.to_numpy()).tobytes()).hexdigest()[:16]
+            for dia, grupo in hashes.groupby(dias.to_numpy())
+        }
+    
+    def _solo_facturas_nuevas(self, hash_por_dia: Dict[str, str], ultima: pd.Timestamp, meses_historial: int) -> bool:
+        """
+        True si las facturas hasta `ultima` son las mismas del último entrenamiento
+        (salvo las que salieron de la ventana de meses_historial)
+        """
+        previos = self.metadata.get("hash_por_dia")
+        if not previos or "clientes" not in self.metadata:
+            return False
+        limite = (date.today() - timedelta(days=meses_historial * 30)).isoformat()
+        ultimo_dia = ultima.strftime('%Y-%m-%d')
+        actuales = {dia: h for dia, h in hash_por_dia.items() if dia <= ultimo_dia}
+        anteriores = {dia: h for dia, h in previos.items() if dia >= limite}
+        return actuales == anteriores
+    
+    def _ruta_artefacto(self, version: str) -> str:
+        return os.path.join(self.model_dir, f"clasificador_{version}.joblib")
+    
+    def _guardar_modelo(self):
+        """Guarda el artefacto versionado y actualiza el puntero al último modelo"""
+        try:
+            import joblib
+
+            os.makedirs(self.model_dir, exist_ok=True)
+            version = self.metadata["version_datos"]
+            joblib.dump(
+                {"scaler": self.scaler, "kmeans": self.kmeans, "pca": self.pca, "metadata": self.metadata},
+                self._ruta_artefacto(version)
+            )
+            with open(os.path.join(self.model_dir, "ultimo.json"), "w", encoding="utf-8") as f:
+                json.dump({"version_datos": version, "entrenado_en": self.metadata["entrenado_en"]}, f)
+        except Exception as e:
+            print(f"⚠️ No se pudo guardar el modelo de clasificación: {e}")
+            return
+        self._limpiar_artefactos()
+    
+    def _limpiar_artefactos(self):
+        """Borra los artefactos más antiguos, conservando los MAX_ARTEFACTOS más recientes"""
+        try:
+            rutas = [
+                os.path.join(self.model_dir, nombre) for nombre in os.listdir(self.model_dir)
+                if nombre.startswith("clasificador_") and nombre.endswith(".joblib")
+            ]
+            actual = self._ruta_artefacto(self.metadata["version_datos"])
+            rutas.sort(key=os.path.getmtime, reverse=True)
+            for ruta in rutas[self.MAX_ARTEFACTOS:]:
+                if ruta != actual:
+                    os.remove(ruta)
+        except OSError as e:
+            print(f"⚠️ No se pudieron borrar modelos de clasificación antiguos: {e}")
+    
+    def _cargar_modelo(self, version: str) -> bool:
+        """Carga el artefacto de una versión de datos; False si no existe o es incompatible"""
+        ruta = self._ruta_artefacto(version)
+        if not os.path.exists(ruta):
+            return False
+        try:
+            import joblib
+
+            artefacto = joblib.load(ruta)
+        except Exception as e:
+            print(f"⚠️ Artefacto de clasificación ilegible ({ruta}): {e}")
+            return False
+        if artefacto.get("metadata", {}).get("schema") != self.MODEL_SCHEMA_VERSION:
+            return False
+        self.scaler = artefacto["scaler"]
+        self.kmeans = artefacto["kmeans"]
+        self.pca = artefacto["pca"]
+        self.metadata = artefacto["metadata"]
+        self.is_trained = True
+        return True
+    
+    def _cargar_ultimo_modelo(self) -> bool:
+        puntero = os.path.join(self.model_dir, "ultimo.json")
+        if not os.path.exists(puntero):
+            return False
+        try:
+            with open(puntero, encoding="utf-8") as f:
+                return self._cargar_modelo(json.load(f)["version_datos"])
+        except Exception:
+            return False
+    
+    def _puede_actualizar_incremental(self, meses_historial: int) -> bool:
+        """Hay un modelo reciente, entrenado con la misma ventana, sobre el que sumar facturas nuevas"""
+        if not self.is_trained or self.metadata.get("meses_historial") != meses_historial:
+            return False
+        if not self.metadata.get("fecha_max_factura") or not self.metadata.get("entrenado_completo_en"):
+            return False
+        edad = datetime.now() - datetime.fromisoformat(self.metadata["entrenado_completo_en"])
+        return edad.days < self.MAX_DIAS_INCREMENTAL
+    
     def _obtener_datos_entrenamiento(self, meses: int) -> pd.DataFrame:
         """Obtiene datos históricos para entrenamiento"""
         df = self.db_manager.cargar_datos()
@@ -104,19 +335,15 @@ class ClientClassifier:
         client_features['volumen_total'] = client_features['valor_sum']
         client_features['puntualidad_pago'] = client_features['dias_pago_real_mean']
         client_features['variabilidad_pago'] = client_features['dias_pago_real_std'].fillna(0)
-        client_features['antiguedad_cliente'] = (date.today() - pd.to_datetime(client_features['fecha_factura_min']).dt.date).dt.days
-        client_features['ultima_compra_dias'] = (date.today() - pd.to_datetime(client_features['fecha_factura_max']).dt.date).dt.days
+        hoy = pd.Timestamp(date.today())
+        client_features['antiguedad_cliente'] = (hoy - pd.to_datetime(client_features['fecha_factura_min']).dt.normalize()).dt.days
+        client_features['ultima_compra_dias'] = (hoy - pd.to_datetime(client_features['fecha_factura_max']).dt.normalize()).dt.days
         client_features['es_cliente_propio'] = client_features['cliente_propio_first'].astype(int)
         client_features['descuento_promedio'] = client_features['descuento_adicional_mean'].fillna(0)
         
-        # Seleccionar features para ML
-        ml_features = [
-            'frecuencia_compras', 'ticket_promedio', 'volumen_total',
-            'puntualidad_pago', 'variabilidad_pago', 'antiguedad_cliente',
-            'ultima_compra_dias', 'es_cliente_propio', 'descuento_promedio'
-        ]
-        
-        features_df = client_features[ml_features].fillna(0)
+        # Seleccionar features para ML (indexadas por cliente)
+        features_df = client_features[self.ML_FEATURES].fillna(0)
+        features_df.index = client_features['cliente']
         
         return features_df
     
@@ -264,8 +491,62 @@ class ClientClassifier:
         else:
             return "3-6 meses (mínimo viable, considerar más datos)"
     
-    def clasificar_cliente_nuevo(self, cliente_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Clasifica un cliente nuevo basado en el modelo entrenado"""
+    # ========================================
+    # CLASIFICACIÓN VECTORIZADA
+    # ========================================
+    
+    def _predecir_scaled(self, X_scaled: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Cluster más cercano y distancia para una matriz ya escalada (una sola operación)"""
+        centros = self.kmeans.cluster_centers_
+        # ||x - c||² = ||x||² - 2·x·c + ||c||²
+        d2 = (
+            np.einsum('ij,ij->i', X_scaled, X_scaled)[:, None]
+            - 2.0 * X_scaled @ centros.T
+            + np.einsum('ij,ij->i', centros, centros)[None, :]
+        )
+        clusters = d2.argmin(axis=1)
+        distancias = np.sqrt(np.maximum(d2[np.arange(len(clusters)), clusters], 0))
+        return clusters, distancias
+    
+    def clasificar_clientes(self, features: pd.DataFrame) -> pd.DataFrame:
+        """
+        Clasifica un lote de clientes con una sola multiplicación de matrices
+        
+        Args:
+            features: DataFrame con las columnas ML_FEATURES (una fila por cliente)
+            
+        Returns:
+            DataFrame con columnas cluster y distancia_centroide (mismo índice)
+        """
+        X = features.reindex(columns=self.ML_FEATURES).fillna(0).to_numpy(dtype=float)
+        X_scaled = (X - self.scaler.mean_) / self.scaler.scale_
+        clusters, distancias = self._predecir_scaled(X_scaled)
+        return pd.DataFrame(
+            {"cluster": clusters, "distancia_centroide": distancias},
+            index=features.index
+        )
+    
+    def clasificar_base_clientes(self, meses_historial: Optional[int] = None) -> pd.DataFrame:
+        """Clasifica toda la base de clientes con el modelo actual"""
+        if not self.is_trained:
+            return pd.DataFrame()
+        meses = meses_historial or self.metadata.get("meses_historial", 12)
+        df = self._obtener_datos_entrenamiento(meses)
+        if df.empty:
+            return pd.DataFrame()
+        features_df = self._preparar_features(df)
+        return features_df.join(self.clasificar_clientes(features_df))
+    
+    def clasificar_cliente_nuevo(
+        self,
+        cliente_data: Union[Dict[str, Any], List[Dict[str, Any]], pd.DataFrame]
+    ) -> Union[Dict[str, Any], pd.DataFrame]:
+        """
+        Clasifica uno o varios clientes nuevos basado en el modelo entrenado
+        
+        Con un dict devuelve el resultado de siempre; con una lista de dicts o un
+        DataFrame de features devuelve un DataFrame con el cluster de cada fila.
+        """
         if not self.is_trained:
             return {
                 "success": False,
@@ -273,12 +554,21 @@ class ClientClassifier:
             }
         
         try:
+            if isinstance(cliente_data, pd.DataFrame):
+                return self.clasificar_clientes(cliente_data)
+            if isinstance(cliente_data, list):
+                features = pd.DataFrame(
+                    [self._preparar_features_cliente_nuevo(c) for c in cliente_data],
+                    columns=self.ML_FEATURES
+                )
+                return self.clasificar_clientes(features)
+            
             # Preparar features del cliente nuevo
             features = self._preparar_features_cliente_nuevo(cliente_data)
             
             # Predecir cluster
-            X_scaled = self.scaler.transform([features])
-            cluster_pred = self.kmeans.predict(X_scaled)[0]
+            resultado = self.clasificar_clientes(pd.DataFrame([features], columns=self.ML_FEATURES))
+            cluster_pred = int(resultado["cluster"].iloc[0])
             
             return {
                 "success": True,
@@ -332,21 +622,20 @@ class ClientClassifier:
                 return {"error": "Cliente no encontrado"}
             
             # Preparar features del cliente
-            features_df = self._preparar_features(df)
-            cliente_features = features_df[df.groupby('cliente').ngroup() == df[df['cliente'] == cliente].index[0]]
+            cliente_features = self._preparar_features(cliente_data)
             
             # Predecir cluster
-            X_scaled = self.scaler.transform([cliente_features.iloc[0]])
-            cluster_pred = self.kmeans.predict(X_scaled)[0]
+            cluster_pred = int(self.clasificar_clientes(cliente_features)["cluster"].iloc[0])
+            features = cliente_features.iloc[0]
             
             # Generar recomendaciones específicas
             return {
                 "cliente": cliente,
                 "cluster": cluster_pred,
-                "productos_recomendados": self._generar_productos_importacion(cluster_pred, cliente_features.iloc[0]),
-                "mensaje_personalizado": self._generar_mensaje_importacion(cluster_pred, cliente_features.iloc[0]),
+                "productos_recomendados": self._generar_productos_importacion(cluster_pred, features),
+                "mensaje_personalizado": self._generar_mensaje_importacion(cluster_pred, features),
                 "descuentos_aplicables": self._calcular_descuentos_importacion(cluster_pred),
-                "prioridad_contacto": self._calcular_prioridad_contacto(cluster_pred, cliente_features.iloc[0])
+                "prioridad_contacto": self._calcular_prioridad_contacto(cluster_pred, features)
             }
             
         except Exception as e:
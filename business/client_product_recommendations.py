@@ -1,9 +1,11 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, Any, Optional
 from collections import Counter
-import streamlit as st
+
+from database.cache import cache
+from database.client_purchases_manager import ClientPurchasesManager
 
 class ClientProductRecommendations:
     """Sistema de recomendaciones de productos basado en historial de compras y catálogo de inventario"""
@@ -12,6 +14,8 @@ class ClientProductRecommendations:
         self.db_manager = db_manager
         self.inventario_df = None
         self.historial_compras = None
+        # (versión de compras e inventario, resultado) del último lote
+        self._resultado_lote = None
     
     def cargar_inventario_csv(self, archivo_csv) -> Dict[str, Any]:
         """Carga el CSV de inventario con todas las referencias disponibles (método legacy)"""
@@ -82,7 +86,14 @@ class ClientProductRecommendations:
             }
     
     def generar_recomendaciones_clientes(self) -> Dict[str, Any]:
-        """Genera recomendaciones para todos los clientes basadas en historial y inventario"""
+        """
+        Genera recomendaciones para todos los clientes en un solo lote
+        
+        Usa el historial de `compras_clientes`: productos abandonados (una sola
+        agregación por cliente y producto), complementarios por co-compra
+        (matriz dispersa cliente x producto) y similares por categoría. El
+        resultado se reutiliza mientras no cambien las compras ni el inventario.
+        """
         try:
             # Validar que el inventario esté cargado
             if self.inventario_df is None or self.inventario_df.empty:
@@ -90,275 +101,187 @@ class ClientProductRecommendations:
                     "error": "Debe cargar primero el CSV de inventario"
                 }
             
+            compras_manager = ClientPurchasesManager(self.db_manager.supabase)
+            clave = (cache.version("compras_clientes"), id(self.inventario_df), len(self.inventario_df))
+            if self._resultado_lote is not None and self._resultado_lote[0] == clave:
+                return self._resultado_lote[1]
+            
             # Cargar historial de compras
-            df_compras = self.db_manager.cargar_datos()
+            df_compras = compras_manager.cargar_compras()
             
-            if df_compras.empty:
+            if df_compras.empty or 'cod_articulo' not in df_compras.columns:
                 return {
                     "error": "No hay datos de compras disponibles"
                 }
             
-            # Validar que exista columna referencia
-            if 'referencia' not in df_compras.columns:
-                return {
-                    "error": "La base de datos no contiene información de referencias de productos"
-                }
+            compras = pd.DataFrame({
+                'nit': df_compras['nit_cliente'].astype(str).str.strip(),
+                'referencia': _normalizar_referencia(df_compras['cod_articulo']),
+                'fecha': pd.to_datetime(df_compras['fecha'], errors='coerce') if 'fecha' in df_compras.columns else pd.NaT,
+                'valor': pd.to_numeric(df_compras['total'], errors='coerce') if 'total' in df_compras.columns else np.nan,
+            })
+            compras = compras[(compras['referencia'] != '') & (compras['referencia'] != 'NAN')]
+            self.historial_compras = compras
+            
+            # Productos del inventario (por cod_ur si viene del catálogo, si no por referencia)
+            columna_inventario = 'cod_ur' if 'cod_ur' in self.inventario_df.columns else 'referencia'
+            inventario = pd.DataFrame({
+                'referencia': _normalizar_referencia(self.inventario_df[columna_inventario]),
+                'categoria': self.inventario_df['categoria'].fillna('N/A').astype(str) if 'categoria' in self.inventario_df.columns else 'N/A',
+            }).drop_duplicates('referencia')
             
-            self.historial_compras = df_compras
+            # 1. PRODUCTOS ABANDONADOS: Que compraba antes y ya no compra
+            abandonados = self._productos_abandonados(compras)
+            abandonados = abandonados[abandonados['referencia'].isin(inventario['referencia'])]
+            
+            # 2. PRODUCTOS COMPLEMENTARIOS: lo que compran clientes con compras parecidas
+            complementarios = compras_manager.modelo_co_compra().recomendar_todos(
+                k=5, productos_validos=inventario['referencia']
+            ).rename(columns={'cliente': 'nit', 'producto': 'referencia'})
+            complementarios = complementarios.assign(
+                tipo_recomendacion="Producto Complementario",
+                razon="Clientes con compras parecidas también compran este producto",
+                prioridad="Media"
+            )
+            
+            # 3. PRODUCTOS SIMILARES: de las categorías que más compra
+            similares = self._productos_similares(compras, inventario, complementarios)
+            
+            recomendaciones = pd.concat(
+                [df for df in (abandonados, complementarios, similares) if not df.empty],
+                ignore_index=True
+            ) if not (abandonados.empty and complementarios.empty and similares.empty) else pd.DataFrame()
+            
+            if recomendaciones.empty:
+                resultado = {
+                    "success": True,
+                    "total_recomendaciones": 0,
+                    "total_clientes": int(compras['nit'].nunique()),
+                    "recomendaciones": []
+                }
+                self._resultado_lote = (clave, resultado)
+                return resultado
             
-            # Obtener lista de clientes
-            clientes_unicos = df_compras['cliente'].unique()
+            recomendaciones = recomendaciones.drop(columns=['categoria'], errors='ignore').merge(
+                inventario, on='referencia', how='left'
+            )
+            recomendaciones['categoria'] = recomendaciones['categoria'].fillna('N/A')
             
-            recomendaciones_todas = []
+            nombres = compras_manager.clientes.mapa_nit_nombre()
+            recomendaciones['cliente'] = recomendaciones['nit'].map(
+                {str(nit).strip(): nombre for nit, nombre in nombres.items()}
+            ).fillna(recomendaciones['nit'])
             
-            for cliente in clientes_unicos:
-                recomendaciones_cliente = self._generar_recomendaciones_cliente(cliente, df_compras)
-                if recomendaciones_cliente:
-                    recomendaciones_todas.extend(recomendaciones_cliente)
+            for columna, defecto in (('ultima_compra', None), ('frecuencia_historica', 0), ('valor_promedio', None), ('dias_sin_comprar', None)):
+                if columna not in recomendaciones.columns:
+                    recomendaciones[columna] = defecto
+            recomendaciones['frecuencia_historica'] = recomendaciones['frecuencia_historica'].fillna(0).astype(int)
+            recomendaciones['dias_sin_comprar'] = pd.to_numeric(recomendaciones['dias_sin_comprar'], errors='coerce').astype('Int64')
             
             # Ordenar por prioridad
-            recomendaciones_todas.sort(key=lambda x: self._calcular_score_prioridad(x), reverse=True)
+            recomendaciones['_score'] = self._score_prioridad(recomendaciones)
+            recomendaciones = recomendaciones.sort_values('_score', ascending=False, kind='mergesort')
             
-            return {
+            columnas = [
+                'cliente', 'referencia', 'tipo_recomendacion', 'razon', 'ultima_compra',
+                'frecuencia_historica', 'valor_promedio', 'prioridad', 'categoria', 'dias_sin_comprar'
+            ]
+            registros = recomendaciones[columnas].astype(object).where(recomendaciones[columnas].notna(), None)
+            
+            resultado = {
                 "success": True,
-                "total_recomendaciones": len(recomendaciones_todas),
-                "total_clientes": len(clientes_unicos),
-                "recomendaciones": recomendaciones_todas
+                "total_recomendaciones": len(registros),
+                "total_clientes": int(compras['nit'].nunique()),
+                "recomendaciones": registros.to_dict('records')
             }
+            self._resultado_lote = (clave, resultado)
+            return resultado
             
         except Exception as e:
             return {
                 "error": f"Error generando recomendaciones: {str(e)}"
             }
     
-    def _generar_recomendaciones_cliente(self, cliente: str, df_compras: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Genera recomendaciones para un cliente específico"""
-        recomendaciones = []
-        
-        # Filtrar compras del cliente
-        df_cliente = df_compras[df_compras['cliente'] == cliente].copy()
-        
-        if df_cliente.empty:
-            return []
-        
-        # Convertir fecha_factura a datetime si no lo es
-        if 'fecha_factura' in df_cliente.columns:
-            df_cliente['fecha_factura'] = pd.to_datetime(df_cliente['fecha_factura'], errors='coerce')
-        
-        # Limpiar referencias
-        df_cliente['referencia'] = df_cliente['referencia'].astype(str).str.strip().str.upper()
-        df_cliente = df_cliente[df_cliente['referencia'].notna() & (df_cliente['referencia'] != 'NAN')]
-        
-        if df_cliente.empty:
-            return []
-        
-        # 1. PRODUCTOS ABANDONADOS: Que compraba antes y ya no compra
-        productos_abandonados = self._identificar_productos_abandonados(df_cliente)
-        for producto in productos_abandonados:
-            if producto['referencia'] in self.inventario_df['referencia'].values:
-                recomendaciones.append({
-                    "cliente": cliente,
-                    "referencia": producto['referencia'],
-                    "tipo_recomendacion": "Producto Abandonado",
-                    "razon": producto['razon'],
-                    "ultima_compra": producto['ultima_compra'],
-                    "frecuencia_historica": producto['frecuencia'],
-                    "valor_promedio": producto['valor_promedio'],
-                    "prioridad": "Alta",
-                    "categoria": self._obtener_categoria(producto['referencia']),
-                    "dias_sin_comprar": producto['dias_sin_comprar']
-                })
-        
-        # 2. PRODUCTOS COMPLEMENTARIOS: Basados en hábitos de compra
-        productos_complementarios = self._identificar_productos_complementarios(df_cliente)
-        for producto in productos_complementarios:
-            if producto['referencia'] in self.inventario_df['referencia'].values:
-                recomendaciones.append({
-                    "cliente": cliente,
-                    "referencia": producto['referencia'],
-                    "tipo_recomendacion": "Producto Complementario",
-                    "razon": producto['razon'],
-                    "ultima_compra": None,
-                    "frecuencia_historica": 0,
-                    "valor_promedio": None,
-                    "prioridad": producto['prioridad'],
-                    "categoria": self._obtener_categoria(producto['referencia']),
-                    "dias_sin_comprar": None
-                })
-        
-        # 3. PRODUCTOS SIMILARES: Basados en categorías que compra
-        productos_similares = self._identificar_productos_similares(df_cliente)
-        for producto in productos_similares:
-            if producto['referencia'] in self.inventario_df['referencia'].values:
-                recomendaciones.append({
-                    "cliente": cliente,
-                    "referencia": producto['referencia'],
-                    "tipo_recomendacion": "Producto Similar",
-                    "razon": producto['razon'],
-                    "ultima_compra": None,
-                    "frecuencia_historica": 0,
-                    "valor_promedio": None,
-                    "prioridad": producto['prioridad'],
-                    "categoria": self._obtener_categoria(producto['referencia']),
-                    "dias_sin_comprar": None
-                })
+    def _productos_abandonados(self, compras: pd.DataFrame) -> pd.DataFrame:
+        """Productos que cada cliente compraba antes pero ya no compra (todos los clientes a la vez)"""
+        historial = compras.groupby(['nit', 'referencia']).agg(
+            ultima_compra=('fecha', 'max'),
+            primera_compra=('fecha', 'min'),
+            frecuencia_historica=('fecha', 'count'),
+            valor_promedio=('valor', 'mean')
+        ).reset_index()
         
-        return recomendaciones
-    
-    def _identificar_productos_abandonados(self, df_cliente: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Identifica productos que el cliente compraba antes pero ya no compra"""
-        productos_abandonados = []
+        # Días desde última compra
+        hoy = pd.Timestamp(date.today())
+        historial['dias_sin_comprar'] = (hoy - historial['ultima_compra'].dt.normalize()).dt.days.fillna(999).astype(int)
         
-        # Agrupar por referencia
-        productos_historial = df_cliente.groupby('referencia').agg({
-            'fecha_factura': ['max', 'min', 'count'],
-            'valor': 'mean'
-        }).reset_index()
+        # Frecuencia promedio de compra
+        historial['dias_entre_compras'] = (
+            historial['ultima_compra'] - historial['primera_compra']
+        ).dt.days / historial['frecuencia_historica']
         
-        productos_historial.columns = ['referencia', 'ultima_compra', 'primera_compra', 'frecuencia', 'valor_promedio']
+        # Abandonado: más de 2 veces la frecuencia promedio sin comprar
+        dias_esperados = np.where(historial['dias_entre_compras'] > 0, historial['dias_entre_compras'] * 2, 60)
+        abandonados = historial[
+            (historial['dias_sin_comprar'] > dias_esperados) & (historial['frecuencia_historica'] >= 2)
+        ].copy()
         
-        # Calcular días desde última compra
-        fecha_hoy = date.today()
-        productos_historial['dias_sin_comprar'] = productos_historial['ultima_compra'].apply(
-            lambda x: (fecha_hoy - x.date()).days if pd.notna(x) else 999
+        abandonados['razon'] = (
+            "Compraba cada " + abandonados['dias_entre_compras'].fillna(0).astype(int).astype(str) +
+            " días aproximadamente, lleva " + abandonados['dias_sin_comprar'].astype(str) + " días sin comprar"
         )
-        
-        # Calcular frecuencia promedio de compra
-        productos_historial['dias_entre_compras'] = (
-            productos_historial['ultima_compra'] - productos_historial['primera_compra']
-        ).dt.days / productos_historial['frecuencia']
-        
-        # Identificar productos abandonados (más de 2 veces la frecuencia promedio sin comprar)
-        for _, row in productos_historial.iterrows():
-            dias_esperados = row['dias_entre_compras'] * 2 if row['dias_entre_compras'] > 0 else 60
-            dias_sin_comprar = row['dias_sin_comprar']
-            
-            if dias_sin_comprar > dias_esperados and row['frecuencia'] >= 2:
-                razon = f"Compraba cada {int(row['dias_entre_compras'])} días aproximadamente, lleva {dias_sin_comprar} días sin comprar"
-                productos_abandonados.append({
-                    "referencia": row['referencia'],
-                    "ultima_compra": row['ultima_compra'],
-                    "frecuencia": int(row['frecuencia']),
-                    "valor_promedio": float(row['valor_promedio']),
-                    "dias_sin_comprar": int(dias_sin_comprar),
-                    "razon": razon
-                })
-        
-        return productos_abandonados
-    
-    def _identificar_productos_complementarios(self, df_cliente: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Identifica productos complementarios basados en patrones de compra"""
-        productos_complementarios = []
-        
-        # Obtener referencias que el cliente compra frecuentemente
-        referencias_frecuentes = df_cliente['referencia'].value_counts().head(10).index.tolist()
-        
-        # Buscar productos relacionados en el inventario
-        if 'categoria' in self.inventario_df.columns:
-            # Si hay categorías, buscar productos de las mismas categorías
-            categorias_cliente = self.inventario_df[
-                self.inventario_df['referencia'].isin(referencias_frecuentes)
-            ]['categoria'].unique() if 'categoria' in self.inventario_df.columns else []
-            
-            productos_relacionados = self.inventario_df[
-                (self.inventario_df['categoria'].isin(categorias_cliente)) &
-                (~self.inventario_df['referencia'].isin(df_cliente['referencia'].unique()))
-            ]
-            
-            for _, producto in productos_relacionados.head(5).iterrows():
-                productos_complementarios.append({
-                    "referencia": producto['referencia'],
-                    "razon": f"Producto complementario en categoría {producto.get('categoria', 'N/A')} que compra frecuentemente",
-                    "prioridad": "Media"
-                })
-        else:
-            # Si no hay categorías, sugerir productos del inventario que no ha comprado
-            referencias_cliente = set(df_cliente['referencia'].unique())
-            productos_disponibles = self.inventario_df[
-                ~self.inventario_df['referencia'].isin(referencias_cliente)
-            ]
-            
-            for _, producto in productos_disponibles.head(5).iterrows():
-                productos_complementarios.append({
-                    "referencia": producto['referencia'],
-                    "razon": "Producto disponible que podría complementar sus compras habituales",
-                    "prioridad": "Baja"
-                })
-        
-        return productos_complementarios
+        abandonados['tipo_recomendacion'] = "Producto Abandonado"
+        abandonados['prioridad'] = "Alta"
+        return abandonados.drop(columns=['primera_compra', 'dias_entre_compras'])
     
-    def _identificar_productos_similares(self, df_cliente: pd.DataFrame) -> List[Dict[str, Any]]:
-        """Identifica productos similares basados en lo que compra"""
-        productos_similares = []
+    def _productos_similares(
+        self,
+        compras: pd.DataFrame,
+        inventario: pd.DataFrame,
+        excluir: pd.DataFrame,
+        por_cliente: int = 5
+    ) -> pd.DataFrame:
+        """Productos no comprados de las categorías de los 10 productos más comprados por cada cliente"""
+        if (inventario['categoria'] == 'N/A').all():
+            return pd.DataFrame()
         
-        # Obtener referencias más compradas
-        referencias_top = df_cliente['referencia'].value_counts().head(5).index.tolist()
+        # Categorías de los productos más comprados por cliente
+        frecuentes = compras.groupby(['nit', 'referencia']).size().rename('veces').reset_index()
+        frecuentes = frecuentes.sort_values(['nit', 'veces'], ascending=[True, False]).groupby('nit').head(10)
+        categorias = frecuentes.merge(inventario, on='referencia')[['nit', 'categoria']].drop_duplicates()
+        categorias = categorias[categorias['categoria'] != 'N/A']
         
-        # Buscar productos similares en inventario
-        referencias_cliente = set(df_cliente['referencia'].unique())
-        productos_disponibles = self.inventario_df[
-            ~self.inventario_df['referencia'].isin(referencias_cliente)
-        ]
+        # Primeros productos de cada categoría como candidatos
+        candidatos_categoria = inventario.groupby('categoria').head(por_cliente * 4)
+        candidatos = categorias.merge(candidatos_categoria, on='categoria')
         
-        # Si hay descripción o nombre, buscar similitudes
-        if 'descripcion' in self.inventario_df.columns or 'nombre' in self.inventario_df.columns:
-            col_desc = 'descripcion' if 'descripcion' in self.inventario_df.columns else 'nombre'
-            
-            # Obtener palabras clave de productos que compra
-            palabras_clave = []
-            for ref in referencias_top:
-                producto_inv = self.inventario_df[self.inventario_df['referencia'] == ref]
-                if not producto_inv.empty:
-                    desc = str(producto_inv[col_desc].iloc[0]).lower()
-                    palabras_clave.extend(desc.split()[:3])  # Primeras 3 palabras
-            
-            # Buscar productos con palabras similares
-            for _, producto in productos_disponibles.iterrows():
-                desc = str(producto.get(col_desc, '')).lower()
-                palabras_comunes = sum(1 for palabra in palabras_clave if palabra in desc)
-                
-                if palabras_comunes >= 1:
-                    productos_similares.append({
-                        "referencia": producto['referencia'],
-                        "razon": f"Producto similar a los que suele comprar",
-                        "prioridad": "Media"
-                    })
-                    
-                    if len(productos_similares) >= 5:
-                        break
+        # Quitar lo ya comprado y lo ya recomendado como complementario
+        vistos = pd.concat([compras[['nit', 'referencia']], excluir[['nit', 'referencia']]]).drop_duplicates()
+        candidatos = candidatos.merge(vistos, on=['nit', 'referencia'], how='left', indicator=True)
+        candidatos = candidatos[candidatos['_merge'] == 'left_only'].drop(columns='_merge')
+        candidatos = candidatos.drop_duplicates(['nit', 'referencia']).groupby('nit').head(por_cliente)
         
-        return productos_similares
-    
-    def _obtener_categoria(self, referencia: str) -> str:
-        """Obtiene la categoría de un producto del inventario"""
-        if self.inventario_df is None or self.inventario_df.empty:
-            return "N/A"
-        
-        producto = self.inventario_df[self.inventario_df['referencia'] == referencia]
-        if not producto.empty and 'categoria' in producto.columns:
-            return str(producto['categoria'].iloc[0])
-        return "N/A"
+        return candidatos.assign(
+            tipo_recomendacion="Producto Similar",
+            razon="Producto de la categoría " + candidatos['categoria'] + " que compra frecuentemente",
+            prioridad="Media"
+        )
     
-    def _calcular_score_prioridad(self, recomendacion: Dict[str, Any]) -> int:
-        """Calcula un score numérico para ordenar por prioridad"""
-        score = 0
-        
+    @staticmethod
+    def _score_prioridad(recomendaciones: pd.DataFrame) -> pd.Series:
+        """Score numérico para ordenar por prioridad"""
         # Prioridad Alta = 30, Media = 20, Baja = 10
-        prioridades = {"Alta": 30, "Media": 20, "Baja": 10}
-        score += prioridades.get(recomendacion.get('prioridad', 'Baja'), 10)
+        score = recomendaciones['prioridad'].map({"Alta": 30, "Media": 20, "Baja": 10}).fillna(10)
         
-        # Productos abandonados tienen más peso
-        if recomendacion.get('tipo_recomendacion') == "Producto Abandonado":
-            score += 20
-            # Más días sin comprar = más urgente
-            dias = recomendacion.get('dias_sin_comprar', 0)
-            if dias:
-                score += min(dias // 30, 10)  # Máximo 10 puntos adicionales
-        
-        # Productos con mayor frecuencia histórica
-        frecuencia = recomendacion.get('frecuencia_historica', 0)
-        if frecuencia:
-            score += min(frecuencia, 10)  # Máximo 10 puntos
+        # Productos abandonados tienen más peso; más días sin comprar = más urgente
+        abandonado = recomendaciones['tipo_recomendacion'] == "Producto Abandonado"
+        dias = pd.to_numeric(recomendaciones['dias_sin_comprar'], errors='coerce').fillna(0)
+        score += abandonado * (20 + (dias // 30).clip(upper=10))
         
+        # Productos con mayor frecuencia histórica (máximo 10 puntos)
+        score += recomendaciones['frecuencia_historica'].clip(upper=10)
         return score
 
+
+def _normalizar_referencia(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).str.strip().str.upper()
@@ -0,0 +1,166 @@
+"""
+Recomendaciones por co-compra (filtrado colaborativo ítem-ítem)
+
+Se construye una matriz dispersa cliente x producto a partir de
+`compras_clientes` (1 si el cliente compró el producto alguna vez). La
+similitud coseno entre productos sale de la co-ocurrencia X^T X normalizada y
+se poda a los vecinos más cercanos de cada producto. El puntaje de un cliente
+para un producto es la suma de similitudes con lo que ya compra (X S); los
+productos ya comprados se excluyen y el top-k se elige en bloque para todos
+los clientes a la vez.
+"""
+
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Vecinos que se conservan por producto en la matriz de similitud
+VECINOS_POR_PRODUCTO = 50
+
+# Clientes por bloque al puntuar en lote (acota la memoria de X S)
+LOTE_CLIENTES = 1000
+
+
+def top_k_por_fila(matriz: sparse.spmatrix, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(filas, columnas, valores) de los k mayores valores no nulos de cada fila"""
+    coo = matriz.tocoo()
+    if coo.nnz == 0:
+        vacio = np.array([], dtype=np.int64)
+        return vacio, vacio, np.array([], dtype=np.float64)
+    orden = np.lexsort((-coo.data, coo.row))
+    filas, columnas, valores = coo.row[orden], coo.col[orden], coo.data[orden]
+    # Posición de cada valor dentro de su fila
+    rango = np.arange(len(filas)) - np.searchsorted(filas, filas, side='left')
+    mantener = rango < k
+    return filas[mantener], columnas[mantener], valores[mantener]
+
+
+def _normalizar_codigo(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).str.strip().str.upper()
+
+
+class CoPurchaseModel:
+    """Matriz cliente x producto y similitud ítem-ítem para recomendar en lote"""
+
+    def __init__(
+        self,
+        compras: pd.DataFrame,
+        columna_cliente: str = 'nit_cliente',
+        columna_producto: str = 'cod_articulo',
+        vecinos: int = VECINOS_POR_PRODUCTO
+    ):
+        datos = compras[[columna_cliente, columna_producto]].dropna()
+        clientes = pd.Categorical(datos[columna_cliente].astype(str).str.strip())
+        productos = pd.Categorical(_normalizar_codigo(datos[columna_producto]))
+
+        self.clientes = pd.Index(clientes.categories)
+        self.productos = pd.Index(productos.categories)
+
+        # Presencia binaria: comprar 1 o 100 veces cuenta igual
+        X = sparse.csr_matrix(
+            (np.ones(len(datos), dtype=np.float32), (clientes.codes, productos.codes)),
+            shape=(len(self.clientes), len(self.productos))
+        )
+        X.sum_duplicates()
+        X.data[:] = 1.0
+        self.compras = X
+
+        # Popularidad: clientes distintos por producto
+        self.popularidad = np.asarray(X.sum(axis=0)).ravel()
+
+        # Coseno ítem-ítem: C_ij / sqrt(C_ii C_jj) sin la diagonal, podado a los vecinos
+        coocurrencia = (X.T @ X).tocsr()
+        with np.errstate(divide='ignore'):
+            inversa = np.where(self.popularidad > 0, 1.0 / np.sqrt(self.popularidad), 0.0)
+        similitud = sparse.diags(inversa) @ coocurrencia @ sparse.diags(inversa)
+        similitud = sparse.csr_matrix(similitud)
+        similitud.setdiag(0)
+        similitud.eliminate_zeros()
+
+        filas, columnas, valores = top_k_por_fila(similitud, vecinos)
+        self.similitud = sparse.csr_matrix(
+            (valores.astype(np.float32), (filas, columnas)),
+            shape=similitud.shape
+        )
+
+    @property
+    def empty(self) -> bool:
+        return self.compras.nnz == 0
+
+    def _mascara_validos(self, productos_validos: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        if productos_validos is None:
+            return None
+        validos = pd.Index(_normalizar_codigo(pd.Series(list(productos_validos), dtype=object)).unique())
+        return self.productos.isin(validos)
+
+    def _puntuar(self, X: sparse.csr_matrix, validos: Optional[np.ndarray]) -> sparse.csr_matrix:
+        """Puntajes X S sin los productos ya comprados ni los no válidos"""
+        puntajes = (X @ self.similitud).tocsr()
+        # X es binaria: multiply deja solo lo ya comprado y al restarlo queda en cero
+        puntajes = (puntajes - puntajes.multiply(X)).tocsr()
+        if validos is not None:
+            puntajes = (puntajes @ sparse.diags(validos.astype(np.float32))).tocsr()
+        puntajes.eliminate_zeros()
+        return puntajes
+
+    def recomendar_todos(self, k: int = 10, productos_validos: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        Top-k de productos no comprados para todos los clientes
+
+        Returns:
+            DataFrame con cliente, producto, score y rank (1 = mejor)
+        """
+        validos = self._mascara_validos(productos_validos)
+        partes = []
+        for inicio in range(0, len(self.clientes), LOTE_CLIENTES):
+            bloque = self.compras[inicio:inicio + LOTE_CLIENTES]
+            puntajes = self._puntuar(bloque, validos)
+            if puntajes.nnz == 0:
+                continue
+            filas, columnas, valores = top_k_por_fila(puntajes, k)
+            partes.append(pd.DataFrame({
+                'cliente': self.clientes[filas + inicio],
+                'producto': self.productos[columnas],
+                'score': valores.astype(np.float64),
+                'fila': filas + inicio,
+            }))
+
+        if not partes:
+            return pd.DataFrame(columns=['cliente', 'producto', 'score', 'rank'])
+        resultado = pd.concat(partes, ignore_index=True)
+        resultado['rank'] = resultado.groupby('fila').cumcount() + 1
+        return resultado.drop(columns='fila')
+
+    def recomendar(
+        self,
+        cliente: str,
+        k: int = 10,
+        productos_validos: Optional[Iterable[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Top-k para un cliente con el producto comprado que más aporta a cada uno
+
+        Returns:
+            DataFrame con producto, score y basado_en
+        """
+        columnas = ['producto', 'score', 'basado_en']
+        posicion = self.clientes.get_indexer([str(cliente).strip()])[0]
+        if posicion < 0:
+            return pd.DataFrame(columns=columnas)
+
+        fila = self.compras[posicion]
+        puntajes = self._puntuar(fila, self._mascara_validos(productos_validos))
+        if puntajes.nnz == 0:
+            return pd.DataFrame(columns=columnas)
+
+        orden = np.argsort(-puntajes.data, kind='stable')[:k]
+        elegidos = puntajes.indices[orden]
+        comprados = fila.indices
+        aporte = self.similitud[comprados][:, elegidos].toarray()
+        return pd.DataFrame({
+            'producto': self.productos[elegidos],
+            'score': puntajes.data[orden].astype(np.float64),
+            'basado_en': self.productos[comprados[aporte.argmax(axis=0)]],
+        })
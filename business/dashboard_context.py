@@ -0,0 +1,396 @@
+"""
+Contexto de cálculo compartido del dashboard del vendedor
+
+Carga una sola vez comisiones (copia cacheada) y las devoluciones agregadas por
+factura y mes (libro de devoluciones), y deriva en bloque las columnas que usan
+todas las secciones: mes de factura, valor neto ajustado, devoluciones sin IVA
+y comisión estimada por factura. Las secciones
+(métricas del mes, gráfico de ventas, clientes clave y meses disponibles) se
+calculan sobre el mismo contexto, así que las ventas y comisiones de un mes
+son las mismas en la tarjeta de métricas y en el gráfico.
+
+El contexto se cachea con las etiquetas `comisiones` y `devoluciones` y es de
+solo lectura: cada sección devuelve estructuras nuevas.
+"""
+
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from database.cache import cache
+from database.return_ledger import get_return_ledger
+
+IVA = 1.19
+
+# Secciones que puede devolver el bundle del dashboard
+SECCIONES = ("metricas", "grafico_ventas", "clientes_clave", "meses")
+
+MESES_GRAFICO = 6
+LIMITE_CLIENTES_CLAVE = 10
+
+# Columnas de comisiones que necesita _derivar_facturas (contexto de un mes)
+COLUMNAS_FACTURAS_MES = (
+    "cliente", "fecha_factura", "valor", "valor_neto", "iva", "valor_flete", "valor_descuento_pesos",
+    "valor_devuelto", "cliente_propio", "descuento_pie_factura", "descuento_adicional",
+    "condicion_especial", "dias_pago_real"
+)
+
+NOMBRES_MESES_ES = {
+    1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
+    5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
+    9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
+}
+
+
+def es_ver_todo(mes: Optional[str]) -> bool:
+    """True si no hay filtro de mes (None, vacío o "todos")"""
+    return mes is None or mes == "" or str(mes).lower() == "todos"
+
+
+def _numero(df: pd.DataFrame, columna: str) -> pd.Series:
+    if columna not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[columna], errors='coerce').fillna(0).astype(float)
+
+
+def _booleano(df: pd.DataFrame, columna: str) -> pd.Series:
+    if columna not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df[columna].eq(True)
+
+
+def _fecha_texto(fechas: pd.Series) -> pd.Series:
+    return fechas.dt.strftime('%Y-%m-%d').fillna('')
+
+
+def _derivar_facturas(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas derivadas por factura, calculadas una vez para todas las secciones"""
+    df = df.copy()
+    df['fecha_factura'] = pd.to_datetime(df['fecha_factura'], errors='coerce')
+    df['mes_factura'] = df['fecha_factura'].dt.to_period('M').astype(str).where(df['fecha_factura'].notna())
+
+    # Valor neto sin IVA: el registrado o, si falta o es cero, (valor - flete) / IVA
+    valor_neto = pd.to_numeric(df['valor_neto'], errors='coerce') if 'valor_neto' in df.columns else pd.Series(np.nan, index=df.index)
+    sin_flete = (_numero(df, 'valor') - _numero(df, 'valor_flete')).clip(lower=0) / IVA
+    df['valor_neto'] = valor_neto.where(valor_neto.notna() & (valor_neto != 0), sin_flete)
+
+    df['valor_neto_ajustado'] = df['valor_neto'] - _numero(df, 'valor_descuento_pesos')
+    df['devuelto_sin_iva'] = _numero(df, 'valor_devuelto') / IVA
+    df['cliente_propio'] = _booleano(df, 'cliente_propio')
+    df['comision_estimada'] = _comision_estimada(df)
+    return df
+
+
+def _comision_estimada(df: pd.DataFrame) -> pd.Series:
+    """
+    Comisión por factura con las reglas de negocio (en bloque)
+
+    - Base: valor neto completo con descuento a pie de factura; si no, 85% cuando
+      se pagó dentro del límite (45 días, 60 con condición especial) o aún no se paga
+    - Se restan las devoluciones sin IVA (mínimo 0)
+    - 2.5% cliente propio / 1% externo; 1.5% / 0.5% con descuento adicional
+    - Sin comisión si el pago tardó más de 80 días
+    """
+    valor_neto = df['valor_neto']
+    dias_pago = pd.to_numeric(df['dias_pago_real'], errors='coerce') if 'dias_pago_real' in df.columns else pd.Series(np.nan, index=df.index)
+    limite_dias = np.where(_booleano(df, 'condicion_especial'), 60, 45)
+
+    a_tiempo = dias_pago.isna() | (dias_pago <= limite_dias)
+    base = np.where(_booleano(df, 'descuento_pie_factura') | ~a_tiempo, valor_neto, valor_neto * 0.85)
+    base_final = np.maximum(base - df['devuelto_sin_iva'], 0)
+
+    descuento = _numero(df, 'descuento_adicional')
+    if 'descuento_aplicado' in df.columns:
+        descuento = descuento.where(descuento != 0, _numero(df, 'descuento_aplicado'))
+    con_descuento = descuento > 0
+    porcentaje = np.where(
+        df['cliente_propio'],
+        np.where(con_descuento, 1.5, 2.5),
+        np.where(con_descuento, 0.5, 1.0)
+    )
+
+    comision = base_final * porcentaje / 100
+    return pd.Series(np.where(dias_pago > 80, 0.0, comision), index=df.index)
+
+
+class DashboardContext:
+    """Facturas y devoluciones derivadas una vez; cada método es una sección del dashboard"""
+
+    def __init__(self, facturas: pd.DataFrame, devoluciones: pd.DataFrame):
+        self.facturas = _derivar_facturas(facturas) if not facturas.empty else pd.DataFrame()
+        self.propias = (
+            self.facturas[self.facturas['cliente_propio']] if not self.facturas.empty else pd.DataFrame()
+        )
+        self.devoluciones = self._devoluciones_propias(devoluciones)
+
+    @classmethod
+    def cargar(cls, db_manager) -> "DashboardContext":
+        """Contexto vigente (cacheado hasta que cambien comisiones o devoluciones)"""
+        def construir():
+            facturas = db_manager.cargar_datos()
+            try:
+                devoluciones = get_return_ledger(db_manager.supabase).por_factura_y_mes()
+            except Exception as e:
+                print(f"⚠️ Error cargando devoluciones: {e}")
+                devoluciones = pd.DataFrame()
+            return cls(facturas, devoluciones)
+
+        return cache.get_or_load(
+            ("business.dashboard_context.DashboardContext",), ("comisiones", "devoluciones"), construir
+        )
+
+    @classmethod
+    def cargar_mes(cls, db_manager, mes: Optional[str]) -> "DashboardContext":
+        """
+        Contexto con solo las facturas propias del mes, filtradas en la consulta
+        (sin devoluciones: sirve para clientes_clave, no para métricas ni gráfico)
+        """
+        if es_ver_todo(mes):
+            return cls.cargar(db_manager)
+        facturas = db_manager.cargar_facturas(mes=mes, columnas=COLUMNAS_FACTURAS_MES, solo_propios=True)
+        return cls(facturas, pd.DataFrame())
+
+    def _devoluciones_propias(self, devoluciones: pd.DataFrame) -> pd.DataFrame:
+        """Devoluciones (por factura y mes) de facturas de clientes propios, con su mes"""
+        if devoluciones.empty or 'fecha_devolucion' not in devoluciones.columns or self.propias.empty:
+            return pd.DataFrame(columns=['factura_id', 'valor_devuelto', 'fecha_devolucion', 'mes_devolucion'])
+        devoluciones = devoluciones[devoluciones['factura_id'].isin(self.propias['id'])].copy()
+        devoluciones['fecha_devolucion'] = pd.to_datetime(devoluciones['fecha_devolucion'], errors='coerce')
+        devoluciones['mes_devolucion'] = devoluciones['fecha_devolucion'].dt.to_period('M').astype(str)
+        devoluciones['valor_devuelto'] = _numero(devoluciones, 'valor_devuelto')
+        return devoluciones
+
+    # ========================================
+    # FILTROS POR MES
+    # ========================================
+
+    def _facturas_mes(self, mes: Optional[str]) -> pd.DataFrame:
+        if self.propias.empty or es_ver_todo(mes):
+            return self.propias
+        return self.propias[self.propias['mes_factura'] == mes]
+
+    def _devoluciones_mes(self, mes: Optional[str]) -> pd.DataFrame:
+        if self.devoluciones.empty or es_ver_todo(mes):
+            return self.devoluciones
+        return self.devoluciones[self.devoluciones['mes_devolucion'] == mes]
+
+    def ventas_mes(self, mes: Optional[str]) -> float:
+        """
+        Ventas netas sin IVA del mes (o de todo si no hay mes): facturas después de
+        descuentos, menos lo devuelto en esas facturas y las devoluciones del mes
+        """
+        facturas = self._facturas_mes(mes)
+        if facturas.empty:
+            return 0.0
+        devoluciones_mes = self._devoluciones_mes(mes)['valor_devuelto'].sum() / IVA
+        ventas = facturas['valor_neto_ajustado'].sum() - facturas['devuelto_sin_iva'].sum() - devoluciones_mes
+        return max(0.0, float(ventas))
+
+    def comisiones_mes(self, mes: Optional[str]) -> float:
+        return float(self._facturas_mes(mes)['comision_estimada'].sum()) if not self.propias.empty else 0.0
+
+    # ========================================
+    # SECCIONES
+    # ========================================
+
+    def metricas(self, mes: Optional[str], meta_ventas: float = 0) -> Dict[str, Any]:
+        """Tarjetas del dashboard y detalle de facturas/devoluciones del mes"""
+        ver_todo = es_ver_todo(mes)
+        if ver_todo:
+            meta_ventas = 0  # No hay meta cuando se ve todo
+        facturas = self._facturas_mes(mes)
+
+        if self.facturas.empty:
+            return {
+                "totalVentas": 0,
+                "comisiones": 0,
+                "clientesActivos": 0,
+                "pedidosMes": 0,
+                "metaVentas": meta_ventas,
+                "progresoMeta": 0,
+                "faltanteMeta": meta_ventas,
+                "facturasDetalle": []
+            }
+
+        total_ventas = self.ventas_mes(mes)
+
+        if ver_todo or meta_ventas == 0:
+            progreso_meta = 0
+            faltante_meta = 0
+        else:
+            progreso_meta = (total_ventas / meta_ventas * 100) if meta_ventas > 0 else 0
+            faltante_meta = max(0, meta_ventas - total_ventas)
+
+        diagnostico = {}
+        if not facturas.empty:
+            diagnostico = {
+                "total_filas": len(facturas),
+                "tiene_comision_ajustada": 'comision_ajustada' in facturas.columns,
+                "tiene_comision": 'comision' in facturas.columns,
+                "suma_comision_ajustada": float(facturas['comision_ajustada'].sum()) if 'comision_ajustada' in facturas.columns else None,
+                "suma_comision": float(facturas['comision'].sum()) if 'comision' in facturas.columns else None,
+                "columnas_disponibles": list(facturas.columns)
+            }
+
+        return {
+            "totalVentas": total_ventas,
+            "comisiones": self.comisiones_mes(mes),
+            "clientesActivos": int(facturas['cliente'].nunique()) if 'cliente' in facturas.columns else 0,
+            "pedidosMes": len(facturas),
+            "mes": None if ver_todo else mes,
+            "metaVentas": meta_ventas,
+            "progresoMeta": min(100, max(0, progreso_meta)),  # Entre 0 y 100%
+            "faltanteMeta": faltante_meta,
+            "facturasDetalle": self._detalle(facturas, self._devoluciones_mes(mes)),
+            "_diagnostico": diagnostico
+        }
+
+    def _detalle(self, facturas: pd.DataFrame, devoluciones: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Líneas del desglose (formato del reporte de la empresa): cada factura del
+        mes en positivo, lo devuelto en ellas y las devoluciones del mes de
+        facturas anteriores en negativo, todo sin IVA
+        """
+        def textos(df: pd.DataFrame) -> Dict[str, List[Any]]:
+            return {
+                "id": [int(v) for v in df['id']],
+                "pedido": df['pedido'].astype(str).tolist() if 'pedido' in df.columns else ['N/A'] * len(df),
+                "factura": df['factura'].fillna('N/A').astype(str).tolist() if 'factura' in df.columns else ['N/A'] * len(df),
+                "cliente": df['cliente'].astype(str).tolist() if 'cliente' in df.columns else ['N/A'] * len(df),
+                "fecha_factura": _fecha_texto(df['fecha_factura']).tolist(),
+            }
+
+        lineas: List[Dict[str, Any]] = []
+
+        # 1. Facturas del mes y lo devuelto en cada una
+        if not facturas.empty:
+            base = textos(facturas)
+            netos = facturas['valor_neto_ajustado'].astype(float).tolist()
+            devueltos = facturas['devuelto_sin_iva'].astype(float).tolist()
+            for i, (neto, devuelto) in enumerate(zip(netos, devueltos)):
+                comunes = {clave: valores[i] for clave, valores in base.items()}
+                lineas.append({
+                    **comunes,
+                    "valor_bruto": neto,  # Valor sin IVA, después de descuentos
+                    "valor_devuelto": 0,  # Las devoluciones se muestran como líneas separadas
+                    "valor_neto": neto,
+                    "valor_transaccion": neto,  # Positivo para ventas
+                    "tipo": "factura"
+                })
+                if devuelto > 0:
+                    lineas.append({
+                        **comunes,
+                        "valor_bruto": 0,
+                        "valor_devuelto": devuelto,
+                        "valor_neto": -devuelto,
+                        "valor_transaccion": -devuelto,  # Negativo para devoluciones
+                        "tipo": "devolucion_factura_mes"
+                    })
+
+        # 2. Devoluciones del mes de facturas de otros meses
+        if not devoluciones.empty:
+            por_factura = devoluciones.groupby('factura_id').agg(
+                devuelto_mes=('valor_devuelto', 'sum'),
+                fecha_devolucion_mes=('fecha_devolucion', 'max')
+            )
+            if not facturas.empty:
+                por_factura = por_factura[~por_factura.index.isin(facturas['id'])]
+            anteriores = self.propias.set_index('id').join(por_factura, how='inner').reset_index()
+            if not anteriores.empty:
+                base = textos(anteriores)
+                fechas_devolucion = _fecha_texto(anteriores['fecha_devolucion_mes']).tolist()
+                devueltos = (anteriores['devuelto_mes'] / IVA).astype(float).tolist()
+                for i, devuelto in enumerate(devueltos):
+                    lineas.append({
+                        **{clave: valores[i] for clave, valores in base.items()},
+                        "fecha_devolucion": fechas_devolucion[i],
+                        "valor_bruto": 0,
+                        "valor_devuelto": devuelto,
+                        "valor_neto": -devuelto,
+                        "valor_transaccion": -devuelto,
+                        "tipo": "devolucion_mes"  # Devolución del mes pero factura anterior
+                    })
+
+        # Ordenar por cliente y luego por fecha (similar al reporte de la empresa)
+        lineas.sort(key=lambda x: (x['cliente'], x['fecha_factura'], x['valor_transaccion'] < 0))
+        return lineas
+
+    def grafico_ventas(self, meses: int = MESES_GRAFICO) -> Dict[str, List[Dict[str, Any]]]:
+        """Ventas y comisiones de los últimos `meses` meses (mismo cálculo que metricas)"""
+        if self.propias.empty:
+            return {"ventas_mensuales": [], "comisiones_mensuales": []}
+
+        actual = pd.Period(date.today(), freq='M')
+        ventas_mensuales = []
+        comisiones_mensuales = []
+        for atras in range(meses - 1, -1, -1):
+            mes = str(actual - atras)
+            nombre_mes = datetime.strptime(mes, "%Y-%m").strftime("%b")
+            comisiones = self.comisiones_mes(mes)
+            ventas_mensuales.append({"mes": nombre_mes, "ventas": self.ventas_mes(mes), "comisiones": comisiones})
+            comisiones_mensuales.append({"mes": nombre_mes, "comisiones": comisiones})
+
+        return {"ventas_mensuales": ventas_mensuales, "comisiones_mensuales": comisiones_mensuales}
+
+    def clientes_clave(self, mes: Optional[str], limite: int = LIMITE_CLIENTES_CLAVE) -> List[Dict[str, Any]]:
+        """Clientes propios con más ventas del mes (valor neto después de descuentos)"""
+        facturas = self._facturas_mes(mes)
+        if facturas.empty:
+            return []
+
+        clientes = facturas.assign(
+            valor_cliente=facturas['valor_neto_ajustado'].clip(lower=0)
+        ).groupby('cliente').agg(
+            total_ventas=('valor_cliente', 'sum'),
+            ultima_compra=('fecha_factura', 'max'),
+            num_facturas=('id', 'count')
+        ).reset_index().sort_values('total_ventas', ascending=False).head(limite)
+
+        resultado = []
+        for nombre, total, ultima, num in zip(
+            clientes['cliente'].astype(str), clientes['total_ventas'], clientes['ultima_compra'], clientes['num_facturas']
+        ):
+            iniciales = ''.join(p[0].upper() for p in nombre.split()[:3] if p)
+            resultado.append({
+                "cliente": nombre,
+                "iniciales": iniciales[:4] if iniciales else 'N/A',
+                "total_ventas": float(total),
+                "ultima_compra": ultima.strftime('%Y-%m-%d') if pd.notna(ultima) else 'N/A',
+                "num_facturas": int(num)
+            })
+        return resultado
+
+    def meses(self) -> List[Dict[str, Any]]:
+        """Meses con facturas, del más reciente al más antiguo"""
+        if self.facturas.empty:
+            return []
+        resultado = []
+        for mes in sorted(self.facturas['mes_factura'].dropna().unique(), reverse=True):
+            fecha = datetime.strptime(mes, "%Y-%m")
+            resultado.append({
+                "valor": mes,  # "2024-11"
+                "nombre": f"{NOMBRES_MESES_ES[fecha.month]} {fecha.year}",  # "Noviembre 2024"
+                "nombre_corto": f"{NOMBRES_MESES_ES[fecha.month][:3]} {fecha.year}",  # "Nov 2024"
+                "año": fecha.year,
+                "mes_numero": fecha.month
+            })
+        return resultado
+
+
+def meta_ventas_mes(supabase, mes: Optional[str]) -> float:
+    """Meta de ventas del mes en metas_mensuales (0 si no hay mes o no está definida)"""
+    if es_ver_todo(mes):
+        return 0
+
+    def cargar() -> float:
+        respuesta = supabase.table("metas_mensuales").select("meta_ventas").eq("mes", mes).execute()
+        return float(respuesta.data[0].get('meta_ventas') or 0) if respuesta.data else 0
+
+    try:
+        return cache.get_or_load(("business.dashboard_context.meta_ventas_mes", mes), ("metas_mensuales",), cargar)
+    except Exception as e:
+        # Un error no se cachea: la próxima petición vuelve a consultar
+        print(f"Error obteniendo meta: {e}")
+        return 0
@@ -5,8 +5,12 @@ Dashboard Ejecutivo - KPIs y Métricas Avanzadas para Gerencia
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, date
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
 from database.queries import DatabaseManager
+from business.forecasting import forecaster, serie_temporal
+
+# Días de historial necesarios para proyectar con el modelo (cuatro semanas)
+MIN_DIAS_PRONOSTICO = 28
 
 class ExecutiveDashboard:
     """Sistema de Dashboard Ejecutivo con KPIs avanzados"""
@@ -102,7 +106,7 @@ class ExecutiveDashboard:
             "analisis_riesgo": self._analizar_riesgos(df),
             
             # Proyecciones
-            "proyecciones": self._calcular_proyecciones(df_facturas_mes_actual, inicio_mes_actual),
+            "proyecciones": self._calcular_proyecciones(df_facturas_mes_actual, inicio_mes_actual, df),
             
             # Comparativas
             "comparativas": self._generar_comparativas(df_facturas_mes_actual, df_facturas_mes_anterior)
@@ -496,8 +500,19 @@ class ExecutiveDashboard:
             "alertas": alertas
         }
     
-    def _calcular_proyecciones(self, df_facturas_mes_actual: pd.DataFrame, inicio_mes: datetime) -> Dict[str, Any]:
-        """Calcula proyecciones para fin de mes a partir de facturas emitidas"""
+    def _calcular_proyecciones(
+        self,
+        df_facturas_mes_actual: pd.DataFrame,
+        inicio_mes: datetime,
+        df_historico: pd.DataFrame = None
+    ) -> Dict[str, Any]:
+        """
+        Calcula proyecciones para fin de mes a partir de facturas emitidas
+        
+        Con historial suficiente se suma al acumulado del mes el pronóstico
+        Holt-Winters de los días restantes (modelo cacheado por versión de los
+        datos); si no, se usa el promedio diario del mes.
+        """
         
         if df_facturas_mes_actual.empty:
             return {
@@ -524,8 +539,23 @@ class ExecutiveDashboard:
         promedio_diario_comision = comision_actual / dias_transcurridos
         
         # Proyección lineal
-        proyeccion_revenue = promedio_diario_revenue * dias_mes
-        proyeccion_comision = promedio_diario_comision * dias_mes
+        proyeccion_revenue_lineal = promedio_diario_revenue * dias_mes
+        proyeccion_comision_lineal = promedio_diario_comision * dias_mes
+        
+        # Proyección con modelo (acumulado + pronóstico de los días restantes)
+        resto_revenue = self._pronosticar_resto_mes(df_historico, 'valor', hoy, fin_mes)
+        resto_comision = self._pronosticar_resto_mes(df_historico, 'comision', hoy, fin_mes)
+        
+        if resto_revenue is not None and resto_comision is not None:
+            metodo = "holt_winters"
+            proyeccion_revenue = revenue_actual + resto_revenue[0]
+            proyeccion_comision = comision_actual + resto_comision[0]
+            rango_revenue = (revenue_actual + resto_revenue[1], revenue_actual + resto_revenue[2])
+        else:
+            metodo = "lineal"
+            proyeccion_revenue = proyeccion_revenue_lineal
+            proyeccion_comision = proyeccion_comision_lineal
+            rango_revenue = (proyeccion_revenue, proyeccion_revenue)
         
         # Nivel de confianza basado en días transcurridos
         if dias_transcurridos < 7:
@@ -538,6 +568,10 @@ class ExecutiveDashboard:
         return {
             "proyeccion_revenue": proyeccion_revenue,
             "proyeccion_comision": proyeccion_comision,
+            "proyeccion_revenue_lineal": proyeccion_revenue_lineal,
+            "proyeccion_comision_lineal": proyeccion_comision_lineal,
+            "rango_revenue": rango_revenue,
+            "metodo": metodo,
             "revenue_actual": revenue_actual,
             "comision_actual": comision_actual,
             "dias_transcurridos": dias_transcurridos,
@@ -547,6 +581,33 @@ class ExecutiveDashboard:
             "promedio_diario": promedio_diario_revenue
         }
     
+    def _pronosticar_resto_mes(
+        self,
+        df_historico: pd.DataFrame,
+        columna: str,
+        hoy: datetime,
+        fin_mes: datetime
+    ) -> Optional[Tuple[float, float, float]]:
+        """(valor, inferior, superior) pronosticado entre mañana y fin de mes, o None sin historial suficiente"""
+        if df_historico is None or df_historico.empty or columna not in df_historico.columns:
+            return None
+        
+        serie = serie_temporal(df_historico, 'fecha_factura', columna, freq='D', hasta=hoy)
+        if len(serie) < MIN_DIAS_PRONOSTICO:
+            return None
+        
+        horizonte = (fin_mes.date() - serie.index[-1].date()).days
+        if horizonte <= 0:
+            return (0.0, 0.0, 0.0)
+        
+        pronostico = forecaster.pronosticar(serie, horizonte, freq='D')
+        restantes = pronostico.fechas.date > hoy.date()
+        return (
+            float(pronostico.valores[restantes].sum()),
+            float(pronostico.inferior[restantes].sum()),
+            float(pronostico.superior[restantes].sum())
+        )
+    
     def _generar_comparativas(
         self,
         df_actual: pd.DataFrame,
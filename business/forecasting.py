@@ -0,0 +1,374 @@
+"""
+Pronóstico de series de ventas con suavizamiento exponencial Holt-Winters
+
+- Modelo aditivo con tendencia amortiguada y estacionalidad semanal (serie
+  diaria, m=7) o anual (serie mensual, m=12). Si no hay al menos dos ciclos
+  completos se ajusta sin estacionalidad (Holt).
+- Los parámetros se eligen por búsqueda en grilla: la recursión avanza en el
+  tiempo y en cada paso actualiza a la vez todas las combinaciones de
+  parámetros y todas las series (matrices NumPy), así que ajustar una serie o
+  miles de clientes cuesta casi lo mismo.
+- Intervalos de predicción cerrados (varianza a h pasos) calculados en bloque.
+- Los modelos ajustados se cachean por huella de los datos (versión) y se
+  reutilizan para cualquier horizonte; el pronóstico se cachea por horizonte.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import product
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Periodo estacional por frecuencia de la serie
+ESTACIONALIDAD = {"D": 7, "W": 52, "M": 12}
+
+# Grilla de parámetros (alpha: nivel, beta: tendencia, gamma: estacionalidad, phi: amortiguación)
+GRILLA_ALPHA = (0.05, 0.15, 0.3, 0.5, 0.8)
+GRILLA_BETA = (0.01, 0.05, 0.15)
+GRILLA_GAMMA = (0.05, 0.15, 0.4)
+GRILLA_PHI = (0.9, 0.98)
+
+MAX_MODELOS_CACHE = 128
+
+
+@dataclass
+class Pronostico:
+    """Pronóstico de una serie: valores e intervalos por fecha futura"""
+    fechas: pd.DatetimeIndex
+    valores: np.ndarray
+    inferior: np.ndarray
+    superior: np.ndarray
+    confianza: float
+    tendencia: float
+    r2: float
+    mae: float
+    n_obs: int
+    estacionalidad: int
+    parametros: Dict[str, float]
+
+    @property
+    def total(self) -> float:
+        return float(self.valores.sum())
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "fecha": self.fechas,
+            "valor_predicho": self.valores,
+            "intervalo_inferior": self.inferior,
+            "intervalo_superior": self.superior,
+        })
+
+    def registros(self) -> List[Dict[str, Any]]:
+        """Formato de `MLAnalytics.predict_sales` (una fila por fecha)"""
+        return [
+            {
+                "fecha": fecha.date(),
+                "valor_predicho": float(valor),
+                "intervalo_inferior": float(inf),
+                "intervalo_superior": float(sup),
+                "confianza": self.confianza
+            }
+            for fecha, valor, inf, sup in zip(self.fechas, self.valores, self.inferior, self.superior)
+        ]
+
+
+@dataclass
+class _ModeloAjustado:
+    """Estado final y parámetros elegidos para S series (arrays de largo S)"""
+    nivel: np.ndarray
+    tendencia: np.ndarray
+    estacional: np.ndarray  # (S, m), indexado por t % m
+    alpha: np.ndarray
+    beta: np.ndarray
+    gamma: np.ndarray
+    phi: np.ndarray
+    sigma: np.ndarray
+    r2: np.ndarray
+    mae: np.ndarray
+    n_obs: int
+    m: int
+    ultima_fecha: pd.Timestamp
+    freq: str
+
+
+# ========================================
+# SERIES
+# ========================================
+
+def serie_temporal(
+    df: pd.DataFrame,
+    columna_fecha: str = "fecha_pago_real",
+    columna_valor: str = "valor",
+    freq: str = "D",
+    hasta: Optional[Any] = None
+) -> pd.Series:
+    """Totales por periodo con los periodos sin ventas en cero"""
+    fechas = pd.to_datetime(df[columna_fecha], errors="coerce")
+    valores = pd.to_numeric(df[columna_valor], errors="coerce").fillna(0.0)
+    mask = fechas.notna()
+    if hasta is not None:
+        mask &= fechas <= pd.Timestamp(hasta)
+    if not mask.any():
+        return pd.Series(dtype=float)
+    periodos = fechas[mask].dt.to_period(freq).dt.to_timestamp()
+    serie = valores[mask].groupby(periodos).sum()
+    indice = pd.date_range(serie.index.min(), serie.index.max(), freq=_freq_pandas(freq))
+    return serie.reindex(indice, fill_value=0.0).astype(float)
+
+
+def matriz_por_grupo(
+    df: pd.DataFrame,
+    columna_grupo: str,
+    columna_fecha: str = "fecha_pago_real",
+    columna_valor: str = "valor",
+    freq: str = "M"
+) -> pd.DataFrame:
+    """Matriz periodos x grupos (cliente, marca...) con ceros donde no hubo ventas"""
+    fechas = pd.to_datetime(df[columna_fecha], errors="coerce")
+    mask = fechas.notna() & df[columna_grupo].notna()
+    if not mask.any():
+        return pd.DataFrame()
+    tabla = pd.DataFrame({
+        "periodo": fechas[mask].dt.to_period(freq).dt.to_timestamp(),
+        "grupo": df.loc[mask, columna_grupo],
+        "valor": pd.to_numeric(df.loc[mask, columna_valor], errors="coerce").fillna(0.0),
+    })
+    matriz = tabla.pivot_table(index="periodo", columns="grupo", values="valor", aggfunc="sum", fill_value=0.0)
+    indice = pd.date_range(matriz.index.min(), matriz.index.max(), freq=_freq_pandas(freq))
+    return matriz.reindex(indice, fill_value=0.0).astype(float)
+
+
+def _freq_pandas(freq: str) -> str:
+    return {"D": "D", "W": "W-MON", "M": "MS"}.get(freq, freq)
+
+
+def _huella(valores: np.ndarray, extra: Tuple) -> Tuple:
+    """Versión de los datos: hash del contenido de la serie y sus metadatos"""
+    contenido = np.ascontiguousarray(valores, dtype=np.float64)
+    return extra + (contenido.shape, hash(contenido.tobytes()))
+
+
+# ========================================
+# MODELO
+# ========================================
+
+def _estado_inicial(y: np.ndarray, m: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Nivel, tendencia y estacionalidad iniciales a partir de los dos primeros ciclos"""
+    if m > 1:
+        ciclo1 = y[:m].mean(axis=0)
+        ciclo2 = y[m:2 * m].mean(axis=0)
+        nivel = ciclo1
+        tendencia = (ciclo2 - ciclo1) / m
+        estacional = (y[:m] - ciclo1).T  # (S, m)
+    else:
+        n = min(len(y), 4)
+        nivel = y[0].copy()
+        tendencia = (y[n - 1] - y[0]) / max(n - 1, 1)
+        estacional = np.zeros((y.shape[1], 1))
+    return nivel, tendencia, estacional
+
+
+def _recorrer(y, nivel, tendencia, estacional, alpha, beta, gamma, phi, m, guardar_ajuste=False):
+    """
+    Recursión Holt-Winters aditiva vectorizada
+
+    `nivel`/`tendencia` tienen forma (P, S) y `estacional` (P, S, m): P
+    combinaciones de parámetros por S series. Devuelve el SSE a un paso y el
+    estado final (y opcionalmente los valores ajustados).
+    """
+    sse = np.zeros_like(nivel)
+    ajustados = np.empty((len(y),) + nivel.shape) if guardar_ajuste else None
+    for t in range(len(y)):
+        k = t % m
+        s = estacional[..., k]
+        pred = nivel + phi * tendencia + s
+        if guardar_ajuste:
+            ajustados[t] = pred
+        obs = y[t]
+        error = obs - pred
+        sse += error * error
+        nivel_nuevo = alpha * (obs - s) + (1 - alpha) * (nivel + phi * tendencia)
+        tendencia = beta * (nivel_nuevo - nivel) + (1 - beta) * phi * tendencia
+        estacional[..., k] = gamma * (obs - nivel_nuevo) + (1 - gamma) * s
+        nivel = nivel_nuevo
+    return sse, nivel, tendencia, estacional, ajustados
+
+
+def ajustar(matriz: np.ndarray, m: int) -> Dict[str, np.ndarray]:
+    """
+    Ajusta Holt-Winters a cada columna de `matriz` (T x S) eligiendo parámetros por SSE
+
+    Returns:
+        Dict con el estado final y los parámetros elegidos por serie
+    """
+    y = np.asarray(matriz, dtype=np.float64)
+    if y.ndim == 1:
+        y = y[:, None]
+    T, S = y.shape
+    if m > 1 and T < 2 * m:
+        m = 1
+
+    grilla = np.array(list(product(GRILLA_ALPHA, GRILLA_BETA, GRILLA_GAMMA if m > 1 else (0.0,), GRILLA_PHI)))
+    alpha, beta, gamma, phi = (grilla[:, i][:, None] for i in range(4))  # (P, 1)
+    P = len(grilla)
+
+    nivel0, tendencia0, estacional0 = _estado_inicial(y, m)
+    sse, _, _, _, _ = _recorrer(
+        y,
+        np.broadcast_to(nivel0, (P, S)).copy(),
+        np.broadcast_to(tendencia0, (P, S)).copy(),
+        np.broadcast_to(estacional0, (P, S, m)).copy(),
+        alpha, beta, gamma, phi, m
+    )
+
+    # Mejor combinación por serie y segunda pasada con esos parámetros para el ajuste
+    mejor = np.argmin(sse, axis=0)  # (S,)
+    elegidos = grilla[mejor]  # (S, 4)
+    a, b, g, f = (elegidos[:, i][None, :] for i in range(4))  # (1, S)
+    sse_mejor, nivel, tendencia, estacional, ajustados = _recorrer(
+        y, nivel0[None, :].copy(), tendencia0[None, :].copy(), estacional0[None, :, :].copy(),
+        a, b, g, f, m, guardar_ajuste=True
+    )
+    ajustados = ajustados[:, 0, :]
+
+    n_parametros = 4 + (m if m > 1 else 0)
+    sigma = np.sqrt(sse_mejor[0] / max(T - n_parametros, 1))
+    residuos = y - ajustados
+    ss_tot = ((y - y.mean(axis=0)) ** 2).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(ss_tot > 0, 1 - (residuos ** 2).sum(axis=0) / ss_tot, 0.0)
+
+    return {
+        "nivel": nivel[0], "tendencia": tendencia[0], "estacional": estacional[0],
+        "alpha": elegidos[:, 0], "beta": elegidos[:, 1], "gamma": elegidos[:, 2], "phi": elegidos[:, 3],
+        "sigma": sigma, "r2": r2, "mae": np.abs(residuos).mean(axis=0), "m": m, "n_obs": T,
+    }
+
+
+def _proyectar(modelo: _ModeloAjustado, horizonte: int, confianza: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Valores e intervalos (S x horizonte) a partir del estado final"""
+    h = np.arange(1, horizonte + 1)
+    phi = modelo.phi[:, None]
+    # Suma de phi^1..phi^h (tendencia amortiguada)
+    phi_h = np.cumsum(phi ** h[None, :], axis=1)
+    indices = (modelo.n_obs + h - 1) % modelo.m
+    valores = modelo.nivel[:, None] + phi_h * modelo.tendencia[:, None] + modelo.estacional[:, indices]
+
+    # Var(h) = sigma^2 * (1 + sum_{j<h} c_j^2), c_j = alpha (1 + beta sum phi^i) + gamma [j % m == 0]
+    c = modelo.alpha[:, None] * (1 + modelo.beta[:, None] * phi_h)
+    if modelo.m > 1:
+        c = c + modelo.gamma[:, None] * ((h % modelo.m) == 0)[None, :]
+    acumulado = np.concatenate([np.zeros((len(c), 1)), np.cumsum(c[:, :-1] ** 2, axis=1)], axis=1)
+    z = NormalDist().inv_cdf((1 + confianza) / 2)
+    margen = z * modelo.sigma[:, None] * np.sqrt(1 + acumulado)
+
+    # Las ventas no son negativas
+    return np.maximum(valores, 0), np.maximum(valores - margen, 0), np.maximum(valores + margen, 0)
+
+
+# ========================================
+# PRONOSTICADOR CON CACHÉ
+# ========================================
+
+class SalesForecaster:
+    """Ajusta y cachea modelos Holt-Winters por versión de los datos"""
+
+    def __init__(self, max_modelos: int = MAX_MODELOS_CACHE):
+        self.max_modelos = max_modelos
+        self._lock = threading.Lock()
+        self._modelos: "OrderedDict[Tuple, _ModeloAjustado]" = OrderedDict()
+        self._pronosticos: "OrderedDict[Tuple, Any]" = OrderedDict()
+
+    def _recordar(self, tabla: OrderedDict, clave: Tuple, valor: Any):
+        with self._lock:
+            tabla[clave] = valor
+            tabla.move_to_end(clave)
+            while len(tabla) > self.max_modelos:
+                tabla.popitem(last=False)
+
+    def _buscar(self, tabla: OrderedDict, clave: Tuple) -> Any:
+        with self._lock:
+            valor = tabla.get(clave)
+            if valor is not None:
+                tabla.move_to_end(clave)
+            return valor
+
+    def modelo(self, matriz: pd.DataFrame, freq: str) -> Tuple[_ModeloAjustado, Tuple]:
+        """Modelo ajustado para las columnas de `matriz` (índice de fechas), cacheado por contenido"""
+        clave = _huella(matriz.to_numpy(), (freq, matriz.index[-1], tuple(map(str, matriz.columns))))
+        modelo = self._buscar(self._modelos, clave)
+        if modelo is None:
+            ajuste = ajustar(matriz.to_numpy(), ESTACIONALIDAD.get(freq, 1))
+            modelo = _ModeloAjustado(
+                nivel=ajuste["nivel"], tendencia=ajuste["tendencia"], estacional=ajuste["estacional"],
+                alpha=ajuste["alpha"], beta=ajuste["beta"], gamma=ajuste["gamma"], phi=ajuste["phi"],
+                sigma=ajuste["sigma"], r2=ajuste["r2"], mae=ajuste["mae"],
+                n_obs=ajuste["n_obs"], m=ajuste["m"], ultima_fecha=matriz.index[-1], freq=freq
+            )
+            self._recordar(self._modelos, clave, modelo)
+        return modelo, clave
+
+    def pronosticar(self, serie: pd.Series, horizonte: int, freq: str = "D", confianza: float = 0.95) -> Pronostico:
+        """Pronóstico de una serie (índice de fechas continuo, ver `serie_temporal`)"""
+        modelo, clave = self.modelo(serie.to_frame("valor"), freq)
+        clave_pronostico = clave + (horizonte, confianza)
+        pronostico = self._buscar(self._pronosticos, clave_pronostico)
+        if pronostico is None:
+            valores, inferior, superior = _proyectar(modelo, horizonte, confianza)
+            pronostico = Pronostico(
+                fechas=pd.date_range(modelo.ultima_fecha, periods=horizonte + 1, freq=_freq_pandas(freq))[1:],
+                valores=valores[0], inferior=inferior[0], superior=superior[0],
+                confianza=confianza,
+                tendencia=float(modelo.tendencia[0]),
+                r2=float(modelo.r2[0]), mae=float(modelo.mae[0]),
+                n_obs=modelo.n_obs, estacionalidad=modelo.m,
+                parametros={
+                    "alpha": float(modelo.alpha[0]), "beta": float(modelo.beta[0]),
+                    "gamma": float(modelo.gamma[0]), "phi": float(modelo.phi[0])
+                }
+            )
+            self._recordar(self._pronosticos, clave_pronostico, pronostico)
+        return pronostico
+
+    def pronosticar_grupos(
+        self,
+        matriz: pd.DataFrame,
+        horizonte: int,
+        freq: str = "M",
+        confianza: float = 0.95
+    ) -> pd.DataFrame:
+        """
+        Pronóstico en lote para cada columna de `matriz` (ver `matriz_por_grupo`)
+
+        Returns:
+            DataFrame largo: grupo, fecha, valor_predicho, intervalo_inferior,
+            intervalo_superior, r2
+        """
+        if matriz.empty:
+            return pd.DataFrame(columns=["grupo", "fecha", "valor_predicho", "intervalo_inferior", "intervalo_superior", "r2"])
+
+        modelo, clave = self.modelo(matriz, freq)
+        clave_pronostico = clave + (horizonte, confianza)
+        resultado = self._buscar(self._pronosticos, clave_pronostico)
+        if resultado is None:
+            valores, inferior, superior = _proyectar(modelo, horizonte, confianza)
+            fechas = pd.date_range(modelo.ultima_fecha, periods=horizonte + 1, freq=_freq_pandas(freq))[1:]
+            grupos = np.asarray(matriz.columns)
+            resultado = pd.DataFrame({
+                "grupo": np.repeat(grupos, horizonte),
+                "fecha": np.tile(fechas, len(grupos)),
+                "valor_predicho": valores.ravel(),
+                "intervalo_inferior": inferior.ravel(),
+                "intervalo_superior": superior.ravel(),
+                "r2": np.repeat(modelo.r2, horizonte),
+            })
+            self._recordar(self._pronosticos, clave_pronostico, resultado)
+        return resultado.copy()
+
+
+# Pronosticador del proceso (compartido por el dashboard, la calculadora y MLAnalytics)
+forecaster = SalesForecaster()
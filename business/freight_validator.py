@@ -4,6 +4,8 @@ Sistema de validación de flete según reglas de envío
 
 from typing import Dict, Any, Tuple
 
+from business.gazetteer import buscar_ciudad
+
 class FreightValidator:
     """Validador de flete según ciudad y valor base"""
     
@@ -12,6 +14,22 @@ class FreightValidator:
     UMBRAL_BOGOTA = 2_000_000
     UMBRAL_RESTO = 4_000_000
     
+    # Zonas con umbral propio, por código DANE del municipio
+    ZONAS_DANE = {'05001': "Medellín", '11001': "Bogotá"}
+    
+    @staticmethod
+    def zona_destino(ciudad_destino: str) -> str:
+        """
+        Zona de flete de una ciudad escrita libremente ("MEDELLIN", "Bogotá D.C.", ...)
+        
+        Returns:
+            "Medellín", "Bogotá" o "Resto"
+        """
+        ciudad = buscar_ciudad(ciudad_destino)
+        if ciudad is None:
+            return "Resto"
+        return FreightValidator.ZONAS_DANE.get(ciudad.codigo_dane, "Resto")
+    
     @staticmethod
     def debe_tener_flete(base_comision: float, ciudad_destino: str, recogida_local: bool = False) -> Tuple[bool, str]:
         """
@@ -19,12 +37,14 @@ class FreightValidator:
         
         Args:
             base_comision: Valor base del pedido (sin IVA)
-            ciudad_destino: "Medellín", "Bogotá", o "Resto"
+            ciudad_destino: "Medellín", "Bogotá", "Resto" o el nombre de la ciudad
             recogida_local: Si es recogida local (solo aplica para Medellín)
         
         Returns:
             Tupla (debe_tener_flete, razon)
         """
+        ciudad_destino = FreightValidator.zona_destino(ciudad_destino)
+        
         # Recogida local NUNCA paga flete
         if recogida_local and ciudad_destino == "Medellín":
             return False, "Recogida local - Sin flete"
@@ -89,6 +109,7 @@ class FreightValidator:
     @staticmethod
     def obtener_umbral_ciudad(ciudad_destino: str) -> float:
         """Retorna el umbral de flete gratis para una ciudad"""
+        ciudad_destino = FreightValidator.zona_destino(ciudad_destino)
         if ciudad_destino == "Medellín":
             return FreightValidator.UMBRAL_MEDELLIN
         elif ciudad_destino == "Bogotá":
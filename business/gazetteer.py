@@ -0,0 +1,222 @@
+"""
+Nomenclátor de ciudades colombianas (código DANE, departamento y coordenadas)
+
+Un solo índice por nombre normalizado (minúsculas, sin tildes ni signos), armado
+una vez al importar el módulo. La búsqueda es exacta sobre el nombre normalizado
+y, si no hay coincidencia, aproximada: el texto se parte en un nombre de ciudad
+y un resto que debe ser su departamento ("Medellín - Antioquia", "Cali Valle");
+el nombre se busca exacto o, si no, por similitud de texto (errores de
+digitación). Solo se acepta una ciudad si es la única candidata, de modo que
+"San Andrés de Sotavento" o "Girardota" no se confunden con San Andrés o
+Girardot. Los resultados se memorizan por texto normalizado, y
+`resolver_ciudades` resuelve una columna completa buscando cada valor distinto
+una sola vez.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from difflib import get_close_matches
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Similitud mínima para aceptar una coincidencia aproximada (0 a 1)
+SIMILITUD_MINIMA = 0.85
+
+
+@dataclass(frozen=True)
+class Ciudad:
+    """Ciudad del nomenclátor"""
+    nombre: str
+    codigo_dane: str
+    departamento: str
+    lat: float
+    lon: float
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            'codigo_dane': self.codigo_dane,
+            'lat': self.lat,
+            'lon': self.lon,
+            'departamento': self.departamento
+        }
+
+
+# (nombre, código DANE, departamento, lat, lon, alias); las variantes sin tildes
+# o en mayúsculas no se listan porque se resuelven al normalizar
+_CIUDADES: Tuple[Tuple[str, str, str, float, float, Tuple[str, ...]], ...] = (
+    # Capitales de departamento y ciudades principales
+    ('Bogotá', '11001', 'Cundinamarca', 4.7110, -74.0721, ('Bogotá D.C.', 'Bogota DC', 'Santafé de Bogotá', 'Santa Fe de Bogotá')),
+    ('Medellín', '05001', 'Antioquia', 6.2476, -75.5658, ()),
+    ('Cali', '76001', 'Valle del Cauca', 3.4516, -76.5320, ('Santiago de Cali',)),
+    ('Barranquilla', '08001', 'Atlántico', 10.9639, -74.7964, ()),
+    ('Cartagena', '13001', 'Bolívar', 10.3910, -75.4794, ('Cartagena de Indias',)),
+    ('Bucaramanga', '68001', 'Santander', 7.1254, -73.1198, ()),
+    ('Cúcuta', '54001', 'Norte de Santander', 7.8939, -72.5078, ('San José de Cúcuta',)),
+    ('Pereira', '66001', 'Risaralda', 4.8133, -75.6961, ()),
+    ('Santa Marta', '47001', 'Magdalena', 11.2408, -74.1990, ()),
+    ('Manizales', '17001', 'Caldas', 5.0700, -75.5138, ()),
+    ('Armenia', '63001', 'Quindío', 4.5339, -75.6811, ()),
+    ('Villavicencio', '50001', 'Meta', 4.1533, -73.6350, ()),
+    ('Ibagué', '73001', 'Tolima', 4.4447, -75.2322, ()),
+    ('Pasto', '52001', 'Nariño', 1.2136, -77.2811, ('San Juan de Pasto',)),
+    ('Valledupar', '20001', 'Cesar', 10.4631, -73.2532, ()),
+    ('Montería', '23001', 'Córdoba', 8.7500, -75.8833, ()),
+    ('Sincelejo', '70001', 'Sucre', 9.3047, -75.3978, ()),
+    ('Tunja', '15001', 'Boyacá', 5.5353, -73.3678, ()),
+    ('Neiva', '41001', 'Huila', 2.5353, -75.5277, ()),
+    ('Popayán', '19001', 'Cauca', 2.4448, -76.6147, ()),
+    ('Riohacha', '44001', 'La Guajira', 11.5444, -72.9072, ()),
+    ('Quibdó', '27001', 'Chocó', 5.6947, -76.6611, ()),
+    ('Florencia', '18001', 'Caquetá', 1.6142, -75.6062, ()),
+    ('Yopal', '85001', 'Casanare', 5.3378, -72.3958, ()),
+    ('Arauca', '81001', 'Arauca', 7.0847, -70.7591, ()),
+    ('Mocoa', '86001', 'Putumayo', 1.1528, -76.6519, ()),
+    ('San Andrés', '88001', 'San Andrés y Providencia', 12.5847, -81.7006, ()),
+    ('Leticia', '91001', 'Amazonas', -4.2153, -69.9406, ()),
+    ('Inírida', '94001', 'Guainía', 3.8653, -67.9239, ('Puerto Inírida',)),
+    ('San José del Guaviare', '95001', 'Guaviare', 2.5683, -72.6383, ()),
+    ('Mitú', '97001', 'Vaupés', 1.1983, -70.1733, ()),
+    ('Puerto Carreño', '99001', 'Vichada', 6.1847, -67.4881, ()),
+    # Ciudades adicionales comunes
+    ('Bello', '05088', 'Antioquia', 6.3389, -75.5621, ()),
+    ('Itagüí', '05360', 'Antioquia', 6.1845, -75.5991, ()),
+    ('Envigado', '05266', 'Antioquia', 6.1759, -75.5917, ()),
+    ('Sabaneta', '05631', 'Antioquia', 6.1515, -75.6166, ()),
+    ('Rionegro', '05615', 'Antioquia', 6.1551, -75.3737, ()),
+    ('Carepa', '05154', 'Antioquia', 7.7583, -76.6633, ()),
+    ('Soacha', '25754', 'Cundinamarca', 4.5794, -74.2168, ()),
+    ('Girardot', '25307', 'Cundinamarca', 4.3032, -74.8017, ()),
+    ('Soledad', '08758', 'Atlántico', 10.9184, -74.7646, ()),
+    ('Floridablanca', '68276', 'Santander', 7.0622, -73.0864, ()),
+    ('Dosquebradas', '66170', 'Risaralda', 4.8391, -75.6673, ()),
+    ('Palmira', '76520', 'Valle del Cauca', 3.5394, -76.3036, ()),
+    ('Buenaventura', '76109', 'Valle del Cauca', 3.8801, -77.0197, ()),
+    ('Tuluá', '76834', 'Valle del Cauca', 4.0847, -76.1954, ()),
+    ('Corozal', '70221', 'Sucre', 9.3178, -75.2939, ()),
+    ('Lérida', '73408', 'Tolima', 4.8611, -74.9108, ()),
+)
+
+
+def normalizar_ciudad(texto: Any) -> str:
+    """Nombre comparable: minúsculas, sin tildes, signos ni espacios repetidos"""
+    if texto is None or (isinstance(texto, float) and pd.isna(texto)):
+        return ""
+    sin_tildes = unicodedata.normalize('NFKD', str(texto))
+    sin_tildes = ''.join(c for c in sin_tildes if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^a-z0-9 ]', ' ', sin_tildes.lower()).split())
+
+
+def _construir_indice() -> Dict[str, Ciudad]:
+    indice: Dict[str, Ciudad] = {}
+    for nombre, codigo, departamento, lat, lon, alias in _CIUDADES:
+        ciudad = Ciudad(nombre, codigo, departamento, lat, lon)
+        for variante in (nombre,) + alias:
+            indice.setdefault(normalizar_ciudad(variante), ciudad)
+    return indice
+
+
+_INDICE = _construir_indice()
+
+_NOMBRES = sorted(_INDICE)
+
+_DEPARTAMENTOS = sorted({normalizar_ciudad(c[2]) for c in _CIUDADES})
+
+
+def ciudades() -> Tuple[Ciudad, ...]:
+    """Todas las ciudades del nomenclátor (una por código DANE)"""
+    return tuple(dict.fromkeys(_INDICE.values()))
+
+
+@lru_cache(maxsize=4096)
+def _buscar_normalizado(clave: str, aproximado: bool) -> Optional[Ciudad]:
+    if not clave:
+        return None
+    ciudad = _INDICE.get(clave)
+    if ciudad is not None or not aproximado:
+        return ciudad
+
+    return _buscar_aproximado(clave)
+
+
+def _buscar_aproximado(clave: str) -> Optional[Ciudad]:
+    palabras = clave.split()
+    # Cada tramo de palabras seguidas es un posible nombre; el resto, su departamento
+    tramos = []
+    for inicio in range(len(palabras)):
+        for fin in range(len(palabras), inicio, -1):
+            resto = ' '.join(palabras[:inicio] + palabras[fin:])
+            if not resto or any(_coincide_departamento(resto, d) for d in _DEPARTAMENTOS):
+                tramos.append((' '.join(palabras[inicio:fin]), resto))
+
+    # 1. Nombre exacto ("medellin antioquia" viene de "Medellín - Antioquia")
+    exactas = [
+        _INDICE[nombre] for nombre, resto in tramos
+        if nombre in _INDICE and _coincide_departamento(resto, normalizar_ciudad(_INDICE[nombre].departamento))
+    ]
+    if exactas:
+        return _unica(exactas)
+
+    # 2. Similitud de texto (errores de digitación)
+    parecidas = [
+        _INDICE[parecido] for nombre, resto in tramos
+        for parecido in get_close_matches(nombre, _NOMBRES, n=3, cutoff=SIMILITUD_MINIMA)
+        # "girardota" no es un error de digitación de "girardot", es otra ciudad
+        if not nombre.startswith(parecido)
+        and _coincide_departamento(resto, normalizar_ciudad(_INDICE[parecido].departamento))
+    ]
+    return _unica(parecidas)
+
+
+def _coincide_departamento(resto: str, departamento: str) -> bool:
+    """Sin resto siempre coincide; el resto "valle" coincide con "valle del cauca" """
+    return not resto or f' {resto} ' in f' {departamento} '
+
+
+def _unica(candidatas: List[Ciudad]) -> Optional[Ciudad]:
+    distintas = set(candidatas)
+    return distintas.pop() if len(distintas) == 1 else None
+
+
+def buscar_ciudad(texto: Any, aproximado: bool = True) -> Optional[Ciudad]:
+    """
+    Ciudad del nomenclátor para un texto libre
+
+    Args:
+        texto: Nombre tal como viene de los datos ("MEDELLIN", "Bogotá D.C.", ...)
+        aproximado: Si no hay coincidencia exacta, intentar la búsqueda aproximada
+
+    Returns:
+        Ciudad encontrada o None
+    """
+    return _buscar_normalizado(normalizar_ciudad(texto), aproximado)
+
+
+def resolver_ciudades(serie: pd.Series, aproximado: bool = True) -> pd.DataFrame:
+    """
+    Resuelve una columna de ciudades completa
+
+    Cada valor distinto se busca una sola vez y el resultado se expande por
+    posición, así que el costo depende del número de ciudades distintas y no
+    del número de filas.
+
+    Returns:
+        DataFrame con el índice de `serie` y columnas ciudad_oficial,
+        codigo_dane, departamento, lat y lon (None/NaN si no se encontró)
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    encontradas = [buscar_ciudad(valor, aproximado) for valor in unicos]
+    # Fila extra al final para los valores nulos (código -1)
+    tabla = pd.DataFrame(
+        [
+            (c.nombre, c.codigo_dane, c.departamento, c.lat, c.lon) if c is not None
+            else (None, None, None, float('nan'), float('nan'))
+            for c in encontradas + [None]
+        ],
+        columns=['ciudad_oficial', 'codigo_dane', 'departamento', 'lat', 'lon']
+    )
+    resultado = tabla.iloc[codigos].reset_index(drop=True)
+    resultado.index = serie.index
+    return resultado
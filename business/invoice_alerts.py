@@ -2,7 +2,6 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Any, Tuple
-import streamlit as st
 
 class InvoiceAlertsSystem:
     """Sistema de alertas para vencimiento de facturas"""
@@ -4,12 +4,14 @@ Sistema de Machine Learning y Analytics Avanzado
 
 import pandas as pd
 import numpy as np
-from datetime import datetime, date, timedelta
+from datetime import datetime, date
 from typing import Dict, List, Tuple, Any, Optional
 from dataclasses import dataclass
 import warnings
 warnings.filterwarnings('ignore')
 
+from business.forecasting import forecaster, serie_temporal, matriz_por_grupo
+
 @dataclass
 class PredictionResult:
     """Resultado de predicción"""
@@ -19,6 +21,145 @@ class PredictionResult:
     intervalo_inferior: float
     intervalo_superior: float
 
+# Reglas de segmentación RFM, evaluadas en orden (la primera que se cumple gana)
+SEGMENTOS_RFM = [
+    ("Champions", lambda r, f, m: (r >= 4) & (f >= 4) & (m >= 4)),  # Mejores clientes
+    ("Loyal Customers", lambda r, f, m: (r >= 4) & (f >= 3)),  # Leales
+    ("Promising", lambda r, f, m: (r >= 4) & (f <= 2)),  # Prometedores
+    ("Potential Loyalists", lambda r, f, m: (r >= 3) & (f >= 3) & (m >= 3)),  # Potencial leales
+    ("New Customers", lambda r, f, m: (r >= 3) & (f <= 2) & (m <= 2)),  # Nuevos
+    ("At Risk", lambda r, f, m: (r <= 2) & (f >= 3) & (m >= 3)),  # En riesgo
+    ("Can't Lose Them", lambda r, f, m: (r <= 2) & (f >= 4) & (m >= 4)),  # No perderlos
+    ("Lost", lambda r, f, m: r <= 2),  # Perdidos
+]
+SEGMENTO_DEFAULT = "Need Attention"  # Necesitan atención
+
+DESCRIPCION_SEGMENTOS = {
+    "Champions": "Mejores clientes: compran recientemente, frecuentemente y gastan mucho",
+    "Loyal Customers": "Clientes leales: compran regularmente",
+    "At Risk": "En riesgo: antes eran buenos, ahora no compran",
+    "Can't Lose Them": "No perderlos: grandes gastadores que no han comprado recientemente",
+    "Lost": "Perdidos: hace mucho no compran",
+    "Promising": "Prometedores: compradores recientes con potencial",
+    "New Customers": "Clientes nuevos: compraron recientemente pero poco",
+    "Potential Loyalists": "Potencial leales: buenos clientes a desarrollar",
+    "Need Attention": "Necesitan atención: por debajo del promedio"
+}
+
+
+def _quintil(serie: pd.Series) -> np.ndarray:
+    """Quintil 1-5 por rango percentil (los empates caen en el mismo quintil, como qcut)"""
+    if serie.empty:
+        return np.array([], dtype=np.int8)
+    return np.clip(np.ceil(serie.rank(method='max', pct=True).to_numpy() * 5), 1, 5).astype(np.int8)
+
+
+class ClientScoringEngine:
+    """
+    Scoring RFM y de churn columnar sobre las ventas pagadas
+
+    Las compras se ordenan una sola vez por (cliente, fecha) y el intervalo con la
+    compra anterior se calcula en una pasada con groupby().diff(). Como cada
+    intervalo solo depende de compras previas, puntuar a una fecha de corte es
+    filtrar filas `fecha <= corte` y agregar, sin recargar ni reordenar: sirve
+    para backtests sobre el mismo histórico.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        columnas = [c for c in ('cliente', 'fecha_pago_real', 'valor', 'comision') if c in df.columns]
+        if 'pagado' in df.columns:
+            df = df.loc[df['pagado'] == True, columnas]
+        else:
+            df = df[columnas]
+
+        compras = pd.DataFrame({
+            'cliente': df['cliente'].astype('category') if 'cliente' in df.columns else pd.Series(dtype='category'),
+            'fecha': pd.to_datetime(df['fecha_pago_real'], errors='coerce') if 'fecha_pago_real' in df.columns else pd.Series(dtype='datetime64[ns]'),
+            'valor': pd.to_numeric(df['valor'], errors='coerce').fillna(0.0).astype(np.float64) if 'valor' in df.columns else 0.0,
+            'comision': pd.to_numeric(df['comision'], errors='coerce').fillna(0.0).astype(np.float64) if 'comision' in df.columns else 0.0,
+        })
+        compras = compras.dropna(subset=['cliente', 'fecha'])
+        compras = compras.sort_values(['cliente', 'fecha'], kind='mergesort').reset_index(drop=True)
+        compras['intervalo'] = compras.groupby('cliente', observed=True)['fecha'].diff().dt.days
+
+        self.compras = compras
+        self._fechas = compras['fecha'].to_numpy()
+
+    @property
+    def empty(self) -> bool:
+        return self.compras.empty
+
+    def _agregar(self, fecha_corte: Optional[Any]) -> Tuple[pd.DataFrame, pd.Timestamp]:
+        """Métricas por cliente con las compras hasta `fecha_corte` (None = todo, a hoy)"""
+        if fecha_corte is None:
+            corte = pd.Timestamp.now()
+            compras = self.compras
+        else:
+            corte = pd.Timestamp(fecha_corte)
+            compras = self.compras[self._fechas <= np.datetime64(corte)]
+
+        base = compras.groupby('cliente', observed=True, sort=True).agg(
+            Ultima_Compra=('fecha', 'max'),
+            Frequency=('fecha', 'size'),
+            Monetary=('valor', 'sum'),
+            Total_Comision=('comision', 'sum'),
+            Promedio_Dias_Entre_Compras=('intervalo', 'mean'),
+        )
+        base['Recency'] = (corte - base['Ultima_Compra']).dt.days.astype(np.int64)
+        base['Frequency'] = base['Frequency'].astype(np.int64)
+        return base, corte
+
+    def rfm(self, fecha_corte: Optional[Any] = None) -> pd.DataFrame:
+        """
+        Tabla RFM por cliente (índice `cliente`)
+
+        Columnas: Recency, Frequency, Monetary, R_Score, F_Score, M_Score (int8),
+        RFM_Score y Segmento (category).
+        """
+        base, _ = self._agregar(fecha_corte)
+        rfm = base[['Recency', 'Frequency', 'Monetary']].copy()
+
+        # Scores 1-5 (5 es mejor); la frecuencia desempata por orden como rank('first')
+        rfm['R_Score'] = (6 - _quintil(rfm['Recency'])).astype(np.int8)
+        rfm['F_Score'] = _quintil(rfm['Frequency'].rank(method='first'))
+        rfm['M_Score'] = _quintil(rfm['Monetary'])
+        rfm['RFM_Score'] = (rfm['R_Score'] + rfm['F_Score'] + rfm['M_Score']).astype(np.int8)
+
+        r, f, m = rfm['R_Score'].to_numpy(), rfm['F_Score'].to_numpy(), rfm['M_Score'].to_numpy()
+        segmentos = np.select(
+            [regla(r, f, m) for _, regla in SEGMENTOS_RFM],
+            [nombre for nombre, _ in SEGMENTOS_RFM],
+            default=SEGMENTO_DEFAULT
+        )
+        rfm['Segmento'] = pd.Categorical(
+            segmentos, categories=[nombre for nombre, _ in SEGMENTOS_RFM] + [SEGMENTO_DEFAULT]
+        )
+        return rfm
+
+    def churn(self, fecha_corte: Optional[Any] = None, dias_inactivo: int = 60) -> pd.DataFrame:
+        """
+        Riesgo de churn por cliente (índice `cliente`)
+
+        Churn_Score (0-100) = inactividad relativa a su ciclo de compra * 50, más
+        50 si supera `dias_inactivo`. Con una sola compra el ciclo es `dias_inactivo`.
+        """
+        base, _ = self._agregar(fecha_corte)
+        churn = base[['Ultima_Compra', 'Monetary', 'Frequency', 'Total_Comision', 'Recency', 'Promedio_Dias_Entre_Compras']].rename(
+            columns={'Monetary': 'Total_Comprado', 'Frequency': 'Num_Compras', 'Recency': 'Dias_Inactivo'}
+        )
+
+        ciclo = churn['Promedio_Dias_Entre_Compras'].fillna(dias_inactivo).clip(lower=1).to_numpy()
+        dias = churn['Dias_Inactivo'].to_numpy()
+        churn['Churn_Score'] = np.clip(dias / ciclo * 50 + np.where(dias > dias_inactivo, 50, 0), 0, 100)
+        churn['Riesgo'] = pd.cut(
+            churn['Churn_Score'],
+            bins=[0, 30, 60, 100],
+            labels=['Bajo', 'Medio', 'Alto'],
+            include_lowest=True
+        )
+        return churn
+
+
 class MLAnalytics:
     """Sistema de Machine Learning y Analytics Avanzado"""
     
@@ -36,7 +177,10 @@ class MLAnalytics:
         confidence: float = 0.95
     ) -> Dict[str, Any]:
         """
-        Predice ventas futuras usando regresión lineal y tendencias
+        Predice ventas futuras con Holt-Winters (tendencia y estacionalidad semanal)
+        
+        El modelo se ajusta una vez por versión de los datos y se reutiliza para
+        cualquier horizonte o nivel de confianza.
         
         Args:
             df: DataFrame con histórico de ventas
@@ -50,182 +194,123 @@ class MLAnalytics:
             return self._empty_prediction()
         
         try:
-            # Preparar datos
-            df_prep = df[df['pagado'] == True].copy()
-            df_prep['fecha_pago_real'] = pd.to_datetime(df_prep['fecha_pago_real'])
+            # Ventas diarias pagadas (los días sin ventas cuentan como cero)
+            df_prep = df[df['pagado'] == True]
+            daily = serie_temporal(df_prep, 'fecha_pago_real', 'valor', freq='D')
             
-            # Agrupar por día
-            daily = df_prep.groupby(df_prep['fecha_pago_real'].dt.date)['valor'].sum().reset_index()
-            daily.columns = ['fecha', 'valor']
-            daily['fecha'] = pd.to_datetime(daily['fecha'])
-            
-            if len(daily) < 30:
+            dias_con_ventas = int((daily > 0).sum())
+            if dias_con_ventas < 30:
                 return {
                     "error": "Insuficientes datos históricos (mínimo 30 días)",
-                    "dias_disponibles": len(daily)
+                    "dias_disponibles": dias_con_ventas
                 }
             
-            # Crear features
-            daily['dia_num'] = (daily['fecha'] - daily['fecha'].min()).dt.days
-            
-            # Modelo simple: Regresión lineal
-            from sklearn.linear_model import LinearRegression
-            from sklearn.metrics import r2_score, mean_absolute_error
-            
-            X = daily[['dia_num']].values
-            y = daily['valor'].values
-            
-            model = LinearRegression()
-            model.fit(X, y)
-            
-            # Predecir en datos históricos (para métricas)
-            y_pred_hist = model.predict(X)
-            r2 = r2_score(y, y_pred_hist)
-            mae = mean_absolute_error(y, y_pred_hist)
-            
-            # Predecir futuro
-            ultimo_dia = daily['dia_num'].max()
-            futuro_dias = np.array([[ultimo_dia + i] for i in range(1, periods + 1)])
-            predicciones_futuro = model.predict(futuro_dias)
-            
-            # Calcular intervalo de confianza
-            std_error = np.std(y - y_pred_hist)
-            z_score = 1.96 if confidence == 0.95 else 2.576  # 95% o 99%
-            
-            predicciones_lista = []
-            fecha_inicio = daily['fecha'].max() + timedelta(days=1)
-            
-            for i, pred in enumerate(predicciones_futuro):
-                fecha_pred = fecha_inicio + timedelta(days=i)
-                intervalo = z_score * std_error
-                
-                predicciones_lista.append({
-                    "fecha": fecha_pred.date(),
-                    "valor_predicho": max(0, pred),
-                    "intervalo_inferior": max(0, pred - intervalo),
-                    "intervalo_superior": pred + intervalo,
-                    "confianza": confidence
-                })
+            pronostico = forecaster.pronosticar(daily, periods, freq='D', confianza=confidence)
             
             # Tendencia
-            tendencia = "Creciente" if model.coef_[0] > 0 else "Decreciente"
-            cambio_diario = model.coef_[0]
+            cambio_diario = pronostico.tendencia
+            tendencia = "Creciente" if cambio_diario > 0 else "Decreciente"
             
-            # Suma total predicha
-            total_predicho = sum(p["valor_predicho"] for p in predicciones_lista)
+            modelo = "Holt-Winters (estacionalidad semanal)" if pronostico.estacionalidad > 1 else "Holt (tendencia amortiguada)"
             
             return {
-                "predicciones": predicciones_lista,
-                "total_predicho": total_predicho,
+                "predicciones": pronostico.registros(),
+                "total_predicho": pronostico.total,
                 "tendencia": tendencia,
                 "cambio_diario": cambio_diario,
-                "r2_score": r2,
-                "mae": mae,
-                "datos_historicos": len(daily),
-                "modelo": "Regresión Lineal",
-                "confianza_modelo": "Alta" if r2 > 0.7 else "Media" if r2 > 0.4 else "Baja"
+                "r2_score": pronostico.r2,
+                "mae": pronostico.mae,
+                "datos_historicos": dias_con_ventas,
+                "modelo": modelo,
+                "parametros": pronostico.parametros,
+                "confianza_modelo": "Alta" if pronostico.r2 > 0.7 else "Media" if pronostico.r2 > 0.4 else "Baja"
             }
             
         except Exception as e:
             return {"error": str(e)}
     
+    def predict_sales_por_grupo(
+        self,
+        df: pd.DataFrame,
+        columna_grupo: str = 'cliente',
+        periods: int = 3,
+        freq: str = 'M',
+        confidence: float = 0.95
+    ) -> pd.DataFrame:
+        """
+        Pronóstico en lote por cliente, marca u otra columna
+        
+        Args:
+            df: DataFrame con ventas
+            columna_grupo: Columna que define cada serie
+            periods: Periodos a predecir
+            freq: 'M' (mensual, estacionalidad anual), 'W' o 'D'
+            confidence: Nivel de confianza (0-1)
+            
+        Returns:
+            DataFrame con grupo, fecha, valor_predicho e intervalos
+        """
+        if df.empty or columna_grupo not in df.columns:
+            return pd.DataFrame()
+        
+        df_prep = df[df['pagado'] == True] if 'pagado' in df.columns else df
+        matriz = matriz_por_grupo(df_prep, columna_grupo, 'fecha_pago_real', 'valor', freq=freq)
+        resultado = forecaster.pronosticar_grupos(matriz, periods, freq=freq, confianza=confidence)
+        return resultado.rename(columns={'grupo': columna_grupo})
+    
     # ========================================
     # ANÁLISIS RFM
     # ========================================
     
-    def rfm_analysis(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def preparar_scoring(self, df: pd.DataFrame) -> ClientScoringEngine:
+        """Prepara el motor de scoring una vez para puntuar a varias fechas de corte"""
+        return ClientScoringEngine(df)
+    
+    def rfm_analysis(self, df: pd.DataFrame, fecha_corte: Optional[Any] = None) -> Dict[str, Any]:
         """
         Análisis RFM (Recency, Frequency, Monetary) de clientes
         
+        Args:
+            df: DataFrame con ventas (o un ClientScoringEngine ya preparado)
+            fecha_corte: Puntuar con las compras hasta esta fecha (None = hoy)
+        
         Returns:
-            Dict con segmentación RFM de clientes
+            Dict con segmentación RFM de clientes; `rfm_data` es la tabla tipada
         """
-        if df.empty:
+        if isinstance(df, ClientScoringEngine):
+            engine = df
+        elif df.empty:
             return {"error": "No hay datos disponibles"}
+        else:
+            engine = None
         
         try:
-            # Filtrar solo pagadas
-            df_pagadas = df[df['pagado'] == True].copy()
-            df_pagadas['fecha_pago_real'] = pd.to_datetime(df_pagadas['fecha_pago_real'])
-            
-            # Calcular métricas RFM
-            hoy = pd.Timestamp.now()
-            
-            rfm = df_pagadas.groupby('cliente').agg({
-                'fecha_pago_real': lambda x: (hoy - x.max()).days,  # Recency
-                'id': 'count',  # Frequency
-                'valor': 'sum'  # Monetary
-            })
-            
-            rfm.columns = ['Recency', 'Frequency', 'Monetary']
-            
-            # Calcular scores (1-5, donde 5 es mejor)
-            rfm['R_Score'] = pd.qcut(rfm['Recency'], q=5, labels=[5, 4, 3, 2, 1], duplicates='drop')
-            rfm['F_Score'] = pd.qcut(rfm['Frequency'].rank(method='first'), q=5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-            rfm['M_Score'] = pd.qcut(rfm['Monetary'], q=5, labels=[1, 2, 3, 4, 5], duplicates='drop')
-            
-            # Score total
-            rfm['RFM_Score'] = rfm['R_Score'].astype(int) + rfm['F_Score'].astype(int) + rfm['M_Score'].astype(int)
-            
-            # Segmentación
-            def segment_cliente(row):
-                r, f, m = int(row['R_Score']), int(row['F_Score']), int(row['M_Score'])
-                
-                if r >= 4 and f >= 4 and m >= 4:
-                    return "Champions"  # Mejores clientes
-                elif r >= 4 and f >= 3:
-                    return "Loyal Customers"  # Leales
-                elif r >= 4 and f <= 2:
-                    return "Promising"  # Prometedores
-                elif r >= 3 and f >= 3 and m >= 3:
-                    return "Potential Loyalists"  # Potencial leales
-                elif r >= 3 and f <= 2 and m <= 2:
-                    return "New Customers"  # Nuevos
-                elif r <= 2 and f >= 3 and m >= 3:
-                    return "At Risk"  # En riesgo
-                elif r <= 2 and f >= 4 and m >= 4:
-                    return "Can't Lose Them"  # No perderlos
-                elif r <= 2:
-                    return "Lost"  # Perdidos
-                else:
-                    return "Need Attention"  # Necesitan atención
-            
-            rfm['Segmento'] = rfm.apply(segment_cliente, axis=1)
+            engine = engine or ClientScoringEngine(df)
+            rfm = engine.rfm(fecha_corte)
+            if rfm.empty:
+                return {"error": "No hay datos disponibles"}
             
             # Estadísticas por segmento
-            segmentos = rfm.groupby('Segmento').agg({
-                'Recency': 'mean',
-                'Frequency': ['mean', 'count'],
-                'Monetary': 'sum'
-            }).round(2)
-            
-            segmentos.columns = ['Recency_Avg', 'Frequency_Avg', 'Clientes', 'Revenue_Total']
-            segmentos = segmentos.reset_index()
-            
-            # Convertir a lista de diccionarios
-            segmentos_list = segmentos.to_dict('records')
+            segmentos = rfm.groupby('Segmento', observed=True).agg(
+                Recency_Avg=('Recency', 'mean'),
+                Frequency_Avg=('Frequency', 'mean'),
+                Clientes=('Frequency', 'size'),
+                Revenue_Total=('Monetary', 'sum')
+            ).round(2).reset_index()
+            segmentos['Segmento'] = segmentos['Segmento'].astype(str)
             
             # Top clientes por segmento
             top_champions = rfm[rfm['Segmento'] == 'Champions'].nlargest(5, 'Monetary')
             at_risk = rfm[rfm['Segmento'] == 'At Risk'].nlargest(5, 'Monetary')
             
             return {
-                "rfm_data": rfm.reset_index().to_dict('records'),
-                "segmentos": segmentos_list,
+                "rfm_data": rfm.reset_index(),
+                "segmentos": segmentos.to_dict('records'),
                 "top_champions": top_champions.reset_index().to_dict('records'),
                 "at_risk": at_risk.reset_index().to_dict('records'),
                 "total_clientes": len(rfm),
-                "descripcion_segmentos": {
-                    "Champions": "Mejores clientes: compran recientemente, frecuentemente y gastan mucho",
-                    "Loyal Customers": "Clientes leales: compran regularmente",
-                    "At Risk": "En riesgo: antes eran buenos, ahora no compran",
-                    "Can't Lose Them": "No perderlos: grandes gastadores que no han comprado recientemente",
-                    "Lost": "Perdidos: hace mucho no compran",
-                    "Promising": "Prometedores: compradores recientes con potencial",
-                    "New Customers": "Clientes nuevos: compraron recientemente pero poco",
-                    "Potential Loyalists": "Potencial leales: buenos clientes a desarrollar",
-                    "Need Attention": "Necesitan atención: por debajo del promedio"
-                }
+                "fecha_corte": fecha_corte,
+                "descripcion_segmentos": DESCRIPCION_SEGMENTOS
             }
             
         except Exception as e:
@@ -370,75 +455,48 @@ class MLAnalytics:
     def predict_churn(
         self,
         df: pd.DataFrame,
-        dias_inactivo: int = 60
+        dias_inactivo: int = 60,
+        fecha_corte: Optional[Any] = None
     ) -> Dict[str, Any]:
         """
         Predice qué clientes están en riesgo de abandonar
         
         Args:
-            df: DataFrame con ventas
+            df: DataFrame con ventas (o un ClientScoringEngine ya preparado)
             dias_inactivo: Días sin comprar para considerar en riesgo
+            fecha_corte: Puntuar con las compras hasta esta fecha (None = hoy)
             
         Returns:
-            Dict con clientes en riesgo
+            Dict con clientes en riesgo; `scores` es la tabla tipada completa
         """
-        if df.empty:
+        if isinstance(df, ClientScoringEngine):
+            engine = df
+        elif df.empty:
             return {"error": "No hay datos disponibles"}
+        else:
+            engine = None
         
         try:
-            df_pagadas = df[df['pagado'] == True].copy()
-            df_pagadas['fecha_pago_real'] = pd.to_datetime(df_pagadas['fecha_pago_real'])
-            
-            # Última compra por cliente
-            ultima_compra = df_pagadas.groupby('cliente').agg({
-                'fecha_pago_real': 'max',
-                'valor': ['sum', 'count'],
-                'comision': 'sum'
-            })
-            
-            ultima_compra.columns = ['Ultima_Compra', 'Total_Comprado', 'Num_Compras', 'Total_Comision']
-            
-            # Días desde última compra
-            hoy = pd.Timestamp.now()
-            ultima_compra['Dias_Inactivo'] = (hoy - ultima_compra['Ultima_Compra']).dt.days
-            
-            # Calcular promedio de días entre compras
-            compras_por_cliente = df_pagadas.groupby('cliente')['fecha_pago_real'].apply(
-                lambda x: x.diff().dt.days.mean()
-            )
-            ultima_compra['Promedio_Dias_Entre_Compras'] = compras_por_cliente
-            
-            # Score de riesgo de churn (0-100)
-            ultima_compra['Churn_Score'] = np.clip(
-                (ultima_compra['Dias_Inactivo'] / ultima_compra['Promedio_Dias_Entre_Compras'] * 50) +
-                (50 if ultima_compra['Dias_Inactivo'] > dias_inactivo else 0),
-                0, 100
-            )
-            
-            # Clasificar riesgo
-            ultima_compra['Riesgo'] = pd.cut(
-                ultima_compra['Churn_Score'],
-                bins=[0, 30, 60, 100],
-                labels=['Bajo', 'Medio', 'Alto']
-            )
+            engine = engine or ClientScoringEngine(df)
+            churn = engine.churn(fecha_corte, dias_inactivo)
             
-            # Clientes en riesgo alto
-            alto_riesgo = ultima_compra[ultima_compra['Riesgo'] == 'Alto'].copy()
-            alto_riesgo = alto_riesgo.nlargest(20, 'Total_Comprado')  # Top 20 por valor
+            conteos = churn['Riesgo'].value_counts()
             
-            # Clientes en riesgo medio
-            medio_riesgo = ultima_compra[ultima_compra['Riesgo'] == 'Medio'].copy()
-            medio_riesgo = medio_riesgo.nlargest(20, 'Total_Comprado')
+            # Top 20 por valor en riesgo alto y medio
+            alto_riesgo = churn[churn['Riesgo'] == 'Alto'].nlargest(20, 'Total_Comprado')
+            medio_riesgo = churn[churn['Riesgo'] == 'Medio'].nlargest(20, 'Total_Comprado')
             
             return {
-                "total_clientes": len(ultima_compra),
-                "alto_riesgo_count": len(ultima_compra[ultima_compra['Riesgo'] == 'Alto']),
-                "medio_riesgo_count": len(ultima_compra[ultima_compra['Riesgo'] == 'Medio']),
-                "bajo_riesgo_count": len(ultima_compra[ultima_compra['Riesgo'] == 'Bajo']),
+                "total_clientes": len(churn),
+                "alto_riesgo_count": int(conteos.get('Alto', 0)),
+                "medio_riesgo_count": int(conteos.get('Medio', 0)),
+                "bajo_riesgo_count": int(conteos.get('Bajo', 0)),
                 "alto_riesgo": alto_riesgo.reset_index().to_dict('records'),
                 "medio_riesgo": medio_riesgo.reset_index().to_dict('records'),
-                "valor_en_riesgo": alto_riesgo['Total_Comprado'].sum(),
-                "dias_inactivo_threshold": dias_inactivo
+                "valor_en_riesgo": float(alto_riesgo['Total_Comprado'].sum()),
+                "dias_inactivo_threshold": dias_inactivo,
+                "fecha_corte": fecha_corte,
+                "scores": churn.reset_index()
             }
             
         except Exception as e:
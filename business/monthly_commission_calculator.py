@@ -4,6 +4,11 @@ from datetime import datetime, date, timedelta
 from typing import Dict, List, Any, Tuple
 from calendar import monthrange
 
+from business.forecasting import forecaster, serie_temporal
+
+# Días de historial de pagos necesarios para proyectar el cierre del mes con el modelo
+MIN_DIAS_PRONOSTICO = 28
+
 class MonthlyCommissionCalculator:
     """Calculadora de comisiones mensuales con pagos mes vencido"""
     
@@ -204,6 +209,9 @@ class MonthlyCommissionCalculator:
                 (df['fecha_pago_real'].dt.date <= fin_mes)
             ]
             
+            # Comisiones que se esperan pagar entre mañana y fin de mes (pronóstico)
+            pronostico_resto = self._pronosticar_comisiones_resto_mes(df, hoy, fin_mes)
+            
             if facturas_mes.empty:
                 return {
                     "mes": hoy.strftime('%Y-%m'),
@@ -213,7 +221,8 @@ class MonthlyCommissionCalculator:
                     "descuento_reserva": 0,
                     "total_descuentos": 0,
                     "comisiones_netas": 0,
-                    "facturas_procesadas": 0
+                    "facturas_procesadas": 0,
+                    **self._proyeccion_cierre(0, pronostico_resto)
                 }
             
             # Calcular comisiones con descuento automático del 15%
@@ -236,7 +245,8 @@ class MonthlyCommissionCalculator:
                 "total_descuentos": total_descuentos,
                 "comisiones_netas": comisiones_netas,
                 "facturas_procesadas": len(facturas_con_comisiones),
-                "detalle_facturas": facturas_con_comisiones.to_dict('records')
+                "detalle_facturas": facturas_con_comisiones.to_dict('records'),
+                **self._proyeccion_cierre(total_comisiones_brutas, pronostico_resto)
             }
             
         except Exception as e:
@@ -244,6 +254,45 @@ class MonthlyCommissionCalculator:
                 "error": f"Error calculando proyección: {str(e)}"
             }
     
+    def _pronosticar_comisiones_resto_mes(self, df: pd.DataFrame, hoy: date, fin_mes: date) -> Tuple[float, float, float]:
+        """
+        (valor, inferior, superior) de comisiones pagadas entre mañana y fin de mes
+        
+        Usa el pronóstico Holt-Winters de las comisiones pagadas por día; el
+        modelo se cachea por versión de los datos, así que recalcular es inmediato.
+        Sin historial suficiente devuelve ceros.
+        """
+        pagadas = df[(df['pagado'] == True) & df['fecha_pago_real'].notna()]
+        if pagadas.empty or 'comision' not in pagadas.columns:
+            return (0.0, 0.0, 0.0)
+        
+        serie = serie_temporal(pagadas, 'fecha_pago_real', 'comision', freq='D', hasta=datetime.combine(hoy, datetime.max.time()))
+        horizonte = (fin_mes - serie.index[-1].date()).days if len(serie) else 0
+        if len(serie) < MIN_DIAS_PRONOSTICO or horizonte <= 0:
+            return (0.0, 0.0, 0.0)
+        
+        pronostico = forecaster.pronosticar(serie, horizonte, freq='D')
+        restantes = pronostico.fechas.date > hoy
+        return (
+            float(pronostico.valores[restantes].sum()),
+            float(pronostico.inferior[restantes].sum()),
+            float(pronostico.superior[restantes].sum())
+        )
+    
+    def _proyeccion_cierre(self, comisiones_brutas: float, pronostico_resto: Tuple[float, float, float]) -> Dict[str, Any]:
+        """Proyección de cierre de mes: acumulado + pronóstico, bruto y neto de descuentos"""
+        factor_neto = 1 - self.DESCUENTO_TOTAL
+        valor, inferior, superior = pronostico_resto
+        proyeccion_brutas = comisiones_brutas + valor
+        return {
+            "proyeccion_comisiones_brutas": proyeccion_brutas,
+            "proyeccion_comisiones_netas": proyeccion_brutas * factor_neto,
+            "rango_comisiones_netas": (
+                (comisiones_brutas + inferior) * factor_neto,
+                (comisiones_brutas + superior) * factor_neto
+            )
+        }
+    
     def calcular_potencial_mes_actual(self) -> Dict[str, Any]:
         """Calcula comisiones potenciales de facturas con fecha límite en el mes actual"""
         try:
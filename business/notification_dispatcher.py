@@ -0,0 +1,303 @@
+"""
+Despachador de notificaciones programadas: deduplicación persistente,
+resúmenes por destinatario, una sesión SMTP por lote, límite de envío y reintentos
+"""
+
+import smtplib
+import socket
+import time
+from collections import OrderedDict
+from datetime import date
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Dict, List, Any, Optional, Callable
+
+import pandas as pd
+
+from business.notification_store import NotificationStore
+
+# Errores de transporte que justifican reconectar y reintentar
+TRANSIENT_SMTP_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    smtplib.SMTPHeloError,
+    ConnectionError,
+    socket.timeout,
+)
+
+
+def _es_transitorio(error: Exception) -> bool:
+    """True si el error SMTP es temporal (desconexión o código 4xx)"""
+    if isinstance(error, TRANSIENT_SMTP_ERRORS):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+class RateLimiter:
+    """Token bucket simple: como máximo `por_minuto` envíos con ráfaga `rafaga`"""
+
+    def __init__(
+        self,
+        por_minuto: float,
+        rafaga: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.tasa = por_minuto / 60.0
+        self.capacidad = max(1, rafaga)
+        self.tokens = float(self.capacidad)
+        self.clock = clock
+        self.sleep = sleep
+        self.ultimo = clock()
+
+    def acquire(self):
+        """Bloquea hasta disponer de un token"""
+        if self.tasa <= 0:
+            return
+        ahora = self.clock()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.tasa)
+        self.ultimo = ahora
+        if self.tokens < 1:
+            espera = (1 - self.tokens) / self.tasa
+            self.sleep(espera)
+            self.ultimo = self.clock()
+            self.tokens = 1.0
+        self.tokens -= 1
+
+
+class SMTPSession:
+    """Conexión SMTP reutilizable durante un lote de envíos"""
+
+    def __init__(self, email_config: Dict[str, Any], timeout: float = 30):
+        self.config = email_config
+        self.timeout = timeout
+        self.server: Optional[smtplib.SMTP] = None
+
+    def open(self):
+        self.close()
+        server = smtplib.SMTP(self.config["smtp_server"], self.config["smtp_port"], timeout=self.timeout)
+        server.ehlo()
+        # STARTTLS solo si el servidor lo ofrece (los servidores locales de prueba no lo hacen)
+        if self.config.get("smtp_starttls", True) and server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+        if self.config.get("email_password"):
+            server.login(self.config["email_from"], self.config["email_password"])
+        self.server = server
+
+    def send(self, msg: MIMEMultipart):
+        if self.server is None:
+            self.open()
+        self.server.send_message(msg)
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NotificationDispatcher:
+    """Envía notificaciones automáticas sin duplicados ni saturar al destinatario"""
+
+    def __init__(
+        self,
+        notification_system,
+        store: Optional[NotificationStore] = None,
+        max_por_resumen: int = 200,
+        envios_por_minuto: float = 30,
+        max_reintentos: int = 3,
+        backoff_base: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+        session_factory: Optional[Callable[[Dict[str, Any]], SMTPSession]] = None
+    ):
+        self.notification_system = notification_system
+        self.store = store or NotificationStore()
+        self.max_por_resumen = max(1, max_por_resumen)
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.sleep = sleep
+        self.rate_limiter = RateLimiter(envios_por_minuto, rafaga=5, sleep=sleep)
+        self.session_factory = session_factory or SMTPSession
+
+    # ========================================
+    # SELECCIÓN DE FACTURAS
+    # ========================================
+
+    @staticmethod
+    def seleccionar_vencidas(df: pd.DataFrame, hoy: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Filtra facturas pendientes con fecha de pago vencida (vectorizado)"""
+        if df.empty or 'fecha_pago_max' not in df.columns:
+            return df.iloc[0:0]
+        hoy = hoy if hoy is not None else pd.Timestamp.now()
+        fechas = pd.to_datetime(df['fecha_pago_max'], errors='coerce')
+        mask = (df['pagado'] == False) & (fechas < hoy)
+        vencidas = df.loc[mask].copy()
+        vencidas['fecha_pago_max'] = fechas[mask]
+        return vencidas
+
+    def dispatch_overdue(
+        self,
+        df: pd.DataFrame,
+        email_to: str,
+        trigger: str = "factura_vencida",
+        recipient_column: Optional[str] = None,
+        hoy: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """
+        Notifica facturas vencidas agrupadas en un resumen por destinatario
+
+        Args:
+            df: Facturas (comisiones) cargadas
+            email_to: Destinatario por defecto
+            trigger: Trigger a registrar en la deduplicación
+            recipient_column: Columna opcional con el email de cada factura
+            hoy: Día de referencia para la deduplicación
+
+        Returns:
+            Dict con enviados, errores y omitidas por deduplicación
+        """
+        vencidas = self.seleccionar_vencidas(df, pd.Timestamp(hoy) if hoy else None)
+        columnas = [c for c in ['factura', 'cliente', 'valor', 'fecha_pago_max'] if c in vencidas.columns]
+        if recipient_column and recipient_column in vencidas.columns:
+            columnas.append(recipient_column)
+        registros = vencidas[columnas].to_dict('records')
+
+        items_por_destinatario: Dict[str, List[Dict]] = OrderedDict()
+        for registro in registros:
+            destino = (registro.get(recipient_column) if recipient_column else None) or email_to
+            if destino:
+                items_por_destinatario.setdefault(destino, []).append(registro)
+
+        return self.dispatch_digests(items_por_destinatario, trigger, canal="email", dia=hoy)
+
+    # ========================================
+    # ENVÍO EN LOTE
+    # ========================================
+
+    def dispatch_digests(
+        self,
+        items_por_destinatario: Dict[str, List[Dict]],
+        trigger: str,
+        canal: str = "email",
+        dia: Optional[date] = None
+    ) -> Dict[str, Any]:
+        """Deduplica, agrupa en resúmenes y envía todo por una sola sesión SMTP"""
+        resultado = {"email": [], "whatsapp": [], "errors": [], "omitidas": 0}
+
+        lotes = []
+        ya_enviadas = self.store.ya_enviadas(trigger, canal, dia)
+        for destino, items in items_por_destinatario.items():
+            nuevos = [it for it in items if str(it.get('factura')) not in ya_enviadas]
+            resultado["omitidas"] += len(items) - len(nuevos)
+            for i in range(0, len(nuevos), self.max_por_resumen):
+                lotes.append((destino, nuevos[i:i + self.max_por_resumen]))
+
+        if not lotes:
+            return resultado
+
+        config = self.notification_system.email_config
+        if not config.get("email_from"):
+            resultado["errors"].append({
+                "success": False,
+                "error": "Configuración de email incompleta. Verifica EMAIL_FROM en .env"
+            })
+            return resultado
+
+        with self.session_factory(config) as session:
+            for destino, items in lotes:
+                subject, html = self._build_digest(trigger, items)
+                msg = self._build_message(config["email_from"], destino, subject, html)
+                error = self._send_with_retry(session, msg)
+
+                self.notification_system._add_to_history(
+                    "email", destino, subject, html, "error" if error else "enviado", error
+                )
+                if error:
+                    resultado["errors"].append({"success": False, "error": error, "destinatario": destino})
+                    continue
+
+                self.store.marcar_enviadas(
+                    [(trigger, it.get('factura'), canal) for it in items], destino, dia
+                )
+                resultado["email"].extend(
+                    {"tipo": trigger, "factura": it.get('factura'), "destinatario": destino} for it in items
+                )
+
+        return resultado
+
+    def _send_with_retry(self, session: SMTPSession, msg: MIMEMultipart) -> Optional[str]:
+        """Envía con límite de tasa y backoff exponencial; devuelve el error o None"""
+        for intento in range(self.max_reintentos + 1):
+            self.rate_limiter.acquire()
+            try:
+                session.send(msg)
+                return None
+            except Exception as e:
+                # Tras un fallo la conexión no es fiable: el siguiente send() la reabre
+                session.close()
+                if not _es_transitorio(e) or intento == self.max_reintentos:
+                    return str(e)
+                self.sleep(self.backoff_base * (2 ** intento))
+        return None
+
+    # ========================================
+    # CONSTRUCCIÓN DE MENSAJES
+    # ========================================
+
+    @staticmethod
+    def _build_message(email_from: str, to: str, subject: str, html: str) -> MIMEMultipart:
+        msg = MIMEMultipart('alternative')
+        msg['From'] = email_from
+        msg['To'] = to
+        msg['Subject'] = subject
+        msg.attach(MIMEText(html, 'html'))
+        return msg
+
+    def _build_digest(self, trigger: str, items: List[Dict]):
+        """Un solo mensaje usa la plantilla individual; varios, una tabla resumen"""
+        if len(items) == 1 and trigger == "factura_vencida":
+            template = self.notification_system.get_template_factura_vencida(items[0])
+            return template["email_subject"], template["email_html"]
+
+        total = sum(float(it.get('valor') or 0) for it in items)
+        filas = "".join(
+            f"<tr><td>{it.get('factura', 'N/A')}</td><td>{it.get('cliente', '')}</td>"
+            f"<td style='text-align:right;'>${float(it.get('valor') or 0):,.0f}</td>"
+            f"<td>{pd.Timestamp(it['fecha_pago_max']).strftime('%Y-%m-%d') if pd.notna(it.get('fecha_pago_max')) else 'N/A'}</td></tr>"
+            for it in items
+        )
+        nombre = self.notification_system.TRIGGERS.get(trigger, {}).get("nombre", trigger)
+
+        html = f"""
+        <html>
+            <body style='font-family: Arial, sans-serif; padding: 20px;'>
+                <div style='background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 10px; color: white;'>
+                    <h2>🚨 Resumen: {len(items)} facturas - {nombre}</h2>
+                </div>
+
+                <div style='margin-top: 20px; padding: 20px; background: #f8f9fa; border-radius: 10px;'>
+                    <p><strong>Valor total:</strong> ${total:,.0f}</p>
+                    <table style='width: 100%; border-collapse: collapse;' border='1' cellpadding='6'>
+                        <tr><th>Factura</th><th>Cliente</th><th>Valor</th><th>Vencimiento</th></tr>
+                        {filas}
+                    </table>
+                </div>
+
+                <div style='margin-top: 20px; text-align: center; color: #666; font-size: 12px;'>
+                    <p>CRM Inteligente 2.0 - Sistema de Notificaciones</p>
+                </div>
+            </body>
+        </html>
+        """
+        return f"🚨 Resumen: {len(items)} facturas - {nombre} (${total:,.0f})", html
@@ -0,0 +1,217 @@
+"""
+Cola de entrega de notificaciones en segundo plano (worker asyncio + outbox SQLite)
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, List, Any, Optional, Callable
+
+from business.notification_store import NotificationStore
+
+# Callback de estado: (outbox_id, estado, resultado)
+StatusCallback = Callable[[int, str, Dict[str, Any]], None]
+
+# Envíos simultáneos por canal
+DEFAULT_LIMITES = {"email": 2, "whatsapp": 4}
+
+
+class NotificationQueue:
+    """Worker asyncio en un hilo propio que vacía el outbox respetando límites por canal"""
+
+    def __init__(
+        self,
+        store: NotificationStore,
+        senders: Dict[str, Callable[[Dict], Dict[str, Any]]],
+        limites: Optional[Dict[str, int]] = None,
+        max_intentos: int = 3,
+        backoff_base: float = 2.0,
+        poll_interval: float = 5.0,
+        al_terminar_lote: Optional[Callable[[], None]] = None
+    ):
+        self.store = store
+        self.senders = senders
+        self.limites = {**DEFAULT_LIMITES, **(limites or {})}
+        self.max_intentos = max_intentos
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        # Se llama (en un hilo) cuando la cola queda sin envíos en curso y al
+        # detener el worker; p. ej. para cerrar las conexiones SMTP
+        self.al_terminar_lote = al_terminar_lote
+
+        self._callbacks: Dict[int, StatusCallback] = {}
+        self._listeners: List[StatusCallback] = []
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._stopping = False
+
+    # ========================================
+    # API PÚBLICA
+    # ========================================
+
+    def start(self):
+        """Arranca el worker (idempotente) y reencola lo que quedó 'enviando'"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.store.recuperar_en_curso()
+            self._stopping = False
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run_loop, name="notification-queue", daemon=True)
+            self._thread.start()
+        self._ready.wait(timeout=5)
+
+    def stop(self, timeout: float = 10):
+        """Detiene el worker; los mensajes no enviados siguen en el outbox"""
+        self._stopping = True
+        self._notify_worker()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def enqueue(
+        self,
+        canal: str,
+        destinatario: str,
+        asunto: str,
+        mensaje: str,
+        html: bool = True,
+        metadata: Optional[Dict] = None,
+        callback: Optional[StatusCallback] = None
+    ) -> int:
+        """Guarda el mensaje en el outbox y despierta al worker; no bloquea por el envío"""
+        if canal not in self.senders:
+            raise ValueError(f"Canal no soportado: {canal}")
+        outbox_id = self.store.encolar(canal, destinatario, asunto, mensaje, html=html, metadata=metadata)
+        if callback:
+            with self._lock:
+                self._callbacks[outbox_id] = callback
+        self.start()
+        self._notify_worker()
+        return outbox_id
+
+    def add_listener(self, callback: StatusCallback):
+        """Registra un callback para todos los cambios de estado"""
+        self._listeners.append(callback)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que el outbox quede sin pendientes (útil en scripts y pruebas)"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self.store.contar_en_cola() > 0:
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # ========================================
+    # WORKER
+    # ========================================
+
+    def _notify_worker(self):
+        if self._loop and self._wake and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._worker())
+        finally:
+            self._loop.close()
+
+    async def _worker(self):
+        self._wake = asyncio.Event()
+        semaforos = {canal: asyncio.Semaphore(max(1, n)) for canal, n in self.limites.items()}
+        en_vuelo = set()
+        max_en_vuelo = sum(self.limites.values()) * 2
+        lote_abierto = False
+        self._ready.set()
+
+        while not self._stopping:
+            self._wake.clear()
+            cupo = max_en_vuelo - len(en_vuelo)
+            mensajes = self.store.reclamar_pendientes(limite=cupo) if cupo > 0 else []
+            for row in mensajes:
+                semaforo = semaforos.setdefault(row["canal"], asyncio.Semaphore(1))
+                task = asyncio.create_task(self._deliver(row, semaforo))
+                en_vuelo.add(task)
+                task.add_done_callback(en_vuelo.discard)
+                lote_abierto = True
+
+            if lote_abierto and not en_vuelo:
+                await self._terminar_lote()
+                lote_abierto = False
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        if en_vuelo:
+            await asyncio.gather(*en_vuelo, return_exceptions=True)
+        await self._terminar_lote()
+
+    async def _terminar_lote(self):
+        if self.al_terminar_lote is None:
+            return
+        try:
+            await asyncio.to_thread(self.al_terminar_lote)
+        except Exception as e:
+            print(f"⚠️ Error al cerrar el lote de notificaciones: {e}")
+
+    async def _deliver(self, row: Dict, semaforo: asyncio.Semaphore):
+        sender = self.senders.get(row["canal"])
+        async with semaforo:
+            try:
+                resultado = await asyncio.to_thread(sender, row)
+            except Exception as e:
+                resultado = {"success": False, "error": str(e), "reintentar": True}
+
+        if resultado.get("success"):
+            estado = NotificationStore.ENVIADO
+        elif resultado.get("reintentar") and row["intentos"] < self.max_intentos:
+            # Backoff exponencial fuera del semáforo para no bloquear el canal
+            await asyncio.sleep(self.backoff_base * (2 ** (row["intentos"] - 1)))
+            estado = NotificationStore.PENDIENTE
+        else:
+            estado = NotificationStore.ERROR
+
+        self.store.marcar_resultado(row["id"], estado, resultado.get("error"))
+        self._emit(row["id"], estado, resultado)
+        self._wake.set()
+
+    def _emit(self, outbox_id: int, estado: str, resultado: Dict[str, Any]):
+        with self._lock:
+            callback = self._callbacks.get(outbox_id)
+            if estado != NotificationStore.PENDIENTE:
+                self._callbacks.pop(outbox_id, None)
+        for cb in ([callback] if callback else []) + self._listeners:
+            try:
+                cb(outbox_id, estado, resultado)
+            except Exception as e:
+                print(f"⚠️ Error en callback de notificación {outbox_id}: {e}")
+
+
+# Una cola por archivo de outbox en todo el proceso (Streamlit crea un
+# NotificationSystem por sesión, pero el worker debe ser único)
+_queues: Dict[str, NotificationQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_notification_queue(
+    store: NotificationStore,
+    senders: Dict[str, Callable[[Dict], Dict[str, Any]]],
+    **kwargs
+) -> NotificationQueue:
+    """Devuelve (creando si hace falta) la cola compartida para el outbox dado"""
+    with _queues_lock:
+        queue = _queues.get(store.db_path)
+        if queue is None or store.db_path == ":memory:":
+            queue = NotificationQueue(store, senders, **kwargs)
+            if store.db_path != ":memory:":
+                _queues[store.db_path] = queue
+    return queue
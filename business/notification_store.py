@@ -0,0 +1,237 @@
+"""
+Almacenamiento persistente (SQLite) del sistema de notificaciones
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime, date
+from typing import Dict, List, Iterable, Tuple, Set, Optional
+
+# Ruta por defecto: <raíz del proyecto>/data/notificaciones.db
+DEFAULT_DB_PATH = os.getenv(
+    "NOTIFICATIONS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "notificaciones.db")
+)
+
+# Clave de deduplicación: (trigger, factura, canal)
+DedupKey = Tuple[str, str, str]
+
+
+class NotificationStore:
+    """Estado persistente de notificaciones (deduplicación por factura × trigger × día)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS notificaciones_enviadas (
+            trigger TEXT NOT NULL,
+            factura TEXT NOT NULL,
+            canal TEXT NOT NULL,
+            dia TEXT NOT NULL,
+            destinatario TEXT,
+            fecha_envio TEXT NOT NULL,
+            PRIMARY KEY (trigger, factura, canal, dia)
+        );
+        CREATE INDEX IF NOT EXISTS idx_notif_enviadas_dia
+            ON notificaciones_enviadas (dia, trigger);
+
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            canal TEXT NOT NULL,
+            destinatario TEXT NOT NULL,
+            asunto TEXT,
+            mensaje TEXT NOT NULL,
+            html INTEGER NOT NULL DEFAULT 1,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            fecha_creacion TEXT NOT NULL,
+            fecha_envio TEXT,
+            metadata TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_outbox_estado ON outbox (estado, id);
+    """
+
+    # Estados del outbox
+    PENDIENTE = "pendiente"
+    ENVIANDO = "enviando"
+    ENVIADO = "enviado"
+    ERROR = "error"
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or DEFAULT_DB_PATH
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        # Una sola conexión compartida; sqlite3 serializa el acceso con el lock
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if self.db_path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    # ========================================
+    # DEDUPLICACIÓN
+    # ========================================
+
+    @staticmethod
+    def _dia(dia: Optional[date]) -> str:
+        return (dia or date.today()).isoformat()
+
+    def ya_enviadas(self, trigger: str, canal: str, dia: Optional[date] = None) -> Set[str]:
+        """Facturas ya notificadas hoy para un trigger y canal (una sola consulta)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT factura FROM notificaciones_enviadas WHERE dia = ? AND trigger = ? AND canal = ?",
+                (self._dia(dia), trigger, canal)
+            ).fetchall()
+        return {row["factura"] for row in rows}
+
+    def filtrar_pendientes(self, keys: Iterable[DedupKey], dia: Optional[date] = None) -> List[DedupKey]:
+        """Devuelve solo las claves que aún no se han notificado en el día"""
+        keys = list(keys)
+        cache: Dict[Tuple[str, str], Set[str]] = {}
+        pendientes = []
+        for trigger, factura, canal in keys:
+            if (trigger, canal) not in cache:
+                cache[(trigger, canal)] = self.ya_enviadas(trigger, canal, dia)
+            if str(factura) not in cache[(trigger, canal)]:
+                pendientes.append((trigger, factura, canal))
+        return pendientes
+
+    def marcar_enviadas(self, keys: Iterable[DedupKey], destinatario: str, dia: Optional[date] = None):
+        """Registra en bloque las claves notificadas (idempotente)"""
+        dia_str = self._dia(dia)
+        ahora = datetime.now().isoformat()
+        rows = [(t, str(f), c, dia_str, destinatario, ahora) for t, f, c in keys]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO notificaciones_enviadas "
+                "(trigger, factura, canal, dia, destinatario, fecha_envio) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def purgar(self, antes_de: date) -> int:
+        """Elimina el estado de deduplicación anterior a una fecha"""
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM notificaciones_enviadas WHERE dia < ?", (antes_de.isoformat(),)
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    # ========================================
+    # OUTBOX (COLA DE ENVÍO DURABLE)
+    # ========================================
+
+    def encolar(
+        self,
+        canal: str,
+        destinatario: str,
+        asunto: str,
+        mensaje: str,
+        html: bool = True,
+        estado: str = PENDIENTE,
+        error: Optional[str] = None,
+        metadata: Optional[Dict] = None
+    ) -> int:
+        """Inserta un mensaje en el outbox y devuelve su id"""
+        ahora = datetime.now().isoformat()
+        fecha_envio = ahora if estado in (self.ENVIADO, self.ERROR) else None
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (canal, destinatario, asunto, mensaje, html, estado, error, "
+                "fecha_creacion, fecha_envio, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (canal, destinatario, asunto, mensaje, int(html), estado, error, ahora, fecha_envio,
+                 json.dumps(metadata, default=str) if metadata else None)
+            )
+            self._conn.commit()
+        return cur.lastrowid
+
+    def reclamar_pendientes(self, limite: int = 50) -> List[Dict]:
+        """Marca como 'enviando' y devuelve los mensajes pendientes más antiguos (con el intento en curso contado)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM outbox WHERE estado = ? ORDER BY id LIMIT ?", (self.PENDIENTE, limite)
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE outbox SET estado = ?, intentos = intentos + 1 WHERE id = ?",
+                    [(self.ENVIANDO, row["id"]) for row in rows]
+                )
+                self._conn.commit()
+        return [dict(row, intentos=row["intentos"] + 1) for row in rows]
+
+    def marcar_resultado(self, outbox_id: int, estado: str, error: Optional[str] = None):
+        """Registra el resultado final (o el retorno a 'pendiente') de un mensaje"""
+        fecha_envio = datetime.now().isoformat() if estado in (self.ENVIADO, self.ERROR) else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET estado = ?, error = ?, fecha_envio = ? WHERE id = ?",
+                (estado, error, fecha_envio, outbox_id)
+            )
+            self._conn.commit()
+
+    def recuperar_en_curso(self) -> int:
+        """Devuelve a 'pendiente' los mensajes interrumpidos por un reinicio"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE outbox SET estado = ? WHERE estado = ?", (self.PENDIENTE, self.ENVIANDO)
+            )
+            self._conn.commit()
+        return cur.rowcount
+
+    def contar_en_cola(self) -> int:
+        """Mensajes pendientes o en envío"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE estado IN (?, ?)", (self.PENDIENTE, self.ENVIANDO)
+            ).fetchone()
+        return row[0]
+
+    def obtener(self, outbox_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+        return dict(row) if row else None
+
+    def historial(self, limit: int = 50) -> List[Dict]:
+        """Últimos mensajes del outbox en el formato del historial (más antiguo primero)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, canal, destinatario, asunto, substr(mensaje, 1, 104) AS mensaje, estado, "
+                "error, COALESCE(fecha_envio, fecha_creacion) AS fecha FROM outbox ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        historial = []
+        for row in reversed(rows):
+            mensaje = row["mensaje"] or ""
+            historial.append({
+                "id": f"{row['canal']}_{row['id']}",
+                "tipo": row["canal"],
+                "destinatario": row["destinatario"],
+                "asunto": row["asunto"],
+                "mensaje": mensaje[:100] + "..." if len(mensaje) > 100 else mensaje,
+                "estado": row["estado"],
+                "fecha": row["fecha"],
+                "error": row["error"]
+            })
+        return historial
+
+    def estadisticas(self) -> Dict[str, Dict[str, int]]:
+        """Conteos agregados por canal y estado (una consulta GROUP BY)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT canal, estado, COUNT(*) AS n FROM outbox GROUP BY canal, estado"
+            ).fetchall()
+        conteos: Dict[str, Dict[str, int]] = {}
+        for row in rows:
+            conteos.setdefault(row["canal"], {})[row["estado"]] = row["n"]
+        return conteos
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
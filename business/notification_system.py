@@ -7,8 +7,8 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, date
 from typing import Dict, List, Optional, Any
-import pandas as pd
 import json
+import threading
 from dataclasses import dataclass, asdict
 import os
 
@@ -69,7 +69,12 @@ class NotificationSystem:
     
     def __init__(self, db_manager=None):
         self.db_manager = db_manager
-        self.notifications_history = []
+        self._dispatcher = None
+        self._store = None
+        self._queue = None
+        # Sesión SMTP por hilo de envío; se descarta al fallar y todas se cierran al terminar cada lote
+        self._smtp_sesiones: Dict[int, Any] = {}
+        self._smtp_lock = threading.Lock()
         
         # Configuración de Email (desde variables de entorno)
         self.email_config = {
@@ -77,7 +82,8 @@ class NotificationSystem:
             "smtp_port": int(os.getenv("SMTP_PORT", "587")),
             "email_from": os.getenv("EMAIL_FROM", ""),
             "email_password": os.getenv("EMAIL_PASSWORD", ""),
-            "email_to_default": os.getenv("EMAIL_TO_DEFAULT", "")
+            "email_to_default": os.getenv("EMAIL_TO_DEFAULT", ""),
+            "smtp_starttls": os.getenv("SMTP_STARTTLS", "true").lower() != "false"
         }
         
         # Configuración de WhatsApp (Twilio)
@@ -100,7 +106,8 @@ class NotificationSystem:
         html: bool = True
     ) -> Dict[str, Any]:
         """
-        Envía un email
+        Envía un email de forma síncrona (scripts y tareas programadas).
+        Desde la UI usar `enqueue_email` para no bloquear el render.
         
         Args:
             to: Destinatario
@@ -112,46 +119,18 @@ class NotificationSystem:
             Dict con status y mensaje
         """
         # Validar configuración
-        if not self.email_config["email_from"] or not self.email_config["email_password"]:
-            return {
-                "success": False,
-                "error": "Configuración de email incompleta. Verifica EMAIL_FROM y EMAIL_PASSWORD en .env"
-            }
+        config_error = self._email_config_error()
+        if config_error:
+            return config_error
         
-        try:
-            # Crear mensaje
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.email_config["email_from"]
-            msg['To'] = to
-            msg['Subject'] = subject
-            
-            # Agregar cuerpo
-            if html:
-                msg.attach(MIMEText(body, 'html'))
-            else:
-                msg.attach(MIMEText(body, 'plain'))
-            
-            # Conectar y enviar
-            with smtplib.SMTP(self.email_config["smtp_server"], self.email_config["smtp_port"]) as server:
-                server.starttls()
-                server.login(self.email_config["email_from"], self.email_config["email_password"])
-                server.send_message(msg)
-            
-            # Registrar en historial
+        result = self._deliver_email(to, subject, body, html)
+        
+        # Registrar en historial
+        if result["success"]:
             self._add_to_history("email", to, subject, body, "enviado")
-            
-            return {
-                "success": True,
-                "message": f"Email enviado exitosamente a {to}"
-            }
-            
-        except Exception as e:
-            error_msg = str(e)
-            self._add_to_history("email", to, subject, body, "error", error_msg)
-            return {
-                "success": False,
-                "error": error_msg
-            }
+        else:
+            self._add_to_history("email", to, subject, body, "error", result["error"])
+        return result
     
     def send_whatsapp(
         self,
@@ -159,7 +138,8 @@ class NotificationSystem:
         message: str
     ) -> Dict[str, Any]:
         """
-        Envía un mensaje de WhatsApp vía Twilio
+        Envía un mensaje de WhatsApp vía Twilio de forma síncrona.
+        Desde la UI usar `enqueue_whatsapp`.
         
         Args:
             to: Número de WhatsApp (formato: +573001234567)
@@ -169,52 +149,206 @@ class NotificationSystem:
             Dict con status y mensaje
         """
         # Validar configuración
+        config_error = self._whatsapp_config_error()
+        if config_error:
+            return config_error
+        
+        result = self._deliver_whatsapp(to, message)
+        
+        # Registrar en historial
+        if result["success"]:
+            self._add_to_history("whatsapp", to, "WhatsApp", message, "enviado")
+        elif not result.get("sin_historial"):
+            self._add_to_history("whatsapp", to, "WhatsApp", message, "error", result["error"])
+        return result
+    
+    def _email_config_error(self) -> Optional[Dict[str, Any]]:
+        """Error de configuración de email, o None (la contraseña es opcional para relays locales)"""
+        if not self.email_config["email_from"]:
+            return {
+                "success": False,
+                "error": "Configuración de email incompleta. Verifica EMAIL_FROM en .env (EMAIL_PASSWORD solo si el servidor SMTP pide autenticación)"
+            }
+        return None
+    
+    def _whatsapp_config_error(self) -> Optional[Dict[str, Any]]:
+        """Error de configuración de WhatsApp, o None"""
         if not self.whatsapp_config["account_sid"] or not self.whatsapp_config["auth_token"]:
             return {
                 "success": False,
                 "error": "Configuración de WhatsApp incompleta. Verifica TWILIO_ACCOUNT_SID y TWILIO_AUTH_TOKEN en .env"
             }
+        return None
+    
+    def _deliver_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        html: bool = True
+    ) -> Dict[str, Any]:
+        """Entrega un email reutilizando la sesión SMTP del hilo actual"""
+        from business.notification_dispatcher import SMTPSession, _es_transitorio
+        
+        config_error = self._email_config_error()
+        if config_error:
+            return config_error
+        
+        # Crear mensaje
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.email_config["email_from"]
+        msg['To'] = to
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'html' if html else 'plain'))
+        
+        hilo = threading.get_ident()
+        with self._smtp_lock:
+            session = self._smtp_sesiones.get(hilo)
+            if session is None:
+                session = self._smtp_sesiones[hilo] = SMTPSession(self.email_config)
         
         try:
-            # Importar Twilio (solo si está configurado)
             try:
-                from twilio.rest import Client
-            except ImportError:
-                return {
-                    "success": False,
-                    "error": "Twilio no instalado. Ejecuta: pip install twilio"
-                }
-            
-            # Crear cliente
+                session.send(msg)
+            except smtplib.SMTPServerDisconnected:
+                # La conexión reutilizada expiró: reconectar una vez
+                session.open()
+                session.send(msg)
+            return {
+                "success": True,
+                "message": f"Email enviado exitosamente a {to}"
+            }
+        except Exception as e:
+            # Una sesión fallida no se reutiliza: el próximo email del hilo abre otra
+            with self._smtp_lock:
+                if self._smtp_sesiones.get(hilo) is session:
+                    del self._smtp_sesiones[hilo]
+            session.close()
+            return {
+                "success": False,
+                "error": str(e),
+                "reintentar": _es_transitorio(e)
+            }
+    
+    def close_smtp_sessions(self):
+        """Cierra y descarta las conexiones SMTP de los hilos de envío (se reabren al próximo email)"""
+        with self._smtp_lock:
+            sesiones = list(self._smtp_sesiones.values())
+            self._smtp_sesiones.clear()
+        for session in sesiones:
+            session.close()
+
+    def _deliver_whatsapp(self, to: str, message: str) -> Dict[str, Any]:
+        """Entrega un WhatsApp vía Twilio"""
+        config_error = self._whatsapp_config_error()
+        if config_error:
+            return config_error
+        
+        # Importar Twilio (solo si está configurado)
+        try:
+            from twilio.rest import Client
+        except ImportError:
+            return {
+                "success": False,
+                "error": "Twilio no instalado. Ejecuta: pip install twilio",
+                "sin_historial": True
+            }
+        
+        try:
             client = Client(
                 self.whatsapp_config["account_sid"],
                 self.whatsapp_config["auth_token"]
             )
-            
-            # Enviar mensaje
             message_obj = client.messages.create(
                 from_=f'whatsapp:{self.whatsapp_config["whatsapp_from"]}',
                 body=message,
                 to=f'whatsapp:{to}'
             )
-            
-            # Registrar en historial
-            self._add_to_history("whatsapp", to, "WhatsApp", message, "enviado")
-            
             return {
                 "success": True,
                 "message": f"WhatsApp enviado exitosamente a {to}",
                 "sid": message_obj.sid
             }
-            
         except Exception as e:
-            error_msg = str(e)
-            self._add_to_history("whatsapp", to, "WhatsApp", message, "error", error_msg)
             return {
                 "success": False,
-                "error": error_msg
+                "error": str(e),
+                "reintentar": isinstance(e, (ConnectionError, TimeoutError))
             }
     
+    # ========================================
+    # COLA DE ENVÍO EN SEGUNDO PLANO
+    # ========================================
+    
+    def get_store(self):
+        """Outbox/estado persistente compartido (SQLite)"""
+        if self._store is None:
+            from business.notification_store import NotificationStore
+            self._store = NotificationStore()
+        return self._store
+    
+    def get_queue(self):
+        """Cola asyncio compartida por el proceso que vacía el outbox"""
+        if self._queue is None:
+            from business.notification_queue import get_notification_queue
+            self._queue = get_notification_queue(
+                self.get_store(),
+                senders={
+                    "email": lambda row: self._deliver_email(
+                        row["destinatario"], row["asunto"], row["mensaje"], bool(row["html"])
+                    ),
+                    "whatsapp": lambda row: self._deliver_whatsapp(row["destinatario"], row["mensaje"])
+                },
+                limites={
+                    "email": int(os.getenv("NOTIFICATIONS_EMAIL_CONCURRENCY", "2")),
+                    "whatsapp": int(os.getenv("NOTIFICATIONS_WHATSAPP_CONCURRENCY", "4"))
+                },
+                al_terminar_lote=self.close_smtp_sessions
+            )
+        return self._queue
+    
+    def enqueue_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        html: bool = True,
+        callback=None
+    ) -> Dict[str, Any]:
+        """Encola un email en el outbox; el worker lo envía en segundo plano"""
+        config_error = self._email_config_error()
+        if config_error:
+            return config_error
+        outbox_id = self.get_queue().enqueue("email", to, subject, body, html=html, callback=callback)
+        return {
+            "success": True,
+            "message": f"Email a {to} en cola de envío",
+            "id": outbox_id
+        }
+    
+    def enqueue_whatsapp(self, to: str, message: str, callback=None) -> Dict[str, Any]:
+        """Encola un WhatsApp en el outbox; el worker lo envía en segundo plano"""
+        config_error = self._whatsapp_config_error()
+        if config_error:
+            return config_error
+        outbox_id = self.get_queue().enqueue("whatsapp", to, "WhatsApp", message, html=False, callback=callback)
+        return {
+            "success": True,
+            "message": f"WhatsApp a {to} en cola de envío",
+            "id": outbox_id
+        }
+    
+    def get_dispatcher(self):
+        """Despachador con deduplicación persistente y sesión SMTP por lote (creado al primer uso)"""
+        if self._dispatcher is None:
+            from business.notification_dispatcher import NotificationDispatcher
+            self._dispatcher = NotificationDispatcher(
+                self,
+                store=self.get_store(),
+                envios_por_minuto=float(os.getenv("NOTIFICATIONS_RATE_PER_MINUTE", "30"))
+            )
+        return self._dispatcher
+    
     # ========================================
     # PLANTILLAS DE MENSAJES
     # ========================================
@@ -458,30 +592,12 @@ _CRM Inteligente 2.0_"""
         email_dest = email_to or self.email_config["email_to_default"]
         whatsapp_dest = whatsapp_to or self.whatsapp_config["whatsapp_to_default"]
         
-        # 1. Facturas vencidas
-        df_pendientes = df[df['pagado'] == False].copy()
-        if not df_pendientes.empty:
-            df_pendientes['fecha_pago_max'] = pd.to_datetime(df_pendientes['fecha_pago_max'])
-            hoy = pd.Timestamp.now()
-            df_vencidas = df_pendientes[df_pendientes['fecha_pago_max'] < hoy]
-            
-            for _, factura in df_vencidas.iterrows():
-                template = self.get_template_factura_vencida(factura.to_dict())
-                
-                # Enviar email
-                if email_dest:
-                    result = self.send_email(
-                        email_dest,
-                        template["email_subject"],
-                        template["email_html"]
-                    )
-                    if result["success"]:
-                        notifications_sent["email"].append({
-                            "tipo": "factura_vencida",
-                            "factura": factura['factura']
-                        })
-                    else:
-                        notifications_sent["errors"].append(result)
+        # 1. Facturas vencidas: un resumen por destinatario, deduplicado por día
+        if email_dest:
+            resultado = self.get_dispatcher().dispatch_overdue(df, email_dest, trigger="factura_vencida")
+            notifications_sent["email"].extend(resultado["email"])
+            notifications_sent["errors"].extend(resultado["errors"])
+            notifications_sent["omitidas"] = resultado["omitidas"]
         
         # 2. Meta alcanzada (ejemplo)
         # Aquí podrías agregar lógica para verificar si se alcanzó la meta
@@ -501,40 +617,36 @@ _CRM Inteligente 2.0_"""
         estado: str,
         error: Optional[str] = None
     ):
-        """Agrega una notificación al historial"""
-        notification = {
-            "id": f"{tipo}_{datetime.now().timestamp()}",
-            "tipo": tipo,
-            "destinatario": destinatario,
-            "asunto": asunto,
-            "mensaje": mensaje[:100] + "..." if len(mensaje) > 100 else mensaje,
-            "estado": estado,
-            "fecha": datetime.now().isoformat(),
-            "error": error
-        }
-        self.notifications_history.append(notification)
+        """Registra en el outbox un envío síncrono ya resuelto"""
+        self.get_store().encolar(tipo, destinatario, asunto, mensaje, estado=estado, error=error)
     
     def get_history(self, limit: int = 50) -> List[Dict]:
-        """Obtiene el historial de notificaciones"""
-        return self.notifications_history[-limit:]
+        """Obtiene el historial de notificaciones desde el outbox"""
+        return self.get_store().historial(limit)
     
     def get_stats(self) -> Dict[str, Any]:
-        """Obtiene estadísticas de notificaciones"""
-        if not self.notifications_history:
+        """Obtiene estadísticas de notificaciones desde el outbox"""
+        conteos = self.get_store().estadisticas()
+        por_tipo = {canal: sum(estados.values()) for canal, estados in conteos.items()}
+        total = sum(por_tipo.values())
+        enviados = sum(estados.get("enviado", 0) for estados in conteos.values())
+        errores = sum(estados.get("error", 0) for estados in conteos.values())
+        pendientes = sum(estados.get("pendiente", 0) + estados.get("enviando", 0) for estados in conteos.values())
+        
+        if total == 0:
             return {
                 "total": 0,
                 "enviados": 0,
                 "errores": 0,
+                "pendientes": 0,
                 "por_tipo": {}
             }
         
-        df = pd.DataFrame(self.notifications_history)
-        
         return {
-            "total": len(df),
-            "enviados": len(df[df['estado'] == 'enviado']),
-            "errores": len(df[df['estado'] == 'error']),
-            "por_tipo": df['tipo'].value_counts().to_dict(),
-            "tasa_exito": len(df[df['estado'] == 'enviado']) / len(df) * 100 if len(df) > 0 else 0
+            "total": total,
+            "enviados": enviados,
+            "errores": errores,
+            "pendientes": pendientes,
+            "por_tipo": por_tipo,
+            "tasa_exito": enviados / total * 100
         }
-
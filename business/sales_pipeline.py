@@ -3,14 +3,22 @@ Sistema de Pipeline de Ventas con Kanban
 """
 
 import pandas as pd
+from bisect import bisect_left
+from collections import defaultdict
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Tuple
 from dataclasses import dataclass, asdict
 import json
 
 @dataclass
 class Deal:
-    """Representa una oportunidad de venta"""
+    """Representa una oportunidad de venta (slotted; el historial vive en PipelineEventLog)"""
+    __slots__ = (
+        "id", "cliente", "valor_estimado", "etapa", "probabilidad", "fecha_creacion",
+        "fecha_cierre_estimada", "contacto", "telefono", "email", "notas", "productos_interes",
+        "origen", "vendedor", "prioridad", "siguiente_accion", "fecha_siguiente_accion"
+    )
+    
     id: str
     cliente: str
     valor_estimado: float
@@ -28,7 +36,11 @@ class Deal:
     prioridad: str  # 'Alta', 'Media', 'Baja'
     siguiente_accion: str
     fecha_siguiente_accion: Optional[date]
-    historial: List[Dict]  # Cambios de etapa, notas, etc.
+    
+    @property
+    def valor_ponderado(self) -> float:
+        """Valor estimado ponderado por probabilidad"""
+        return self.valor_estimado * (self.probabilidad / 100)
     
     def to_dict(self) -> Dict:
         """Convierte a diccionario"""
@@ -41,6 +53,144 @@ class Deal:
         if self.fecha_siguiente_accion:
             data['fecha_siguiente_accion'] = self.fecha_siguiente_accion.isoformat()
         return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Deal':
+        """Crea un Deal desde un diccionario (fechas como string ISO o date)"""
+        data = dict(data)
+        for campo in ('fecha_creacion', 'fecha_cierre_estimada', 'fecha_siguiente_accion'):
+            if isinstance(data.get(campo), str) and data[campo]:
+                data[campo] = date.fromisoformat(data[campo][:10])
+        data['productos_interes'] = list(data.get('productos_interes') or [])
+        return cls(**{k: data.get(k) for k in cls.__dataclass_fields__})
+
+
+class PipelineEventLog:
+    """Historial append-only de eventos de todos los deals, en orden cronológico"""
+    __slots__ = ("_eventos", "_fechas", "_por_deal")
+    
+    def __init__(self):
+        self._eventos: List[Dict] = []
+        self._fechas: List[str] = []  # ISO, paralelo a _eventos para búsqueda binaria
+        self._por_deal: Dict[str, List[int]] = defaultdict(list)
+    
+    def __len__(self) -> int:
+        return len(self._eventos)
+    
+    def append(self, deal_id: str, evento: Dict) -> Dict:
+        """Agrega un evento; debe ser posterior o igual al último registrado"""
+        evento = {"deal_id": deal_id, **evento}
+        self._por_deal[deal_id].append(len(self._eventos))
+        self._eventos.append(evento)
+        self._fechas.append(evento["fecha"])
+        return evento
+    
+    def load(self, eventos: Iterable[Tuple[str, Dict]]):
+        """Carga eventos existentes ordenándolos por fecha (orden estable)"""
+        ordenados = sorted(
+            ({"deal_id": deal_id, **evento} for deal_id, evento in eventos),
+            key=lambda e: e["fecha"]
+        )
+        self.clear()
+        for evento in ordenados:
+            self.append(evento["deal_id"], evento)
+    
+    def clear(self):
+        self._eventos.clear()
+        self._fechas.clear()
+        self._por_deal.clear()
+    
+    def for_deal(self, deal_id: str) -> List[Dict]:
+        """Eventos de un deal en orden cronológico"""
+        return [self._eventos[i] for i in self._por_deal.get(deal_id, [])]
+    
+    def since(self, fecha_inicio: date, limit: Optional[int] = None) -> Tuple[int, List[Dict]]:
+        """(cantidad, últimos `limit` eventos) desde una fecha, del más reciente al más antiguo"""
+        total = len(self._eventos)
+        inicio = bisect_left(self._fechas, fecha_inicio.isoformat())
+        desde = inicio if limit is None else max(inicio, total - limit)
+        return total - inicio, self._eventos[desde:][::-1]
+    
+    def items(self) -> Iterable[Tuple[str, Dict]]:
+        for evento in self._eventos:
+            yield evento["deal_id"], {k: v for k, v in evento.items() if k != "deal_id"}
+
+
+class PipelineAggregates:
+    """Agregados corrientes (cantidad, valor, valor ponderado) actualizados en O(1)"""
+    __slots__ = ("por_etapa", "por_vendedor", "por_prioridad_activa", "cierres_activos",
+                 "total_deals", "valor_total", "suma_ordinal_ganadas")
+    
+    ETAPAS_CERRADAS = ("ganada", "perdida")
+    
+    def __init__(self):
+        self.por_etapa: Dict[str, Dict[str, float]] = defaultdict(self._vacio)
+        self.por_vendedor: Dict[str, Dict[str, float]] = defaultdict(self._vacio_vendedor)
+        self.por_prioridad_activa: Dict[str, int] = defaultdict(int)
+        # Deals activos agrupados por fecha de cierre estimada (para el pronóstico)
+        self.cierres_activos: Dict[date, Dict[str, float]] = defaultdict(self._vacio)
+        self.total_deals = 0
+        self.valor_total = 0.0
+        self.suma_ordinal_ganadas = 0
+    
+    @staticmethod
+    def _vacio() -> Dict[str, float]:
+        return {"cantidad": 0, "valor": 0.0, "valor_ponderado": 0.0}
+    
+    @staticmethod
+    def _vacio_vendedor() -> Dict[str, float]:
+        return {
+            "total_deals": 0,
+            "deals_activos": 0,
+            "deals_ganados": 0,
+            "deals_perdidos": 0,
+            "valor_total": 0.0,
+            "valor_ganado": 0.0,
+            "valor_ponderado": 0.0
+        }
+    
+    def apply(self, deal: Deal, signo: int):
+        """Suma (signo=1) o resta (signo=-1) la contribución de un deal"""
+        valor = deal.valor_estimado * signo
+        ponderado = deal.valor_ponderado * signo
+        activo = deal.etapa not in self.ETAPAS_CERRADAS
+        
+        self.total_deals += signo
+        self.valor_total += valor
+        
+        etapa = self.por_etapa[deal.etapa]
+        etapa["cantidad"] += signo
+        etapa["valor"] += valor
+        etapa["valor_ponderado"] += ponderado
+        
+        v = self.por_vendedor[deal.vendedor]
+        v["total_deals"] += signo
+        v["valor_total"] += valor
+        v["valor_ponderado"] += ponderado
+        if deal.etapa == "ganada":
+            v["deals_ganados"] += signo
+            v["valor_ganado"] += valor
+            if deal.fecha_creacion:
+                self.suma_ordinal_ganadas += deal.fecha_creacion.toordinal() * signo
+        elif deal.etapa == "perdida":
+            v["deals_perdidos"] += signo
+        else:
+            v["deals_activos"] += signo
+        if v["total_deals"] == 0:
+            del self.por_vendedor[deal.vendedor]
+        
+        if activo:
+            self.por_prioridad_activa[deal.prioridad] += signo
+            if deal.fecha_cierre_estimada:
+                cierre = self.cierres_activos[deal.fecha_cierre_estimada]
+                cierre["cantidad"] += signo
+                cierre["valor"] += valor
+                cierre["valor_ponderado"] += ponderado
+                if cierre["cantidad"] == 0:
+                    del self.cierres_activos[deal.fecha_cierre_estimada]
+    
+    def clear(self):
+        self.__init__()
 
 class SalesPipeline:
     """Sistema de gestión de pipeline de ventas"""
@@ -98,10 +248,92 @@ class SalesPipeline:
         }
     ]
     
-    def __init__(self, db_manager=None):
+    # Campos con índice secundario en memoria
+    INDEXED_FIELDS = ("etapa", "vendedor", "prioridad")
+    
+    def __init__(self, db_manager=None, storage=None):
+        """
+        Args:
+            db_manager: DatabaseManager (opcional)
+            storage: Backend persistente (database.pipeline_storage); sin él el
+                pipeline vive solo en memoria
+        """
         self.db_manager = db_manager
-        self.deals: List[Deal] = []
+        self.storage = storage
         self.stages = self.DEFAULT_STAGES.copy()
+        self._deals: Dict[str, Deal] = {}
+        self._index: Dict[str, Dict[Any, Dict[str, Deal]]] = {
+            field: defaultdict(dict) for field in self.INDEXED_FIELDS
+        }
+        self.eventos = PipelineEventLog()
+        self.aggregates = PipelineAggregates()
+        
+        if self.storage is not None:
+            self._load_from_storage()
+    
+    def _load_from_storage(self):
+        """Carga deals y eventos; migra el historial embebido de versiones anteriores"""
+        eventos = list(self.storage.load_events())
+        con_eventos = {deal_id for deal_id, _ in eventos}
+        legado = []
+        for deal_data in self.storage.load_all():
+            deal = Deal.from_dict(deal_data)
+            self._add(deal)
+            if deal.id not in con_eventos:
+                legado.extend((deal.id, evento) for evento in deal_data.get("historial") or [])
+        if legado:
+            self.storage.append_events(legado)
+        self.eventos.load(eventos + legado)
+    
+    # ========================================
+    # ÍNDICES EN MEMORIA
+    # ========================================
+    
+    @property
+    def deals(self) -> List[Deal]:
+        """Todos los deals en orden de creación"""
+        return list(self._deals.values())
+    
+    @deals.setter
+    def deals(self, deals: List[Deal]):
+        self._deals = {}
+        for index in self._index.values():
+            index.clear()
+        self.aggregates.clear()
+        for deal in deals:
+            self._add(deal)
+    
+    def _add(self, deal: Deal):
+        self._deals[deal.id] = deal
+        for field in self.INDEXED_FIELDS:
+            self._index[field][getattr(deal, field)][deal.id] = deal
+        self.aggregates.apply(deal, 1)
+    
+    def _remove(self, deal: Deal):
+        self._deals.pop(deal.id, None)
+        for field in self.INDEXED_FIELDS:
+            bucket = self._index[field].get(getattr(deal, field))
+            if bucket is not None:
+                bucket.pop(deal.id, None)
+                if not bucket:
+                    del self._index[field][getattr(deal, field)]
+        self.aggregates.apply(deal, -1)
+    
+    def _persist(self, deal: Deal):
+        """Escribe solo el deal modificado en el backend"""
+        if self.storage is not None:
+            self.storage.upsert(deal.to_dict())
+    
+    def _log(self, deal_id: str, evento: Dict):
+        """Agrega un evento al historial (memoria + backend)"""
+        evento = {"fecha": datetime.now().isoformat(), **evento}
+        self.eventos.append(deal_id, evento)
+        if self.storage is not None:
+            self.storage.append_events([(deal_id, evento)])
+    
+    def get_historial(self, deal_id: str) -> List[Dict]:
+        """Historial de un deal en orden cronológico"""
+        return self.eventos.for_deal(deal_id)
     
     # ========================================
     # GESTIÓN DE DEALS
@@ -124,6 +356,12 @@ class SalesPipeline:
         """Crea una nueva oportunidad de venta"""
         
         deal_id = f"DEAL-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        # Evitar colisiones cuando se crean varios deals en el mismo segundo
+        if deal_id in self._deals:
+            sufijo = 2
+            while f"{deal_id}-{sufijo}" in self._deals:
+                sufijo += 1
+            deal_id = f"{deal_id}-{sufijo}"
         
         deal = Deal(
             id=deal_id,
@@ -142,17 +380,17 @@ class SalesPipeline:
             vendedor=vendedor,
             prioridad=prioridad,
             siguiente_accion="Contactar cliente",
-            fecha_siguiente_accion=date.today() + timedelta(days=1),
-            historial=[{
-                "fecha": datetime.now().isoformat(),
-                "accion": "Creado",
-                "etapa": "lead",
-                "usuario": vendedor,
-                "notas": "Oportunidad creada"
-            }]
+            fecha_siguiente_accion=date.today() + timedelta(days=1)
         )
         
-        self.deals.append(deal)
+        self._add(deal)
+        self._persist(deal)
+        self._log(deal_id, {
+            "accion": "Creado",
+            "etapa": "lead",
+            "usuario": vendedor,
+            "notas": "Oportunidad creada"
+        })
         return deal
     
     def move_deal(self, deal_id: str, nueva_etapa: str, usuario: str, notas: str = "") -> bool:
@@ -170,12 +408,14 @@ class SalesPipeline:
         etapa_anterior = deal.etapa
         
         # Actualizar deal
+        self._remove(deal)
         deal.etapa = nueva_etapa
         deal.probabilidad = stage_info["probabilidad"]
+        self._add(deal)
+        self._persist(deal)
         
         # Agregar al historial
-        deal.historial.append({
-            "fecha": datetime.now().isoformat(),
+        self._log(deal_id, {
             "accion": "Cambio de etapa",
             "etapa_anterior": etapa_anterior,
             "etapa_nueva": nueva_etapa,
@@ -192,13 +432,15 @@ class SalesPipeline:
         if not deal:
             return False
         
+        self._remove(deal)
         for key, value in updates.items():
-            if hasattr(deal, key):
+            if key in Deal.__slots__ and key != "id":
                 setattr(deal, key, value)
+        self._add(deal)
+        self._persist(deal)
         
         # Agregar al historial
-        deal.historial.append({
-            "fecha": datetime.now().isoformat(),
+        self._log(deal_id, {
             "accion": "Actualización",
             "campos": list(updates.keys()),
             "notas": "Deal actualizado"
@@ -210,13 +452,20 @@ class SalesPipeline:
         """Elimina un deal"""
         deal = self.get_deal_by_id(deal_id)
         if deal:
-            self.deals.remove(deal)
+            self._remove(deal)
+            if self.storage is not None:
+                self.storage.delete(deal_id)
+            self._log(deal_id, {
+                "accion": "Eliminado",
+                "cliente": deal.cliente,
+                "notas": "Oportunidad eliminada"
+            })
             return True
         return False
     
     def get_deal_by_id(self, deal_id: str) -> Optional[Deal]:
         """Obtiene un deal por ID"""
-        return next((d for d in self.deals if d.id == deal_id), None)
+        return self._deals.get(deal_id)
     
     # ========================================
     # CONSULTAS Y FILTROS
@@ -224,30 +473,39 @@ class SalesPipeline:
     
     def get_deals_by_stage(self, stage_id: str) -> List[Deal]:
         """Obtiene todos los deals de una etapa"""
-        return [d for d in self.deals if d.etapa == stage_id]
+        return list(self._index["etapa"].get(stage_id, {}).values())
     
     def get_deals_by_vendedor(self, vendedor: str) -> List[Deal]:
         """Obtiene todos los deals de un vendedor"""
-        return [d for d in self.deals if d.vendedor == vendedor]
+        return list(self._index["vendedor"].get(vendedor, {}).values())
     
     def get_deals_by_prioridad(self, prioridad: str) -> List[Deal]:
         """Obtiene todos los deals de una prioridad"""
-        return [d for d in self.deals if d.prioridad == prioridad]
+        return list(self._index["prioridad"].get(prioridad, {}).values())
+    
+    def get_vendedores(self) -> List[str]:
+        """Vendedores con al menos un deal"""
+        return list(self._index["vendedor"].keys())
     
     def get_active_deals(self) -> List[Deal]:
         """Obtiene deals activos (no ganados ni perdidos)"""
-        return [d for d in self.deals if d.etapa not in ["ganada", "perdida"]]
+        return [
+            deal
+            for etapa, bucket in self._index["etapa"].items()
+            if etapa not in ["ganada", "perdida"]
+            for deal in bucket.values()
+        ]
     
     def get_closed_deals(self, ganadas: bool = True) -> List[Deal]:
         """Obtiene deals cerrados"""
         etapa = "ganada" if ganadas else "perdida"
-        return [d for d in self.deals if d.etapa == etapa]
+        return self.get_deals_by_stage(etapa)
     
     def search_deals(self, query: str) -> List[Deal]:
         """Busca deals por cliente, contacto o notas"""
         query_lower = query.lower()
         return [
-            d for d in self.deals
+            d for d in self._deals.values()
             if query_lower in d.cliente.lower() or
                query_lower in d.contacto.lower() or
                query_lower in d.notas.lower()
@@ -258,61 +516,52 @@ class SalesPipeline:
     # ========================================
     
     def get_pipeline_metrics(self) -> Dict[str, Any]:
-        """Calcula métricas del pipeline"""
+        """Calcula métricas del pipeline a partir de los agregados corrientes"""
         
-        active_deals = self.get_active_deals()
-        ganadas = self.get_closed_deals(ganadas=True)
-        perdidas = self.get_closed_deals(ganadas=False)
+        agg = self.aggregates
+        por_etapa = agg.por_etapa
         
-        # Valor total del pipeline
-        valor_pipeline = sum(d.valor_estimado for d in active_deals)
+        ganadas = por_etapa.get("ganada", {}).get("cantidad", 0)
+        perdidas = por_etapa.get("perdida", {}).get("cantidad", 0)
+        activas = [v for k, v in por_etapa.items() if k not in PipelineAggregates.ETAPAS_CERRADAS]
         
-        # Valor ponderado (valor * probabilidad)
-        valor_ponderado = sum(
-            d.valor_estimado * (d.probabilidad / 100)
-            for d in active_deals
-        )
+        # Valor total del pipeline y ponderado (valor * probabilidad)
+        valor_pipeline = sum(v["valor"] for v in activas)
+        valor_ponderado = sum(v["valor_ponderado"] for v in activas)
         
         # Distribución por etapa
         distribucion_etapas = {}
         for stage in self.stages:
-            deals_etapa = self.get_deals_by_stage(stage["id"])
+            datos = por_etapa.get(stage["id"], {})
             distribucion_etapas[stage["nombre"]] = {
-                "cantidad": len(deals_etapa),
-                "valor": sum(d.valor_estimado for d in deals_etapa)
+                "cantidad": datos.get("cantidad", 0),
+                "valor": datos.get("valor", 0)
             }
         
         # Tasa de conversión
-        total_cerradas = len(ganadas) + len(perdidas)
-        tasa_conversion = (len(ganadas) / total_cerradas * 100) if total_cerradas > 0 else 0
+        total_cerradas = ganadas + perdidas
+        tasa_conversion = (ganadas / total_cerradas * 100) if total_cerradas > 0 else 0
         
         # Valor promedio de deal
-        avg_deal_value = (
-            sum(d.valor_estimado for d in self.deals) / len(self.deals)
-            if self.deals else 0
-        )
-        
-        # Ciclo de venta promedio (días desde creación hasta cierre)
-        ciclos = []
-        for deal in ganadas:
-            if deal.fecha_creacion:
-                dias = (date.today() - deal.fecha_creacion).days
-                ciclos.append(dias)
+        avg_deal_value = agg.valor_total / agg.total_deals if agg.total_deals else 0
         
-        ciclo_promedio = sum(ciclos) / len(ciclos) if ciclos else 0
+        # Ciclo de venta promedio (días desde creación hasta hoy para las ganadas)
+        ciclo_promedio = (
+            date.today().toordinal() - agg.suma_ordinal_ganadas / ganadas
+            if ganadas else 0
+        )
         
         # Deals por prioridad
         por_prioridad = {
-            "Alta": len([d for d in active_deals if d.prioridad == "Alta"]),
-            "Media": len([d for d in active_deals if d.prioridad == "Media"]),
-            "Baja": len([d for d in active_deals if d.prioridad == "Baja"])
+            prioridad: agg.por_prioridad_activa.get(prioridad, 0)
+            for prioridad in ["Alta", "Media", "Baja"]
         }
         
         return {
-            "total_deals": len(self.deals),
-            "deals_activos": len(active_deals),
-            "deals_ganados": len(ganadas),
-            "deals_perdidos": len(perdidas),
+            "total_deals": agg.total_deals,
+            "deals_activos": sum(v["cantidad"] for v in activas),
+            "deals_ganados": ganadas,
+            "deals_perdidos": perdidas,
             "valor_pipeline": valor_pipeline,
             "valor_ponderado": valor_ponderado,
             "tasa_conversion": tasa_conversion,
@@ -341,24 +590,22 @@ class SalesPipeline:
         return urgentes
     
     def get_forecast(self, meses: int = 1) -> Dict[str, Any]:
-        """Genera pronóstico de ventas"""
+        """Genera pronóstico de ventas (suma por fecha de cierre, no por deal)"""
         
         fecha_limite = date.today() + timedelta(days=meses * 30)
         
         # Deals que cierran en el período
-        deals_forecast = [
-            d for d in self.get_active_deals()
-            if d.fecha_cierre_estimada and d.fecha_cierre_estimada <= fecha_limite
+        cierres = [
+            v for fecha, v in self.aggregates.cierres_activos.items()
+            if fecha <= fecha_limite
         ]
+        deals_count = sum(v["cantidad"] for v in cierres)
         
         # Valor esperado (ponderado por probabilidad)
-        valor_esperado = sum(
-            d.valor_estimado * (d.probabilidad / 100)
-            for d in deals_forecast
-        )
+        valor_esperado = sum(v["valor_ponderado"] for v in cierres)
         
         # Valor best case (todos se ganan)
-        valor_best_case = sum(d.valor_estimado for d in deals_forecast)
+        valor_best_case = sum(v["valor"] for v in cierres)
         
         # Valor worst case (aplicar tasa de conversión histórica)
         metrics = self.get_pipeline_metrics()
@@ -367,11 +614,11 @@ class SalesPipeline:
         
         return {
             "periodo_meses": meses,
-            "deals_count": len(deals_forecast),
+            "deals_count": deals_count,
             "valor_esperado": valor_esperado,
             "valor_best_case": valor_best_case,
             "valor_worst_case": valor_worst_case,
-            "confianza": "Alta" if len(deals_forecast) > 10 else "Media" if len(deals_forecast) > 5 else "Baja"
+            "confianza": "Alta" if deals_count > 10 else "Media" if deals_count > 5 else "Baja"
         }
     
     # ========================================
@@ -380,8 +627,15 @@ class SalesPipeline:
     
     def export_to_dict(self) -> Dict:
         """Exporta todos los deals a diccionario"""
+        deals = []
+        for d in self._deals.values():
+            data = d.to_dict()
+            data["historial"] = [
+                {k: v for k, v in e.items() if k != "deal_id"} for e in self.get_historial(d.id)
+            ]
+            deals.append(data)
         return {
-            "deals": [d.to_dict() for d in self.deals],
+            "deals": deals,
             "stages": self.stages,
             "export_date": datetime.now().isoformat()
         }
@@ -402,19 +656,21 @@ class SalesPipeline:
             with open(filename, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
-            # Importar deals
-            self.deals = []
-            for deal_data in data.get("deals", []):
-                # Convertir strings a fechas
-                if deal_data.get('fecha_creacion'):
-                    deal_data['fecha_creacion'] = date.fromisoformat(deal_data['fecha_creacion'])
-                if deal_data.get('fecha_cierre_estimada'):
-                    deal_data['fecha_cierre_estimada'] = date.fromisoformat(deal_data['fecha_cierre_estimada'])
-                if deal_data.get('fecha_siguiente_accion'):
-                    deal_data['fecha_siguiente_accion'] = date.fromisoformat(deal_data['fecha_siguiente_accion'])
-                
-                deal = Deal(**deal_data)
-                self.deals.append(deal)
+            # Importar deals y su historial
+            deals_data = data.get("deals", [])
+            self.deals = [Deal.from_dict(deal_data) for deal_data in deals_data]
+            eventos = [
+                (deal_data["id"], evento)
+                for deal_data in deals_data
+                for evento in deal_data.get("historial") or []
+            ]
+            self.eventos.load(eventos)
+            
+            # Reemplazar el contenido del backend
+            if self.storage is not None:
+                self.storage.clear()
+                self.storage.upsert_many(d.to_dict() for d in self._deals.values())
+                self.storage.append_events(self.eventos.items())
             
             # Importar stages si existen
             if "stages" in data:
@@ -430,67 +686,50 @@ class SalesPipeline:
     # ========================================
     
     def generate_activity_report(self, dias: int = 30) -> Dict:
-        """Genera reporte de actividad"""
+        """Genera reporte de actividad (búsqueda binaria sobre el log de eventos)"""
         
         fecha_inicio = date.today() - timedelta(days=dias)
+        total, eventos = self.eventos.since(fecha_inicio, limit=50)
         
         actividades = []
-        for deal in self.deals:
-            for evento in deal.historial:
-                fecha_evento = datetime.fromisoformat(evento["fecha"]).date()
-                if fecha_evento >= fecha_inicio:
-                    actividades.append({
-                        "fecha": fecha_evento,
-                        "deal_id": deal.id,
-                        "cliente": deal.cliente,
-                        "accion": evento["accion"],
-                        "usuario": evento.get("usuario", "N/A")
-                    })
-        
-        # Ordenar por fecha
-        actividades.sort(key=lambda x: x["fecha"], reverse=True)
+        for evento in eventos:
+            deal = self._deals.get(evento["deal_id"])
+            actividades.append({
+                "fecha": datetime.fromisoformat(evento["fecha"]).date(),
+                "deal_id": evento["deal_id"],
+                "cliente": deal.cliente if deal else evento.get("cliente", "N/A"),
+                "accion": evento["accion"],
+                "usuario": evento.get("usuario", "N/A")
+            })
         
         return {
             "periodo_dias": dias,
-            "total_actividades": len(actividades),
-            "actividades": actividades[:50]  # Últimas 50
+            "total_actividades": total,
+            "actividades": actividades  # Últimas 50
         }
     
     def generate_vendedor_report(self) -> Dict:
-        """Genera reporte por vendedor"""
+        """Genera reporte por vendedor desde los agregados corrientes"""
         
         vendedores = {}
         
-        for deal in self.deals:
-            if deal.vendedor not in vendedores:
-                vendedores[deal.vendedor] = {
-                    "total_deals": 0,
-                    "deals_activos": 0,
-                    "deals_ganados": 0,
-                    "deals_perdidos": 0,
-                    "valor_total": 0,
-                    "valor_ganado": 0
-                }
-            
-            v = vendedores[deal.vendedor]
-            v["total_deals"] += 1
-            v["valor_total"] += deal.valor_estimado
+        for vendedor, agg in self.aggregates.por_vendedor.items():
+            v_data = {
+                "total_deals": agg["total_deals"],
+                "deals_activos": agg["deals_activos"],
+                "deals_ganados": agg["deals_ganados"],
+                "deals_perdidos": agg["deals_perdidos"],
+                "valor_total": agg["valor_total"],
+                "valor_ganado": agg["valor_ganado"],
+                "valor_ponderado": agg["valor_ponderado"]
+            }
             
-            if deal.etapa == "ganada":
-                v["deals_ganados"] += 1
-                v["valor_ganado"] += deal.valor_estimado
-            elif deal.etapa == "perdida":
-                v["deals_perdidos"] += 1
-            else:
-                v["deals_activos"] += 1
-        
-        # Calcular tasas de conversión
-        for v_data in vendedores.values():
+            # Calcular tasa de conversión
             total_cerrados = v_data["deals_ganados"] + v_data["deals_perdidos"]
             v_data["tasa_conversion"] = (
                 v_data["deals_ganados"] / total_cerrados * 100
                 if total_cerrados > 0 else 0
             )
+            vendedores[vendedor] = v_data
         
         return vendedores
-
@@ -1,11 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query
+from app.tracing import RutaTrazada
 from fastapi.responses import Response
 from typing import Dict, Any
 import sys
 import os
 from dotenv import load_dotenv
-import pandas as pd
-import numpy as np
 import io
 from datetime import datetime
 
@@ -15,10 +14,13 @@ sys.path.insert(0, project_root)
 
 load_dotenv()
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
 
 def limpiar_nan_para_json(data):
     """Reemplaza NaN, inf y -inf con valores válidos para JSON"""
+    import pandas as pd
+    import numpy as np
+
     if isinstance(data, pd.DataFrame):
         data = data.fillna(0)
         result = data.to_dict('records')
@@ -100,7 +102,7 @@ async def get_analisis_comercial():
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         db_manager = DatabaseManager(supabase)
         
-        df = db_manager._cargar_datos_raw()
+        df = db_manager.cargar_datos()
         
         if df.empty:
             return {
@@ -283,7 +285,7 @@ async def get_comisiones_mensuales():
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         db_manager = DatabaseManager(supabase)
         
-        df = db_manager._cargar_datos_raw()
+        df = db_manager.cargar_datos()
         
         if df.empty:
             return {
@@ -421,7 +423,7 @@ async def get_facturas_por_mes(mes: str):
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         db_manager = DatabaseManager(supabase)
 
-        df = db_manager._cargar_datos_raw()
+        df = db_manager.cargar_datos()
 
         if df.empty:
             return {"facturas": []}
@@ -506,7 +508,7 @@ async def get_comisiones_gerencia():
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         db_manager = DatabaseManager(supabase)
         
-        df = db_manager._cargar_datos_raw()
+        df = db_manager.cargar_datos()
         
         if df.empty:
             return {
@@ -725,6 +727,8 @@ async def get_analisis_compras(
     try:
         from supabase import create_client
         from config.settings import AppConfig
+        from database.aggregations import a_fecha, agregar, get_aggregation_backend
+        from database.client_repository import get_client_repository
         import pandas as pd
         from datetime import datetime, timedelta
         
@@ -742,29 +746,11 @@ async def get_analisis_compras(
         
         fecha_inicio = (datetime.now() - timedelta(days=meses * 30)).strftime('%Y-%m-%d')
         
-        # Cargar compras_clientes usando paginación automática
-        all_compras = []
-        page_size = 1000
-        current_offset = 0
+        # Agregados en la base de datos: solo viajan las filas agrupadas
+        backend = get_aggregation_backend(supabase)
+        resumen = agregar(backend, "compras_resumen", desde=fecha_inicio)
         
-        while True:
-            query = supabase.table("compras_clientes").select("*")
-            query = query.eq("es_devolucion", False)  # Solo compras, no devoluciones
-            query = query.gte("fecha", fecha_inicio)
-            query = query.range(current_offset, current_offset + page_size - 1).order("fecha", desc=True)
-            response = query.execute()
-            
-            if not response.data:
-                break
-            
-            all_compras.extend(response.data)
-            
-            if len(response.data) < page_size:
-                break
-            
-            current_offset += page_size
-        
-        if not all_compras:
+        if resumen.empty or int(resumen.iloc[0]['total_compras'] or 0) == 0:
             return {
                 "kpis": {
                     "total_compras": 0,
@@ -782,42 +768,21 @@ async def get_analisis_compras(
                 "frecuencia_compras": []
             }
         
-        df_compras = pd.DataFrame(all_compras)
-        
-        # Convertir fechas
-        df_compras['fecha'] = pd.to_datetime(df_compras['fecha'], errors='coerce')
-        df_compras['mes'] = df_compras['fecha'].dt.to_period('M').astype(str)
-        
-        # Cargar información de clientes
-        clientes_response = supabase.table("clientes_b2b").select("nit, nombre, ciudad").execute()
-        nit_a_info = {}
-        if clientes_response.data:
-            for cliente in clientes_response.data:
-                nit = cliente.get('nit', '')
-                if nit:
-                    nit_a_info[nit] = {
-                        'nombre': cliente.get('nombre', ''),
-                        'ciudad': cliente.get('ciudad', '')
-                    }
-        
-        # Agregar información de clientes
-        df_compras['nombre_cliente'] = df_compras['nit_cliente'].map(lambda x: nit_a_info.get(x, {}).get('nombre', x) if x else 'N/A')
-        df_compras['ciudad_cliente'] = df_compras['nit_cliente'].map(lambda x: nit_a_info.get(x, {}).get('ciudad', '') if x else '')
+        # Información de clientes (copia cacheada)
+        df_info = get_client_repository(supabase).listar(columnas=['nit', 'nombre', 'ciudad'])
+        nit_a_nombre = dict(zip(df_info['nit'], df_info['nombre'])) if not df_info.empty else {}
+        nit_a_ciudad = dict(zip(df_info['nit'], df_info['ciudad'])) if not df_info.empty else {}
         
         # KPIs
-        total_compras = len(df_compras)
-        valor_total = float(df_compras['total'].sum()) if 'total' in df_compras.columns else 0
+        total_compras = int(resumen.iloc[0]['total_compras'])
+        valor_total = float(resumen.iloc[0]['valor_total'] or 0)
         promedio_compra = valor_total / total_compras if total_compras > 0 else 0
-        clientes_activos = df_compras['nit_cliente'].nunique()
-        referencias_unicas = df_compras['cod_articulo'].nunique() if 'cod_articulo' in df_compras.columns else 0
+        clientes_activos = int(resumen.iloc[0]['clientes_activos'])
+        referencias_unicas = int(resumen.iloc[0]['referencias_unicas'])
         
         # Tendencias - Compras mensuales
-        compras_mensuales = df_compras.groupby('mes').agg({
-            'total': 'sum',
-            'id': 'count',
-            'nit_cliente': 'nunique'
-        }).reset_index()
-        compras_mensuales.columns = ['mes', 'valor_total', 'num_compras', 'clientes_activos']
+        compras_mensuales = agregar(backend, "compras_por_mes", desde=fecha_inicio)
+        compras_mensuales['valor_total'] = pd.to_numeric(compras_mensuales['valor_total'], errors='coerce').fillna(0)
         
         # Calcular crecimiento mensual
         if len(compras_mensuales) >= 2:
@@ -827,54 +792,45 @@ async def get_analisis_compras(
         else:
             crecimiento = 0
         
-        # Top clientes por valor total
-        top_clientes = df_compras.groupby('nit_cliente').agg({
-            'total': 'sum',
-            'id': 'count',
-            'nombre_cliente': 'first',
-            'ciudad_cliente': 'first',
-            'fecha': ['min', 'max']
-        }).reset_index()
+        # Por cliente (ya ordenado por valor total)
+        por_cliente = agregar(backend, "compras_por_cliente", desde=fecha_inicio).head(20)
+        por_cliente['valor_total'] = pd.to_numeric(por_cliente['total_compras'], errors='coerce').fillna(0)
+        por_cliente['nombre'] = por_cliente['nit_cliente'].map(nit_a_nombre).fillna(por_cliente['nit_cliente'])
+        por_cliente['primera_compra'] = a_fecha(por_cliente['primera_compra'])
+        por_cliente['ultima_compra'] = a_fecha(por_cliente['ultima_compra'])
         
-        top_clientes.columns = ['nit', 'valor_total', 'num_compras', 'nombre', 'ciudad', 'primera_compra', 'ultima_compra']
-        top_clientes = top_clientes.sort_values('valor_total', ascending=False).head(20)
+        # Top clientes por valor total
+        top_clientes = pd.DataFrame({
+            'nit': por_cliente['nit_cliente'],
+            'valor_total': por_cliente['valor_total'],
+            'num_compras': por_cliente['num_transacciones'],
+            'nombre': por_cliente['nombre'],
+            'ciudad': por_cliente['nit_cliente'].map(nit_a_ciudad).fillna(''),
+            'primera_compra': por_cliente['primera_compra'],
+            'ultima_compra': por_cliente['ultima_compra'],
+        })
         
         # Calcular días desde última compra
-        hoy = datetime.now()
-        top_clientes['dias_desde_compra'] = top_clientes['ultima_compra'].apply(
-            lambda x: (hoy - pd.to_datetime(x).to_pydatetime()).days if pd.notna(x) else None
-        )
+        top_clientes['dias_desde_compra'] = (datetime.now() - top_clientes['ultima_compra']).dt.days
         
         # Top referencias por valor total
-        top_referencias = df_compras.groupby('cod_articulo').agg({
-            'total': 'sum',
-            'cantidad': 'sum',
-            'id': 'count',
-            'nit_cliente': 'nunique',
-            'detalle': 'first',
-            'marca': 'first'
-        }).reset_index()
-        
-        top_referencias.columns = ['codigo', 'valor_total', 'cantidad_total', 'num_compras', 'clientes_unicos', 'detalle', 'marca']
-        top_referencias = top_referencias.sort_values('valor_total', ascending=False).head(20)
+        top_referencias = agregar(backend, "compras_por_referencia", desde=fecha_inicio, limite=20)
         
         # Análisis de frecuencia de compras por cliente
-        frecuencia_compras = df_compras.groupby('nit_cliente').agg({
-            'fecha': ['min', 'max', 'count'],
-            'total': 'sum',
-            'nombre_cliente': 'first'
-        }).reset_index()
-        
-        frecuencia_compras.columns = ['nit', 'primera_compra', 'ultima_compra', 'num_compras', 'valor_total', 'nombre']
+        frecuencia_compras = pd.DataFrame({
+            'nit': por_cliente['nit_cliente'],
+            'primera_compra': por_cliente['primera_compra'],
+            'ultima_compra': por_cliente['ultima_compra'],
+            'num_compras': por_cliente['num_transacciones'],
+            'valor_total': por_cliente['valor_total'],
+            'nombre': por_cliente['nombre'],
+        })
         
         # Calcular frecuencia promedio (compras por mes)
-        frecuencia_compras['dias_activo'] = frecuencia_compras.apply(
-            lambda row: (pd.to_datetime(row['ultima_compra']) - pd.to_datetime(row['primera_compra'])).days + 1
-            if pd.notna(row['primera_compra']) and pd.notna(row['ultima_compra']) else 1,
-            axis=1
-        )
+        frecuencia_compras['dias_activo'] = (
+            (frecuencia_compras['ultima_compra'] - frecuencia_compras['primera_compra']).dt.days + 1
+        ).fillna(1)
         frecuencia_compras['frecuencia_mensual'] = (frecuencia_compras['num_compras'] / (frecuencia_compras['dias_activo'] / 30)).round(2)
-        frecuencia_compras = frecuencia_compras.sort_values('valor_total', ascending=False).head(20)
         
         return {
             "kpis": limpiar_nan_para_json({
@@ -1,18 +1,19 @@
 from fastapi import APIRouter, HTTPException, Query
-from fastapi.responses import Response
-from typing import Dict, Any, Optional, List
+from app.tracing import RutaTrazada
+from typing import TYPE_CHECKING, Dict, Any, Optional, List
 from pydantic import BaseModel
 from datetime import datetime
 import sys
 import os
-import pandas as pd
-import io
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Agregar el directorio raíz al path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
 sys.path.insert(0, project_root)
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
 
 # Modelos Pydantic
 class ProductoCreate(BaseModel):
@@ -169,6 +170,32 @@ async def get_productos(
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error obteniendo productos: {str(e)}")
 
+@router.get("/sugerencias")
+async def get_sugerencias_productos(
+    q: str = Query("", description="Texto a buscar en código, referencia, descripción o marca"),
+    limite: int = Query(20, ge=1, le=100, description="Máximo de sugerencias")
+) -> Dict[str, Any]:
+    """
+    Autocompletado de productos activos usando el índice precalculado del catálogo
+    """
+    try:
+        from database.catalog_manager import CatalogManager
+        from supabase import create_client
+        from config.settings import AppConfig
+
+        env_status = AppConfig.validate_environment()
+        if not env_status["valid"]:
+            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
+
+        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
+        indice = CatalogManager(supabase).obtener_indice_opciones()
+
+        return indice.sugerencias(q, limite=limite)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error buscando productos: {str(e)}")
+
 @router.get("/productos/{producto_id}")
 async def get_producto(producto_id: int) -> Dict[str, Any]:
     """
@@ -251,6 +278,9 @@ async def crear_producto(producto: ProductoCreate) -> Dict[str, Any]:
         if not response.data:
             raise HTTPException(status_code=400, detail="Error creando producto")
 
+        from database.cache import invalidate
+        invalidate("catalogo_productos")
+
         return {
             "success": True,
             "message": "Producto creado correctamente",
@@ -328,6 +358,9 @@ async def actualizar_producto(producto_id: int, producto: ProductoUpdate) -> Dic
         if not response.data:
             raise HTTPException(status_code=400, detail="Error actualizando producto")
 
+        from database.cache import invalidate
+        invalidate("catalogo_productos")
+
         return {
             "success": True,
             "message": "Producto actualizado correctamente",
@@ -369,6 +402,9 @@ async def eliminar_producto(producto_id: int) -> Dict[str, Any]:
         if not response.data:
             raise HTTPException(status_code=400, detail="Error desactivando producto")
 
+        from database.cache import invalidate
+        invalidate("catalogo_productos")
+
         return {
             "success": True,
             "message": "Producto desactivado correctamente"
@@ -452,6 +488,54 @@ async def get_resumen_catalogo() -> Dict[str, Any]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo resumen: {str(e)}")
 
+def _cargar_catalogo_exportacion(supabase) -> "pd.DataFrame":
+    """Carga todos los productos con paginación automática (404 si no hay ninguno)"""
+    import pandas as pd
+
+    all_productos = []
+    page_size = 1000
+    current_offset = 0
+    
+    while True:
+        response = supabase.table("catalogo_productos").select("*").range(current_offset, current_offset + page_size - 1).order("cod_ur", desc=False).execute()
+        
+        if not response.data:
+            break
+        
+        all_productos.extend(response.data)
+        
+        if len(response.data) < page_size:
+            break
+        
+        current_offset += page_size
+    
+    if not all_productos:
+        raise HTTPException(status_code=404, detail="No hay productos para exportar")
+    
+    return pd.DataFrame(all_productos)
+
+
+def _formato_exportacion_catalogo(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Columnas Artículo, Bodega O., Descripción y Cantidad calculadas de forma vectorizada"""
+    import pandas as pd
+
+    vacio = pd.Series('', index=df.index)
+    cod_ur = df['cod_ur'].fillna('').astype(str) if 'cod_ur' in df.columns else vacio
+    referencia = df['referencia'].fillna('').astype(str) if 'referencia' in df.columns else vacio
+    descripcion = df['descripcion'].fillna('').astype(str) if 'descripcion' in df.columns else vacio
+    precio = pd.to_numeric(df['precio'], errors='coerce').fillna(0) if 'precio' in df.columns else pd.Series(0.0, index=df.index)
+    
+    # Formato "99 - Bodega (TIPO)" con el tipo de producto tomado de la descripción
+    tipo_producto = descripcion.str.split().str[0].fillna('')
+    bodega = ("99 - Bodega (" + tipo_producto).where(tipo_producto != '', "99 - Bodega")
+    
+    return pd.DataFrame({
+        'Artículo': cod_ur.where(cod_ur != '', referencia),
+        'Bodega O.': bodega,
+        'Descripción': descripcion,
+        'Cantidad': precio.map('{:.2f}'.format)
+    })
+
 @router.get("/exportar-csv")
 async def exportar_catalogo_csv():
     """
@@ -467,70 +551,56 @@ async def exportar_catalogo_csv():
         
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
-        # Cargar todos los productos con paginación automática
-        all_productos = []
-        page_size = 1000
-        current_offset = 0
-        
-        while True:
-            response = supabase.table("catalogo_productos").select("*").range(current_offset, current_offset + page_size - 1).order("cod_ur", desc=False).execute()
-            
-            if not response.data:
-                break
-            
-            all_productos.extend(response.data)
-            
-            if len(response.data) < page_size:
-                break
-            
-            current_offset += page_size
-        
-        if not all_productos:
-            raise HTTPException(status_code=404, detail="No hay productos para exportar")
-        
-        # Convertir a DataFrame
-        df = pd.DataFrame(all_productos)
+        df = _cargar_catalogo_exportacion(supabase)
         
         # Crear CSV con el formato de las imágenes: Artículo, Bodega O., Descripción, Cantidad/Precio
         # Formato basado en las imágenes: código, "99 - Bodega (descripción)", descripción completa, precio
-        datos_csv = []
-        for _, row in df.iterrows():
-            codigo = str(row.get('cod_ur', '') or row.get('referencia', ''))
-            descripcion = str(row.get('descripcion', ''))
-            precio = float(row.get('precio', 0)) if pd.notna(row.get('precio')) else 0
-            
-            # Formato "99 - Bodega (TIPO)" basado en la descripción
-            # Extraer el tipo de producto de la descripción si es posible
-            tipo_producto = descripcion.split()[0] if descripcion else ''
-            bodega = f"99 - Bodega ({tipo_producto}" if tipo_producto else "99 - Bodega"
-            
-            datos_csv.append({
-                'Artículo': codigo,
-                'Bodega O.': bodega,
-                'Descripción': descripcion,
-                'Cantidad': f"{precio:.2f}"
-            })
+        df_csv = _formato_exportacion_catalogo(df)
         
-        df_csv = pd.DataFrame(datos_csv)
+        # Enviar el CSV por bloques a medida que se genera (UTF-8 con BOM para Excel)
+        from utils.exporters import streaming_csv_response
+        return streaming_csv_response(
+            df_csv,
+            filename=f"catalogo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"Error exportando catálogo a CSV: {e}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error exportando catálogo: {str(e)}")
+
+
+@router.get("/exportar-excel")
+async def exportar_catalogo_excel():
+    """
+    Exporta el catálogo completo a Excel (.xlsx) con las mismas columnas que el CSV
+    """
+    try:
+        import pandas as pd
+        from supabase import create_client
+        from config.settings import AppConfig
+        from utils.exporters import ExportSheet, streaming_excel_response
         
-        # Convertir a CSV en memoria con encoding UTF-8-sig para Excel
-        output = io.StringIO()
-        df_csv.to_csv(output, index=False, encoding='utf-8-sig', sep=',')
-        csv_content = output.getvalue()
-        output.close()
+        env_status = AppConfig.validate_environment()
+        if not env_status["valid"]:
+            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
         
-        # Devolver como Response con tipo CSV
-        return Response(
-            content=csv_content.encode('utf-8-sig'),
-            media_type="text/csv; charset=utf-8-sig",
-            headers={
-                "Content-Disposition": f"attachment; filename=catalogo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            }
+        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
+        df = _cargar_catalogo_exportacion(supabase)
+        
+        df_excel = _formato_exportacion_catalogo(df)
+        df_excel['Cantidad'] = pd.to_numeric(df_excel['Cantidad'])
+        
+        return streaming_excel_response(
+            ExportSheet("Catálogo", df_excel, formatos={"Cantidad": "decimal"}),
+            filename=f"catalogo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         )
     except HTTPException:
         raise
     except Exception as e:
         import traceback
-        print(f"Error exportando catálogo a CSV: {e}")
+        print(f"Error exportando catálogo a Excel: {e}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error exportando catálogo: {str(e)}")
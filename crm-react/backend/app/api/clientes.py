@@ -1,11 +1,11 @@
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from app.tracing import RutaTrazada
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import sys
 import os
 from dotenv import load_dotenv
 import tempfile
-import pandas as pd
 from datetime import datetime
 
 # Agregar el directorio raíz al path
@@ -14,7 +14,7 @@ sys.path.insert(0, project_root)
 
 load_dotenv()
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
 
 # Modelos Pydantic para validación
 class ClienteCreate(BaseModel):
@@ -149,6 +149,7 @@ async def get_cliente_detalle(nombre: str = Query(...)):
     Reutiliza la lógica de ui/tabs.py render_clientes_vendedor
     """
     try:
+        import pandas as pd
         from database.queries import DatabaseManager
         from database.client_purchases_manager import ClientPurchasesManager
         from supabase import create_client
@@ -367,6 +368,9 @@ async def actualizar_cliente(cliente_id: int, cliente_data: ClienteUpdate) -> Di
         if not resultado.data:
             raise HTTPException(status_code=400, detail="Error actualizando cliente")
         
+        from database.cache import invalidate
+        invalidate("clientes_b2b")
+        
         return {"success": True, "mensaje": "Cliente actualizado", "cliente": resultado.data[0]}
     except HTTPException:
         raise
@@ -893,6 +897,9 @@ async def eliminar_cliente(cliente_id: int) -> Dict[str, Any]:
         if not resultado.data:
             raise HTTPException(status_code=400, detail="Error eliminando cliente")
         
+        from database.cache import invalidate
+        invalidate("clientes_b2b")
+        
         return {
             "success": True, 
             "mensaje": "Cliente eliminado (marcado como inactivo)", 
@@ -914,6 +921,7 @@ async def cargar_compras_desde_excel(
     Si FUENTE = 'FE' es compra, si FUENTE = 'DV' es devolución.
     """
     try:
+        import pandas as pd
         from database.client_purchases_manager import ClientPurchasesManager
         from supabase import create_client
         from config.settings import AppConfig
@@ -1074,6 +1082,14 @@ async def corregir_devoluciones_por_valor_negativo() -> Dict[str, Any]:
                 errores += 1
                 continue
         
+        if corregidos:
+            from database.cache import invalidate
+            from database.product_rotation import ProductRotationStore
+            from database.purchase_cube import get_purchase_cube
+            ProductRotationStore(supabase).actualizar_productos_seguro(compras_negativas['cod_articulo'])
+            get_purchase_cube(supabase).actualizar_clientes_seguro(compras_negativas['nit_cliente'])
+            invalidate("compras_clientes")
+        
         return {
             "success": True,
             "mensaje": f"Corregidos {corregidos} registros",
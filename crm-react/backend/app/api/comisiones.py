@@ -1,11 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Form
+from app.tracing import RutaTrazada
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 import sys
 import os
 from dotenv import load_dotenv
-import pandas as pd
-import numpy as np
 from datetime import datetime, date, timedelta
 import base64
 
@@ -15,10 +14,21 @@ sys.path.insert(0, project_root)
 
 load_dotenv()
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
+
+# Columnas de comisiones que usa /facturas (más las que necesita el procesamiento de DatabaseManager)
+COLUMNAS_FACTURAS = (
+    "pedido", "factura", "cliente", "fecha_factura", "fecha_pago_max", "fecha_pago_real", "dias_pago_real",
+    "valor", "valor_neto", "iva", "valor_flete", "valor_descuento_pesos", "valor_devuelto",
+    "cliente_propio", "descuento_pie_factura", "descuento_adicional", "condicion_especial",
+    "ciudad_destino", "pagado", "referencia"
+)
 
 def limpiar_nan_para_json(data):
     """Reemplaza NaN, inf y -inf con valores válidos para JSON"""
+    import pandas as pd
+    import numpy as np
+
     if isinstance(data, pd.DataFrame):
         data = data.fillna(0)
         result = data.to_dict('records')
@@ -61,6 +71,7 @@ async def get_facturas(
     Obtiene las facturas (todas por defecto, o solo clientes propios si se especifica)
     """
     try:
+        import pandas as pd
         from database.queries import DatabaseManager
         from supabase import create_client
         from config.settings import AppConfig
@@ -73,32 +84,10 @@ async def get_facturas(
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         db_manager = DatabaseManager(supabase)
 
-        # Obtener datos
-        df = db_manager._cargar_datos_raw()
-
-        if df.empty:
-            return {
-                "facturas": [],
-                "total_facturas": 0,
-                "total_valor": 0,
-                "total_comisiones": 0
-            }
-
-        # Convertir fecha_factura
-        df['fecha_factura'] = pd.to_datetime(df['fecha_factura'], errors='coerce')
-        df['mes_factura'] = df['fecha_factura'].dt.to_period('M').astype(str)
-
-        # Filtrar por clientes propios si es necesario
-        if solo_propios:
-            df = df[df.get('cliente_propio', False) == True].copy()
-
-        # Filtrar por mes si se especifica
-        if mes:
-            df = df[df['mes_factura'] == mes].copy()
-
-        # Filtrar por cliente si se especifica
-        if cliente:
-            df = df[df['cliente'].str.contains(cliente, case=False, na=False)].copy()
+        # Solo el mes, los clientes y las columnas pedidas (filtrados en la consulta)
+        df = db_manager.cargar_facturas(
+            mes=mes or None, columnas=COLUMNAS_FACTURAS, solo_propios=solo_propios, cliente=cliente or None
+        )
 
         if df.empty:
             return {
@@ -244,6 +233,8 @@ async def get_facturas(
                     supabase.table("comisiones").update({
                         'ciudad_destino': factura_update['ciudad']
                     }).eq("id", factura_update['id']).execute()
+                from database.cache import invalidate
+                invalidate("comisiones")
                 print(f"✅ Actualizadas {len(facturas_actualizar_ciudad)} facturas con ciudades de clientes")
             except Exception as e:
                 print(f"⚠️ Error actualizando ciudades en BD: {e}")
@@ -542,6 +533,9 @@ async def actualizar_factura(factura_id: int, factura_data: FacturaUpdate) -> Di
         if not resultado.data:
             raise HTTPException(status_code=400, detail="Error actualizando factura")
 
+        from database.cache import invalidate
+        invalidate("comisiones")
+
         return {
             "success": True,
             "message": "Factura actualizada correctamente",
@@ -667,6 +661,9 @@ async def marcar_factura_pagado(factura_id: int, request: MarcarPagadoRequest) -
         if not resultado.data:
             raise HTTPException(status_code=400, detail="Error marcando factura como pagada")
 
+        from database.cache import invalidate
+        invalidate("comisiones")
+
         return {
             "success": True,
             "message": "Factura marcada como pagada correctamente",
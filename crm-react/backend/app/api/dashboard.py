@@ -1,10 +1,9 @@
 from fastapi import APIRouter, HTTPException, Query
+from app.tracing import RutaTrazada, etapa
 from typing import Dict, Any, Optional
 import sys
 import os
 from dotenv import load_dotenv
-import pandas as pd
-import numpy as np
 
 # Agregar el directorio raíz al path para importar módulos existentes
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
@@ -12,10 +11,13 @@ sys.path.insert(0, project_root)
 
 load_dotenv()
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
 
 def limpiar_nan_para_json(data):
     """Reemplaza NaN, inf y -inf con valores válidos para JSON"""
+    import pandas as pd
+    import numpy as np
+
     if isinstance(data, pd.DataFrame):
         # Reemplazar NaN en el DataFrame
         data = data.fillna(0)
@@ -50,6 +52,74 @@ def limpiar_nan_para_json(data):
         return float(data)
     return data
 
+def _contexto_dashboard(mes_unico: Optional[str] = None):
+    """
+    Cliente de Supabase y contexto de cálculo compartido del dashboard (ver business/dashboard_context.py)
+
+    Con `mes_unico` el contexto trae solo las facturas propias de ese mes (sin devoluciones)
+    """
+    from database.queries import DatabaseManager
+    from supabase import create_client
+    from config.settings import AppConfig
+    from business.dashboard_context import DashboardContext
+
+    env_status = AppConfig.validate_environment()
+    if not env_status["valid"]:
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "message": "Faltan variables de entorno para conectar a Supabase.",
+                "errors": env_status["errors"],
+            },
+        )
+
+    supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
+    with etapa("contexto"):
+        if mes_unico is None:
+            contexto = DashboardContext.cargar(DatabaseManager(supabase))
+        else:
+            contexto = DashboardContext.cargar_mes(DatabaseManager(supabase), mes_unico)
+    return supabase, contexto
+
+@router.get("/bundle")
+async def get_dashboard_bundle(
+    mes: str = None,
+    secciones: Optional[str] = Query(None, description="Secciones separadas por coma: metricas, grafico_ventas, clientes_clave, meses (por defecto todas)")
+) -> Dict[str, Any]:
+    """
+    Todas las secciones del dashboard en una sola respuesta, calculadas sobre la
+    misma carga de comisiones y devoluciones (los números coinciden entre sí).
+    Cada sección tiene el mismo formato que su endpoint individual.
+    """
+    try:
+        from business.dashboard_context import SECCIONES, meta_ventas_mes
+
+        pedidas = [s.strip() for s in secciones.split(",") if s.strip()] if secciones else list(SECCIONES)
+        desconocidas = [s for s in pedidas if s not in SECCIONES]
+        if desconocidas:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Secciones desconocidas: {desconocidas}. Disponibles: {list(SECCIONES)}"
+            )
+
+        supabase, contexto = _contexto_dashboard()
+
+        resultado: Dict[str, Any] = {"mes": mes}
+        if "metricas" in pedidas:
+            resultado["metricas"] = contexto.metricas(mes, meta_ventas_mes(supabase, mes))
+        if "grafico_ventas" in pedidas:
+            resultado["grafico_ventas"] = contexto.grafico_ventas()
+        if "clientes_clave" in pedidas:
+            resultado["clientes_clave"] = {"clientes_clave": contexto.clientes_clave(mes)}
+        if "meses" in pedidas:
+            resultado["meses"] = {"meses": contexto.meses()}
+
+        return limpiar_nan_para_json(resultado)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo dashboard: {str(e)}")
+
 @router.get("/metrics")
 async def get_dashboard_metrics(mes: str = None) -> Dict[str, Any]:
     """
@@ -58,375 +128,12 @@ async def get_dashboard_metrics(mes: str = None) -> Dict[str, Any]:
     Solo muestra datos de clientes propios
     """
     try:
-        from database.queries import DatabaseManager
-        from supabase import create_client
-        from config.settings import AppConfig
-        from datetime import datetime, date
-        from fastapi import Query
-        import pandas as pd
+        from business.dashboard_context import meta_ventas_mes
 
-        env_status = AppConfig.validate_environment()
-        if not env_status["valid"]:
-            raise HTTPException(
-                status_code=500,
-                detail={
-                    "message": "Faltan variables de entorno para conectar a Supabase.",
-                    "errors": env_status["errors"],
-                },
-            )
-        
-        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
-        db_manager = DatabaseManager(supabase)
-        
-        # Determinar si mostrar todo o filtrar por mes
-        ver_todo = mes is None or mes == "" or mes.lower() == "todos"
-        
-        if ver_todo:
-            mes_filtro = None  # No filtrar por mes
-            meta_ventas = 0  # No hay meta cuando se ve todo
-        else:
-            mes_filtro = mes  # Formato: "2024-12"
-            # Obtener meta del mes seleccionado
-            try:
-                meta_response = supabase.table("metas_mensuales").select("*").eq("mes", mes_filtro).execute()
-                if meta_response.data and len(meta_response.data) > 0:
-                    meta_actual = meta_response.data[0]
-                    meta_ventas = float(meta_actual.get('meta_ventas', 0))
-                else:
-                    # Si no hay meta para ese mes, usar valor por defecto
-                    meta_ventas = 0
-            except Exception as e:
-                print(f"Error obteniendo meta: {e}")
-                meta_ventas = 0
-        
-        # Obtener datos
-        df = db_manager._cargar_datos_raw()  # Sin cache para datos frescos
-        
-        if df.empty:
-            return {
-                "totalVentas": 0,
-                "comisiones": 0,
-                "clientesActivos": 0,
-                "pedidosMes": 0,
-                "metaVentas": meta_ventas,
-                "progresoMeta": 0,
-                "faltanteMeta": meta_ventas,
-                "facturasDetalle": []
-            }
-        
-        # Convertir fecha_factura a datetime
-        df['fecha_factura'] = pd.to_datetime(df['fecha_factura'], errors='coerce')
-        df['mes_factura'] = df['fecha_factura'].dt.to_period('M').astype(str)
-        
-        # Filtrar por mes seleccionado (si aplica) y solo clientes propios
-        if mes_filtro:
-            df_mes_propios = df[
-                (df['mes_factura'] == mes_filtro) & 
-                (df.get('cliente_propio', False) == True)
-            ].copy()
-        else:
-            # Ver todo: solo filtrar por clientes propios
-            df_mes_propios = df[
-                (df.get('cliente_propio', False) == True)
-            ].copy()
-        
-        # Calcular métricas del mes seleccionado (o todos) y clientes propios
-        # IMPORTANTE: Restar devoluciones del total de ventas
-        # valor_devuelto incluye IVA, por lo que se resta directamente del valor total
-        
-        # Obtener devoluciones (del mes seleccionado o todas)
-        devoluciones_mes = pd.DataFrame()
-        try:
-            df_devoluciones = db_manager.cargar_devoluciones()
-            if not df_devoluciones.empty and 'fecha_devolucion' in df_devoluciones.columns:
-                df_devoluciones['fecha_devolucion'] = pd.to_datetime(df_devoluciones['fecha_devolucion'], errors='coerce')
-                df_devoluciones['mes_devolucion'] = df_devoluciones['fecha_devolucion'].dt.to_period('M').astype(str)
-                if mes_filtro:
-                    devoluciones_mes = df_devoluciones[df_devoluciones['mes_devolucion'] == mes_filtro].copy()
-                else:
-                    # Ver todo: incluir todas las devoluciones
-                    devoluciones_mes = df_devoluciones.copy()
-        except Exception as e:
-            print(f"Error cargando devoluciones: {e}")
-            devoluciones_mes = pd.DataFrame()
-        
-        # Calcular total de devoluciones (del mes o todas)
-        total_devoluciones_mes = 0
-        if not devoluciones_mes.empty:
-            # Filtrar solo devoluciones de clientes propios
-            # Necesitamos obtener el cliente_propio de cada factura relacionada
-            facturas_ids_devoluciones = devoluciones_mes['factura_id'].unique().tolist()
-            if facturas_ids_devoluciones:
-                try:
-                    facturas_devoluciones = supabase.table("comisiones").select("id, cliente_propio").in_("id", facturas_ids_devoluciones).execute()
-                    facturas_propios_ids = {f['id']: f.get('cliente_propio', True) for f in facturas_devoluciones.data if f.get('cliente_propio', True)}
-                    # Filtrar devoluciones solo de clientes propios
-                    devoluciones_mes = devoluciones_mes[devoluciones_mes['factura_id'].isin(facturas_propios_ids.keys())].copy()
-                    total_devoluciones_mes = devoluciones_mes['valor_devuelto'].fillna(0).sum() if 'valor_devuelto' in devoluciones_mes.columns else 0
-                except Exception as e:
-                    print(f"Error filtrando devoluciones por cliente_propio: {e}")
-                    total_devoluciones_mes = devoluciones_mes['valor_devuelto'].fillna(0).sum() if 'valor_devuelto' in devoluciones_mes.columns else 0
-        
-        if not df_mes_propios.empty:
-            # Calcular valor total de ventas del mes SIN IVA y DESPUÉS de descuentos
-            # 1. Obtener valor_neto (sin IVA) de cada factura
-            df_mes_propios = df_mes_propios.copy()
-            if 'valor_neto' not in df_mes_propios.columns or df_mes_propios['valor_neto'].isna().all():
-                # Si no hay valor_neto, calcularlo desde valor (sin flete)
-                if 'valor_flete' in df_mes_propios.columns:
-                    valor_sin_flete = df_mes_propios['valor'].fillna(0) - df_mes_propios['valor_flete'].fillna(0)
-                else:
-                    valor_sin_flete = df_mes_propios['valor'].fillna(0)
-                df_mes_propios['valor_neto'] = valor_sin_flete / 1.19
-            else:
-                df_mes_propios['valor_neto'] = df_mes_propios['valor_neto'].fillna(0)
-            
-            # 2. Restar descuentos en pesos si existen
-            if 'valor_descuento_pesos' in df_mes_propios.columns:
-                df_mes_propios['valor_neto_ajustado'] = df_mes_propios['valor_neto'] - df_mes_propios['valor_descuento_pesos'].fillna(0)
-            else:
-                df_mes_propios['valor_neto_ajustado'] = df_mes_propios['valor_neto']
-            
-            # 3. Sumar valor neto ajustado (sin IVA, después de descuentos)
-            total_ventas_bruto = df_mes_propios['valor_neto_ajustado'].sum()
-            
-            # 4. Restar devoluciones de facturas del mes (convertir a valor sin IVA)
-            devoluciones_facturas_mes = 0
-            if 'valor_devuelto' in df_mes_propios.columns:
-                # valor_devuelto incluye IVA, se divide por 1.19 para obtener valor sin IVA
-                devoluciones_facturas_mes = (df_mes_propios['valor_devuelto'].fillna(0) / 1.19).sum()
-            
-            # 5. Sumar devoluciones del mes (de facturas de cualquier mes) - convertir a valor sin IVA
-            # El total_devoluciones_mes ya está en valor con IVA, se divide por 1.19
-            total_devoluciones_mes_sin_iva = float(total_devoluciones_mes) / 1.19 if total_devoluciones_mes > 0 else 0
-            
-            # 6. Calcular total de ventas neto (valor sin IVA, después de descuentos, restando devoluciones sin IVA)
-            total_ventas = float(total_ventas_bruto) - float(devoluciones_facturas_mes) - float(total_devoluciones_mes_sin_iva)
-            total_ventas = max(0, total_ventas)  # No puede ser negativo
-        else:
-            # Si no hay facturas del mes, pero hay devoluciones del mes, el total es negativo de devoluciones (sin IVA)
-            total_ventas = max(0, -float(total_devoluciones_mes) / 1.19)
-        
-        # RECALCULAR comisión estimada basándose en el porcentaje de cada venta
-        # Esto asegura que la comisión sea consistente con las reglas de negocio
-        comisiones = 0
-        if not df_mes_propios.empty:
-            from business.calculations import ComisionCalculator
-            
-            # Calcular comisión para cada venta del mes
-            for _, row in df_mes_propios.iterrows():
-                # Obtener valores necesarios
-                valor_neto = row.get('valor_neto', 0)
-                if valor_neto == 0 or pd.isna(valor_neto):
-                    # Si no hay valor_neto, calcularlo desde valor
-                    valor_total = row.get('valor', 0)
-                    if valor_total and not pd.isna(valor_total):
-                        valor_neto = valor_total / 1.19
-                
-                cliente_propio = row.get('cliente_propio', False)
-                descuento_pie_factura = row.get('descuento_pie_factura', False)
-                descuento_aplicado = row.get('descuento_adicional', 0) or row.get('descuento_aplicado', 0)
-                valor_devuelto = row.get('valor_devuelto', 0) or 0
-                dias_pago = row.get('dias_pago_real')
-                condicion_especial = row.get('condicion_especial', False)
-                
-                # Calcular base de comisión
-                if descuento_pie_factura:
-                    base = valor_neto
-                else:
-                    limite_dias = 60 if condicion_especial else 45
-                    if not dias_pago or dias_pago <= limite_dias:
-                        base = valor_neto * 0.85
-                    else:
-                        base = valor_neto
-                
-                # Restar devoluciones
-                base_final = base - (valor_devuelto / 1.19 if valor_devuelto else 0)
-                base_final = max(0, base_final)  # No puede ser negativo
-                
-                # Determinar porcentaje según reglas de negocio
-                # REGLA CORREGIDA:
-                # - El descuento_pie_factura (15% base de la empresa) NO reduce la comisión
-                # - Solo los descuentos ADICIONALES (descuento_aplicado > 0) reducen la comisión
-                tiene_descuento_adicional = descuento_aplicado > 0
-                if cliente_propio:
-                    porcentaje = 1.5 if tiene_descuento_adicional else 2.5
-                else:
-                    porcentaje = 0.5 if tiene_descuento_adicional else 1.0
-                
-                # Verificar pérdida por +80 días
-                if dias_pago and dias_pago > 80:
-                    comision_venta = 0
-                else:
-                    comision_venta = base_final * (porcentaje / 100)
-                
-                comisiones += comision_venta
-        
-        # Limpiar NaN
-        total_ventas = float(total_ventas) if not pd.isna(total_ventas) else 0
-        comisiones = float(comisiones) if not pd.isna(comisiones) else 0
-        
-        # Clientes activos del mes (solo propios)
-        clientes_activos = df_mes_propios['cliente'].nunique() if not df_mes_propios.empty and 'cliente' in df_mes_propios.columns else 0
-        
-        # Pedidos del mes
-        pedidos_mes = len(df_mes_propios) if not df_mes_propios.empty else 0
-        
-        # Información de diagnóstico (solo en desarrollo)
-        diagnostico = {}
-        if not df_mes_propios.empty:
-            diagnostico = {
-                "total_filas": len(df_mes_propios),
-                "tiene_comision_ajustada": 'comision_ajustada' in df_mes_propios.columns,
-                "tiene_comision": 'comision' in df_mes_propios.columns,
-                "suma_comision_ajustada": float(df_mes_propios['comision_ajustada'].sum()) if 'comision_ajustada' in df_mes_propios.columns else None,
-                "suma_comision": float(df_mes_propios['comision'].sum()) if 'comision' in df_mes_propios.columns else None,
-                "columnas_disponibles": list(df_mes_propios.columns)
-            }
-        
-        # Calcular progreso de meta (solo si hay meta definida y no es "Ver todo")
-        if ver_todo or meta_ventas == 0:
-            progreso_meta = 0
-            faltante_meta = 0
-        else:
-            progreso_meta = (total_ventas / meta_ventas * 100) if meta_ventas > 0 else 0
-            faltante_meta = max(0, meta_ventas - total_ventas)
-        
-        # Preparar detalle de facturas para el desglose
-        # Formato similar al reporte de la empresa: cada factura/devolución como línea separada
-        facturas_detalle = []
-        
-        # 1. Agregar facturas del mes seleccionado (cada factura como línea positiva)
-        if not df_mes_propios.empty:
-            for _, row in df_mes_propios.iterrows():
-                # Calcular valor_neto (sin IVA)
-                valor_neto = row.get('valor_neto', 0)
-                if valor_neto == 0 or pd.isna(valor_neto):
-                    # Si no hay valor_neto, calcularlo desde valor (sin flete)
-                    valor_total = float(row.get('valor', 0)) if pd.notna(row.get('valor')) else 0
-                    valor_flete = float(row.get('valor_flete', 0)) if pd.notna(row.get('valor_flete')) else 0
-                    valor_sin_flete = valor_total - valor_flete
-                    valor_neto = valor_sin_flete / 1.19
-                
-                # Restar descuentos en pesos
-                valor_descuento_pesos = float(row.get('valor_descuento_pesos', 0)) if pd.notna(row.get('valor_descuento_pesos')) else 0
-                valor_neto_ajustado = float(valor_neto) - valor_descuento_pesos
-                
-                # Devoluciones (convertir a valor sin IVA)
-                valor_devuelto_factura = float(row.get('valor_devuelto', 0)) if pd.notna(row.get('valor_devuelto')) else 0
-                valor_devuelto_sin_iva = valor_devuelto_factura / 1.19 if valor_devuelto_factura > 0 else 0
-                
-                fecha_factura = row.get('fecha_factura', '')
-                if pd.notna(fecha_factura):
-                    if isinstance(fecha_factura, pd.Timestamp):
-                        fecha_factura_str = fecha_factura.strftime('%Y-%m-%d')
-                    else:
-                        fecha_factura_str = str(fecha_factura)
-                else:
-                    fecha_factura_str = ''
-                
-                # Agregar la factura (valor positivo, sin IVA, después de descuentos)
-                facturas_detalle.append({
-                    "id": int(row.get('id', 0)),
-                    "pedido": str(row.get('pedido', 'N/A')),
-                    "factura": str(row.get('factura', 'N/A')),
-                    "cliente": str(row.get('cliente', 'N/A')),
-                    "fecha_factura": fecha_factura_str,
-                    "valor_bruto": float(valor_neto_ajustado),  # Valor sin IVA, después de descuentos
-                    "valor_devuelto": 0,  # Las devoluciones se muestran como líneas separadas
-                    "valor_neto": float(valor_neto_ajustado),  # Valor neto después de descuentos
-                    "valor_transaccion": float(valor_neto_ajustado),  # Valor de la transacción (positivo para ventas)
-                    "tipo": "factura"  # Factura del mes seleccionado
-                })
-                
-                # Si hay devoluciones en esta factura, agregarlas como líneas negativas separadas (sin IVA)
-                if valor_devuelto_sin_iva > 0:
-                    facturas_detalle.append({
-                        "id": int(row.get('id', 0)),
-                        "pedido": str(row.get('pedido', 'N/A')),
-                        "factura": str(row.get('factura', 'N/A')),
-                        "cliente": str(row.get('cliente', 'N/A')),
-                        "fecha_factura": fecha_factura_str,
-                        "valor_bruto": 0,
-                        "valor_devuelto": valor_devuelto_sin_iva,
-                        "valor_neto": -valor_devuelto_sin_iva,
-                        "valor_transaccion": -valor_devuelto_sin_iva,  # Negativo para devoluciones (sin IVA)
-                        "tipo": "devolucion_factura_mes"  # Devolución de factura del mes
-                    })
-        
-        # 2. Agregar devoluciones del mes de facturas de meses anteriores (como líneas negativas)
-        if not devoluciones_mes.empty:
-            # Obtener IDs de facturas únicas de las devoluciones
-            facturas_ids_devoluciones = devoluciones_mes['factura_id'].unique().tolist()
-            
-            # Obtener información de esas facturas
-            try:
-                facturas_devoluciones_response = supabase.table("comisiones").select("*").in_("id", facturas_ids_devoluciones).execute()
-                
-                if facturas_devoluciones_response.data:
-                    # Agrupar devoluciones por factura_id
-                    devoluciones_por_factura = devoluciones_mes.groupby('factura_id')['valor_devuelto'].sum().to_dict()
-                    
-                    for factura_data in facturas_devoluciones_response.data:
-                        factura_id = factura_data['id']
-                        valor_devuelto_total = float(devoluciones_por_factura.get(factura_id, 0))
-                        # Convertir devolución a valor sin IVA
-                        valor_devuelto_sin_iva = valor_devuelto_total / 1.19 if valor_devuelto_total > 0 else 0
-                        
-                        # Solo agregar si la factura no es del mes actual (para evitar duplicados)
-                        if factura_id not in df_mes_propios['id'].values if not df_mes_propios.empty else []:
-                            fecha_factura = factura_data.get('fecha_factura', '')
-                            if fecha_factura:
-                                if isinstance(fecha_factura, str):
-                                    fecha_factura_str = fecha_factura
-                                else:
-                                    fecha_factura_str = pd.to_datetime(fecha_factura).strftime('%Y-%m-%d')
-                            else:
-                                fecha_factura_str = ''
-                            
-                            # Obtener fecha de devolución
-                            fecha_devolucion = ''
-                            devoluciones_factura = devoluciones_mes[devoluciones_mes['factura_id'] == factura_id]
-                            if not devoluciones_factura.empty:
-                                fecha_dev = devoluciones_factura['fecha_devolucion'].max()
-                                if pd.notna(fecha_dev):
-                                    if isinstance(fecha_dev, pd.Timestamp):
-                                        fecha_devolucion = fecha_dev.strftime('%Y-%m-%d')
-                                    else:
-                                        fecha_devolucion = str(fecha_dev)
-                            
-                            # Agregar como línea negativa (devolución, sin IVA)
-                            facturas_detalle.append({
-                                "id": int(factura_id),
-                                "pedido": str(factura_data.get('pedido', 'N/A')),
-                                "factura": str(factura_data.get('factura', 'N/A')),
-                                "cliente": str(factura_data.get('cliente', 'N/A')),
-                                "fecha_factura": fecha_factura_str,
-                                "fecha_devolucion": fecha_devolucion,
-                                "valor_bruto": 0,
-                                "valor_devuelto": valor_devuelto_sin_iva,  # Sin IVA
-                                "valor_neto": -valor_devuelto_sin_iva,
-                                "valor_transaccion": -valor_devuelto_sin_iva,  # Negativo para devoluciones (sin IVA)
-                                "tipo": "devolucion_mes"  # Devolución del mes pero factura anterior
-                            })
-            except Exception as e:
-                print(f"Error obteniendo facturas de devoluciones: {e}")
-        
-        # Ordenar por cliente y luego por fecha (similar al reporte de la empresa)
-        facturas_detalle.sort(key=lambda x: (x['cliente'], x['fecha_factura'], x['valor_transaccion'] < 0))
-        
-        return limpiar_nan_para_json({
-            "totalVentas": total_ventas,
-            "comisiones": comisiones,
-            "clientesActivos": int(clientes_activos),
-            "pedidosMes": int(pedidos_mes),
-            "mes": mes_filtro,
-            "metaVentas": meta_ventas,
-            "progresoMeta": min(100, max(0, progreso_meta)),  # Entre 0 y 100%
-            "faltanteMeta": faltante_meta,
-            "facturasDetalle": facturas_detalle,  # Detalle de facturas
-            "_diagnostico": diagnostico  # Información de diagnóstico
-        })
+        supabase, contexto = _contexto_dashboard()
+        return limpiar_nan_para_json(contexto.metricas(mes, meta_ventas_mes(supabase, mes)))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo métricas: {str(e)}")
 
@@ -434,210 +141,10 @@ async def get_dashboard_metrics(mes: str = None) -> Dict[str, Any]:
 async def get_sales_chart():
     """Obtiene datos para el gráfico de ventas y comisiones de los últimos 6 meses (solo clientes propios)"""
     try:
-        from database.queries import DatabaseManager
-        from supabase import create_client
-        from config.settings import AppConfig
-        from datetime import datetime, date, timedelta
-        import pandas as pd
-
-        env_status = AppConfig.validate_environment()
-        if not env_status["valid"]:
-            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
-        
-        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
-        db_manager = DatabaseManager(supabase)
-        
-        df = db_manager._cargar_datos_raw()
-        
-        if df.empty:
-            return {
-                "ventas_mensuales": [],
-                "comisiones_mensuales": []
-            }
-        
-        # Convertir fecha_factura
-        df['fecha_factura'] = pd.to_datetime(df['fecha_factura'], errors='coerce')
-        df['mes_factura'] = df['fecha_factura'].dt.to_period('M').astype(str)
-        
-        # Filtrar solo clientes propios
-        df_propios = df[df.get('cliente_propio', False) == True].copy()
-        
-        if df_propios.empty:
-            return {
-                "ventas_mensuales": [],
-                "comisiones_mensuales": []
-            }
-        
-        # Obtener últimos 6 meses
-        hoy = date.today()
-        meses = []
-        for i in range(5, -1, -1):  # Últimos 6 meses
-            fecha = hoy.replace(day=1) - timedelta(days=30 * i)
-            meses.append(fecha.strftime("%Y-%m"))
-        
-        # Agrupar por mes
-        ventas_mensuales = []
-        comisiones_mensuales = []
-        
-        for mes in meses:
-            df_mes = df_propios[df_propios['mes_factura'] == mes].copy()
-            
-            # Calcular ventas usando la MISMA lógica que /metrics
-            # 1. Obtener valor_neto (sin IVA) de cada factura
-            if not df_mes.empty:
-                if 'valor_neto' not in df_mes.columns or df_mes['valor_neto'].isna().all():
-                    # Si no hay valor_neto, calcularlo desde valor (sin flete)
-                    if 'valor_flete' in df_mes.columns:
-                        valor_sin_flete = df_mes['valor'].fillna(0) - df_mes['valor_flete'].fillna(0)
-                    else:
-                        valor_sin_flete = df_mes['valor'].fillna(0)
-                    df_mes['valor_neto'] = valor_sin_flete / 1.19
-                else:
-                    df_mes['valor_neto'] = df_mes['valor_neto'].fillna(0)
-                
-                # 2. Restar descuentos en pesos si existen
-                if 'valor_descuento_pesos' in df_mes.columns:
-                    df_mes['valor_neto_ajustado'] = df_mes['valor_neto'] - df_mes['valor_descuento_pesos'].fillna(0)
-                else:
-                    df_mes['valor_neto_ajustado'] = df_mes['valor_neto']
-                
-                # 3. Sumar valor neto ajustado (sin IVA, después de descuentos)
-                ventas_bruto = df_mes['valor_neto_ajustado'].sum()
-                
-                # 4. Restar devoluciones de facturas del mes (convertir a valor sin IVA)
-                devoluciones_facturas_mes = 0
-                if 'valor_devuelto' in df_mes.columns:
-                    # valor_devuelto incluye IVA, se divide por 1.19 para obtener valor sin IVA
-                    devoluciones_facturas_mes = (df_mes['valor_devuelto'].fillna(0) / 1.19).sum()
-                
-                # 5. Obtener devoluciones del mes (de facturas de cualquier mes)
-                devoluciones_mes_totales = 0
-                try:
-                    df_devoluciones = db_manager.cargar_devoluciones()
-                    if not df_devoluciones.empty and 'fecha_devolucion' in df_devoluciones.columns:
-                        df_devoluciones['fecha_devolucion'] = pd.to_datetime(df_devoluciones['fecha_devolucion'], errors='coerce')
-                        df_devoluciones['mes_devolucion'] = df_devoluciones['fecha_devolucion'].dt.to_period('M').astype(str)
-                        devoluciones_mes_df = df_devoluciones[df_devoluciones['mes_devolucion'] == mes].copy()
-                        
-                        # Filtrar solo devoluciones de clientes propios
-                        if not devoluciones_mes_df.empty:
-                            facturas_ids_devoluciones = devoluciones_mes_df['factura_id'].unique().tolist()
-                            if facturas_ids_devoluciones:
-                                try:
-                                    facturas_devoluciones = supabase.table("comisiones").select("id, cliente_propio").in_("id", facturas_ids_devoluciones).execute()
-                                    facturas_propios_ids = {f['id']: f.get('cliente_propio', True) for f in facturas_devoluciones.data if f.get('cliente_propio', True)}
-                                    devoluciones_mes_df = devoluciones_mes_df[devoluciones_mes_df['factura_id'].isin(facturas_propios_ids.keys())].copy()
-                                    devoluciones_mes_totales = devoluciones_mes_df['valor_devuelto'].fillna(0).sum() if 'valor_devuelto' in devoluciones_mes_df.columns else 0
-                                except Exception as e:
-                                    print(f"Error filtrando devoluciones por cliente_propio en gráfico: {e}")
-                                    devoluciones_mes_totales = devoluciones_mes_df['valor_devuelto'].fillna(0).sum() if 'valor_devuelto' in devoluciones_mes_df.columns else 0
-                except Exception as e:
-                    print(f"Error cargando devoluciones del mes {mes} para gráfico: {e}")
-                    devoluciones_mes_totales = 0
-                
-                # 6. Convertir devoluciones totales a valor sin IVA
-                devoluciones_mes_sin_iva = float(devoluciones_mes_totales) / 1.19 if devoluciones_mes_totales > 0 else 0
-                
-                # 7. Calcular total de ventas neto (valor sin IVA, después de descuentos, restando devoluciones sin IVA)
-                ventas = float(ventas_bruto) - float(devoluciones_facturas_mes) - float(devoluciones_mes_sin_iva)
-                ventas = max(0, ventas)  # No puede ser negativo
-            else:
-                # Si no hay facturas del mes, verificar si hay devoluciones del mes
-                devoluciones_mes_totales = 0
-                try:
-                    df_devoluciones = db_manager.cargar_devoluciones()
-                    if not df_devoluciones.empty and 'fecha_devolucion' in df_devoluciones.columns:
-                        df_devoluciones['fecha_devolucion'] = pd.to_datetime(df_devoluciones['fecha_devolucion'], errors='coerce')
-                        df_devoluciones['mes_devolucion'] = df_devoluciones['fecha_devolucion'].dt.to_period('M').astype(str)
-                        devoluciones_mes_df = df_devoluciones[df_devoluciones['mes_devolucion'] == mes].copy()
-                        if not devoluciones_mes_df.empty:
-                            facturas_ids_devoluciones = devoluciones_mes_df['factura_id'].unique().tolist()
-                            if facturas_ids_devoluciones:
-                                try:
-                                    facturas_devoluciones = supabase.table("comisiones").select("id, cliente_propio").in_("id", facturas_ids_devoluciones).execute()
-                                    facturas_propios_ids = {f['id']: f.get('cliente_propio', True) for f in facturas_devoluciones.data if f.get('cliente_propio', True)}
-                                    devoluciones_mes_df = devoluciones_mes_df[devoluciones_mes_df['factura_id'].isin(facturas_propios_ids.keys())].copy()
-                                    devoluciones_mes_totales = devoluciones_mes_df['valor_devuelto'].fillna(0).sum() if 'valor_devuelto' in devoluciones_mes_df.columns else 0
-                                except Exception as e:
-                                    print(f"Error filtrando devoluciones por cliente_propio en gráfico: {e}")
-                except Exception as e:
-                    print(f"Error cargando devoluciones del mes {mes} para gráfico: {e}")
-                
-                ventas = max(0, -float(devoluciones_mes_totales) / 1.19) if devoluciones_mes_totales > 0 else 0
-            
-            # RECALCULAR comisiones usando las mismas reglas que en /metrics
-            # Esto asegura consistencia entre el gráfico y las métricas
-            comisiones = 0
-            if not df_mes.empty:
-                for _, row in df_mes.iterrows():
-                    # Obtener valores necesarios
-                    valor_neto = row.get('valor_neto', 0)
-                    if valor_neto == 0 or pd.isna(valor_neto):
-                        # Si no hay valor_neto, calcularlo desde valor
-                        valor_total = row.get('valor', 0)
-                        if valor_total and not pd.isna(valor_total):
-                            valor_flete = row.get('valor_flete', 0) or 0
-                            valor_neto = (valor_total - valor_flete) / 1.19
-                    
-                    cliente_propio = row.get('cliente_propio', False)
-                    descuento_pie_factura = row.get('descuento_pie_factura', False)
-                    descuento_aplicado = row.get('descuento_adicional', 0) or row.get('descuento_aplicado', 0)
-                    valor_devuelto = row.get('valor_devuelto', 0) or 0
-                    dias_pago = row.get('dias_pago_real')
-                    condicion_especial = row.get('condicion_especial', False)
-                    
-                    # Calcular base de comisión
-                    if descuento_pie_factura:
-                        base = valor_neto
-                    else:
-                        limite_dias = 60 if condicion_especial else 45
-                        if not dias_pago or dias_pago <= limite_dias:
-                            base = valor_neto * 0.85
-                        else:
-                            base = valor_neto
-                    
-                    # Restar devoluciones
-                    base_final = base - (valor_devuelto / 1.19 if valor_devuelto else 0)
-                    base_final = max(0, base_final)  # No puede ser negativo
-                    
-                    # Determinar porcentaje según reglas de negocio
-                    tiene_descuento = descuento_aplicado > 0
-                    if cliente_propio:
-                        porcentaje = 1.5 if tiene_descuento else 2.5
-                    else:
-                        porcentaje = 0.5 if tiene_descuento else 1.0
-                    
-                    # Verificar pérdida por +80 días
-                    if dias_pago and dias_pago > 80:
-                        comision_venta = 0
-                    else:
-                        comision_venta = base_final * (porcentaje / 100)
-                    
-                    comisiones += comision_venta
-            
-            # Limpiar NaN e infinitos
-            ventas = float(ventas) if not pd.isna(ventas) and not np.isinf(ventas) else 0
-            comisiones = float(comisiones) if not pd.isna(comisiones) and not np.isinf(comisiones) else 0
-            
-            # Formatear nombre del mes
-            fecha_mes = datetime.strptime(mes, "%Y-%m")
-            nombre_mes = fecha_mes.strftime("%b")  # Ene, Feb, Mar, etc.
-            
-            ventas_mensuales.append({
-                "mes": nombre_mes,
-                "ventas": ventas,
-                "comisiones": comisiones
-            })
-            
-            comisiones_mensuales.append({
-                "mes": nombre_mes,
-                "comisiones": comisiones
-            })
-        
-        return limpiar_nan_para_json({
-            "ventas_mensuales": ventas_mensuales,
-            "comisiones_mensuales": comisiones_mensuales
-        })
+        _, contexto = _contexto_dashboard()
+        return limpiar_nan_para_json(contexto.grafico_ventas())
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -645,14 +152,11 @@ async def get_sales_chart():
 async def get_colombia_map(periodo: str = "historico"):
     """Obtiene datos para el mapa de Colombia con distribución de clientes - OPTIMIZADO"""
     try:
+        import pandas as pd
         from supabase import create_client
         from config.settings import AppConfig
-        import pandas as pd
-        import time
         from datetime import datetime, timedelta
         
-        start_time = time.time()
-        
         env_status = AppConfig.validate_environment()
         if not env_status["valid"]:
             raise HTTPException(
@@ -666,7 +170,7 @@ async def get_colombia_map(periodo: str = "historico"):
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
         # OPTIMIZACIÓN: Usar compras_clientes directamente (más rápido que distribucion_geografica)
-        print("🔄 Cargando compras_clientes para mapa de Colombia...")
+        print("🔄 Consultando cubo de compras para mapa de Colombia...")
         
         # Calcular fecha límite según período
         fecha_limite = None
@@ -678,65 +182,17 @@ async def get_colombia_map(periodo: str = "historico"):
             fecha_limite = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
         # Si es "historico", no aplicar filtro de fecha
         
-        # Cargar compras con paginación optimizada
-        query_compras = supabase.table("compras_clientes").select("nit_cliente, total, es_devolucion").eq("es_devolucion", False)
-        
-        if fecha_limite:
-            try:
-                query_compras = query_compras.gte("fecha", fecha_limite)
-            except Exception as e:
-                print(f"⚠️ No se pudo aplicar filtro de fecha: {e}")
-        
-        all_compras = []
-        page_size = 1000
-        current_offset = 0
-        max_registros = 5000  # Límite para velocidad
-        
-        while len(all_compras) < max_registros:
-            response_compras = query_compras.range(current_offset, current_offset + page_size - 1).execute()
-            if not response_compras.data:
-                break
-            all_compras.extend(response_compras.data)
-            if len(response_compras.data) < page_size:
-                break
-            current_offset += page_size
-        
-        print(f"⏱️ Compras cargadas en {time.time() - start_time:.2f}s: {len(all_compras)} registros")
-        
-        if not all_compras:
-            return {
-                "distribucion": {
-                    "datos_mapa": [],
-                    "total_clientes": 0,
-                    "total_ciudades": 0
-                },
-                "por_ciudad": [],
-                "total_clientes": 0,
-                "total_ciudades": 0
-            }
-        
-        # Cargar clientes y crear diccionario
-        print("🔄 Cargando clientes_b2b...")
-        all_clientes = []
-        current_offset_clientes = 0
-        
-        while True:
-            response_clientes = supabase.table("clientes_b2b").select("nit, ciudad").range(current_offset_clientes, current_offset_clientes + page_size - 1).execute()
-            if not response_clientes.data:
-                break
-            all_clientes.extend(response_clientes.data)
-            if len(response_clientes.data) < page_size:
-                break
-            current_offset_clientes += page_size
-        
-        nit_a_ciudad = {cliente.get('nit', ''): cliente.get('ciudad', '') for cliente in all_clientes if cliente.get('nit')}
+        # Compras por ciudad desde el cubo en memoria (todo el historial, sin límite de
+        # registros); el período se aplica por mes completo
+        from database.purchase_cube import get_purchase_cube
+        with etapa("cubo"):
+            stats_por_ciudad = get_purchase_cube(supabase).por_ciudad(
+                desde_mes=fecha_limite[:7] if fecha_limite else None
+            ).rename(columns={'total': 'total_compras'})
         
-        # Procesar con pandas
-        df_compras = pd.DataFrame(all_compras)
-        df_compras['ciudad'] = df_compras['nit_cliente'].map(nit_a_ciudad)
-        df_compras = df_compras[df_compras['ciudad'].notna() & (df_compras['ciudad'] != '')]
+        print(f"📊 Compras por ciudad: {len(stats_por_ciudad)} ciudades")
         
-        if df_compras.empty:
+        if stats_por_ciudad.empty:
             return {
                 "distribucion": {
                     "datos_mapa": [],
@@ -748,35 +204,25 @@ async def get_colombia_map(periodo: str = "historico"):
                 "total_ciudades": 0
             }
         
-        # Agrupar por ciudad
-        stats_por_ciudad = df_compras.groupby('ciudad').agg({
-            'total': 'sum',
-            'nit_cliente': 'nunique'
-        }).reset_index()
-        stats_por_ciudad.columns = ['ciudad', 'total_compras', 'num_clientes']
-        
-        # Cargar coordenadas
-        from business.client_analytics import ClientAnalytics
-        client_analytics = ClientAnalytics(supabase)
-        coordenadas_dict = client_analytics._obtener_codigos_dane_coordenadas()
+        # Coordenadas desde el nomenclátor compartido (cada ciudad distinta se busca una vez)
+        from business.gazetteer import resolver_ciudades
+        with etapa("coordenadas"):
+            datos_geo = resolver_ciudades(stats_por_ciudad['ciudad'])
         
         # Preparar datos del mapa
         datos_mapa = []
         por_ciudad = []
         
-        for _, row in stats_por_ciudad.iterrows():
+        for (_, row), lat, lon in zip(stats_por_ciudad.iterrows(), datos_geo['lat'], datos_geo['lon']):
             ciudad = row['ciudad']
             total_compras = float(row['total_compras'])
             num_clientes = int(row['num_clientes'])
             
-            # Buscar coordenadas
-            coords = coordenadas_dict.get(ciudad) or coordenadas_dict.get(ciudad.lower()) or coordenadas_dict.get(ciudad.title())
-            
-            if coords:
+            if pd.notna(lat):
                 datos_mapa.append({
                     'ciudad': ciudad,
-                    'lat': coords.get('lat'),
-                    'lon': coords.get('lon'),
+                    'lat': lat,
+                    'lon': lon,
                     'total_compras': total_compras,
                     'num_clientes': num_clientes
                 })
@@ -787,11 +233,10 @@ async def get_colombia_map(periodo: str = "historico"):
                 'num_clientes': num_clientes
             })
         
-        total_clientes = df_compras['nit_cliente'].nunique()
+        # Cada cliente tiene una sola ciudad: la suma por ciudad es el total de clientes
+        total_clientes = int(stats_por_ciudad['num_clientes'].sum())
         total_ciudades = len(por_ciudad)
         
-        print(f"⏱️ Mapa procesado en {time.time() - start_time:.2f}s total")
-        
         return limpiar_nan_para_json({
             "distribucion": {
                 "datos_mapa": datos_mapa,
@@ -813,7 +258,7 @@ async def get_colombia_map(periodo: str = "historico"):
 
 @router.get("/referencias-por-ciudad")
 async def get_referencias_por_ciudad():
-    """Obtiene las referencias más compradas por ciudad - USA TABLA compras_clientes"""
+    """Obtiene las referencias más compradas por ciudad - USA EL CUBO DE COMPRAS (cubo_compras)"""
     try:
         from supabase import create_client
         from config.settings import AppConfig
@@ -831,108 +276,28 @@ async def get_referencias_por_ciudad():
         
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
-        # Cargar compras_clientes usando paginación automática
-        all_compras = []
-        page_size = 1000
-        current_offset = 0
-        
-        while True:
-            response_compras = supabase.table("compras_clientes").select("*").range(current_offset, current_offset + page_size - 1).execute()
-            
-            if not response_compras.data:
-                break
-            
-            all_compras.extend(response_compras.data)
-            
-            if len(response_compras.data) < page_size:
-                break
-            
-            current_offset += page_size
-        
-        if not all_compras:
-            return {
-                "referencias_por_ciudad": [],
-                "total_ciudades": 0,
-                "total_referencias_unicas": 0
-            }
-        
-        df_compras = pd.DataFrame(all_compras)
-        
-        # Cargar clientes_b2b para obtener ciudades
-        all_clientes = []
-        current_offset_clientes = 0
-        
-        while True:
-            response_clientes = supabase.table("clientes_b2b").select("id, nit, ciudad").range(current_offset_clientes, current_offset_clientes + page_size - 1).execute()
-            
-            if not response_clientes.data:
-                break
-            
-            all_clientes.extend(response_clientes.data)
-            
-            if len(response_clientes.data) < page_size:
-                break
-            
-            current_offset_clientes += page_size
-        
-        # Crear diccionario de NIT a ciudad
-        df_clientes = pd.DataFrame(all_clientes) if all_clientes else pd.DataFrame()
-        nit_a_ciudad = {}
-        if not df_clientes.empty:
-            for _, row in df_clientes.iterrows():
-                nit = row.get('nit', '')
-                ciudad = row.get('ciudad', '')
-                if nit and ciudad:
-                    nit_a_ciudad[nit] = ciudad
-        
-        # Filtrar solo compras (no devoluciones) y referencias válidas
-        df_compras_filtrado = df_compras[
-            (df_compras.get('es_devolucion', False) == False) &
-            df_compras['cod_articulo'].notna() & 
-            (df_compras['cod_articulo'] != '') &
-            (df_compras['cod_articulo'].astype(str).str.strip() != '') &
-            (df_compras['cod_articulo'].astype(str) != 'N/A')
-        ].copy()
-        
-        if df_compras_filtrado.empty:
-            return {
-                "referencias_por_ciudad": [],
-                "total_ciudades": 0,
-                "total_referencias_unicas": 0
-            }
-        
-        # Agregar ciudad a cada compra usando nit_cliente
-        df_compras_filtrado['ciudad'] = df_compras_filtrado['nit_cliente'].map(nit_a_ciudad)
-        
-        # Filtrar solo las que tienen ciudad
-        df_compras_filtrado = df_compras_filtrado[df_compras_filtrado['ciudad'].notna() & (df_compras_filtrado['ciudad'] != '')]
+        # Ciudad x referencia desde el cubo en memoria (todo el historial)
+        from database.purchase_cube import get_purchase_cube
+        referencias_por_ciudad = get_purchase_cube(supabase).por_ciudad_y('cod_articulo').rename(columns={
+            'cod_articulo': 'referencia',
+            'total': 'valor_total',
+            'cantidad': 'cantidad_total',
+            'num_compras': 'cantidad_compras'
+        })
         
-        if df_compras_filtrado.empty:
+        if referencias_por_ciudad.empty:
             return {
                 "referencias_por_ciudad": [],
                 "total_ciudades": 0,
                 "total_referencias_unicas": 0
             }
         
-        # Agrupar por ciudad y cod_articulo (referencia real)
-        referencias_por_ciudad = df_compras_filtrado.groupby(['ciudad', 'cod_articulo']).agg({
-            'total': 'sum',  # Valor total
-            'cantidad': 'sum',  # Cantidad total
-            'id': 'count',  # Número de transacciones
-            'nit_cliente': 'nunique'  # Número de clientes únicos
-        }).reset_index()
-        
-        referencias_por_ciudad.columns = ['ciudad', 'referencia', 'valor_total', 'cantidad_total', 'cantidad_compras', 'num_clientes']
-        
-        # Ordenar por valor total descendente
-        referencias_por_ciudad = referencias_por_ciudad.sort_values(['ciudad', 'valor_total'], ascending=[True, False])
-        
-        # Para cada ciudad, obtener top referencias
+        # Para cada ciudad, obtener top referencias (ya viene ordenado por ciudad y valor)
         resultado = []
         ciudades = referencias_por_ciudad['ciudad'].unique()
+        top_por_ciudad = referencias_por_ciudad.groupby('ciudad', sort=False).head(10)
         
-        for ciudad in ciudades:
-            refs_ciudad = referencias_por_ciudad[referencias_por_ciudad['ciudad'] == ciudad].head(10)
+        for ciudad, refs_ciudad in top_por_ciudad.groupby('ciudad', sort=False):
             # Limpiar NaN antes de convertir a dict
             refs_ciudad_limpio = refs_ciudad.fillna(0)
             
@@ -956,7 +321,7 @@ async def get_referencias_por_ciudad():
         return {
             "referencias_por_ciudad": resultado,
             "total_ciudades": len(ciudades),
-            "total_referencias_unicas": df_compras_filtrado['cod_articulo'].nunique()
+            "total_referencias_unicas": int(referencias_por_ciudad['referencia'].nunique())
         }
     except Exception as e:
         import traceback
@@ -968,12 +333,9 @@ async def get_referencias_por_ciudad():
 async def get_mapa_interactivo(referencia: Optional[str] = Query(None, description="Filtrar por referencia específica")):
     """Obtiene datos para el mapa interactivo: top cliente por ciudad y distribución de referencias - OPTIMIZADO"""
     try:
+        import pandas as pd
         from supabase import create_client
         from config.settings import AppConfig
-        import pandas as pd
-        import time
-        
-        start_time = time.time()
         
         env_status = AppConfig.validate_environment()
         if not env_status["valid"]:
@@ -987,229 +349,80 @@ async def get_mapa_interactivo(referencia: Optional[str] = Query(None, descripti
         
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
-        # OPTIMIZACIÓN 1: Cargar solo campos necesarios y filtrar en la consulta
-        print("🔄 Cargando compras_clientes...")
-        campos_necesarios = "nit_cliente, cod_articulo, total, cantidad, es_devolucion"
-        query_compras = supabase.table("compras_clientes").select(campos_necesarios).eq("es_devolucion", False)
-        
-        if referencia:
-            query_compras = query_compras.eq("cod_articulo", referencia)
-        
-        # OPTIMIZACIÓN EXTRA: Limitar a últimos 12 meses para mejorar velocidad (si no hay filtro de referencia)
-        # Esto reduce significativamente la cantidad de datos a procesar sin perder información relevante
-        if not referencia:
-            from datetime import datetime, timedelta
-            fecha_limite = (datetime.now() - timedelta(days=365)).strftime('%Y-%m-%d')
-            try:
-                query_compras = query_compras.gte("fecha", fecha_limite)
-            except Exception as e:
-                # Si la columna fecha no existe o hay error, continuar sin filtro
-                print(f"⚠️ No se pudo aplicar filtro de fecha: {e}")
+        # Todo el historial desde el cubo en memoria (cliente x referencia x mes),
+        # sin límite de registros; la referencia se filtra sobre el cubo
+        from database.purchase_cube import get_purchase_cube
+        cubo = get_purchase_cube(supabase)
+        with etapa("cubo"):
+            stats_por_ciudad = cubo.por_ciudad(referencia=referencia)
         
-        # Cargar con paginación optimizada - límite máximo de 10000 registros para velocidad
-        all_compras = []
-        page_size = 1000
-        current_offset = 0
-        max_registros = 10000  # Aumentado para mantener datos pero con límite
-        
-        while len(all_compras) < max_registros:
-            response_compras = query_compras.range(current_offset, current_offset + page_size - 1).execute()
-            if not response_compras.data:
-                break
-            all_compras.extend(response_compras.data)
-            if len(response_compras.data) < page_size:
-                break
-            current_offset += page_size
-        
-        print(f"⏱️ Compras cargadas en {time.time() - start_time:.2f}s: {len(all_compras)} registros")
-        
-        if not all_compras:
+        if stats_por_ciudad.empty:
             return {
                 "ciudades": [],
                 "referencias_disponibles": [],
                 "referencia_filtro": referencia
             }
         
-        # OPTIMIZACIÓN 2: Cargar clientes solo una vez y crear diccionarios eficientes
-        print("🔄 Cargando clientes_b2b...")
-        clientes_start = time.time()
-        all_clientes = []
-        current_offset_clientes = 0
-        
-        while True:
-            response_clientes = supabase.table("clientes_b2b").select("nit, nombre, ciudad").range(current_offset_clientes, current_offset_clientes + page_size - 1).execute()
-            if not response_clientes.data:
-                break
-            all_clientes.extend(response_clientes.data)
-            if len(response_clientes.data) < page_size:
-                break
-            current_offset_clientes += page_size
-        
-        # Crear diccionarios de mapeo (más eficiente que DataFrame)
-        nit_a_ciudad = {}
-        nit_a_nombre = {}
-        for cliente in all_clientes:
-            nit = cliente.get('nit', '')
-            if nit:
-                if cliente.get('ciudad'):
-                    nit_a_ciudad[nit] = cliente['ciudad']
-                if cliente.get('nombre'):
-                    nit_a_nombre[nit] = cliente['nombre']
-        
-        print(f"⏱️ Clientes cargados en {time.time() - clientes_start:.2f}s: {len(all_clientes)} registros")
-        
-        # OPTIMIZACIÓN 3: Cargar coordenadas una sola vez y crear diccionario optimizado
-        print("🔄 Cargando coordenadas...")
-        coords_start = time.time()
-        ciudad_a_coordenadas = {}
-        ciudad_a_coordenadas_lower = {}  # Diccionario separado para búsqueda rápida
-        
-        try:
-            from business.client_analytics import ClientAnalytics
-            client_analytics = ClientAnalytics(supabase)
-            coordenadas_dict = client_analytics._obtener_codigos_dane_coordenadas()
-            
-            for ciudad_nombre, datos in coordenadas_dict.items():
-                coords_data = {
-                    'lat': datos.get('lat'),
-                    'lon': datos.get('lon'),
-                    'departamento': datos.get('departamento', '')
+        referencias_disponibles = cubo.referencias()
+        nit_a_nombre = {str(nit).strip(): nombre for nit, nombre in cubo.clientes.mapa_nit_nombre().items() if nombre}
+        
+        # Coordenadas y departamento desde el nomenclátor compartido
+        from business.gazetteer import resolver_ciudades
+        with etapa("coordenadas"):
+            datos_geo = resolver_ciudades(stats_por_ciudad['ciudad'])
+        
+        # Clientes por ciudad (ordenados por total): el primero es el top cliente y,
+        # con referencia seleccionada, la lista completa son los que la compran
+        clientes_por_ciudad = {}
+        for ciudad, grupo in cubo.por_ciudad_y('nit_cliente', referencia=referencia).groupby('ciudad', sort=False):
+            clientes_por_ciudad[ciudad] = [
+                {
+                    'nit': nit,
+                    'nombre': nit_a_nombre.get(nit, nit),
+                    'total_ventas': float(total)
                 }
-                ciudad_a_coordenadas[ciudad_nombre] = coords_data
-                ciudad_a_coordenadas_lower[ciudad_nombre.lower().strip()] = coords_data
-                # También sin acentos
-                ciudad_clean = ciudad_nombre.lower().strip().replace('á', 'a').replace('é', 'e').replace('í', 'i').replace('ó', 'o').replace('ú', 'u')
-                if ciudad_clean not in ciudad_a_coordenadas_lower:
-                    ciudad_a_coordenadas_lower[ciudad_clean] = coords_data
-        except Exception as e:
-            print(f"Error obteniendo coordenadas: {e}")
-        
-        print(f"⏱️ Coordenadas cargadas en {time.time() - coords_start:.2f}s")
-        
-        # OPTIMIZACIÓN 4: Procesar con pandas de manera más eficiente
-        print("🔄 Procesando datos...")
-        process_start = time.time()
-        
-        df_compras = pd.DataFrame(all_compras)
-        
-        # Agregar ciudad y nombre usando map (muy rápido)
-        df_compras['ciudad'] = df_compras['nit_cliente'].map(nit_a_ciudad)
-        df_compras['nombre_cliente'] = df_compras['nit_cliente'].map(nit_a_nombre)
-        
-        # Filtrar solo las que tienen ciudad
-        df_compras = df_compras[df_compras['ciudad'].notna() & (df_compras['ciudad'] != '')]
-        
-        if df_compras.empty:
-            return {
-                "ciudades": [],
-                "referencias_disponibles": [],
-                "referencia_filtro": referencia
-            }
-        
-        # OPTIMIZACIÓN 5: Obtener referencias disponibles de manera eficiente
-        referencias_disponibles = df_compras['cod_articulo'].dropna().unique().tolist()
-        referencias_disponibles = [r for r in referencias_disponibles if r and str(r).strip() != '' and str(r) != 'N/A']
-        referencias_disponibles.sort()
-        
-        # OPTIMIZACIÓN 6: Agrupar todo de una vez en lugar de ciudad por ciudad
-        # Agrupar por ciudad y nit_cliente para top cliente
-        top_clientes_por_ciudad = df_compras.groupby(['ciudad', 'nit_cliente']).agg({
-            'total': 'sum',
-            'nombre_cliente': 'first'
-        }).reset_index().sort_values(['ciudad', 'total'], ascending=[True, False])
-        
-        # Agrupar por ciudad para estadísticas generales
-        stats_por_ciudad = df_compras.groupby('ciudad').agg({
-            'total': 'sum',
-            'nit_cliente': 'nunique',
-            'cod_articulo': 'nunique'
-        }).reset_index()
-        stats_por_ciudad.columns = ['ciudad', 'total_ventas', 'num_clientes', 'num_referencias']
+                for nit, total in zip(grupo['nit_cliente'], grupo['total'])
+            ]
         
         # Top referencia por ciudad (solo si no hay filtro)
         top_refs_por_ciudad = {}
         if not referencia:
-            top_refs = df_compras.groupby(['ciudad', 'cod_articulo']).agg({
-                'total': 'sum',
-                'cantidad': 'sum'
-            }).reset_index().sort_values(['ciudad', 'total'], ascending=[True, False])
-            
-            for ciudad in top_refs['ciudad'].unique():
-                top_ref_ciudad = top_refs[top_refs['ciudad'] == ciudad].iloc[0]
-                top_refs_por_ciudad[ciudad] = {
-                    'codigo': str(top_ref_ciudad['cod_articulo']),
-                    'total_ventas': float(top_ref_ciudad['total']),
-                    'cantidad': float(top_ref_ciudad['cantidad'])
+            top_refs = cubo.por_ciudad_y('cod_articulo').groupby('ciudad', sort=False).head(1)
+            for _, fila in top_refs.iterrows():
+                top_refs_por_ciudad[fila['ciudad']] = {
+                    'codigo': str(fila['cod_articulo']),
+                    'total_ventas': float(fila['total']),
+                    'cantidad': float(fila['cantidad'])
                 }
         
-        # Si hay una referencia seleccionada, obtener TODOS los clientes que la compran por ciudad
-        clientes_por_referencia_ciudad = {}
-        if referencia:
-            clientes_ref = df_compras.groupby(['ciudad', 'nit_cliente']).agg({
-                'total': 'sum',
-                'nombre_cliente': 'first'
-            }).reset_index().sort_values(['ciudad', 'total'], ascending=[True, False])
-            
-            for ciudad in clientes_ref['ciudad'].unique():
-                clientes_ciudad = clientes_ref[clientes_ref['ciudad'] == ciudad]
-                clientes_por_referencia_ciudad[ciudad] = [
-                    {
-                        'nit': row['nit_cliente'],
-                        'nombre': row['nombre_cliente'] if pd.notna(row['nombre_cliente']) else row['nit_cliente'],
-                        'total_ventas': float(row['total'])
-                    }
-                    for _, row in clientes_ciudad.iterrows()
-                ]
-        
         # Construir resultado final
         ciudades_data = []
-        for _, row in stats_por_ciudad.iterrows():
+        for (_, row), (_, geo) in zip(stats_por_ciudad.iterrows(), datos_geo.iterrows()):
             ciudad = row['ciudad']
-            
-            # Obtener top cliente
-            top_cliente_data = top_clientes_por_ciudad[top_clientes_por_ciudad['ciudad'] == ciudad]
-            top_cliente = None
-            if not top_cliente_data.empty:
-                top_row = top_cliente_data.iloc[0]
-                top_cliente = {
-                    'nit': top_row['nit_cliente'],
-                    'nombre': top_row['nombre_cliente'] if pd.notna(top_row['nombre_cliente']) else top_row['nit_cliente'],
-                    'total_ventas': float(top_row['total'])
-                }
-            
-            # Obtener top referencia
-            top_referencia = top_refs_por_ciudad.get(ciudad) if not referencia else None
-            
-            # Obtener todos los clientes que compran la referencia (si hay filtro)
-            clientes_referencia = clientes_por_referencia_ciudad.get(ciudad, []) if referencia else None
-            
-            # Buscar coordenadas (optimizado)
-            ciudad_lower = ciudad.lower().strip()
-            coords = ciudad_a_coordenadas_lower.get(ciudad_lower) or ciudad_a_coordenadas.get(ciudad) or ciudad_a_coordenadas.get(ciudad.title()) or {}
+            clientes_ciudad = clientes_por_ciudad.get(ciudad, [])
+            encontrada = pd.notna(geo['lat'])
             
             ciudad_data = {
                 'ciudad': ciudad,
-                'departamento': coords.get('departamento', '') if coords else '',
-                'lat': coords.get('lat') if coords else None,
-                'lon': coords.get('lon') if coords else None,
-                'total_ventas': float(row['total_ventas']),
+                'departamento': geo['departamento'] if encontrada else '',
+                'lat': geo['lat'] if encontrada else None,
+                'lon': geo['lon'] if encontrada else None,
+                'total_ventas': float(row['total']),
                 'num_clientes': int(row['num_clientes']),
                 'num_referencias': int(row['num_referencias']),
-                'top_cliente': top_cliente,
-                'top_referencia': top_referencia
+                'top_cliente': clientes_ciudad[0] if clientes_ciudad else None,
+                'top_referencia': top_refs_por_ciudad.get(ciudad) if not referencia else None
             }
             
             # Si hay una referencia seleccionada, agregar todos los clientes que la compran
-            if referencia and clientes_referencia:
-                ciudad_data['clientes_referencia'] = clientes_referencia
+            if referencia and clientes_ciudad:
+                ciudad_data['clientes_referencia'] = clientes_ciudad
             
             ciudades_data.append(ciudad_data)
         
         # Ordenar por ventas descendente
         ciudades_data.sort(key=lambda x: x['total_ventas'], reverse=True)
         
-        total_time = time.time() - start_time
-        print(f"✅ Procesamiento completado en {total_time:.2f}s")
         print(f"📊 Ciudades procesadas: {len(ciudades_data)}, Referencias: {len(referencias_disponibles)}")
         
         return limpiar_nan_para_json({
@@ -1229,58 +442,10 @@ async def get_mapa_interactivo(referencia: Optional[str] = Query(None, descripti
 async def get_meses_disponibles():
     """Obtiene la lista de meses disponibles en la base de datos"""
     try:
-        from database.queries import DatabaseManager
-        from supabase import create_client
-        from config.settings import AppConfig
-        import pandas as pd
-        from datetime import datetime
-        
-        env_status = AppConfig.validate_environment()
-        if not env_status["valid"]:
-            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
-        
-        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
-        db_manager = DatabaseManager(supabase)
-        
-        df = db_manager._cargar_datos_raw()
-        
-        if df.empty:
-            return {"meses": []}
-        
-        # Convertir fecha_factura a datetime
-        df['fecha_factura'] = pd.to_datetime(df['fecha_factura'], errors='coerce')
-        
-        # Obtener meses únicos
-        df['mes_factura'] = df['fecha_factura'].dt.to_period('M').astype(str)
-        meses_unicos = df['mes_factura'].dropna().unique()
-        
-        # Ordenar meses de más reciente a más antiguo
-        meses_ordenados = sorted(meses_unicos, reverse=True)
-        
-        # Formatear meses para mostrar (en español)
-        nombres_meses_es = {
-            1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril",
-            5: "Mayo", 6: "Junio", 7: "Julio", 8: "Agosto",
-            9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
-        }
-        
-        meses_formateados = []
-        for mes in meses_ordenados:
-            try:
-                fecha = datetime.strptime(mes, "%Y-%m")
-                nombre_mes = f"{nombres_meses_es[fecha.month]} {fecha.year}"  # "Noviembre 2024"
-                nombre_mes_corto = f"{nombres_meses_es[fecha.month][:3]} {fecha.year}"  # "Nov 2024"
-                meses_formateados.append({
-                    "valor": mes,  # "2024-11"
-                    "nombre": nombre_mes,  # "Noviembre 2024"
-                    "nombre_corto": nombre_mes_corto,  # "Nov 2024"
-                    "año": fecha.year,
-                    "mes_numero": fecha.month
-                })
-            except:
-                continue
-        
-        return {"meses": meses_formateados}
+        _, contexto = _contexto_dashboard()
+        return {"meses": contexto.meses()}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo meses disponibles: {str(e)}")
 
@@ -1288,93 +453,9 @@ async def get_meses_disponibles():
 async def get_clientes_clave(mes: str = None):
     """Obtiene los clientes clave para el dashboard filtrados por mes (solo clientes propios)"""
     try:
-        from database.queries import DatabaseManager
-        from supabase import create_client
-        from config.settings import AppConfig
-        from datetime import date
-        import pandas as pd
-
-        env_status = AppConfig.validate_environment()
-        if not env_status["valid"]:
-            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
-        
-        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
-        db_manager = DatabaseManager(supabase)
-        
-        df = db_manager._cargar_datos_raw()
-        
-        if df.empty:
-            return {"clientes_clave": []}
-        
-        # Convertir fecha_factura a datetime
-        df['fecha_factura'] = pd.to_datetime(df['fecha_factura'], errors='coerce')
-        df['mes_factura'] = df['fecha_factura'].dt.to_period('M').astype(str)
-        
-        # Filtrar solo clientes propios
-        df_propios = df[
-            (df.get('cliente_propio', False) == True)
-        ].copy()
-        
-        # Si se especifica un mes, filtrar por ese mes
-        if mes:
-            mes_filtro = mes  # Formato: "2024-12"
-            df_propios = df_propios[df_propios['mes_factura'] == mes_filtro].copy()
-        # Si mes es None, mostrar todos los meses (no filtrar)
-        
-        if df_propios.empty:
-            return {"clientes_clave": []}
-        
-        # Calcular valor neto sin IVA y menos descuentos para cada factura
-        # valor_neto ya es sin IVA, pero debemos restar valor_descuento_pesos si existe
-        if 'valor_neto' not in df_propios.columns:
-            # Si no hay valor_neto, calcularlo desde valor (sin IVA, sin flete)
-            if 'valor_flete' in df_propios.columns:
-                df_propios['valor_neto'] = (df_propios['valor'] - df_propios['valor_flete'].fillna(0)) / 1.19
-            else:
-                df_propios['valor_neto'] = df_propios['valor'] / 1.19
-        
-        # Restar descuentos en pesos si existen
-        if 'valor_descuento_pesos' in df_propios.columns:
-            df_propios['valor_neto_ajustado'] = df_propios['valor_neto'] - df_propios['valor_descuento_pesos'].fillna(0)
-        else:
-            df_propios['valor_neto_ajustado'] = df_propios['valor_neto']
-        
-        # Asegurar que no sea negativo
-        df_propios['valor_neto_ajustado'] = df_propios['valor_neto_ajustado'].clip(lower=0)
-        
-        # Agrupar por cliente y calcular métricas del mes
-        clientes_stats = df_propios.groupby('cliente').agg({
-            'valor_neto_ajustado': 'sum',  # Valor neto sin IVA y menos descuentos
-            'fecha_factura': 'max',
-            'id': 'count'
-        }).reset_index()
-        
-        clientes_stats.columns = ['cliente', 'total_ventas', 'ultima_compra', 'num_facturas']
-        
-        # Ordenar por total de ventas
-        clientes_stats = clientes_stats.sort_values('total_ventas', ascending=False).head(10)
-        
-        # Formatear resultados
-        resultado = []
-        for _, row in clientes_stats.iterrows():
-            # Obtener iniciales del cliente
-            nombre = str(row['cliente'])
-            palabras = nombre.split()
-            iniciales = ''.join([p[0].upper() for p in palabras[:3] if p and len(p) > 0])
-            
-            # Limpiar NaN
-            total_ventas_limpio = float(row['total_ventas']) if not pd.isna(row['total_ventas']) else 0
-            ultima_compra_limpio = row['ultima_compra'].strftime('%Y-%m-%d') if pd.notna(row['ultima_compra']) else 'N/A'
-            num_facturas_limpio = int(row['num_facturas']) if not pd.isna(row['num_facturas']) else 0
-            
-            resultado.append({
-                "cliente": nombre,
-                "iniciales": iniciales[:4] if iniciales else 'N/A',
-                "total_ventas": total_ventas_limpio,  # Ahora es valor_neto - descuentos
-                "ultima_compra": ultima_compra_limpio,
-                "num_facturas": num_facturas_limpio
-            })
-        
-        return limpiar_nan_para_json({"clientes_clave": resultado})
+        _, contexto = _contexto_dashboard(mes)
+        return limpiar_nan_para_json({"clientes_clave": contexto.clientes_clave(mes)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Query
+from app.tracing import RutaTrazada
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from datetime import datetime, date
 import sys
 import os
 from dotenv import load_dotenv
@@ -12,7 +12,7 @@ sys.path.insert(0, project_root)
 
 load_dotenv()
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
 
 # Modelos Pydantic
 class DevolucionCreate(BaseModel):
@@ -351,13 +351,51 @@ async def get_facturas_disponibles() -> List[Dict[str, Any]]:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error obteniendo facturas: {str(e)}")
 
+@router.get("/totales-mes")
+async def get_totales_devoluciones_por_mes() -> Dict[str, Any]:
+    """
+    Totales de devoluciones por mes, servidos desde el libro de devoluciones
+    """
+    try:
+        from database.return_ledger import get_return_ledger
+        from supabase import create_client
+        from config.settings import AppConfig
+
+        env_status = AppConfig.validate_environment()
+        if not env_status["valid"]:
+            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
+
+        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
+        por_mes = get_return_ledger(supabase).totales_por_mes()
+
+        meses = [
+            {
+                "mes": fila.mes,
+                "valor_devuelto": float(fila.valor_devuelto),
+                "valor_afecta_comision": float(fila.valor_afecta_comision),
+                "num_devoluciones": int(fila.num_devoluciones),
+                "num_facturas": int(fila.num_facturas)
+            }
+            for fila in por_mes.itertuples(index=False)
+        ]
+        return {
+            "meses": meses,
+            "total_valor_devuelto": float(sum(m["valor_devuelto"] for m in meses)),
+            "total_devoluciones": sum(m["num_devoluciones"] for m in meses)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error obteniendo totales de devoluciones: {str(e)}")
+
 @router.post("")
 async def crear_devolucion(devolucion_data: DevolucionCreate) -> Dict[str, Any]:
     """
     Crea una nueva devolución
     """
     try:
-        from database.queries import DatabaseManager
+        from database.return_ledger import get_return_ledger
         from supabase import create_client
         from config.settings import AppConfig
 
@@ -366,77 +404,105 @@ async def crear_devolucion(devolucion_data: DevolucionCreate) -> Dict[str, Any]:
             raise HTTPException(status_code=500, detail="Faltan variables de entorno")
         
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
-        db_manager = DatabaseManager(supabase)
         
         # Validar que la factura existe
-        factura = supabase.table("comisiones").select("*").eq("id", devolucion_data.factura_id).execute()
+        factura = supabase.table("comisiones").select("id, pedido, cliente, factura, valor").eq("id", devolucion_data.factura_id).execute()
         if not factura.data:
             raise HTTPException(status_code=404, detail="Factura no encontrada")
         
-        # Preparar datos
-        data = {
+        # Insertar devolución (el libro ajusta la comisión de la factura)
+        insertadas = get_return_ledger(supabase).registrar([{
             "factura_id": devolucion_data.factura_id,
             "valor_devuelto": float(devolucion_data.valor_devuelto),
             "fecha_devolucion": devolucion_data.fecha_devolucion,
             "motivo": devolucion_data.motivo or '',
             "afecta_comision": devolucion_data.afecta_comision
-        }
+        }])
         
-        # Insertar devolución
-        success = db_manager.insertar_devolucion(data)
-        
-        if not success:
+        if not insertadas:
             raise HTTPException(status_code=400, detail="Error creando devolución")
         
-        # Obtener la devolución creada
-        response = supabase.table("devoluciones").select("""
-            *,
-            comisiones!devoluciones_factura_id_fkey(
-                pedido,
-                cliente,
-                factura,
-                valor
-            )
-        """).order("id", desc=True).limit(1).execute()
-        
-        if response.data:
-            devolucion = response.data[0]
-            return {
-                "success": True,
-                "mensaje": "Devolución creada exitosamente",
-                "devolucion": devolucion
+        factura_actual = factura.data[0]
+        return {
+            "success": True,
+            "mensaje": "Devolución creada exitosamente",
+            "devolucion": {
+                **insertadas[0],
+                "comisiones": {campo: factura_actual.get(campo) for campo in ("pedido", "cliente", "factura", "valor")}
             }
-        
-        return {"success": True, "mensaje": "Devolución creada exitosamente"}
+        }
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creando devolución: {str(e)}")
 
-@router.put("/{devolucion_id}")
-async def actualizar_devolucion(devolucion_id: int, devolucion_data: DevolucionUpdate) -> Dict[str, Any]:
+@router.post("/lote")
+async def crear_devoluciones_lote(devoluciones: List[DevolucionCreate]) -> Dict[str, Any]:
     """
-    Actualiza una devolución existente
+    Registra varias devoluciones de una vez (un insert por lote)
     """
     try:
+        from database.return_ledger import get_return_ledger, LOTE_FACTURAS
         from supabase import create_client
         from config.settings import AppConfig
 
+        if not devoluciones:
+            raise HTTPException(status_code=400, detail="No hay devoluciones para registrar")
+
         env_status = AppConfig.validate_environment()
         if not env_status["valid"]:
             raise HTTPException(status_code=500, detail="Faltan variables de entorno")
         
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
-        # Verificar que la devolución existe
-        devolucion_actual = supabase.table("devoluciones").select("*").eq("id", devolucion_id).execute()
-        if not devolucion_actual.data:
-            raise HTTPException(status_code=404, detail="Devolución no encontrada")
+        # Validar que todas las facturas existen
+        factura_ids = sorted({d.factura_id for d in devoluciones})
+        existentes = set()
+        for inicio in range(0, len(factura_ids), LOTE_FACTURAS):
+            lote = factura_ids[inicio:inicio + LOTE_FACTURAS]
+            respuesta = supabase.table("comisiones").select("id").in_("id", lote).execute()
+            existentes.update(f["id"] for f in respuesta.data or [])
+        faltantes = [f for f in factura_ids if f not in existentes]
+        if faltantes:
+            raise HTTPException(status_code=404, detail=f"Facturas no encontradas: {faltantes}")
+        
+        insertadas = get_return_ledger(supabase).registrar([
+            {
+                "factura_id": d.factura_id,
+                "valor_devuelto": float(d.valor_devuelto),
+                "fecha_devolucion": d.fecha_devolucion,
+                "motivo": d.motivo or '',
+                "afecta_comision": d.afecta_comision
+            }
+            for d in devoluciones
+        ])
         
-        factura_id = devolucion_actual.data[0]['factura_id']
-        valor_original = devolucion_actual.data[0]['valor_devuelto']
-        afecta_original = devolucion_actual.data[0].get('afecta_comision', True)
+        return {
+            "success": True,
+            "mensaje": f"{len(insertadas)} devoluciones registradas",
+            "total_registradas": len(insertadas),
+            "devoluciones": insertadas
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error registrando devoluciones: {str(e)}")
+
+@router.put("/{devolucion_id}")
+async def actualizar_devolucion(devolucion_id: int, devolucion_data: DevolucionUpdate) -> Dict[str, Any]:
+    """
+    Actualiza una devolución existente
+    """
+    try:
+        from database.return_ledger import get_return_ledger
+        from supabase import create_client
+        from config.settings import AppConfig
+
+        env_status = AppConfig.validate_environment()
+        if not env_status["valid"]:
+            raise HTTPException(status_code=500, detail="Faltan variables de entorno")
         
         # Preparar datos de actualización
         update_data = {}
@@ -452,25 +518,18 @@ async def actualizar_devolucion(devolucion_id: int, devolucion_data: DevolucionU
         if not update_data:
             raise HTTPException(status_code=400, detail="No hay campos para actualizar")
         
-        update_data['updated_at'] = datetime.now().isoformat()
-        
-        # Actualizar
-        resultado = supabase.table("devoluciones").update(update_data).eq("id", devolucion_id).execute()
+        supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
-        if not resultado.data:
-            raise HTTPException(status_code=400, detail="Error actualizando devolución")
+        # Actualizar (el libro ajusta la comisión de la factura)
+        devolucion = get_return_ledger(supabase).actualizar(devolucion_id, update_data)
         
-        # Si cambió afecta_comision o valor_devuelto, recalcular comisión
-        if (devolucion_data.afecta_comision is not None and devolucion_data.afecta_comision != afecta_original) or \
-           (devolucion_data.valor_devuelto is not None and devolucion_data.valor_devuelto != valor_original):
-            from database.queries import DatabaseManager
-            db_manager = DatabaseManager(supabase)
-            db_manager._actualizar_comision_por_devolucion(factura_id, update_data.get('valor_devuelto', valor_original))
+        if devolucion is None:
+            raise HTTPException(status_code=404, detail="Devolución no encontrada")
         
         return {
             "success": True,
             "mensaje": "Devolución actualizada exitosamente",
-            "devolucion": resultado.data[0]
+            "devolucion": devolucion
         }
         
     except HTTPException:
@@ -484,9 +543,9 @@ async def eliminar_devolucion(devolucion_id: int) -> Dict[str, Any]:
     Elimina una devolución
     """
     try:
+        from database.return_ledger import get_return_ledger
         from supabase import create_client
         from config.settings import AppConfig
-        from database.queries import DatabaseManager
 
         env_status = AppConfig.validate_environment()
         if not env_status["valid"]:
@@ -494,27 +553,11 @@ async def eliminar_devolucion(devolucion_id: int) -> Dict[str, Any]:
         
         supabase = create_client(AppConfig.SUPABASE_URL, AppConfig.SUPABASE_KEY)
         
-        # Obtener devolución antes de eliminar
-        devolucion = supabase.table("devoluciones").select("*").eq("id", devolucion_id).execute()
-        if not devolucion.data:
-            raise HTTPException(status_code=404, detail="Devolución no encontrada")
-        
-        factura_id = devolucion.data[0]['factura_id']
-        afecta_comision = devolucion.data[0].get('afecta_comision', True)
-        
-        # Eliminar
-        resultado = supabase.table("devoluciones").delete().eq("id", devolucion_id).execute()
+        # Eliminar (el libro ajusta la comisión de la factura)
+        devolucion = get_return_ledger(supabase).eliminar(devolucion_id)
         
-        if not resultado.data:
-            raise HTTPException(status_code=400, detail="Error eliminando devolución")
-        
-        # Si afectaba comisión, recalcular comisión de la factura
-        if afecta_comision:
-            db_manager = DatabaseManager(supabase)
-            # Obtener total de devoluciones restantes
-            devoluciones_restantes = supabase.table("devoluciones").select("valor_devuelto").eq("factura_id", factura_id).eq("afecta_comision", True).execute()
-            total_devuelto = sum([d['valor_devuelto'] for d in devoluciones_restantes.data]) if devoluciones_restantes.data else 0
-            db_manager._actualizar_comision_por_devolucion(factura_id, total_devuelto)
+        if devolucion is None:
+            raise HTTPException(status_code=404, detail="Devolución no encontrada")
         
         return {
             "success": True,
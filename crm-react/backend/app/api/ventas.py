@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from app.tracing import RutaTrazada
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 from datetime import datetime, date, timedelta
@@ -12,7 +13,7 @@ sys.path.insert(0, project_root)
 
 load_dotenv()
 
-router = APIRouter()
+router = APIRouter(route_class=RutaTrazada)
 
 # Modelo para nueva venta
 class NuevaVentaData(BaseModel):
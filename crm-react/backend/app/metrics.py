@@ -0,0 +1,110 @@
+"""
+Métricas en memoria del backend con salida en formato de texto de Prometheus
+
+Histogramas con cubetas fijas y etiquetas, sin dependencias externas. Cada
+proceso (worker de uvicorn) lleva sus propios valores; Prometheus los suma al
+consultar `/api/metrics` de cada uno.
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Cubetas por tipo de medida
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CUBETAS_CONSULTAS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+CUBETAS_FILAS = (0, 10, 100, 1_000, 10_000, 50_000, 100_000, 500_000)
+CUBETAS_BYTES = (1_000, 10_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float('inf'):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class Histograma:
+    """Histograma acumulativo con etiquetas (una serie por combinación de valores)"""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str], cubetas: Sequence[float]):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(sorted(cubetas))
+        self._lock = threading.Lock()
+        # valores de etiquetas -> (conteos por cubeta + desborde, suma)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observar(self, valor: float, **etiquetas: str):
+        clave = tuple(str(etiquetas.get(n, "")) for n in self.etiquetas)
+        posicion = bisect_left(self.cubetas, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = ([0] * (len(self.cubetas) + 1), [0.0])
+            serie[0][posicion] += 1
+            serie[1][0] += valor
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = [(clave, list(conteos), suma[0]) for clave, (conteos, suma) in sorted(self._series.items())]
+        for clave, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.cubetas + (float('inf'),), conteos):
+                acumulado += conteo
+                etiquetas = _etiquetas(self.etiquetas, clave, f'le="{_numero(limite)}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _etiquetas(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return lineas
+
+    def reiniciar(self):
+        with self._lock:
+            self._series.clear()
+
+
+# ========================================
+# MÉTRICAS DEL BACKEND
+# ========================================
+
+DURACION_PETICION = Histograma(
+    "crm_http_request_duration_seconds", "Duración total de la petición",
+    ("ruta", "metodo", "estado"), CUBETAS_SEGUNDOS
+)
+DURACION_ETAPA = Histograma(
+    "crm_http_stage_duration_seconds",
+    "Duración por etapa (fetch = Supabase, transform = resto del endpoint, serialize = respuesta JSON, u otras marcadas con etapa())",
+    ("ruta", "etapa"), CUBETAS_SEGUNDOS
+)
+CONSULTAS_SUPABASE = Histograma(
+    "crm_supabase_requests", "Consultas HTTP a Supabase por petición", ("ruta",), CUBETAS_CONSULTAS
+)
+FILAS_SUPABASE = Histograma(
+    "crm_supabase_rows", "Filas recibidas de Supabase por petición", ("ruta",), CUBETAS_FILAS
+)
+BYTES_RESPUESTA = Histograma(
+    "crm_http_response_bytes", "Tamaño del cuerpo de la respuesta", ("ruta",), CUBETAS_BYTES
+)
+
+METRICAS = (DURACION_PETICION, DURACION_ETAPA, CONSULTAS_SUPABASE, FILAS_SUPABASE, BYTES_RESPUESTA)
+
+
+def exponer_metricas() -> str:
+    """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)"""
+    lineas: List[str] = []
+    for metrica in METRICAS:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
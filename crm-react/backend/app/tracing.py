@@ -0,0 +1,287 @@
+"""
+Trazas por petición del backend (etapas, consultas a Supabase y tamaño de respuesta)
+
+- `TracingMiddleware` abre una traza por petición HTTP y al terminar registra
+  los histogramas de app.metrics y agrega la cabecera `Server-Timing`.
+- `RutaTrazada` (route_class de los routers) mide el endpoint y el manejador
+  completo de FastAPI, de donde salen las etapas de todos los endpoints:
+  fetch = tiempo en consultas a Supabase, transform = resto del endpoint,
+  serialize = validación y JSON de la respuesta.
+- `instrumentar_supabase()` cuenta consultas, filas y tiempo de las llamadas
+  HTTP a PostgREST hechas dentro de una traza.
+- `etapa("nombre")` mide tramos adicionales dentro de un endpoint.
+"""
+
+import functools
+import importlib.abc
+import importlib.util
+import inspect
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional
+
+from fastapi.routing import APIRoute
+
+from app.metrics import (
+    BYTES_RESPUESTA, CONSULTAS_SUPABASE, DURACION_ETAPA, DURACION_PETICION, FILAS_SUPABASE
+)
+
+# Ruta de las peticiones que no llegan a un endpoint (404, preflight CORS, ...)
+RUTA_DESCONOCIDA = "sin_ruta"
+
+_RANGO = re.compile(r'^(\d+)-(\d+)/')
+
+
+class Traza:
+    """Medidas de una petición"""
+
+    def __init__(self, metodo: str):
+        self.metodo = metodo
+        self.ruta = RUTA_DESCONOCIDA
+        self.etapas: Dict[str, float] = {}
+        self.consultas = 0
+        self.filas = 0
+        self.segundos_supabase = 0.0
+        self.segundos_endpoint: Optional[float] = None
+        self.segundos_manejador: Optional[float] = None
+        # Las consultas pueden llegar desde el threadpool de los endpoints síncronos
+        self._lock = threading.Lock()
+
+    def sumar_etapa(self, nombre: str, segundos: float):
+        with self._lock:
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+
+    def registrar_consulta(self, segundos: float, filas: int):
+        with self._lock:
+            self.consultas += 1
+            self.filas += filas
+            self.segundos_supabase += segundos
+
+    def etapas_finales(self) -> Dict[str, float]:
+        """Etapas medidas con etapa() más fetch/transform/serialize del endpoint"""
+        etapas = dict(self.etapas)
+        if self.segundos_endpoint is not None:
+            etapas['fetch'] = self.segundos_supabase
+            etapas['transform'] = max(self.segundos_endpoint - self.segundos_supabase, 0.0)
+            if self.segundos_manejador is not None:
+                etapas['serialize'] = max(self.segundos_manejador - self.segundos_endpoint, 0.0)
+        return etapas
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{nombre};dur={segundos * 1000:.1f}" for nombre, segundos in self.etapas_finales().items()
+        )
+
+    def registrar(self, segundos: float, estado: int, bytes_respuesta: int):
+        DURACION_PETICION.observar(segundos, ruta=self.ruta, metodo=self.metodo, estado=str(estado))
+        for nombre, duracion in self.etapas_finales().items():
+            DURACION_ETAPA.observar(duracion, ruta=self.ruta, etapa=nombre)
+        CONSULTAS_SUPABASE.observar(self.consultas, ruta=self.ruta)
+        FILAS_SUPABASE.observar(self.filas, ruta=self.ruta)
+        BYTES_RESPUESTA.observar(bytes_respuesta, ruta=self.ruta)
+
+
+_traza_actual: ContextVar[Optional[Traza]] = ContextVar("traza_crm", default=None)
+
+
+def traza_actual() -> Optional[Traza]:
+    """Traza de la petición en curso (None fuera de una petición)"""
+    return _traza_actual.get()
+
+
+@contextmanager
+def etapa(nombre: str):
+    """
+    Mide un tramo de un endpoint como etapa propia
+
+    Ejemplo:
+        with etapa("coordenadas"):
+            datos_geo = resolver_ciudades(...)
+    """
+    inicio = perf_counter()
+    try:
+        yield
+    finally:
+        traza = _traza_actual.get()
+        if traza is not None:
+            traza.sumar_etapa(nombre, perf_counter() - inicio)
+
+
+# ========================================
+# MIDDLEWARE Y RUTAS
+# ========================================
+
+class TracingMiddleware:
+    """Middleware ASGI: una traza por petición HTTP"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traza = Traza(scope.get("method", ""))
+        token = _traza_actual.set(traza)
+        inicio = perf_counter()
+        estado = 500
+        bytes_respuesta = 0
+
+        async def enviar(mensaje):
+            nonlocal estado, bytes_respuesta
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                timing = traza.server_timing()
+                if timing:
+                    mensaje["headers"] = list(mensaje.get("headers", [])) + [(b"server-timing", timing.encode())]
+            elif mensaje["type"] == "http.response.body":
+                bytes_respuesta += len(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _traza_actual.reset(token)
+            traza.registrar(perf_counter() - inicio, estado, bytes_respuesta)
+
+
+def _cronometrar(endpoint):
+    """Envuelve el endpoint para guardar su duración en la traza (conserva la firma para FastAPI)"""
+    def guardar(inicio: float):
+        traza = _traza_actual.get()
+        if traza is not None:
+            traza.segundos_endpoint = perf_counter() - inicio
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def medido(*args, **kwargs):
+            inicio = perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                guardar(inicio)
+        return medido
+
+    @functools.wraps(endpoint)
+    def medido_sincrono(*args, **kwargs):
+        inicio = perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            guardar(inicio)
+    return medido_sincrono
+
+
+class RutaTrazada(APIRoute):
+    """Ruta de FastAPI que mide endpoint y manejador (usar como route_class del APIRouter)"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _cronometrar(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        manejador = super().get_route_handler()
+
+        async def manejador_trazado(request):
+            traza = _traza_actual.get()
+            if traza is None:
+                return await manejador(request)
+            traza.ruta = self._plantilla(request.scope["path"])
+            inicio = perf_counter()
+            try:
+                return await manejador(request)
+            finally:
+                traza.segundos_manejador = perf_counter() - inicio
+
+        return manejador_trazado
+
+    def _plantilla(self, ruta_pedida: str) -> str:
+        """
+        Ruta con parámetros sin valores ("/api/clientes/{nit}"), para no crear una
+        serie por cliente. Según la versión de FastAPI, self.path puede no traer el
+        prefijo del router; se toma de los segmentos iniciales de la ruta pedida.
+        """
+        propios = [s for s in self.path.split('/') if s]
+        pedidos = [s for s in ruta_pedida.split('/') if s]
+        prefijo = pedidos[:max(len(pedidos) - len(propios), 0)]
+        if not prefijo:
+            return self.path
+        return '/' + '/'.join(prefijo) + self.path
+
+
+# ========================================
+# CONSULTAS A SUPABASE
+# ========================================
+
+def _filas_respuesta(respuesta) -> int:
+    """Filas de una respuesta de PostgREST según Content-Range ("0-999/*")"""
+    coincidencia = _RANGO.match(respuesta.headers.get("content-range", ""))
+    if not coincidencia:
+        return 0
+    return int(coincidencia.group(2)) - int(coincidencia.group(1)) + 1
+
+
+def instrumentar_supabase():
+    """
+    Mide las llamadas HTTP a PostgREST (/rest/v1/) hechas dentro de una traza
+
+    Envuelve httpx.Client.send, que usa el cliente síncrono de Supabase; fuera
+    de una petición no agrega trabajo. Llamarlo más de una vez no tiene efecto.
+    Si httpx aún no está cargado no lo importa (el arranque en frío no paga su
+    costo): lo instrumenta en cuanto el primer endpoint importe supabase.
+    """
+    if "httpx" in sys.modules:
+        _parchear_httpx(sys.modules["httpx"])
+    elif not any(isinstance(buscador, _InstrumentarAlImportar) for buscador in sys.meta_path):
+        sys.meta_path.insert(0, _InstrumentarAlImportar())
+
+
+class _InstrumentarAlImportar(importlib.abc.MetaPathFinder):
+    """Buscador de sys.meta_path que parchea httpx apenas termina de importarse"""
+
+    def find_spec(self, nombre, path=None, target=None):
+        if nombre != "httpx":
+            return None
+        # Fuera de la lista antes de buscar: el resto de buscadores resuelve el módulo
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(nombre)
+        if spec is None or spec.loader is None:
+            return spec
+
+        ejecutar = spec.loader.exec_module
+
+        def exec_module(modulo):
+            ejecutar(modulo)
+            _parchear_httpx(modulo)
+
+        spec.loader.exec_module = exec_module
+        return spec
+
+
+def _parchear_httpx(httpx):
+    """Envuelve httpx.Client.send una sola vez"""
+    original = httpx.Client.send
+    if getattr(original, "_crm_trazado", False):
+        return
+
+    @functools.wraps(original)
+    def send(self, request, *args, **kwargs):
+        traza = _traza_actual.get()
+        if traza is None or "/rest/v1/" not in request.url.path:
+            return original(self, request, *args, **kwargs)
+
+        inicio = perf_counter()
+        respuesta = None
+        try:
+            respuesta = original(self, request, *args, **kwargs)
+            return respuesta
+        finally:
+            filas = _filas_respuesta(respuesta) if respuesta is not None else 0
+            traza.registrar_consulta(perf_counter() - inicio, filas)
+
+    send._crm_trazado = True
+    httpx.Client.send = send
@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import sys
 import os
 from dotenv import load_dotenv
@@ -17,16 +17,24 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 sys.path.append(project_root)
 
 from app.api import dashboard, clientes, ventas, comisiones, analytics, devoluciones, catalogo
+from app.metrics import exponer_metricas
+from app.tracing import RutaTrazada, TracingMiddleware, instrumentar_supabase
 from config.settings import AppConfig
 
 # Cargar variables de entorno (busca .env si existe; en este repo se recomienda usar env.example como plantilla)
 load_dotenv()
 
+# La invalidación de database/cache.py es local a cada instancia: los datos
+# cacheados (y los libros en memoria) se revisan contra Supabase cada pocos segundos
+os.environ.setdefault("CACHE_TTL_MAXIMO", "10")
+
 app = FastAPI(
     title="CRM API",
     description="API para el sistema CRM - Reutiliza toda la lógica Python existente",
     version="1.0.0"
 )
+# Las rutas declaradas aquí también se miden (los routers de app/api ya usan RutaTrazada)
+app.router.route_class = RutaTrazada
 
 # CORS - Permitir llamadas desde el frontend React
 # Detectar si estamos en producción (Vercel)
@@ -67,6 +75,10 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Trazas por petición: etapas, consultas a Supabase y tamaño de respuesta (ver /api/metrics)
+app.add_middleware(TracingMiddleware)
+instrumentar_supabase()
+
 # Incluir routers
 app.include_router(dashboard.router, prefix="/api/dashboard", tags=["dashboard"])
 app.include_router(clientes.router, prefix="/api/clientes", tags=["clientes"])
@@ -84,6 +96,11 @@ def root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Histogramas de duración, etapas, consultas a Supabase y bytes por ruta (formato Prometheus)"""
+    return PlainTextResponse(exponer_metricas(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/health/db")
 def health_check_db():
     """
@@ -6,6 +6,14 @@ export const getDashboardMetrics = async (mes = null) => {
   return response.data
 }
 
+export const getDashboardBundle = async (mes = null, secciones = null) => {
+  const params = {}
+  if (mes) params.mes = mes
+  if (secciones) params.secciones = secciones.join(',')
+  const response = await apiClient.get('/dashboard/bundle', { params })
+  return response.data
+}
+
 export const getSalesChart = async () => {
   const response = await apiClient.get('/dashboard/sales-chart')
   return response.data
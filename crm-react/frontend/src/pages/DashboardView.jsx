@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import { TrendingUp, DollarSign, Users, Package, ArrowUpRight, Loader2, FileText, X } from 'lucide-react'
-import { getDashboardMetrics, getSalesChart, getClientesClave, getMesesDisponibles } from '../api/dashboard'
+import { getDashboardBundle, getMesesDisponibles } from '../api/dashboard'
 import { getMetricsDirecto } from '../utils/supabaseClient'
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts'
 
@@ -72,14 +72,10 @@ const DashboardView = () => {
       
       try {
         console.log('📡 Intentando conectar con backend...', mesSeleccionado ? `(Mes: ${mesSeleccionado})` : '')
-        const [metricsData, salesChartData, clientesClaveData] = await Promise.all([
-          getDashboardMetrics(mesSeleccionado),
-          getSalesChart(),
-          getClientesClave(mesSeleccionado)
-        ])
-        data = metricsData
-        salesData = salesChartData
-        clientesData = clientesClaveData
+        const bundle = await getDashboardBundle(mesSeleccionado, ['metricas', 'grafico_ventas', 'clientes_clave'])
+        data = bundle.metricas
+        salesData = bundle.grafico_ventas
+        clientesData = bundle.clientes_clave
         
         console.log('✅ Datos cargados desde backend', { mes: mesSeleccionado, metrics: data })
       } catch (backendError) {
@@ -0,0 +1,412 @@
+"""
+Capa de agregación en el servidor (pushdown de GROUP BY)
+
+Cada agregado es una consulta SQL con nombre que agrupa en la base de datos y
+devuelve solo las filas agregadas. El mismo SQL se ejecuta en dos backends:
+
+- SupabaseAggregationBackend: funciones RPC `agg_<nombre>` en Postgres (ver
+  crear_funciones_agregacion.sql, generado con `python -m database.aggregations`).
+  Si la función aún no existe se calcula localmente a partir de las tablas
+  paginadas, con un aviso.
+- LocalAggregationBackend: SQLite en memoria cargado desde archivos de
+  snapshot (`data/snapshots/<tabla>.csv|parquet`) o desde DataFrames; sirve
+  para pruebas y uso sin conexión.
+
+En el SQL, `:param` es un parámetro y `{ts:param}` el mismo parámetro
+interpretado como fecha (cada backend lo traduce a su dialecto).
+
+Uso:
+    agregar(get_aggregation_backend(supabase), "compras_por_cliente", desde="2025-01-01")
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from database.cache import cache, DEFAULT_TTL
+
+DEFAULT_SNAPSHOT_DIR = os.getenv(
+    "AGGREGATION_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "snapshots")
+)
+
+# Columnas de fecha que el backend local normaliza a 'YYYY-MM-DD HH:MM:SS'
+COLUMNAS_FECHA = ("fecha", "fecha_factura", "fecha_pago_real", "fecha_carga")
+
+
+@dataclass(frozen=True)
+class Agregado:
+    """Consulta agregada con nombre, sus columnas de salida (tipos Postgres) y parámetros"""
+    nombre: str
+    sql: str
+    columnas: Tuple[Tuple[str, str], ...]
+    tablas: Tuple[str, ...]
+    parametros: Tuple[Tuple[str, str, Any], ...] = field(default_factory=tuple)
+
+    @property
+    def funcion(self) -> str:
+        return f"agg_{self.nombre}"
+
+    def argumentos(self, valores: Dict[str, Any]) -> Dict[str, Any]:
+        """Parámetros completos (con los valores por defecto) en el orden declarado"""
+        desconocidos = set(valores) - {p[0] for p in self.parametros}
+        if desconocidos:
+            raise ValueError(f"Parámetros desconocidos para {self.nombre}: {sorted(desconocidos)}")
+        return {nombre: valores.get(nombre, defecto) for nombre, _, defecto in self.parametros}
+
+
+def _filtro_compras(alias: str = "") -> str:
+    """Compras (sin devoluciones) desde la fecha `desde`"""
+    p = f"{alias}." if alias else ""
+    return (
+        f"COALESCE({p}es_devolucion, FALSE) = FALSE "
+        f"AND (:desde IS NULL OR {p}fecha >= {{ts:desde}})"
+    )
+
+
+_DESDE = ("desde", "text", None)
+
+AGREGADOS: Dict[str, Agregado] = {a.nombre: a for a in (
+    Agregado(
+        nombre="compras_resumen",
+        sql=f"""
+            SELECT CAST(COUNT(*) AS BIGINT) AS total_compras,
+                   CAST(COALESCE(SUM(total), 0) AS NUMERIC) AS valor_total,
+                   CAST(COUNT(DISTINCT nit_cliente) AS BIGINT) AS clientes_activos,
+                   CAST(COUNT(DISTINCT cod_articulo) AS BIGINT) AS referencias_unicas
+            FROM compras_clientes
+            WHERE {_filtro_compras()}
+        """,
+        columnas=(("total_compras", "bigint"), ("valor_total", "numeric"),
+                  ("clientes_activos", "bigint"), ("referencias_unicas", "bigint")),
+        tablas=("compras_clientes",),
+        parametros=(_DESDE,),
+    ),
+    Agregado(
+        nombre="compras_por_cliente",
+        sql=f"""
+            SELECT CAST(nit_cliente AS TEXT) AS nit_cliente,
+                   CAST(SUM(total) AS NUMERIC) AS total_compras,
+                   CAST(COUNT(*) AS BIGINT) AS num_transacciones,
+                   CAST(AVG(total) AS NUMERIC) AS ticket_promedio,
+                   CAST(MIN(fecha) AS TEXT) AS primera_compra,
+                   CAST(MAX(fecha) AS TEXT) AS ultima_compra
+            FROM compras_clientes
+            WHERE {_filtro_compras()} AND nit_cliente IS NOT NULL
+            GROUP BY nit_cliente
+            ORDER BY total_compras DESC, nit_cliente
+        """,
+        columnas=(("nit_cliente", "text"), ("total_compras", "numeric"), ("num_transacciones", "bigint"),
+                  ("ticket_promedio", "numeric"), ("primera_compra", "text"), ("ultima_compra", "text")),
+        tablas=("compras_clientes",),
+        parametros=(_DESDE,),
+    ),
+    Agregado(
+        nombre="compras_por_mes",
+        sql=f"""
+            SELECT SUBSTR(CAST(fecha AS TEXT), 1, 7) AS mes,
+                   CAST(SUM(total) AS NUMERIC) AS valor_total,
+                   CAST(COUNT(*) AS BIGINT) AS num_compras,
+                   CAST(COUNT(DISTINCT nit_cliente) AS BIGINT) AS clientes_activos
+            FROM compras_clientes
+            WHERE {_filtro_compras()} AND fecha IS NOT NULL
+            GROUP BY SUBSTR(CAST(fecha AS TEXT), 1, 7)
+            ORDER BY mes
+        """,
+        columnas=(("mes", "text"), ("valor_total", "numeric"), ("num_compras", "bigint"),
+                  ("clientes_activos", "bigint")),
+        tablas=("compras_clientes",),
+        parametros=(_DESDE,),
+    ),
+    Agregado(
+        nombre="compras_por_referencia",
+        sql=f"""
+            SELECT CAST(cod_articulo AS TEXT) AS codigo,
+                   CAST(SUM(total) AS NUMERIC) AS valor_total,
+                   CAST(COALESCE(SUM(cantidad), 0) AS NUMERIC) AS cantidad_total,
+                   CAST(COUNT(*) AS BIGINT) AS num_compras,
+                   CAST(COUNT(DISTINCT nit_cliente) AS BIGINT) AS clientes_unicos,
+                   CAST(MIN(detalle) AS TEXT) AS detalle,
+                   CAST(MIN(marca) AS TEXT) AS marca
+            FROM compras_clientes
+            WHERE {_filtro_compras()} AND cod_articulo IS NOT NULL
+            GROUP BY cod_articulo
+            ORDER BY valor_total DESC, codigo
+            LIMIT :limite
+        """,
+        columnas=(("codigo", "text"), ("valor_total", "numeric"), ("cantidad_total", "numeric"),
+                  ("num_compras", "bigint"), ("clientes_unicos", "bigint"), ("detalle", "text"),
+                  ("marca", "text")),
+        tablas=("compras_clientes",),
+        parametros=(_DESDE, ("limite", "integer", 100000)),
+    ),
+    Agregado(
+        nombre="compras_por_ciudad",
+        sql=f"""
+            SELECT CAST(c.ciudad AS TEXT) AS ciudad,
+                   CAST(SUM(cc.total) AS NUMERIC) AS total_compras,
+                   CAST(COUNT(DISTINCT cc.nit_cliente) AS BIGINT) AS num_clientes
+            FROM compras_clientes cc
+            JOIN clientes_b2b c ON c.nit = cc.nit_cliente
+            WHERE {_filtro_compras("cc")} AND c.ciudad IS NOT NULL AND c.ciudad <> ''
+            GROUP BY c.ciudad
+            ORDER BY total_compras DESC, ciudad
+        """,
+        columnas=(("ciudad", "text"), ("total_compras", "numeric"), ("num_clientes", "bigint")),
+        tablas=("compras_clientes", "clientes_b2b"),
+        parametros=(_DESDE,),
+    ),
+    Agregado(
+        # Cubo cliente x referencia x mes (ver database/purchase_cube.py)
+        nombre="cubo_compras",
+        sql=f"""
+            SELECT CAST(nit_cliente AS TEXT) AS nit_cliente,
+                   CAST(TRIM(cod_articulo) AS TEXT) AS cod_articulo,
+                   SUBSTR(CAST(fecha AS TEXT), 1, 7) AS mes,
+                   CAST(SUM(total) AS NUMERIC) AS total,
+                   CAST(COALESCE(SUM(cantidad), 0) AS NUMERIC) AS cantidad,
+                   CAST(COUNT(*) AS BIGINT) AS num_compras
+            FROM compras_clientes
+            WHERE {_filtro_compras()} AND fecha IS NOT NULL AND nit_cliente IS NOT NULL
+              AND cod_articulo IS NOT NULL AND TRIM(cod_articulo) NOT IN ('', 'N/A')
+            GROUP BY nit_cliente, TRIM(cod_articulo), SUBSTR(CAST(fecha AS TEXT), 1, 7)
+            ORDER BY nit_cliente, cod_articulo, mes
+        """,
+        columnas=(("nit_cliente", "text"), ("cod_articulo", "text"), ("mes", "text"),
+                  ("total", "numeric"), ("cantidad", "numeric"), ("num_compras", "bigint")),
+        tablas=("compras_clientes",),
+        parametros=(_DESDE,),
+    ),
+    Agregado(
+        # Ventas netas por cliente propio: sin IVA, después de descuentos y devoluciones
+        nombre="ventas_netas_por_cliente",
+        sql="""
+            SELECT CAST(cliente AS TEXT) AS cliente,
+                   CAST(SUM(CASE WHEN valor_final > 0 THEN valor_final ELSE 0 END) AS NUMERIC) AS total_compras
+            FROM (
+                SELECT cliente,
+                       COALESCE(valor_neto, 0) - COALESCE(valor_descuento_pesos, 0)
+                           - COALESCE(valor_devuelto, 0) / 1.19 AS valor_final
+                FROM comisiones
+                WHERE cliente_propio = TRUE
+                  AND (:desde IS NULL OR fecha_factura >= {ts:desde})
+                  AND (:hasta IS NULL OR fecha_factura <= {ts:hasta})
+            ) ventas
+            GROUP BY cliente
+            ORDER BY cliente
+        """,
+        columnas=(("cliente", "text"), ("total_compras", "numeric")),
+        tablas=("comisiones",),
+        parametros=(_DESDE, ("hasta", "text", None)),
+    ),
+)}
+
+
+# ========================================
+# DIALECTOS
+# ========================================
+
+_TS = re.compile(r"\{ts:(\w+)\}")
+_PARAM = re.compile(r"(?<!:):(\w+)")
+
+
+def sql_local(agregado: Agregado) -> str:
+    """SQL para SQLite (parámetros con nombre; fechas comparadas con datetime())"""
+    return _TS.sub(r"datetime(:\1)", agregado.sql)
+
+
+def sql_postgres(agregado: Agregado) -> str:
+    """Cuerpo de la función Postgres (los parámetros se referencian por nombre)"""
+    return _PARAM.sub(r"\1", _TS.sub(r"CAST(:\1 AS timestamp)", agregado.sql))
+
+
+def script_postgres() -> str:
+    """Script con todas las funciones RPC para el SQL Editor de Supabase"""
+    bloques = [
+        "-- Funciones de agregación (pushdown) usadas por database/aggregations.py",
+        "-- Generado con: python -m database.aggregations > database/crear_funciones_agregacion.sql",
+        "-- Ejecutar este script en Supabase SQL Editor",
+    ]
+    for agregado in AGREGADOS.values():
+        argumentos = ", ".join(
+            f"{nombre} {tipo} DEFAULT {'NULL' if defecto is None else defecto}"
+            for nombre, tipo, defecto in agregado.parametros
+        )
+        columnas = ",\n    ".join(f"{nombre} {tipo}" for nombre, tipo in agregado.columnas)
+        cuerpo = "\n".join(linea[8:] if linea.startswith(" " * 8) else linea for linea in sql_postgres(agregado).strip("\n").splitlines())
+        bloques.append(
+            f"\nCREATE OR REPLACE FUNCTION {agregado.funcion}({argumentos})\n"
+            f"RETURNS TABLE (\n    {columnas}\n)\n"
+            f"LANGUAGE sql STABLE AS $$\n{cuerpo.rstrip()}\n$$;"
+        )
+    bloques.append(
+        "\n-- Índices de apoyo\n"
+        "CREATE INDEX IF NOT EXISTS idx_compras_clientes_fecha ON compras_clientes(fecha);\n"
+        "CREATE INDEX IF NOT EXISTS idx_compras_clientes_nit ON compras_clientes(nit_cliente);"
+    )
+    return "\n".join(bloques) + "\n"
+
+
+# ========================================
+# BACKENDS
+# ========================================
+
+class LocalAggregationBackend:
+    """Agregados sobre SQLite en memoria (snapshots en disco o DataFrames)"""
+
+    nombre = "local"
+
+    def __init__(self, tablas: Optional[Dict[str, pd.DataFrame]] = None, directorio: Optional[str] = None):
+        self.directorio = directorio or DEFAULT_SNAPSHOT_DIR
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._cargadas: set = set()
+        for tabla, df in (tablas or {}).items():
+            self.cargar_tabla(tabla, df)
+
+    def cargar_tabla(self, tabla: str, df: pd.DataFrame):
+        """Reemplaza (o crea) una tabla con el contenido del DataFrame"""
+        df = df.copy()
+        for columna in df.columns:
+            if columna in COLUMNAS_FECHA or pd.api.types.is_datetime64_any_dtype(df[columna]):
+                fechas = pd.to_datetime(df[columna], errors='coerce')
+                if getattr(fechas.dt, 'tz', None) is not None:
+                    fechas = fechas.dt.tz_localize(None)
+                df[columna] = fechas.dt.strftime('%Y-%m-%d %H:%M:%S')
+            elif df[columna].dtype == object and df[columna].map(lambda v: isinstance(v, (list, dict))).any():
+                df[columna] = df[columna].astype(str)
+        with self._lock:
+            df.to_sql(tabla, self._conn, index=False, if_exists="replace")
+            self._cargadas.add(tabla)
+
+    def _asegurar_tablas(self, tablas: Tuple[str, ...]):
+        for tabla in tablas:
+            if tabla in self._cargadas:
+                continue
+            for extension, lector in ((".parquet", pd.read_parquet), (".csv", pd.read_csv)):
+                ruta = os.path.join(self.directorio, tabla + extension)
+                if os.path.exists(ruta):
+                    self.cargar_tabla(tabla, lector(ruta))
+                    break
+            else:
+                raise FileNotFoundError(f"No hay snapshot de '{tabla}' en {self.directorio}")
+
+    def consultar(self, agregado: Agregado, parametros: Dict[str, Any]) -> pd.DataFrame:
+        self._asegurar_tablas(agregado.tablas)
+        with self._lock:
+            return pd.read_sql_query(sql_local(agregado), self._conn, params=parametros)
+
+
+# Funciones RPC que faltan, por URL de Supabase (compartido entre instancias del
+# backend para no reintentar ni repetir el aviso en cada request)
+_rpc_faltantes = set()
+_rpc_faltantes_lock = threading.Lock()
+
+
+def _rpc_inexistente(error: Exception) -> bool:
+    """La función RPC no existe (PGRST202 de PostgREST o 404), no un fallo pasajero"""
+    codigo = str(getattr(error, "code", "") or "")
+    return codigo in ("PGRST202", "404") or "PGRST202" in str(error)
+
+
+class SupabaseAggregationBackend:
+    """Agregados como funciones RPC en Postgres; solo viajan las filas agregadas"""
+
+    nombre = "supabase"
+
+    # Columnas que necesita el cálculo local cuando la función RPC no existe
+    COLUMNAS_RESPALDO = {
+        "compras_clientes": "nit_cliente, cod_articulo, detalle, marca, fecha, total, cantidad, es_devolucion",
+        "clientes_b2b": "nit, ciudad",
+        "comisiones": "cliente, valor_neto, valor_descuento_pesos, valor_devuelto, fecha_factura, cliente_propio",
+    }
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self._respaldo: Optional[LocalAggregationBackend] = None
+
+    def consultar(self, agregado: Agregado, parametros: Dict[str, Any]) -> pd.DataFrame:
+        clave = (self._url(), agregado.funcion)
+        if clave not in _rpc_faltantes:
+            try:
+                filas = self._leer_paginado(lambda: self.supabase.rpc(agregado.funcion, parametros))
+                return pd.DataFrame(filas, columns=[c for c, _ in agregado.columnas])
+            except Exception as e:
+                # Solo una función inexistente cambia al cálculo local; un error de red o
+                # un timeout se propaga para no descargar tablas completas en cada llamada
+                if not _rpc_inexistente(e):
+                    raise
+                print(f"⚠️ RPC {agregado.funcion} no disponible, se agrega localmente: {e}")
+                with _rpc_faltantes_lock:
+                    _rpc_faltantes.add(clave)
+        return self._consultar_respaldo(agregado, parametros)
+
+    def _url(self):
+        return getattr(self.supabase, "supabase_url", None) or id(self.supabase)
+
+    def _consultar_respaldo(self, agregado: Agregado, parametros: Dict[str, Any]) -> pd.DataFrame:
+        respaldo = LocalAggregationBackend()
+        for tabla in agregado.tablas:
+            columnas = self.COLUMNAS_RESPALDO.get(tabla, "*")
+            filas = self._leer_paginado(lambda: self.supabase.table(tabla).select(columnas))
+            respaldo.cargar_tabla(tabla, pd.DataFrame(filas, columns=[c.strip() for c in columnas.split(",")]))
+        return respaldo.consultar(agregado, parametros)
+
+    @staticmethod
+    def _leer_paginado(construir_consulta) -> List[Dict[str, Any]]:
+        all_data = []
+        page_size = 1000
+        offset = 0
+
+        while True:
+            response = construir_consulta().range(offset, offset + page_size - 1).execute()
+
+            if not response.data:
+                break
+
+            all_data.extend(response.data)
+
+            if len(response.data) < page_size:
+                break
+
+            offset += page_size
+
+        return all_data
+
+
+def get_aggregation_backend(supabase=None):
+    """Backend según AGGREGATION_BACKEND ('supabase' por defecto si hay cliente, 'local' usa snapshots)"""
+    backend = os.getenv("AGGREGATION_BACKEND", "supabase").lower()
+    if backend == "supabase" and supabase is not None:
+        return SupabaseAggregationBackend(supabase)
+    return LocalAggregationBackend()
+
+
+def a_fecha(serie: pd.Series) -> pd.Series:
+    """Columna de fecha devuelta como texto por un agregado, sin zona horaria"""
+    # ISO8601: en una misma columna llegan marcas con y sin fracción de segundo
+    fechas = pd.to_datetime(serie, errors='coerce', utc=True, format='ISO8601')
+    return fechas.dt.tz_localize(None)
+
+
+def agregar(backend, nombre: str, ttl: float = DEFAULT_TTL, **parametros) -> pd.DataFrame:
+    """
+    Ejecuta el agregado `nombre` en el backend, cacheado hasta que cambien sus tablas
+
+    Returns:
+        DataFrame con las columnas declaradas del agregado
+    """
+    agregado = AGREGADOS[nombre]
+    argumentos = agregado.argumentos(parametros)
+    clave = ("agregado", backend.nombre, id(backend) if backend.nombre == "local" else None,
+             nombre, tuple(argumentos.items()))
+    return cache.get_or_load(clave, agregado.tablas, lambda: backend.consultar(agregado, argumentos), ttl)
+
+
+if __name__ == "__main__":
+    print(script_postgres(), end="")
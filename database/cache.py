@@ -0,0 +1,242 @@
+"""
+Caché de datos con invalidación por etiquetas (una etiqueta por tabla)
+
+Cada resultado cacheado guarda la versión de las tablas de las que depende. Una
+escritura llama a `invalidate("tabla")`, que solo incrementa el contador de esa
+tabla: las entradas que dependen de ella dejan de coincidir y el resto sigue
+vigente. Los contadores viven en SQLite para que Streamlit y el backend FastAPI
+(procesos distintos en la misma máquina) vean las mismas invalidaciones; si el
+archivo no se puede abrir se usan contadores en memoria.
+
+Las invalidaciones no cruzan máquinas: con varias instancias (FastAPI en
+Vercel) las escrituras de otra instancia o de Streamlit solo se ven al expirar
+el TTL, así que ese proceso acota todos los TTL con CACHE_TTL_MAXIMO.
+
+Uso:
+    @cached("comisiones", ttl=300)
+    def cargar_datos(_self): ...
+
+    invalidate("comisiones")
+
+Como en `st.cache_data`, los parámetros que empiezan por "_" no forman parte de
+la clave.
+"""
+
+import copy
+import functools
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+# Tablas con etiqueta propia
+TAGS = (
+    "comisiones",
+    "compras_clientes",
+    "clientes_b2b",
+    "catalogo_productos",
+    "devoluciones",
+    "metas_mensuales",
+)
+
+DEFAULT_TTL = 300
+
+# Tope de TTL en segundos para todo el proceso (vacío = sin tope)
+TTL_MAXIMO = os.getenv("CACHE_TTL_MAXIMO")
+
+DEFAULT_DB_PATH = os.getenv(
+    "CACHE_VERSIONS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache_versions.db")
+)
+
+
+class TagVersions:
+    """Contadores de versión por etiqueta, compartidos entre procesos vía SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            tag TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or DEFAULT_DB_PATH
+        self._lock = threading.Lock()
+        self._memoria: Dict[str, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            if self.db_path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+        except Exception as e:
+            print(f"⚠️ Versiones de caché solo en memoria ({self.db_path}): {e}")
+            self._conn = None
+
+    def get_many(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        tags = tuple(tags)
+        if not tags:
+            return ()
+        with self._lock:
+            if self._conn is None:
+                return tuple(self._memoria.get(t, 0) for t in tags)
+            try:
+                rows = self._conn.execute(
+                    f"SELECT tag, version FROM cache_versions WHERE tag IN ({','.join('?' * len(tags))})",
+                    tags
+                ).fetchall()
+            except sqlite3.Error:
+                return tuple(self._memoria.get(t, 0) for t in tags)
+        versiones = dict(rows)
+        return tuple(versiones.get(t, 0) for t in tags)
+
+    def get(self, tag: str) -> int:
+        return self.get_many((tag,))[0]
+
+    def bump(self, *tags: str):
+        if not tags:
+            return
+        with self._lock:
+            for tag in tags:
+                self._memoria[tag] = self._memoria.get(tag, 0) + 1
+            if self._conn is None:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT INTO cache_versions (tag, version) VALUES (?, 1) "
+                    "ON CONFLICT(tag) DO UPDATE SET version = version + 1",
+                    [(t,) for t in tags]
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ No se pudo registrar la invalidación de {tags}: {e}")
+
+
+class TaggedCache:
+    """Resultados en memoria (LRU acotado) indexados por clave y versión de sus etiquetas"""
+
+    def __init__(self, versions: Optional[TagVersions] = None, max_entries: int = 256):
+        self._versions = versions
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, Tuple[Tuple[int, ...], float, Any]]" = OrderedDict()
+        self.ttl_maximo: Optional[float] = float(TTL_MAXIMO) if TTL_MAXIMO else None
+
+    @property
+    def versions(self) -> TagVersions:
+        # Se crea al primer uso para no tocar disco al importar
+        if self._versions is None:
+            with self._lock:
+                if self._versions is None:
+                    self._versions = TagVersions()
+        return self._versions
+
+    def version(self, tag: str) -> int:
+        """Versión actual de una etiqueta"""
+        return self.versions.get(tag)
+
+    def ttl_efectivo(self, ttl: float) -> float:
+        """TTL pedido, acotado por el tope del proceso"""
+        return ttl if self.ttl_maximo is None else min(ttl, self.ttl_maximo)
+
+    def get_or_load(self, key: Any, tags: Tuple[str, ...], loader: Callable[[], Any], ttl: float = DEFAULT_TTL) -> Any:
+        """Devuelve la entrada vigente para `key` o la carga con `loader`"""
+        ttl = self.ttl_efectivo(ttl)
+        # La versión se lee antes de cargar: si otra escritura llega durante la
+        # carga, la entrada queda con la versión vieja y no se reutiliza
+        versiones = self.versions.get_many(tags)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entries.get(key)
+            if entrada is not None:
+                if entrada[0] == versiones and ahora - entrada[1] < ttl:
+                    self._entries.move_to_end(key)
+                    return _copiar(entrada[2])
+                del self._entries[key]
+
+        valor = loader()
+
+        with self._lock:
+            self._entries[key] = (versiones, time.monotonic(), valor)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return _copiar(valor)
+
+    def invalidate(self, *tags: str):
+        """Invalida solo los datos que dependen de las etiquetas dadas"""
+        desconocidas = [t for t in tags if t not in TAGS]
+        if desconocidas:
+            raise ValueError(f"Etiquetas de caché desconocidas: {desconocidas}")
+        self.versions.bump(*tags)
+
+    def clear(self):
+        """Descarta todas las entradas de este proceso"""
+        with self._lock:
+            self._entries.clear()
+
+
+def _copiar(valor: Any) -> Any:
+    """Copia defensiva: quien llama puede mutar el DataFrame sin alterar la caché"""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+    if isinstance(valor, (dict, list, set)):
+        return copy.deepcopy(valor)
+    return valor
+
+
+def _clave_argumento(valor: Any) -> Any:
+    try:
+        hash(valor)
+        return valor
+    except TypeError:
+        return repr(valor)
+
+
+# Caché del proceso (compartida por todas las sesiones de Streamlit y los requests de FastAPI)
+cache = TaggedCache()
+
+
+def cached(*tags: str, ttl: float = DEFAULT_TTL):
+    """Decorador: cachea el resultado hasta que expire o se invalide alguna de `tags`"""
+    desconocidas = [t for t in tags if t not in TAGS]
+    if desconocidas:
+        raise ValueError(f"Etiquetas de caché desconocidas: {desconocidas}")
+
+    def decorator(func):
+        firma = inspect.signature(func)
+        nombre = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ligados = firma.bind(*args, **kwargs)
+            ligados.apply_defaults()
+            clave = (nombre,) + tuple(
+                (k, _clave_argumento(v)) for k, v in ligados.arguments.items() if not k.startswith("_")
+            )
+            return cache.get_or_load(clave, tags, lambda: func(*args, **kwargs), ttl)
+
+        wrapper.tags = tags
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags: str):
+    """Invalida las etiquetas dadas (llamar después de escribir en esas tablas)"""
+    cache.invalidate(*tags)
+
+
+def invalidate_all():
+    """Invalida todas las etiquetas (equivalente a limpiar toda la caché)"""
+    cache.invalidate(*TAGS)
+    cache.clear()
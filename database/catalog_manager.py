@@ -1,10 +1,109 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from supabase import Client
-import streamlit as st
 from typing import Dict, List, Any, Optional
 import os
 
+from database.cache import cached, invalidate
+from utils.formatting import normalize_text
+from utils.lazy_imports import modulo_diferido
+
+# Solo para mensajes: se importa al mostrar el primero (ver utils/lazy_imports.py)
+st = modulo_diferido("streamlit")
+
+# Máximo de opciones que se envían al selector de productos (el resto se alcanza escribiendo)
+MAX_OPCIONES_SELECTOR = 100
+
+
+def _columna_texto(df: pd.DataFrame, *nombres: str) -> pd.Series:
+    """Primera columna no vacía entre `nombres` (minúsculas de la BD o nombres del Excel)"""
+    resultado = pd.Series('', index=df.index, dtype=object)
+    for nombre in reversed(nombres):
+        if nombre in df.columns:
+            valores = df[nombre].fillna('').astype(str).str.strip()
+            resultado = valores.where(valores != '', resultado)
+    return resultado
+
+
+class CatalogOptionIndex:
+    """
+    Índice precalculado del catálogo para el selector de productos
+
+    Se construye una vez por versión del catálogo: etiquetas de cada producto,
+    texto normalizado para la búsqueda y posición por cod_ur. Las opciones del
+    selector son posiciones en `df`, así que elegir un producto no copia filas.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+
+        cod_ur = _columna_texto(self.df, 'cod_ur', 'Cod_UR')
+        referencia = _columna_texto(self.df, 'referencia', 'Referencia')
+        descripcion = _columna_texto(self.df, 'descripcion', 'Descripcion')
+        marca = _columna_texto(self.df, 'marca', 'Marca')
+
+        descripcion_corta = descripcion.where(descripcion != '', 'Sin descripción').str[:60]
+        self.labels = np.where(cod_ur != '', cod_ur + ' - ' + descripcion_corta, descripcion_corta).astype(object)
+        self.codigos = cod_ur.str.upper().to_numpy(dtype=object)
+
+        # Primera aparición de cada código
+        self.posiciones = {}
+        for pos, codigo in enumerate(self.codigos):
+            if codigo:
+                self.posiciones.setdefault(codigo, pos)
+
+        self._texto = (cod_ur + ' ' + referencia + ' ' + descripcion + ' ' + marca).map(normalize_text)
+        self._codigos_norm = pd.Series(self.codigos, dtype=object).str.lower()
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def filtrar(self, termino: str = "") -> np.ndarray:
+        """
+        Posiciones de los productos que contienen todas las palabras de `termino`
+
+        Orden: código exacto, códigos que empiezan por el término y luego el
+        orden del catálogo. Sin término devuelve todo el catálogo.
+        """
+        palabras = normalize_text(termino or "").split()
+        if not palabras:
+            return np.arange(len(self.df))
+
+        mask = np.ones(len(self.df), dtype=bool)
+        for palabra in palabras:
+            mask &= self._texto.str.contains(palabra, regex=False).to_numpy()
+        posiciones = np.flatnonzero(mask)
+        if len(posiciones) == 0:
+            return posiciones
+
+        clave = normalize_text(termino).replace(' ', '')
+        codigos = self._codigos_norm.iloc[posiciones]
+        rango = np.where(codigos == clave, 0, np.where(codigos.str.startswith(clave), 1, 2))
+        return posiciones[np.argsort(rango, kind='stable')]
+
+    def posicion(self, cod_ur: str) -> Optional[int]:
+        """Posición del producto con el código dado"""
+        return self.posiciones.get(str(cod_ur).strip().upper())
+
+    def fila(self, pos: int) -> pd.Series:
+        return self.df.iloc[int(pos)]
+
+    def sugerencias(self, termino: str, limite: int = 20) -> Dict[str, Any]:
+        """Coincidencias para autocompletar: {'sugerencias': [{'cod_ur', 'label', 'precio'}], 'total'}"""
+        coincidencias = self.filtrar(termino)
+        precios = self.df['precio'] if 'precio' in self.df.columns else None
+        sugerencias = []
+        for pos in coincidencias[:limite]:
+            precio = precios.iat[pos] if precios is not None else None
+            sugerencias.append({
+                'cod_ur': self.codigos[pos],
+                'label': self.labels[pos],
+                'precio': float(precio) if precio is not None and pd.notna(precio) else None
+            })
+        return {'sugerencias': sugerencias, 'total': int(len(coincidencias))}
+
+
 class CatalogManager:
     """Gestor del catálogo de productos"""
     
@@ -12,7 +111,7 @@ class CatalogManager:
         self.supabase = supabase
         self.table_name = "catalogo_productos"
     
-    @st.cache_data(ttl=300)
+    @cached("catalogo_productos", ttl=300)
     def cargar_catalogo(_self):
         """Carga el catálogo completo desde la base de datos"""
         try:
@@ -61,6 +160,11 @@ class CatalogManager:
                 st.error(f"Error cargando catálogo: {error_msg}")
             return pd.DataFrame()
     
+    @cached("catalogo_productos", ttl=300)
+    def obtener_indice_opciones(_self) -> CatalogOptionIndex:
+        """Índice del selector de productos (se reconstruye solo si cambia el catálogo)"""
+        return CatalogOptionIndex(_self.cargar_catalogo())
+    
     def cargar_catalogo_completo(self):
         """Carga el catálogo completo incluyendo productos inactivos"""
         try:
@@ -170,7 +274,7 @@ class CatalogManager:
             resultado = self._sincronizar_catalogo(df, catalogo_actual)
             
             # Limpiar cache después de actualizar
-            st.cache_data.clear()
+            invalidate("catalogo_productos")
             
             return resultado
             
@@ -337,7 +441,7 @@ class CatalogManager:
                 pass
         
         # Limpiar cache
-        st.cache_data.clear()
+        invalidate("catalogo_productos")
         
         return {
             "success": True,
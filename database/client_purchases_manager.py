@@ -1,10 +1,15 @@
 import pandas as pd
 from datetime import datetime, timedelta
 from supabase import Client
-import streamlit as st
 from typing import Dict, List, Any, Optional
 import os
 
+from database.client_repository import get_client_repository
+from database.cache import cached, invalidate
+from database.product_rotation import ProductRotationStore
+from database.purchase_cube import get_purchase_cube
+from business.copurchase_recommender import CoPurchaseModel
+
 
 class ClientPurchasesManager:
     """Gestor de compras de clientes y análisis"""
@@ -13,6 +18,8 @@ class ClientPurchasesManager:
         self.supabase = supabase
         self.clientes_table = "clientes_b2b"
         self.compras_table = "compras_clientes"
+        # Datos maestros de clientes cacheados e indexados (compartidos en el proceso)
+        self.clientes = get_client_repository(supabase)
     
     # ========================
     # GESTIÓN DE CLIENTES
@@ -54,10 +61,12 @@ class ClientPurchasesManager:
             if existing.data:
                 # Actualizar
                 self.supabase.table(self.clientes_table).update(data).eq("nit", datos_cliente['nit']).execute()
+                self.clientes.invalidar()
                 return {"success": True, "mensaje": "Cliente actualizado", "cliente_id": existing.data[0]['id']}
             else:
                 # Insertar
                 result = self.supabase.table(self.clientes_table).insert(data).execute()
+                self.clientes.invalidar()
                 return {"success": True, "mensaje": "Cliente registrado", "cliente_id": result.data[0]['id'] if result.data else None}
                 
         except Exception as e:
@@ -65,11 +74,7 @@ class ClientPurchasesManager:
     
     def obtener_cliente(self, nit: str) -> Optional[Dict[str, Any]]:
         """Obtiene datos de un cliente por NIT"""
-        try:
-            result = self.supabase.table(self.clientes_table).select("*").eq("nit", nit).execute()
-            return result.data[0] if result.data else None
-        except Exception as e:
-            return None
+        return self.clientes.obtener(nit)
     
     def obtener_patron_descuentos_cliente(self, nit_cliente: str) -> Dict[str, Any]:
         """Obtiene el patrón de descuentos de un cliente desde sus facturas en comisiones"""
@@ -141,11 +146,7 @@ class ClientPurchasesManager:
     
     def listar_clientes(self) -> pd.DataFrame:
         """Lista todos los clientes"""
-        try:
-            result = self.supabase.table(self.clientes_table).select("*").eq("activo", True).execute()
-            return pd.DataFrame(result.data) if result.data else pd.DataFrame()
-        except Exception as e:
-            return pd.DataFrame()
+        return self.clientes.listar(solo_activos=True)
     
     # ========================
     # GESTIÓN DE COMPRAS
@@ -305,8 +306,15 @@ class ClientPurchasesManager:
                 except Exception as e:
                     continue
             
+            # Recalcular la rotación solo de los productos importados
+            if 'COD_ARTICULO' in df.columns:
+                ProductRotationStore(self.supabase).actualizar_productos_seguro(df['COD_ARTICULO'].astype(str))
+            
+            # Reemplazar las filas del cubo de compras de este cliente
+            get_purchase_cube(self.supabase).actualizar_clientes_seguro([nit_cliente])
+            
             # Limpiar cache
-            st.cache_data.clear()
+            invalidate("compras_clientes")
             
             return {
                 "success": True,
@@ -359,7 +367,7 @@ class ClientPurchasesManager:
                     errores += 1
                     continue
             
-            st.cache_data.clear()
+            invalidate("compras_clientes")
             
             return {
                 "success": True,
@@ -387,7 +395,7 @@ class ClientPurchasesManager:
             # Eliminar todas las compras
             self.supabase.table(self.compras_table).delete().eq("nit_cliente", nit_cliente).execute()
             
-            st.cache_data.clear()
+            invalidate("compras_clientes")
             
             return {
                 "success": True,
@@ -555,6 +563,55 @@ class ClientPurchasesManager:
     # RECOMENDACIONES
     # ========================
     
+    @cached("compras_clientes", ttl=300)
+    def cargar_compras(_self) -> pd.DataFrame:
+        """Todas las compras (sin devoluciones) de todos los clientes, con paginación"""
+        all_data = []
+        page_size = 1000
+        offset = 0
+        
+        while True:
+            response = _self.supabase.table(_self.compras_table).select("*").range(
+                offset, offset + page_size - 1
+            ).execute()
+            
+            if not response.data:
+                break
+            
+            all_data.extend(response.data)
+            
+            if len(response.data) < page_size:
+                break
+            
+            offset += page_size
+        
+        df = pd.DataFrame(all_data)
+        if df.empty:
+            return df
+        
+        if 'fuente' in df.columns:
+            df = df[df['fuente'].astype(str).str.upper() != 'DV']
+        if 'es_devolucion' in df.columns:
+            df = df[df['es_devolucion'] != True]
+        return df.reset_index(drop=True)
+    
+    @cached("compras_clientes", ttl=300)
+    def modelo_co_compra(_self) -> CoPurchaseModel:
+        """Modelo de co-compra (cliente x producto); se reconstruye solo si cambian las compras"""
+        return CoPurchaseModel(_self.cargar_compras(), 'nit_cliente', 'cod_articulo')
+    
+    @staticmethod
+    def _columnas_catalogo(catalogo: pd.DataFrame) -> pd.DataFrame:
+        columnas = [c for c in ('cod_ur', 'referencia', 'descripcion', 'marca', 'precio') if c in catalogo.columns]
+        return catalogo[columnas].drop_duplicates('cod_ur')
+    
+    @staticmethod
+    def _registros_catalogo(productos: pd.DataFrame, razon: str) -> List[Dict[str, Any]]:
+        registros = productos.reindex(columns=['cod_ur', 'referencia', 'descripcion', 'marca', 'precio'])
+        registros = registros.fillna({'referencia': '', 'descripcion': '', 'marca': '', 'precio': 0})
+        registros['razon'] = razon
+        return registros.to_dict('records')
+    
     def generar_recomendaciones(self, nit_cliente: str, catalog_manager) -> Dict[str, Any]:
         """Genera recomendaciones de productos para un cliente"""
         try:
@@ -567,6 +624,8 @@ class ClientPurchasesManager:
             catalogo = catalog_manager.cargar_catalogo()
             if catalogo.empty:
                 return {"error": "No hay catálogo disponible"}
+            # Mismos códigos que las compras (sin espacios, en mayúsculas) para cruzarlos
+            catalogo = catalogo.assign(cod_ur=catalogo['cod_ur'].astype(str).str.strip().str.upper())
             
             df_compras = self.obtener_compras_cliente(nit_cliente)
             
@@ -577,48 +636,51 @@ class ClientPurchasesManager:
                 "recompra": []
             }
             
+            productos_comprados = set(df_compras['cod_articulo'].astype(str).str.strip().str.upper().unique())
+            
+            # Candidatos: productos del catálogo que el cliente no ha comprado, con
+            # marca y línea normalizadas una sola vez
+            candidatos = catalogo[~catalogo['cod_ur'].isin(productos_comprados)]
+            marca_upper = candidatos['marca'].fillna('').astype(str).str.upper() if 'marca' in candidatos.columns else pd.Series('', index=candidatos.index)
+            linea_upper = candidatos['linea'].fillna('').astype(str).str.upper() if 'linea' in candidatos.columns else pd.Series('', index=candidatos.index)
+            
             # 1. Recomendaciones por marca preferida
-            marcas_cliente = [m['marca'] for m in analisis['marcas_preferidas'][:3]]
-            productos_comprados = set(df_compras['cod_articulo'].unique())
+            marcas_cliente = [m['marca'] for m in analisis['marcas_preferidas'][:3] if m.get('marca')]
             
             for marca in marcas_cliente:
-                productos_marca = catalogo[
-                    (catalogo['marca'].str.upper() == marca.upper()) & 
-                    (~catalogo['cod_ur'].isin(productos_comprados))
-                ].head(5)
-                
-                for _, prod in productos_marca.iterrows():
-                    recomendaciones['por_marca'].append({
-                        'cod_ur': prod['cod_ur'],
-                        'referencia': prod.get('referencia', ''),
-                        'descripcion': prod.get('descripcion', ''),
-                        'marca': prod.get('marca', ''),
-                        'precio': prod.get('precio', 0),
-                        'razon': f"Compra frecuentemente marca {marca}"
-                    })
+                productos_marca = candidatos[marca_upper == str(marca).upper()].head(5)
+                recomendaciones['por_marca'].extend(
+                    self._registros_catalogo(productos_marca, f"Compra frecuentemente marca {marca}")
+                )
             
             # 2. Recomendaciones por categoría/línea
-            lineas_cliente = [g['grupo'] for g in analisis['grupos_preferidos'][:3]]
+            lineas_cliente = [g['grupo'] for g in analisis['grupos_preferidos'][:3] if str(g.get('grupo') or '').split()]
+            ya_incluidos = set()
             
             for linea in lineas_cliente:
                 # Buscar en catálogo por línea similar
-                productos_linea = catalogo[
-                    (catalogo['linea'].str.upper().str.contains(linea.upper().split()[0], na=False)) &
-                    (~catalogo['cod_ur'].isin(productos_comprados))
+                productos_linea = candidatos[
+                    linea_upper.str.contains(str(linea).upper().split()[0], regex=False) &
+                    ~candidatos['cod_ur'].isin(ya_incluidos)
                 ].head(5)
-                
-                for _, prod in productos_linea.iterrows():
-                    if prod['cod_ur'] not in [r['cod_ur'] for r in recomendaciones['por_categoria']]:
-                        recomendaciones['por_categoria'].append({
-                            'cod_ur': prod['cod_ur'],
-                            'referencia': prod.get('referencia', ''),
-                            'descripcion': prod.get('descripcion', ''),
-                            'marca': prod.get('marca', ''),
-                            'precio': prod.get('precio', 0),
-                            'razon': f"Compra productos de {linea}"
-                        })
-            
-            # 3. Productos para recompra (comprados hace tiempo)
+                ya_incluidos.update(productos_linea['cod_ur'])
+                recomendaciones['por_categoria'].extend(
+                    self._registros_catalogo(productos_linea, f"Compra productos de {linea}")
+                )
+            
+            # 3. Complementarios: lo que compran los clientes con compras parecidas
+            co_compra = self.modelo_co_compra().recomendar(nit_cliente, k=10, productos_validos=catalogo['cod_ur'])
+            if not co_compra.empty:
+                complementarios = co_compra.rename(columns={'producto': 'cod_ur'}).merge(
+                    self._columnas_catalogo(catalogo), on='cod_ur', how='left'
+                )
+                for registro, basado_en in zip(
+                    self._registros_catalogo(complementarios, ""), complementarios['basado_en']
+                ):
+                    registro['razon'] = f"Clientes que compran {basado_en} también compran este producto"
+                    recomendaciones['complementarios'].append(registro)
+            
+            # 4. Productos para recompra (comprados hace tiempo)
             df_compras['fecha'] = pd.to_datetime(df_compras['fecha'])
             hace_90_dias = datetime.now() - timedelta(days=90)
             
@@ -646,6 +708,7 @@ class ClientPurchasesManager:
                 "total_recomendaciones": (
                     len(recomendaciones['por_marca']) +
                     len(recomendaciones['por_categoria']) +
+                    len(recomendaciones['complementarios']) +
                     len(recomendaciones['recompra'])
                 )
             }
@@ -0,0 +1,226 @@
+"""
+Repositorio de datos maestros de clientes B2B (tabla `clientes_b2b`)
+
+Una sola copia en memoria por proceso, con índices por NIT y por nombre
+normalizado. Las lecturas proyectan columnas sobre la copia cacheada en lugar de
+consultar Supabase; cualquier escritura debe llamar a `invalidar()` (o a
+`invalidate("clientes_b2b")` de database.cache).
+"""
+
+import threading
+import time
+from typing import Dict, List, Any, Optional, Iterable
+
+import pandas as pd
+
+from database.cache import cache, invalidate
+from utils.formatting import normalize_text
+
+# Segundos que se considera vigente la copia en memoria (igual que st.cache_data)
+DEFAULT_TTL = 300
+
+
+def normalizar_nombre(nombre: Any) -> str:
+    """Nombre de cliente comparable: minúsculas, sin tildes ni espacios repetidos"""
+    if nombre is None or (isinstance(nombre, float) and pd.isna(nombre)):
+        return ""
+    return " ".join(normalize_text(str(nombre)).split())
+
+
+def _fila_dict(fila: pd.Series) -> Dict[str, Any]:
+    """Fila como dict con None (no NaN) en los valores faltantes"""
+    return fila.astype(object).where(fila.notna(), None).to_dict()
+
+
+class ClientRepository:
+    """Acceso cacheado e indexado a los clientes B2B"""
+
+    def __init__(self, supabase, table_name: str = "clientes_b2b", ttl: float = DEFAULT_TTL):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._cargado_version = -1
+        self._cargado_en = 0.0
+        # (tabla, índice NIT -> fila, índice nombre normalizado -> filas); se
+        # reemplaza de una vez para que los lectores vean un estado consistente
+        self._estado: Optional[tuple] = None
+
+    # ========================================
+    # CACHÉ
+    # ========================================
+
+    @property
+    def version(self) -> int:
+        """Versión de los datos (etiqueta `clientes_b2b`); cambia en cada invalidación"""
+        return cache.version(self.table_name)
+
+    def invalidar(self):
+        """Descarta la copia en memoria (llamar después de escribir en clientes_b2b)"""
+        invalidate(self.table_name)
+
+    def _vigente(self, version: int) -> bool:
+        return (
+            self._estado is not None
+            and self._cargado_version == version
+            and time.monotonic() - self._cargado_en < cache.ttl_efectivo(self.ttl)
+        )
+
+    def _snapshot(self) -> tuple:
+        """Devuelve (tabla, por_nit, por_nombre), recargando solo si la versión cambió o expiró"""
+        version = self.version
+        if self._vigente(version):
+            return self._estado
+        with self._lock:
+            if self._vigente(version):
+                return self._estado
+            df = self._cargar_tabla()
+            self._estado = (df,) + self._indexar(df)
+            self._cargado_version = version
+            self._cargado_en = time.monotonic()
+            return self._estado
+
+    def _snapshot_seguro(self) -> tuple:
+        try:
+            return self._snapshot()
+        except Exception as e:
+            print(f"⚠️ Error cargando clientes B2B: {e}")
+            return pd.DataFrame(), {}, {}
+
+    def _cargar_tabla(self) -> pd.DataFrame:
+        """Descarga todos los clientes usando paginación"""
+        all_data = []
+        page_size = 1000
+        offset = 0
+
+        while True:
+            response = self.supabase.table(self.table_name).select("*").range(
+                offset, offset + page_size - 1
+            ).execute()
+
+            if not response.data:
+                break
+
+            all_data.extend(response.data)
+
+            if len(response.data) < page_size:
+                break
+
+            offset += page_size
+
+        df = pd.DataFrame(all_data)
+        if df.empty:
+            return df
+        if 'activo' in df.columns:
+            df['activo'] = df['activo'].fillna(True).astype(bool)
+        else:
+            df['activo'] = True
+        return df.reset_index(drop=True)
+
+    @staticmethod
+    def _indexar(df: pd.DataFrame) -> tuple:
+        por_nit: Dict[str, int] = {}
+        por_nombre: Dict[str, List[int]] = {}
+        if 'nit' in df.columns:
+            por_nit = {str(nit).strip(): i for i, nit in enumerate(df['nit'])}
+        if 'nombre' in df.columns:
+            for i, nombre in enumerate(df['nombre']):
+                por_nombre.setdefault(normalizar_nombre(nombre), []).append(i)
+        return por_nit, por_nombre
+
+    # ========================================
+    # CONSULTAS
+    # ========================================
+
+    @staticmethod
+    def _proyectar(df: pd.DataFrame, columnas: Optional[Iterable[str]]) -> pd.DataFrame:
+        if columnas is None:
+            return df.copy()
+        return df[[c for c in columnas if c in df.columns]].copy()
+
+    def listar(self, columnas: Optional[Iterable[str]] = None, solo_activos: bool = False) -> pd.DataFrame:
+        """
+        Lista los clientes
+
+        Args:
+            columnas: Columnas a devolver (None = todas)
+            solo_activos: Excluir clientes con activo = False
+        """
+        df = self._snapshot_seguro()[0]
+        if solo_activos and not df.empty:
+            df = df[df['activo']]
+        return self._proyectar(df, columnas)
+
+    def contar(self, solo_activos: bool = False) -> int:
+        df = self.listar(columnas=['activo'], solo_activos=solo_activos)
+        return len(df)
+
+    def obtener(self, nit: Any) -> Optional[Dict[str, Any]]:
+        """Cliente por NIT"""
+        df, por_nit, _ = self._snapshot_seguro()
+        pos = por_nit.get(str(nit).strip())
+        if pos is None:
+            return None
+        return _fila_dict(df.iloc[pos])
+
+    def obtener_varios(self, nits: Iterable[Any], columnas: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """Clientes para un conjunto de NITs (equivalente a .in_('nit', nits))"""
+        df, por_nit, _ = self._snapshot_seguro()
+        posiciones = sorted({
+            por_nit[n] for n in (str(nit).strip() for nit in nits) if n in por_nit
+        })
+        return self._proyectar(df.iloc[posiciones], columnas)
+
+    def obtener_por_nombre(self, nombre: str) -> Optional[Dict[str, Any]]:
+        """Cliente cuyo nombre normalizado coincide exactamente"""
+        df, _, por_nombre = self._snapshot_seguro()
+        posiciones = por_nombre.get(normalizar_nombre(nombre))
+        if not posiciones:
+            return None
+        return _fila_dict(df.iloc[posiciones[0]])
+
+    def buscar(
+        self,
+        texto: str,
+        columnas: Optional[Iterable[str]] = None,
+        solo_activos: bool = False
+    ) -> pd.DataFrame:
+        """Clientes cuyo nombre normalizado contiene el texto (exacto primero)"""
+        df, _, por_nombre = self._snapshot_seguro()
+        clave = normalizar_nombre(texto)
+        if not clave or df.empty:
+            return pd.DataFrame()
+
+        exactas = por_nombre.get(clave, [])
+        parciales = [
+            pos for nombre, lista in por_nombre.items()
+            if clave in nombre and nombre != clave for pos in lista
+        ]
+        df = df.iloc[exactas + sorted(parciales)]
+        if solo_activos:
+            df = df[df['activo']]
+        return self._proyectar(df, columnas)
+
+    def mapa_nit_nombre(self) -> Dict[str, str]:
+        """NIT -> nombre para todos los clientes"""
+        df = self.listar(columnas=['nit', 'nombre'])
+        if df.empty:
+            return {}
+        return dict(zip(df['nit'], df['nombre']))
+
+
+# Un repositorio por cliente de Supabase en todo el proceso, para que las
+# sesiones de Streamlit y las pestañas compartan la misma copia
+_repositories: Dict[int, ClientRepository] = {}
+_repositories_lock = threading.Lock()
+
+
+def get_client_repository(supabase) -> ClientRepository:
+    """Devuelve (creando si hace falta) el repositorio compartido para el cliente dado"""
+    with _repositories_lock:
+        repo = _repositories.get(id(supabase))
+        if repo is None or repo.supabase is not supabase:
+            repo = ClientRepository(supabase)
+            _repositories[id(supabase)] = repo
+    return repo
@@ -0,0 +1,149 @@
+-- Funciones de agregación (pushdown) usadas por database/aggregations.py
+-- Generado con: python -m database.aggregations > database/crear_funciones_agregacion.sql
+-- Ejecutar este script en Supabase SQL Editor
+
+CREATE OR REPLACE FUNCTION agg_compras_resumen(desde text DEFAULT NULL)
+RETURNS TABLE (
+    total_compras bigint,
+    valor_total numeric,
+    clientes_activos bigint,
+    referencias_unicas bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT CAST(COUNT(*) AS BIGINT) AS total_compras,
+           CAST(COALESCE(SUM(total), 0) AS NUMERIC) AS valor_total,
+           CAST(COUNT(DISTINCT nit_cliente) AS BIGINT) AS clientes_activos,
+           CAST(COUNT(DISTINCT cod_articulo) AS BIGINT) AS referencias_unicas
+    FROM compras_clientes
+    WHERE COALESCE(es_devolucion, FALSE) = FALSE AND (desde IS NULL OR fecha >= CAST(desde AS timestamp))
+$$;
+
+CREATE OR REPLACE FUNCTION agg_compras_por_cliente(desde text DEFAULT NULL)
+RETURNS TABLE (
+    nit_cliente text,
+    total_compras numeric,
+    num_transacciones bigint,
+    ticket_promedio numeric,
+    primera_compra text,
+    ultima_compra text
+)
+LANGUAGE sql STABLE AS $$
+    SELECT CAST(nit_cliente AS TEXT) AS nit_cliente,
+           CAST(SUM(total) AS NUMERIC) AS total_compras,
+           CAST(COUNT(*) AS BIGINT) AS num_transacciones,
+           CAST(AVG(total) AS NUMERIC) AS ticket_promedio,
+           CAST(MIN(fecha) AS TEXT) AS primera_compra,
+           CAST(MAX(fecha) AS TEXT) AS ultima_compra
+    FROM compras_clientes
+    WHERE COALESCE(es_devolucion, FALSE) = FALSE AND (desde IS NULL OR fecha >= CAST(desde AS timestamp)) AND nit_cliente IS NOT NULL
+    GROUP BY nit_cliente
+    ORDER BY total_compras DESC, nit_cliente
+$$;
+
+CREATE OR REPLACE FUNCTION agg_compras_por_mes(desde text DEFAULT NULL)
+RETURNS TABLE (
+    mes text,
+    valor_total numeric,
+    num_compras bigint,
+    clientes_activos bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT SUBSTR(CAST(fecha AS TEXT), 1, 7) AS mes,
+           CAST(SUM(total) AS NUMERIC) AS valor_total,
+           CAST(COUNT(*) AS BIGINT) AS num_compras,
+           CAST(COUNT(DISTINCT nit_cliente) AS BIGINT) AS clientes_activos
+    FROM compras_clientes
+    WHERE COALESCE(es_devolucion, FALSE) = FALSE AND (desde IS NULL OR fecha >= CAST(desde AS timestamp)) AND fecha IS NOT NULL
+    GROUP BY SUBSTR(CAST(fecha AS TEXT), 1, 7)
+    ORDER BY mes
+$$;
+
+CREATE OR REPLACE FUNCTION agg_compras_por_referencia(desde text DEFAULT NULL, limite integer DEFAULT 100000)
+RETURNS TABLE (
+    codigo text,
+    valor_total numeric,
+    cantidad_total numeric,
+    num_compras bigint,
+    clientes_unicos bigint,
+    detalle text,
+    marca text
+)
+LANGUAGE sql STABLE AS $$
+    SELECT CAST(cod_articulo AS TEXT) AS codigo,
+           CAST(SUM(total) AS NUMERIC) AS valor_total,
+           CAST(COALESCE(SUM(cantidad), 0) AS NUMERIC) AS cantidad_total,
+           CAST(COUNT(*) AS BIGINT) AS num_compras,
+           CAST(COUNT(DISTINCT nit_cliente) AS BIGINT) AS clientes_unicos,
+           CAST(MIN(detalle) AS TEXT) AS detalle,
+           CAST(MIN(marca) AS TEXT) AS marca
+    FROM compras_clientes
+    WHERE COALESCE(es_devolucion, FALSE) = FALSE AND (desde IS NULL OR fecha >= CAST(desde AS timestamp)) AND cod_articulo IS NOT NULL
+    GROUP BY cod_articulo
+    ORDER BY valor_total DESC, codigo
+    LIMIT limite
+$$;
+
+CREATE OR REPLACE FUNCTION agg_compras_por_ciudad(desde text DEFAULT NULL)
+RETURNS TABLE (
+    ciudad text,
+    total_compras numeric,
+    num_clientes bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT CAST(c.ciudad AS TEXT) AS ciudad,
+           CAST(SUM(cc.total) AS NUMERIC) AS total_compras,
+           CAST(COUNT(DISTINCT cc.nit_cliente) AS BIGINT) AS num_clientes
+    FROM compras_clientes cc
+    JOIN clientes_b2b c ON c.nit = cc.nit_cliente
+    WHERE COALESCE(cc.es_devolucion, FALSE) = FALSE AND (desde IS NULL OR cc.fecha >= CAST(desde AS timestamp)) AND c.ciudad IS NOT NULL AND c.ciudad <> ''
+    GROUP BY c.ciudad
+    ORDER BY total_compras DESC, ciudad
+$$;
+
+CREATE OR REPLACE FUNCTION agg_cubo_compras(desde text DEFAULT NULL)
+RETURNS TABLE (
+    nit_cliente text,
+    cod_articulo text,
+    mes text,
+    total numeric,
+    cantidad numeric,
+    num_compras bigint
+)
+LANGUAGE sql STABLE AS $$
+    SELECT CAST(nit_cliente AS TEXT) AS nit_cliente,
+           CAST(TRIM(cod_articulo) AS TEXT) AS cod_articulo,
+           SUBSTR(CAST(fecha AS TEXT), 1, 7) AS mes,
+           CAST(SUM(total) AS NUMERIC) AS total,
+           CAST(COALESCE(SUM(cantidad), 0) AS NUMERIC) AS cantidad,
+           CAST(COUNT(*) AS BIGINT) AS num_compras
+    FROM compras_clientes
+    WHERE COALESCE(es_devolucion, FALSE) = FALSE AND (desde IS NULL OR fecha >= CAST(desde AS timestamp)) AND fecha IS NOT NULL AND nit_cliente IS NOT NULL
+      AND cod_articulo IS NOT NULL AND TRIM(cod_articulo) NOT IN ('', 'N/A')
+    GROUP BY nit_cliente, TRIM(cod_articulo), SUBSTR(CAST(fecha AS TEXT), 1, 7)
+    ORDER BY nit_cliente, cod_articulo, mes
+$$;
+
+CREATE OR REPLACE FUNCTION agg_ventas_netas_por_cliente(desde text DEFAULT NULL, hasta text DEFAULT NULL)
+RETURNS TABLE (
+    cliente text,
+    total_compras numeric
+)
+LANGUAGE sql STABLE AS $$
+    SELECT CAST(cliente AS TEXT) AS cliente,
+           CAST(SUM(CASE WHEN valor_final > 0 THEN valor_final ELSE 0 END) AS NUMERIC) AS total_compras
+    FROM (
+        SELECT cliente,
+               COALESCE(valor_neto, 0) - COALESCE(valor_descuento_pesos, 0)
+                   - COALESCE(valor_devuelto, 0) / 1.19 AS valor_final
+        FROM comisiones
+        WHERE cliente_propio = TRUE
+          AND (desde IS NULL OR fecha_factura >= CAST(desde AS timestamp))
+          AND (hasta IS NULL OR fecha_factura <= CAST(hasta AS timestamp))
+    ) ventas
+    GROUP BY cliente
+    ORDER BY cliente
+$$;
+
+-- Índices de apoyo
+CREATE INDEX IF NOT EXISTS idx_compras_clientes_fecha ON compras_clientes(fecha);
+CREATE INDEX IF NOT EXISTS idx_compras_clientes_nit ON compras_clientes(nit_cliente);
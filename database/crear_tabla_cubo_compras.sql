@@ -0,0 +1,41 @@
+-- Script para crear la tabla cubo_compras (cliente x referencia x mes)
+-- Ejecutar este script en Supabase SQL Editor
+-- Usado por PurchaseCube (database/purchase_cube.py); las filas de un cliente se
+-- reemplazan al importar sus compras y la ciudad se toma de clientes_b2b al consultar.
+-- Un cliente sin compras queda con una fila vacía (cod_articulo y mes en '')
+
+-- 1. Crear tabla
+CREATE TABLE IF NOT EXISTS cubo_compras (
+    nit_cliente TEXT NOT NULL,
+    cod_articulo TEXT NOT NULL,
+    mes TEXT NOT NULL,  -- YYYY-MM
+    total NUMERIC(15,2) NOT NULL DEFAULT 0,
+    cantidad NUMERIC(15,2) NOT NULL DEFAULT 0,
+    num_compras INTEGER NOT NULL DEFAULT 0,
+    actualizado_en TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (nit_cliente, cod_articulo, mes)
+);
+
+-- Agregar comentario
+COMMENT ON TABLE cubo_compras IS 'Compras sin devoluciones agregadas por cliente, referencia y mes';
+
+-- 2. Índices: cambios desde la última carga y reemplazo por cliente
+CREATE INDEX IF NOT EXISTS idx_cubo_compras_actualizado_en
+ON cubo_compras(actualizado_en);
+
+CREATE INDEX IF NOT EXISTS idx_cubo_compras_cod_articulo
+ON cubo_compras(cod_articulo);
+
+-- 3. Cargar la tabla con las compras existentes (mismo cálculo que agg_cubo_compras; no toca filas ya cargadas)
+INSERT INTO cubo_compras (nit_cliente, cod_articulo, mes, total, cantidad, num_compras)
+SELECT CAST(nit_cliente AS TEXT),
+       TRIM(cod_articulo),
+       SUBSTR(CAST(fecha AS TEXT), 1, 7),
+       COALESCE(SUM(total), 0),
+       COALESCE(SUM(cantidad), 0),
+       COUNT(*)
+FROM compras_clientes
+WHERE COALESCE(es_devolucion, FALSE) = FALSE AND fecha IS NOT NULL AND nit_cliente IS NOT NULL
+  AND cod_articulo IS NOT NULL AND TRIM(cod_articulo) NOT IN ('', 'N/A')
+GROUP BY nit_cliente, TRIM(cod_articulo), SUBSTR(CAST(fecha AS TEXT), 1, 7)
+ON CONFLICT (nit_cliente, cod_articulo, mes) DO NOTHING;
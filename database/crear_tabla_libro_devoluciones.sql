@@ -0,0 +1,154 @@
+-- Script para crear el libro de devoluciones (totales por factura y mes)
+-- Ejecutar este script en Supabase SQL Editor
+-- Usado por ReturnLedger (database/return_ledger.py). Un trigger sobre devoluciones
+-- suma y resta cada insert, update o delete en la misma transacción, y con el
+-- libro actualiza comisiones.valor_devuelto y comision_ajustada de la factura
+
+-- 1. Crear tabla
+CREATE TABLE IF NOT EXISTS libro_devoluciones (
+    factura_id BIGINT NOT NULL REFERENCES comisiones(id) ON DELETE CASCADE,
+    mes TEXT NOT NULL,  -- YYYY-MM de fecha_devolucion ('' sin fecha)
+    valor_devuelto NUMERIC(15,2) NOT NULL DEFAULT 0,
+    valor_afecta_comision NUMERIC(15,2) NOT NULL DEFAULT 0,
+    num_devoluciones INTEGER NOT NULL DEFAULT 0,
+    ultima_fecha DATE,
+    actualizado_en TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (factura_id, mes)
+);
+
+-- Agregar comentario
+COMMENT ON TABLE libro_devoluciones IS 'Devoluciones acumuladas por factura y mes (las filas quedan en cero, no se borran)';
+
+-- 2. Índices: cambios desde la última carga, totales por mes y recálculo de una factura
+CREATE INDEX IF NOT EXISTS idx_libro_devoluciones_actualizado_en
+ON libro_devoluciones(actualizado_en);
+
+CREATE INDEX IF NOT EXISTS idx_libro_devoluciones_mes
+ON libro_devoluciones(mes);
+
+CREATE INDEX IF NOT EXISTS idx_devoluciones_factura_id
+ON devoluciones(factura_id);
+
+-- 3. Comisión de la factura a partir del libro (misma regla que comision_ajustada en return_ledger.py)
+CREATE OR REPLACE FUNCTION libro_devoluciones_ajustar_factura(p_factura_id BIGINT)
+RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_devuelto NUMERIC;
+BEGIN
+    -- Bloquear la factura antes de sumar: otra transacción que escriba la misma
+    -- factura (aunque en otro mes) espera y luego suma viendo esta fila del libro
+    PERFORM 1 FROM comisiones WHERE id = p_factura_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    SELECT COALESCE(SUM(valor_afecta_comision), 0) INTO v_devuelto
+    FROM libro_devoluciones
+    WHERE factura_id = p_factura_id;
+
+    UPDATE comisiones c SET
+        valor_devuelto = v_devuelto,
+        comision_ajustada = GREATEST(0, (
+            CASE
+                WHEN COALESCE(c.descuentos_multiples, FALSE) THEN
+                    COALESCE(c.valor_neto, 0) - v_devuelto / 1.19 - COALESCE(c.valor_descuento_pesos, 0)
+                WHEN COALESCE(c.descuento_pie_factura, FALSE) THEN
+                    COALESCE(c.valor_neto, 0) - v_devuelto / 1.19
+                ELSE
+                    (COALESCE(c.valor_neto, 0) - v_devuelto / 1.19) * 0.85
+            END
+        ) * COALESCE(c.porcentaje, 0) / 100),
+        updated_at = NOW()
+    WHERE c.id = p_factura_id;
+END;
+$$;
+
+-- 4. Suma (p_signo = 1) o resta (p_signo = -1) una devolución en el libro
+CREATE OR REPLACE FUNCTION libro_devoluciones_sumar(
+    p_factura_id BIGINT, p_fecha DATE, p_valor NUMERIC, p_afecta BOOLEAN, p_signo INTEGER
+)
+RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_mes TEXT := COALESCE(SUBSTR(CAST(p_fecha AS TEXT), 1, 7), '');
+    v_valor NUMERIC := p_signo * COALESCE(p_valor, 0);
+    v_afecta NUMERIC := CASE WHEN COALESCE(p_afecta, TRUE) THEN p_signo * COALESCE(p_valor, 0) ELSE 0 END;
+BEGIN
+    -- Sin factura (o borrada en cascada junto con sus devoluciones) no hay nada que sumar;
+    -- si existe queda bloqueada hasta el final de la transacción
+    PERFORM 1 FROM comisiones WHERE id = p_factura_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO libro_devoluciones AS l (
+        factura_id, mes, valor_devuelto, valor_afecta_comision, num_devoluciones, ultima_fecha, actualizado_en
+    )
+    VALUES (p_factura_id, v_mes, v_valor, v_afecta, p_signo, CASE WHEN p_signo > 0 THEN p_fecha END, NOW())
+    ON CONFLICT (factura_id, mes) DO UPDATE SET
+        valor_devuelto = l.valor_devuelto + EXCLUDED.valor_devuelto,
+        valor_afecta_comision = l.valor_afecta_comision + EXCLUDED.valor_afecta_comision,
+        num_devoluciones = l.num_devoluciones + EXCLUDED.num_devoluciones,
+        -- Al restar, la última fecha se toma de las devoluciones que quedan de esa factura y mes
+        ultima_fecha = CASE
+            WHEN p_signo > 0 THEN GREATEST(l.ultima_fecha, p_fecha)
+            ELSE (
+                SELECT MAX(d.fecha_devolucion) FROM devoluciones d
+                WHERE d.factura_id = p_factura_id
+                  AND COALESCE(SUBSTR(CAST(d.fecha_devolucion AS TEXT), 1, 7), '') = v_mes
+            )
+        END,
+        actualizado_en = NOW();
+
+    IF v_afecta <> 0 THEN
+        PERFORM libro_devoluciones_ajustar_factura(p_factura_id);
+    END IF;
+END;
+$$;
+
+-- 5. Trigger: cada cambio en devoluciones mueve el libro en la misma transacción
+CREATE OR REPLACE FUNCTION libro_devoluciones_trigger()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM libro_devoluciones_sumar(OLD.factura_id, OLD.fecha_devolucion, OLD.valor_devuelto, OLD.afecta_comision, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM libro_devoluciones_sumar(NEW.factura_id, NEW.fecha_devolucion, NEW.valor_devuelto, NEW.afecta_comision, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_libro_devoluciones ON devoluciones;
+CREATE TRIGGER trg_libro_devoluciones
+AFTER INSERT OR DELETE OR UPDATE OF factura_id, fecha_devolucion, valor_devuelto, afecta_comision
+ON devoluciones
+FOR EACH ROW EXECUTE FUNCTION libro_devoluciones_trigger();
+
+-- ReturnLedger consulta si el trigger está activo; sin él recalcula la comisión desde Python
+CREATE OR REPLACE FUNCTION libro_devoluciones_trigger_instalado()
+RETURNS boolean
+LANGUAGE sql STABLE AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgname = 'trg_libro_devoluciones'
+          AND tgrelid = 'devoluciones'::regclass
+          AND tgenabled <> 'D'
+    )
+$$;
+
+-- 6. Cargar el libro con las devoluciones existentes (no toca filas ya cargadas)
+INSERT INTO libro_devoluciones (factura_id, mes, valor_devuelto, valor_afecta_comision, num_devoluciones, ultima_fecha)
+SELECT factura_id,
+       COALESCE(SUBSTR(CAST(fecha_devolucion AS TEXT), 1, 7), '') AS mes,
+       SUM(COALESCE(valor_devuelto, 0)),
+       SUM(CASE WHEN COALESCE(afecta_comision, TRUE) THEN COALESCE(valor_devuelto, 0) ELSE 0 END),
+       COUNT(*),
+       MAX(fecha_devolucion)
+FROM devoluciones
+WHERE factura_id IS NOT NULL
+GROUP BY factura_id, COALESCE(SUBSTR(CAST(fecha_devolucion AS TEXT), 1, 7), '')
+ON CONFLICT (factura_id, mes) DO NOTHING;
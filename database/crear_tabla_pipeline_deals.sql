@@ -0,0 +1,55 @@
+-- Script para crear la tabla pipeline_deals (Pipeline de Ventas / Kanban)
+-- Ejecutar este script en Supabase SQL Editor
+-- Usado por SupabasePipelineStorage (PIPELINE_STORAGE=supabase)
+
+-- 1. Crear tabla
+CREATE TABLE IF NOT EXISTS pipeline_deals (
+    id TEXT PRIMARY KEY,
+    cliente TEXT NOT NULL,
+    valor_estimado NUMERIC(15,2) NOT NULL DEFAULT 0,
+    etapa TEXT NOT NULL,
+    probabilidad INTEGER NOT NULL DEFAULT 0,
+    fecha_creacion DATE,
+    fecha_cierre_estimada DATE,
+    contacto TEXT,
+    telefono TEXT,
+    email TEXT,
+    notas TEXT,
+    productos_interes JSONB DEFAULT '[]'::jsonb,
+    origen TEXT,
+    vendedor TEXT,
+    prioridad TEXT,
+    siguiente_accion TEXT,
+    fecha_siguiente_accion DATE,
+    historial JSONB DEFAULT '[]'::jsonb  -- Solo lectura (migración); el historial vive en pipeline_eventos
+);
+
+-- Agregar comentario
+COMMENT ON TABLE pipeline_deals IS 'Oportunidades de venta del pipeline Kanban';
+
+-- 2. Crear índices para las consultas del Kanban
+CREATE INDEX IF NOT EXISTS idx_pipeline_deals_etapa 
+ON pipeline_deals(etapa);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_deals_vendedor 
+ON pipeline_deals(vendedor);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_deals_prioridad 
+ON pipeline_deals(prioridad);
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_deals_siguiente_accion 
+ON pipeline_deals(fecha_siguiente_accion);
+
+-- 3. Historial append-only de eventos de los deals
+CREATE TABLE IF NOT EXISTS pipeline_eventos (
+    seq BIGSERIAL PRIMARY KEY,
+    deal_id TEXT NOT NULL,
+    fecha TIMESTAMP NOT NULL,
+    evento JSONB NOT NULL
+);
+
+-- Agregar comentario
+COMMENT ON TABLE pipeline_eventos IS 'Eventos (creación, cambios de etapa, actualizaciones) de pipeline_deals';
+
+CREATE INDEX IF NOT EXISTS idx_pipeline_eventos_deal 
+ON pipeline_eventos(deal_id);
@@ -0,0 +1,63 @@
+-- Script para crear la tabla rotacion_productos (resumen de rotación por producto)
+-- Ejecutar este script en Supabase SQL Editor
+-- Usado por ProductRotationStore (database/product_rotation.py); se actualiza
+-- por producto al importar compras y se reconstruye completa con reconstruir()
+-- (si la tabla está vacía se reconstruye sola antes del primer recálculo)
+
+-- 1. Crear tabla
+CREATE TABLE IF NOT EXISTS rotacion_productos (
+    cod_articulo TEXT PRIMARY KEY,
+    detalle TEXT,
+    marca TEXT,
+    grupo TEXT,
+    subgrupo TEXT,
+    primera_venta TIMESTAMP,
+    ultima_venta TIMESTAMP,
+    total_vendido NUMERIC(15,2) NOT NULL DEFAULT 0,
+    veces_vendido INTEGER NOT NULL DEFAULT 0,
+    cantidad_total NUMERIC(15,2) NOT NULL DEFAULT 0,
+    rotacion_mensual NUMERIC(12,4) NOT NULL DEFAULT 0,
+    num_clientes INTEGER NOT NULL DEFAULT 0,
+    clientes TEXT[] DEFAULT '{}',  -- NITs distintos que compraron el producto
+    actualizado_en TIMESTAMP DEFAULT NOW()
+);
+
+-- Agregar comentario
+COMMENT ON TABLE rotacion_productos IS 'Resumen precalculado de rotación por producto (compras_clientes sin devoluciones)';
+
+-- 2. Índices para referencias quietas y rankings
+CREATE INDEX IF NOT EXISTS idx_rotacion_productos_ultima_venta
+ON rotacion_productos(ultima_venta);
+
+CREATE INDEX IF NOT EXISTS idx_rotacion_productos_total
+ON rotacion_productos(total_vendido DESC);
+
+-- 3. Índice de apoyo para recalcular un producto en compras_clientes
+CREATE INDEX IF NOT EXISTS idx_compras_clientes_cod_articulo
+ON compras_clientes(cod_articulo);
+
+-- 4. Cargar la tabla con las compras existentes (mismo cálculo que calcular_rotacion; no toca filas ya cargadas)
+INSERT INTO rotacion_productos (
+    cod_articulo, detalle, marca, grupo, subgrupo, primera_venta, ultima_venta,
+    total_vendido, veces_vendido, cantidad_total, rotacion_mensual, num_clientes, clientes
+)
+SELECT TRIM(cod_articulo),
+       (ARRAY_AGG(detalle) FILTER (WHERE detalle IS NOT NULL))[1],
+       (ARRAY_AGG(marca) FILTER (WHERE marca IS NOT NULL))[1],
+       (ARRAY_AGG(grupo) FILTER (WHERE grupo IS NOT NULL))[1],
+       (ARRAY_AGG(subgrupo) FILTER (WHERE subgrupo IS NOT NULL))[1],
+       MIN(fecha),
+       MAX(fecha),
+       COALESCE(SUM(total), 0),
+       COUNT(*),
+       COALESCE(SUM(cantidad), 0),
+       -- Ventas por mes de actividad (días entre primera y última venta / 30; 1 si es cero)
+       COUNT(*) / COALESCE(NULLIF(FLOOR(EXTRACT(EPOCH FROM MAX(fecha) - MIN(fecha)) / 86400) / 30.0, 0), 1),
+       COUNT(DISTINCT TRIM(nit_cliente)),
+       COALESCE(ARRAY_AGG(DISTINCT TRIM(nit_cliente) ORDER BY TRIM(nit_cliente)) FILTER (WHERE nit_cliente IS NOT NULL), '{}')
+FROM compras_clientes
+WHERE es_devolucion = FALSE
+  AND cod_articulo IS NOT NULL
+  AND TRIM(cod_articulo) NOT IN ('', 'None', 'nan')
+GROUP BY TRIM(cod_articulo)
+ON CONFLICT (cod_articulo) DO NOTHING;
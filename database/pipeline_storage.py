@@ -0,0 +1,319 @@
+"""
+Almacenamiento persistente e indexado de los deals del pipeline de ventas.
+
+Dos backends con la misma API:
+- SQLitePipelineStorage: archivo local (por defecto data/pipeline.db)
+- SupabasePipelineStorage: tabla `pipeline_deals` (ver crear_tabla_pipeline_deals.sql)
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import date
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+DEFAULT_DB_PATH = os.getenv(
+    "PIPELINE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "pipeline.db")
+)
+
+# Columnas de la tabla; las listas se guardan como JSON. El historial vive en
+# la tabla append-only pipeline_eventos (la columna `historial` solo se lee
+# para migrar datos de versiones anteriores)
+DEAL_COLUMNS = [
+    "id", "cliente", "valor_estimado", "etapa", "probabilidad", "fecha_creacion",
+    "fecha_cierre_estimada", "contacto", "telefono", "email", "notas", "productos_interes",
+    "origen", "vendedor", "prioridad", "siguiente_accion", "fecha_siguiente_accion"
+]
+JSON_COLUMNS = ("productos_interes", "historial")
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+class SQLitePipelineStorage:
+    """Backend local en SQLite con índices por etapa, vendedor, prioridad y siguiente acción"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pipeline_deals (
+            id TEXT PRIMARY KEY,
+            cliente TEXT NOT NULL,
+            valor_estimado REAL NOT NULL DEFAULT 0,
+            etapa TEXT NOT NULL,
+            probabilidad INTEGER NOT NULL DEFAULT 0,
+            fecha_creacion TEXT,
+            fecha_cierre_estimada TEXT,
+            contacto TEXT,
+            telefono TEXT,
+            email TEXT,
+            notas TEXT,
+            productos_interes TEXT,
+            origen TEXT,
+            vendedor TEXT,
+            prioridad TEXT,
+            siguiente_accion TEXT,
+            fecha_siguiente_accion TEXT,
+            historial TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_pipeline_deals_etapa ON pipeline_deals (etapa);
+        CREATE INDEX IF NOT EXISTS idx_pipeline_deals_vendedor ON pipeline_deals (vendedor);
+        CREATE INDEX IF NOT EXISTS idx_pipeline_deals_prioridad ON pipeline_deals (prioridad);
+        CREATE INDEX IF NOT EXISTS idx_pipeline_deals_siguiente_accion ON pipeline_deals (fecha_siguiente_accion);
+
+        CREATE TABLE IF NOT EXISTS pipeline_eventos (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            deal_id TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            evento TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pipeline_eventos_deal ON pipeline_eventos (deal_id);
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or DEFAULT_DB_PATH
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if self.db_path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def _to_row(deal: Dict[str, Any]) -> tuple:
+        values = []
+        for col in DEAL_COLUMNS:
+            value = _iso(deal.get(col))
+            if col in JSON_COLUMNS:
+                value = json.dumps(value or [], ensure_ascii=False, default=str)
+            values.append(value)
+        return tuple(values)
+
+    @staticmethod
+    def _from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        deal = dict(row)
+        for col in JSON_COLUMNS:
+            if col in deal:
+                deal[col] = json.loads(deal[col]) if deal[col] else []
+        return deal
+
+    def _select(self, where: str = "", params: tuple = (), limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        sql = "SELECT * FROM pipeline_deals"
+        if where:
+            sql += f" WHERE {where}"
+        sql += " ORDER BY rowid"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._from_row(r) for r in rows]
+
+    # ========================================
+    # API COMÚN
+    # ========================================
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        """Carga todos los deals"""
+        return self._select()
+
+    def get(self, deal_id: str) -> Optional[Dict[str, Any]]:
+        """Obtiene un deal por ID (búsqueda por clave primaria)"""
+        rows = self._select("id = ?", (deal_id,))
+        return rows[0] if rows else None
+
+    def upsert(self, deal: Dict[str, Any]):
+        """Inserta o reemplaza un único deal"""
+        self.upsert_many([deal])
+
+    def upsert_many(self, deals: Iterable[Dict[str, Any]]):
+        """Inserta o reemplaza varios deals en una transacción"""
+        rows = [self._to_row(d) for d in deals]
+        if not rows:
+            return
+        placeholders = ", ".join("?" for _ in DEAL_COLUMNS)
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO pipeline_deals ({', '.join(DEAL_COLUMNS)}) VALUES ({placeholders})",
+                rows
+            )
+            self._conn.commit()
+
+    def delete(self, deal_id: str) -> bool:
+        """Elimina un deal"""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM pipeline_deals WHERE id = ?", (deal_id,))
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def clear(self):
+        """Elimina todos los deals y eventos (usado al importar un pipeline completo)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pipeline_deals")
+            self._conn.execute("DELETE FROM pipeline_eventos")
+            self._conn.commit()
+
+    def append_events(self, eventos: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Agrega eventos (deal_id, evento) al log append-only"""
+        rows = [
+            (deal_id, evento["fecha"], json.dumps(evento, ensure_ascii=False, default=str))
+            for deal_id, evento in eventos
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO pipeline_eventos (deal_id, fecha, evento) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def load_events(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Todos los eventos en orden de inserción"""
+        with self._lock:
+            rows = self._conn.execute("SELECT deal_id, evento FROM pipeline_eventos ORDER BY seq").fetchall()
+        return [(row["deal_id"], json.loads(row["evento"])) for row in rows]
+
+    def query(
+        self,
+        etapa: Optional[str] = None,
+        vendedor: Optional[str] = None,
+        prioridad: Optional[str] = None,
+        accion_hasta: Optional[date] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Filtra deals usando los índices de la tabla"""
+        condiciones, params = [], []
+        for col, value in (("etapa", etapa), ("vendedor", vendedor), ("prioridad", prioridad)):
+            if value is not None:
+                condiciones.append(f"{col} = ?")
+                params.append(value)
+        if accion_hasta is not None:
+            condiciones.append("fecha_siguiente_accion <= ?")
+            params.append(_iso(accion_hasta))
+        return self._select(" AND ".join(condiciones), tuple(params), limit)
+
+    def search(self, texto: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Busca por cliente, contacto o notas (sin distinguir mayúsculas)"""
+        patron = f"%{texto}%"
+        return self._select(
+            "cliente LIKE ? OR contacto LIKE ? OR notas LIKE ?", (patron, patron, patron), limit
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SupabasePipelineStorage:
+    """Backend Supabase con la misma API que SQLitePipelineStorage"""
+
+    def __init__(self, supabase, table_name: str = "pipeline_deals", events_table: str = "pipeline_eventos"):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.events_table = events_table
+
+    @staticmethod
+    def _to_row(deal: Dict[str, Any]) -> Dict[str, Any]:
+        # productos_interes e historial son columnas jsonb: se envían como listas
+        return {col: _iso(deal.get(col)) for col in DEAL_COLUMNS}
+
+    @staticmethod
+    def _from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        deal = {col: row.get(col) for col in DEAL_COLUMNS + ["historial"]}
+        for col in JSON_COLUMNS:
+            if isinstance(deal[col], str):
+                deal[col] = json.loads(deal[col])
+            deal[col] = deal[col] or []
+        return deal
+
+    def _fetch_all(self, build_query, limit: Optional[int] = None, raw: bool = False, order: str = "id") -> List[Dict[str, Any]]:
+        """Ejecuta la consulta paginando de 1000 en 1000"""
+        all_data = []
+        page_size = 1000
+        offset = 0
+        while True:
+            response = build_query().order(order).range(offset, offset + page_size - 1).execute()
+            if not response.data:
+                break
+            all_data.extend(response.data)
+            if len(response.data) < page_size or (limit and len(all_data) >= limit):
+                break
+            offset += page_size
+        if limit:
+            all_data = all_data[:limit]
+        return all_data if raw else [self._from_row(r) for r in all_data]
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        return self._fetch_all(lambda: self.supabase.table(self.table_name).select("*"))
+
+    def get(self, deal_id: str) -> Optional[Dict[str, Any]]:
+        response = self.supabase.table(self.table_name).select("*").eq("id", deal_id).limit(1).execute()
+        return self._from_row(response.data[0]) if response.data else None
+
+    def upsert(self, deal: Dict[str, Any]):
+        self.supabase.table(self.table_name).upsert(self._to_row(deal)).execute()
+
+    def upsert_many(self, deals: Iterable[Dict[str, Any]]):
+        rows = [self._to_row(d) for d in deals]
+        for i in range(0, len(rows), 500):
+            self.supabase.table(self.table_name).upsert(rows[i:i + 500]).execute()
+
+    def delete(self, deal_id: str) -> bool:
+        response = self.supabase.table(self.table_name).delete().eq("id", deal_id).execute()
+        return bool(response.data)
+
+    def clear(self):
+        self.supabase.table(self.table_name).delete().neq("id", "").execute()
+        self.supabase.table(self.events_table).delete().gte("seq", 0).execute()
+
+    def append_events(self, eventos: Iterable[Tuple[str, Dict[str, Any]]]):
+        rows = [{"deal_id": deal_id, "fecha": evento["fecha"], "evento": evento} for deal_id, evento in eventos]
+        for i in range(0, len(rows), 500):
+            self.supabase.table(self.events_table).insert(rows[i:i + 500]).execute()
+
+    def load_events(self) -> List[Tuple[str, Dict[str, Any]]]:
+        rows = self._fetch_all(
+            lambda: self.supabase.table(self.events_table).select("deal_id, evento"), raw=True, order="seq"
+        )
+        return [
+            (r["deal_id"], json.loads(r["evento"]) if isinstance(r["evento"], str) else r["evento"])
+            for r in rows
+        ]
+
+    def query(
+        self,
+        etapa: Optional[str] = None,
+        vendedor: Optional[str] = None,
+        prioridad: Optional[str] = None,
+        accion_hasta: Optional[date] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        def build():
+            q = self.supabase.table(self.table_name).select("*")
+            for col, value in (("etapa", etapa), ("vendedor", vendedor), ("prioridad", prioridad)):
+                if value is not None:
+                    q = q.eq(col, value)
+            if accion_hasta is not None:
+                q = q.lte("fecha_siguiente_accion", _iso(accion_hasta))
+            return q
+        return self._fetch_all(build, limit)
+
+    def search(self, texto: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        patron = f"%{texto}%"
+        return self._fetch_all(
+            lambda: self.supabase.table(self.table_name).select("*").or_(
+                f"cliente.ilike.{patron},contacto.ilike.{patron},notas.ilike.{patron}"
+            ),
+            limit
+        )
+
+
+def get_pipeline_storage(supabase=None):
+    """Backend según PIPELINE_STORAGE ('sqlite' por defecto, 'supabase' si hay cliente)"""
+    backend = os.getenv("PIPELINE_STORAGE", "sqlite").lower()
+    if backend == "supabase" and supabase is not None:
+        return SupabasePipelineStorage(supabase)
+    return SQLitePipelineStorage()
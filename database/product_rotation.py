@@ -0,0 +1,286 @@
+"""
+Resumen precalculado de rotación por producto (tabla `rotacion_productos`)
+
+Una fila por `cod_articulo` con primera y última venta, totales, rotación
+mensual y el conjunto de clientes compradores como arreglo de NITs. Las vistas
+de rotación y referencias quietas leen esta tabla pequeña en lugar de
+descargar y reagrupar todo `compras_clientes`.
+
+Al importar compras se recalculan solo los productos afectados, consultando
+sus filas en `compras_clientes` (ver crear_tabla_rotacion_productos.sql). Se
+recalculan en lugar de sumar las filas nuevas porque la importación también
+actualiza compras existentes. Antes del primer recálculo incremental del
+proceso se verifica que la tabla tenga todos los productos: vacía se
+reconstruye completa y, si le faltan productos, se agregan junto con los de
+la importación.
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from database.cache import cached
+
+ROTACION_TABLE = "rotacion_productos"
+
+# Columnas de compras_clientes necesarias para el resumen
+COLUMNAS_COMPRAS = "cod_articulo, detalle, marca, grupo, subgrupo, nit_cliente, fecha, total, cantidad"
+
+COLUMNAS_ROTACION = [
+    "cod_articulo", "detalle", "marca", "grupo", "subgrupo", "primera_venta", "ultima_venta",
+    "total_vendido", "veces_vendido", "cantidad_total", "rotacion_mensual", "num_clientes", "clientes"
+]
+
+# Códigos por consulta .in_() y filas por upsert
+LOTE_CODIGOS = 100
+LOTE_ESCRITURA = 500
+
+
+# Tablas (por URL de Supabase) ya verificadas como completas en este proceso
+_verificadas = set()
+_verificadas_lock = threading.Lock()
+
+
+def _texto(serie: pd.Series) -> pd.Series:
+    return serie.astype(str).str.strip()
+
+
+def _codigos_validos(codigos: Iterable[Any]) -> set:
+    return {str(c).strip() for c in codigos if c is not None and str(c).strip() not in ('', 'None', 'nan')}
+
+
+def calcular_rotacion(compras: pd.DataFrame) -> pd.DataFrame:
+    """
+    Resumen por producto a partir de filas de compras (sin devoluciones)
+
+    Returns:
+        DataFrame con COLUMNAS_ROTACION; `clientes` es la lista ordenada de NITs
+    """
+    if compras.empty or 'cod_articulo' not in compras.columns:
+        return pd.DataFrame(columns=COLUMNAS_ROTACION)
+
+    df = compras.reindex(columns=[
+        'cod_articulo', 'detalle', 'marca', 'grupo', 'subgrupo', 'nit_cliente', 'fecha', 'total', 'cantidad'
+    ])
+    df['cod_articulo'] = _texto(df['cod_articulo'])
+    df = df[~df['cod_articulo'].isin(['', 'None', 'nan'])]
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_ROTACION)
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
+    df['total'] = pd.to_numeric(df['total'], errors='coerce').fillna(0)
+    df['cantidad'] = pd.to_numeric(df['cantidad'], errors='coerce').fillna(0)
+
+    rotacion = df.groupby('cod_articulo').agg(
+        detalle=('detalle', 'first'),
+        marca=('marca', 'first'),
+        grupo=('grupo', 'first'),
+        subgrupo=('subgrupo', 'first'),
+        primera_venta=('fecha', 'min'),
+        ultima_venta=('fecha', 'max'),
+        total_vendido=('total', 'sum'),
+        veces_vendido=('total', 'size'),
+        cantidad_total=('cantidad', 'sum')
+    )
+
+    # Ventas por mes de actividad (mismo criterio que el análisis de rotación)
+    dias_activo = (rotacion['ultima_venta'] - rotacion['primera_venta']).dt.days.fillna(0)
+    rotacion['rotacion_mensual'] = rotacion['veces_vendido'] / (dias_activo / 30).replace(0, 1)
+
+    # Compradores: pares únicos ordenados y cortados por producto (sin lambdas por grupo)
+    pares = pd.DataFrame({
+        'cod_articulo': df['cod_articulo'],
+        'nit_cliente': _texto(df['nit_cliente'].dropna())
+    }).dropna().drop_duplicates().sort_values(['cod_articulo', 'nit_cliente'])
+    codigos, inicios = np.unique(pares['cod_articulo'].to_numpy(), return_index=True)
+    grupos = np.split(pares['nit_cliente'].to_numpy(), inicios[1:]) if len(pares) else []
+    clientes = pd.Series([g.tolist() for g in grupos], index=codigos, dtype=object)
+
+    rotacion['clientes'] = clientes.reindex(rotacion.index)
+    rotacion['clientes'] = [c if isinstance(c, list) else [] for c in rotacion['clientes']]
+    rotacion['num_clientes'] = rotacion['clientes'].str.len().astype(int)
+
+    return rotacion.reset_index()[COLUMNAS_ROTACION]
+
+
+def _normalizar(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipos de la tabla leída de Supabase (fechas, números y arreglo de clientes)"""
+    df = df.reindex(columns=COLUMNAS_ROTACION)
+    for columna in ('primera_venta', 'ultima_venta'):
+        df[columna] = pd.to_datetime(df[columna], errors='coerce')
+    for columna in ('total_vendido', 'cantidad_total', 'rotacion_mensual'):
+        df[columna] = pd.to_numeric(df[columna], errors='coerce').fillna(0)
+    for columna in ('veces_vendido', 'num_clientes'):
+        df[columna] = pd.to_numeric(df[columna], errors='coerce').fillna(0).astype(int)
+    df['clientes'] = [c if isinstance(c, list) else [] for c in df['clientes']]
+    return df
+
+
+def _registros(rotacion: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Filas listas para upsert (fechas ISO, sin NaN)"""
+    df = rotacion[COLUMNAS_ROTACION].copy()
+    for columna in ('primera_venta', 'ultima_venta'):
+        df[columna] = df[columna].map(lambda f: f.isoformat() if pd.notna(f) else None)
+    df = df.astype(object).where(df.notna(), None)
+    df['actualizado_en'] = datetime.now().isoformat()
+    return df.to_dict('records')
+
+
+class ProductRotationStore:
+    """Lectura y mantenimiento incremental de `rotacion_productos`"""
+
+    def __init__(self, supabase, table_name: str = ROTACION_TABLE, compras_table: str = "compras_clientes"):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.compras_table = compras_table
+
+    # ========================================
+    # LECTURA
+    # ========================================
+
+    @cached("compras_clientes", ttl=300)
+    def cargar(_self) -> pd.DataFrame:
+        """Resumen de todos los productos; si la tabla no existe o está vacía se calcula al vuelo"""
+        try:
+            df = pd.DataFrame(_self._leer_paginado(_self.table_name, "*"))
+        except Exception as e:
+            print(f"⚠️ No se pudo leer {_self.table_name}, se calcula desde compras: {e}")
+            df = pd.DataFrame()
+
+        if df.empty:
+            return calcular_rotacion(_self._leer_compras())
+        return _normalizar(df)
+
+    def quietos(self, dias_sin_rotacion: int) -> pd.DataFrame:
+        """Productos sin ventas en los últimos `dias_sin_rotacion` días, los más antiguos primero"""
+        rotacion = self.cargar()
+        if rotacion.empty:
+            return rotacion
+        ahora = pd.Timestamp.now()
+        limite = ahora - pd.Timedelta(days=dias_sin_rotacion)
+        quietos = rotacion[
+            (rotacion['ultima_venta'] < limite) | rotacion['ultima_venta'].isna()
+        ].copy()
+        quietos['dias_sin_venta'] = (ahora - quietos['ultima_venta']).dt.days
+        return quietos.sort_values('dias_sin_venta', ascending=False)
+
+    # ========================================
+    # MANTENIMIENTO
+    # ========================================
+
+    def actualizar_productos(self, codigos: Iterable[Any]) -> int:
+        """
+        Recalcula el resumen solo de los productos dados (llamar tras importar compras)
+
+        Returns:
+            Número de productos actualizados
+        """
+        codigos = _codigos_validos(codigos)
+        if not codigos:
+            return 0
+
+        faltantes = self._productos_faltantes()
+        if faltantes is None:
+            return self.reconstruir()
+        codigos = sorted(codigos | faltantes)
+
+        rotacion = calcular_rotacion(self._leer_compras(codigos))
+        self._guardar(rotacion)
+
+        # Productos que ya no tienen compras (p. ej. corregidas como devolución)
+        sin_compras = sorted(set(codigos) - set(rotacion['cod_articulo']))
+        for inicio in range(0, len(sin_compras), LOTE_CODIGOS):
+            self.supabase.table(self.table_name).delete().in_(
+                "cod_articulo", sin_compras[inicio:inicio + LOTE_CODIGOS]
+            ).execute()
+        return len(rotacion)
+
+    def actualizar_productos_seguro(self, codigos: Iterable[Any]) -> int:
+        """Como actualizar_productos, pero un error no interrumpe la importación"""
+        try:
+            return self.actualizar_productos(codigos)
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar {self.table_name}: {e}")
+            return 0
+
+    def reconstruir(self) -> int:
+        """Recalcula la tabla completa desde compras_clientes"""
+        rotacion = calcular_rotacion(self._leer_compras())
+        self._guardar(rotacion)
+        with _verificadas_lock:
+            _verificadas.add(self._clave())
+        return len(rotacion)
+
+    def _productos_faltantes(self) -> Optional[set]:
+        """
+        Productos con compras que no están en la tabla (una vez por proceso)
+
+        Returns:
+            None si la tabla está vacía (hay que reconstruirla); conjunto vacío si ya se verificó
+        """
+        if self._clave() in _verificadas:
+            return set()
+        en_tabla = _codigos_validos(f.get('cod_articulo') for f in self._leer_paginado(self.table_name, "cod_articulo"))
+        if not en_tabla:
+            return None
+        en_compras = _codigos_validos(f.get('cod_articulo') for f in self._leer_paginado(
+            self.compras_table, "cod_articulo", lambda q: q.eq("es_devolucion", False)
+        ))
+        with _verificadas_lock:
+            _verificadas.add(self._clave())
+        return en_compras - en_tabla
+
+    def _clave(self):
+        return (getattr(self.supabase, "supabase_url", None) or id(self.supabase), self.table_name)
+
+    def _guardar(self, rotacion: pd.DataFrame):
+        registros = _registros(rotacion) if not rotacion.empty else []
+        for inicio in range(0, len(registros), LOTE_ESCRITURA):
+            self.supabase.table(self.table_name).upsert(
+                registros[inicio:inicio + LOTE_ESCRITURA], on_conflict="cod_articulo"
+            ).execute()
+
+    # ========================================
+    # CONSULTAS A SUPABASE
+    # ========================================
+
+    def _leer_compras(self, codigos: Optional[List[str]] = None) -> pd.DataFrame:
+        """Compras (sin devoluciones) de todos los productos o solo de los códigos dados"""
+        if codigos is None:
+            return pd.DataFrame(self._leer_paginado(
+                self.compras_table, COLUMNAS_COMPRAS, lambda q: q.eq("es_devolucion", False)
+            ))
+
+        filas: List[Dict[str, Any]] = []
+        for inicio in range(0, len(codigos), LOTE_CODIGOS):
+            lote = codigos[inicio:inicio + LOTE_CODIGOS]
+            filas.extend(self._leer_paginado(
+                self.compras_table, COLUMNAS_COMPRAS,
+                lambda q, lote=lote: q.eq("es_devolucion", False).in_("cod_articulo", lote)
+            ))
+        return pd.DataFrame(filas)
+
+    def _leer_paginado(self, tabla: str, columnas: str, filtro=None) -> List[Dict[str, Any]]:
+        all_data = []
+        page_size = 1000
+        offset = 0
+
+        while True:
+            query = self.supabase.table(tabla).select(columnas)
+            if filtro is not None:
+                query = filtro(query)
+            response = query.range(offset, offset + page_size - 1).execute()
+
+            if not response.data:
+                break
+
+            all_data.extend(response.data)
+
+            if len(response.data) < page_size:
+                break
+
+            offset += page_size
+
+        return all_data
@@ -0,0 +1,379 @@
+"""
+Cubo de compras ciudad x referencia x cliente x mes, servido desde memoria
+
+La tabla `cubo_compras` (ver crear_tabla_cubo_compras.sql) guarda una fila por
+(nit_cliente, cod_articulo, mes) con total, cantidad y número de compras, sin
+devoluciones. La ciudad no se guarda en la tabla: depende solo del cliente, así
+que se toma del repositorio de clientes al consultar y un cambio de ciudad no
+deja filas desactualizadas.
+
+Mantenimiento incremental: al importar compras de un cliente se recalculan y
+reemplazan solo sus filas (`actualizar_clientes`). Antes del primer reemplazo
+del proceso se verifica que la tabla tenga a todos los clientes con compras:
+vacía se reconstruye completa y los clientes que falten se recalculan con los
+importados. Un cliente que se queda sin compras deja una fila vacía
+(cod_articulo y mes en '') para que los lectores descarten sus filas.
+
+Los lectores tienen el cubo en memoria y, cuando cambia la versión de
+`compras_clientes` o pasa REVISION_CAMBIOS (importaciones de otros procesos o
+instancias), traen solo las filas con `actualizado_en` posterior a la última
+carga; cada hora se recarga completo. `actualizado_en` lo pone Postgres al
+insertar, así que no depende del reloj ni de la zona horaria de quien escribe. Si la tabla no existe o está
+vacía, el cubo se calcula con el agregado `cubo_compras` de
+database/aggregations.py.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from database.aggregations import agregar, get_aggregation_backend
+from database.cache import cache
+from database.client_repository import get_client_repository
+
+CUBO_TABLE = "cubo_compras"
+
+COLUMNAS_CUBO = ["nit_cliente", "cod_articulo", "mes", "total", "cantidad", "num_compras"]
+
+# Segundos entre recargas completas (entre ellas solo se traen los cambios)
+RECARGA_COMPLETA = 3600
+
+# Segundos máximos sin consultar cambios: la versión de la caché solo cambia con
+# las escrituras de este proceso, no con las de Streamlit u otras instancias
+REVISION_CAMBIOS = 60
+
+# NITs por consulta .in_() y filas por insert
+LOTE_CLIENTES = 100
+LOTE_ESCRITURA = 500
+
+# Tablas (por URL de Supabase) ya verificadas como completas en este proceso
+_verificadas = set()
+_verificadas_lock = threading.Lock()
+
+
+def _nits_validos(nits: Iterable[Any]) -> set:
+    return {str(n).strip() for n in nits if n is not None and str(n).strip()}
+
+
+def _sin_filas_vacias(cubo: pd.DataFrame) -> pd.DataFrame:
+    """Descarta las filas vacías de clientes sin compras"""
+    return cubo[cubo['cod_articulo'].astype(str) != ''] if not cubo.empty else cubo
+
+
+def calcular_cubo(compras: pd.DataFrame) -> pd.DataFrame:
+    """Cubo (nit_cliente, cod_articulo, mes) a partir de filas de compras sin devoluciones"""
+    if compras.empty:
+        return pd.DataFrame(columns=COLUMNAS_CUBO)
+
+    df = compras.reindex(columns=['nit_cliente', 'cod_articulo', 'fecha', 'total', 'cantidad'])
+    df['cod_articulo'] = df['cod_articulo'].astype(str).str.strip()
+    df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce', utc=True)
+    df = df[
+        df['nit_cliente'].notna() & df['fecha'].notna() &
+        ~df['cod_articulo'].isin(['', 'N/A', 'None', 'nan'])
+    ]
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_CUBO)
+
+    df['nit_cliente'] = df['nit_cliente'].astype(str)
+    df['mes'] = df['fecha'].dt.strftime('%Y-%m')
+    df['total'] = pd.to_numeric(df['total'], errors='coerce').fillna(0)
+    df['cantidad'] = pd.to_numeric(df['cantidad'], errors='coerce').fillna(0)
+    cubo = df.groupby(['nit_cliente', 'cod_articulo', 'mes'], sort=True).agg(
+        total=('total', 'sum'),
+        cantidad=('cantidad', 'sum'),
+        num_compras=('total', 'size')
+    ).reset_index()
+    return cubo[COLUMNAS_CUBO]
+
+
+def _compactar(cubo: pd.DataFrame) -> pd.DataFrame:
+    """Tipos compactos para tenerlo en memoria (categorías y float64/int32)"""
+    cubo = cubo.reindex(columns=COLUMNAS_CUBO).copy()
+    for columna in ('nit_cliente', 'cod_articulo', 'mes'):
+        cubo[columna] = cubo[columna].astype(str).astype('category')
+    cubo['total'] = pd.to_numeric(cubo['total'], errors='coerce').fillna(0).astype(float)
+    cubo['cantidad'] = pd.to_numeric(cubo['cantidad'], errors='coerce').fillna(0).astype(float)
+    cubo['num_compras'] = pd.to_numeric(cubo['num_compras'], errors='coerce').fillna(0).astype('int32')
+    return cubo.reset_index(drop=True)
+
+
+def _filas_vacias(nits: Iterable[str]) -> pd.DataFrame:
+    """Una fila en cero por cliente sin compras (reemplaza sus filas en los lectores)"""
+    nits = sorted(nits)
+    return pd.DataFrame({
+        'nit_cliente': nits, 'cod_articulo': '', 'mes': '', 'total': 0.0, 'cantidad': 0.0, 'num_compras': 0
+    }, columns=COLUMNAS_CUBO)
+
+
+class PurchaseCube:
+    """Cubo de compras en memoria con consultas por ciudad, referencia y cliente"""
+
+    def __init__(self, supabase, table_name: str = CUBO_TABLE, compras_table: str = "compras_clientes"):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.compras_table = compras_table
+        self.clientes = get_client_repository(supabase)
+
+        self._lock = threading.Lock()
+        self._cubo: Optional[pd.DataFrame] = None
+        self._version = -1
+        self._cargado_en = 0.0
+        self._revisado_en = 0.0
+        # Último actualizado_en visto (None si el cubo viene del agregado)
+        self._marca: Optional[str] = None
+
+    # ========================================
+    # CARGA EN MEMORIA
+    # ========================================
+
+    def _snapshot(self) -> pd.DataFrame:
+        version = cache.version(self.compras_table)
+        if self._vigente(version):
+            return self._cubo
+        with self._lock:
+            if self._vigente(version):
+                return self._cubo
+            ahora = time.monotonic()
+            reciente = ahora - self._cargado_en < RECARGA_COMPLETA
+            if self._cubo is not None and self._marca is not None and reciente:
+                self._aplicar_cambios()
+            else:
+                self._cargar_completo()
+            self._version = version
+            self._revisado_en = ahora
+            return self._cubo
+
+    def _vigente(self, version: int) -> bool:
+        """Cubo cargado, sin escrituras locales ni revisión pendiente"""
+        return (
+            self._cubo is not None
+            and self._version == version
+            and time.monotonic() - self._revisado_en < cache.ttl_efectivo(REVISION_CAMBIOS)
+        )
+
+    def _cargar_completo(self):
+        try:
+            filas = self._leer_paginado(lambda: self.supabase.table(self.table_name).select("*"))
+        except Exception as e:
+            print(f"⚠️ No se pudo leer {self.table_name}, se calcula con el agregado: {e}")
+            filas = []
+
+        if filas:
+            df = pd.DataFrame(filas)
+            self._marca = df['actualizado_en'].max() if 'actualizado_en' in df.columns else None
+            self._cubo = _compactar(_sin_filas_vacias(df))
+        else:
+            self._marca = None
+            self._cubo = _compactar(agregar(get_aggregation_backend(self.supabase), "cubo_compras"))
+        self._cargado_en = time.monotonic()
+
+    def _aplicar_cambios(self):
+        """Reemplaza en memoria las filas de los clientes actualizados desde la última carga"""
+        marca = self._marca
+        cambios = pd.DataFrame(self._leer_paginado(
+            lambda: self.supabase.table(self.table_name).select("*").gt("actualizado_en", marca)
+        ))
+        if cambios.empty:
+            return
+        nits = set(cambios['nit_cliente'].astype(str))
+        actual = self._cubo[~self._cubo['nit_cliente'].isin(nits)]
+        self._cubo = _compactar(pd.concat(
+            [actual.astype({c: str for c in ('nit_cliente', 'cod_articulo', 'mes')}), _sin_filas_vacias(cambios)[COLUMNAS_CUBO]],
+            ignore_index=True
+        ))
+        self._marca = max(marca, cambios['actualizado_en'].max())
+
+    def _con_ciudad(self, desde_mes: Optional[str] = None, referencia: Optional[str] = None) -> pd.DataFrame:
+        """Filas del cubo filtradas, con la ciudad del cliente (solo clientes con ciudad)"""
+        cubo = self._snapshot()
+        if desde_mes:
+            meses = [m for m in cubo['mes'].cat.categories if m >= desde_mes]
+            cubo = cubo[cubo['mes'].isin(meses)]
+        if referencia:
+            cubo = cubo[cubo['cod_articulo'] == str(referencia).strip()]
+
+        clientes = self.clientes.listar(columnas=['nit', 'ciudad'])
+        if clientes.empty or cubo.empty:
+            return cubo.assign(ciudad=pd.Series(dtype=object)).iloc[0:0]
+        ciudades = clientes.assign(nit=clientes['nit'].astype(str).str.strip())
+        ciudades = ciudades[ciudades['ciudad'].notna() & (ciudades['ciudad'].astype(str).str.strip() != '')]
+        nit_a_ciudad = dict(zip(ciudades['nit'], ciudades['ciudad'].astype(str).str.strip()))
+
+        # map sobre una columna categórica solo recorre las categorías
+        cubo = cubo.assign(ciudad=cubo['nit_cliente'].map(nit_a_ciudad))
+        return cubo[cubo['ciudad'].notna()]
+
+    # ========================================
+    # CONSULTAS
+    # ========================================
+
+    def por_ciudad(self, desde_mes: Optional[str] = None, referencia: Optional[str] = None) -> pd.DataFrame:
+        """Totales por ciudad (total, cantidad, compras, clientes y referencias distintos)"""
+        cubo = self._con_ciudad(desde_mes, referencia)
+        if cubo.empty:
+            return pd.DataFrame(columns=['ciudad', 'total', 'cantidad', 'num_compras', 'num_clientes', 'num_referencias'])
+        cubo = cubo.astype({'ciudad': str})
+        por_ciudad = cubo.groupby('ciudad', observed=True).agg(
+            total=('total', 'sum'),
+            cantidad=('cantidad', 'sum'),
+            num_compras=('num_compras', 'sum'),
+            num_clientes=('nit_cliente', 'nunique'),
+            num_referencias=('cod_articulo', 'nunique')
+        ).reset_index()
+        return por_ciudad.sort_values(['total', 'ciudad'], ascending=[False, True]).reset_index(drop=True)
+
+    def por_ciudad_y(self, dimension: str, desde_mes: Optional[str] = None, referencia: Optional[str] = None) -> pd.DataFrame:
+        """
+        Totales por ciudad y `dimension` ('nit_cliente' o 'cod_articulo'), ordenados
+        por ciudad y total descendente
+        """
+        otra = 'cod_articulo' if dimension == 'nit_cliente' else 'nit_cliente'
+        cubo = self._con_ciudad(desde_mes, referencia)
+        columnas = ['ciudad', dimension, 'total', 'cantidad', 'num_compras', f"num_{'clientes' if otra == 'nit_cliente' else 'referencias'}"]
+        if cubo.empty:
+            return pd.DataFrame(columns=columnas)
+        cubo = cubo.astype({'ciudad': str, dimension: str})
+        agrupado = cubo.groupby(['ciudad', dimension], observed=True).agg(
+            total=('total', 'sum'),
+            cantidad=('cantidad', 'sum'),
+            num_compras=('num_compras', 'sum'),
+            distintos=(otra, 'nunique')
+        ).reset_index()
+        agrupado = agrupado.rename(columns={'distintos': columnas[-1]})
+        return agrupado.sort_values(['ciudad', 'total'], ascending=[True, False]).reset_index(drop=True)
+
+    def referencias(self) -> List[str]:
+        """Referencias con compras de clientes que tienen ciudad, ordenadas"""
+        cubo = self._con_ciudad()
+        return sorted(cubo['cod_articulo'].astype(str).unique().tolist())
+
+    # ========================================
+    # MANTENIMIENTO
+    # ========================================
+
+    def actualizar_clientes(self, nits: Iterable[Any]) -> int:
+        """
+        Recalcula las filas del cubo de los clientes dados (llamar tras importar compras)
+
+        Returns:
+            Número de filas escritas
+        """
+        nits = _nits_validos(nits)
+        if not nits:
+            return 0
+
+        faltantes = self._clientes_faltantes()
+        if faltantes is None:
+            return self.reconstruir()
+        nits = sorted(nits | faltantes)
+
+        escritas = 0
+        for inicio in range(0, len(nits), LOTE_CLIENTES):
+            lote = nits[inicio:inicio + LOTE_CLIENTES]
+            compras = pd.DataFrame(self._leer_paginado(
+                lambda: self.supabase.table(self.compras_table).select(
+                    "nit_cliente, cod_articulo, fecha, total, cantidad"
+                ).eq("es_devolucion", False).in_("nit_cliente", lote)
+            ))
+            cubo = calcular_cubo(compras)
+            self.supabase.table(self.table_name).delete().in_("nit_cliente", lote).execute()
+            escritas += self._insertar(cubo)
+            escritas += self._insertar(_filas_vacias(set(lote) - set(cubo['nit_cliente'])))
+        return escritas
+
+    def actualizar_clientes_seguro(self, nits: Iterable[Any]) -> int:
+        """Como actualizar_clientes, pero un error no interrumpe la importación"""
+        try:
+            return self.actualizar_clientes(nits)
+        except Exception as e:
+            print(f"⚠️ No se pudo actualizar {self.table_name}: {e}")
+            return 0
+
+    def reconstruir(self) -> int:
+        """Recalcula la tabla completa con el agregado cubo_compras"""
+        cubo = agregar(get_aggregation_backend(self.supabase), "cubo_compras")
+        anteriores = self._nits_en_tabla()
+        self.supabase.table(self.table_name).delete().neq("nit_cliente", "").execute()
+        escritas = self._insertar(cubo)
+        # Los lectores con el cubo en memoria descartan a los clientes que ya no tienen compras
+        escritas += self._insertar(_filas_vacias(anteriores - set(cubo['nit_cliente'].astype(str))))
+        with _verificadas_lock:
+            _verificadas.add(self._clave())
+        return escritas
+
+    def _clientes_faltantes(self) -> Optional[set]:
+        """
+        Clientes con compras que no están en la tabla (una vez por proceso)
+
+        Returns:
+            None si la tabla está vacía (hay que reconstruirla); conjunto vacío si ya se verificó
+        """
+        if self._clave() in _verificadas:
+            return set()
+        en_tabla = self._nits_en_tabla()
+        if not en_tabla:
+            return None
+        en_compras = _nits_validos(f.get('nit_cliente') for f in self._leer_paginado(
+            lambda: self.supabase.table(self.compras_table).select("nit_cliente").eq("es_devolucion", False)
+        ))
+        with _verificadas_lock:
+            _verificadas.add(self._clave())
+        return en_compras - en_tabla
+
+    def _nits_en_tabla(self) -> set:
+        return _nits_validos(f.get('nit_cliente') for f in self._leer_paginado(
+            lambda: self.supabase.table(self.table_name).select("nit_cliente")
+        ))
+
+    def _clave(self):
+        return (getattr(self.supabase, "supabase_url", None) or id(self.supabase), self.table_name)
+
+    def _insertar(self, cubo: pd.DataFrame) -> int:
+        if cubo.empty:
+            return 0
+        # Sin actualizado_en: lo pone Postgres (DEFAULT NOW()) con un solo reloj para todos
+        registros = cubo[COLUMNAS_CUBO].astype({'total': float, 'cantidad': float, 'num_compras': int}).to_dict('records')
+        for inicio in range(0, len(registros), LOTE_ESCRITURA):
+            self.supabase.table(self.table_name).insert(registros[inicio:inicio + LOTE_ESCRITURA]).execute()
+        return len(registros)
+
+    @staticmethod
+    def _leer_paginado(construir_consulta) -> List[Dict[str, Any]]:
+        all_data = []
+        page_size = 1000
+        offset = 0
+
+        while True:
+            response = construir_consulta().range(offset, offset + page_size - 1).execute()
+
+            if not response.data:
+                break
+
+            all_data.extend(response.data)
+
+            if len(response.data) < page_size:
+                break
+
+            offset += page_size
+
+        return all_data
+
+
+# Un cubo por proyecto de Supabase en todo el proceso (cada request de FastAPI
+# crea su propio cliente, así que se comparte por URL y conserva el primero)
+_cubos: Dict[Any, PurchaseCube] = {}
+_cubos_lock = threading.Lock()
+
+
+def get_purchase_cube(supabase) -> PurchaseCube:
+    """Devuelve (creando si hace falta) el cubo compartido"""
+    clave = getattr(supabase, "supabase_url", None) or id(supabase)
+    with _cubos_lock:
+        cubo = _cubos.get(clave)
+        if cubo is None:
+            cubo = PurchaseCube(supabase)
+            _cubos[clave] = cubo
+    return cubo
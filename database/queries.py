@@ -1,9 +1,22 @@
 import pandas as pd
 from datetime import datetime, date, timedelta
 from supabase import Client
-import streamlit as st
 from typing import Optional, Dict, List, Any
 
+from database.cache import cached, invalidate, invalidate_all
+from utils.lazy_imports import modulo_diferido
+
+# Solo para mensajes: se importa al mostrar el primero (ver utils/lazy_imports.py)
+st = modulo_diferido("streamlit")
+
+
+def rango_mes(mes: str) -> tuple:
+    """Fechas (inicio, inicio del mes siguiente) de un mes YYYY-MM, para filtrar con gte/lt"""
+    inicio = datetime.strptime(mes, "%Y-%m").date()
+    siguiente = date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+    return inicio.isoformat(), siguiente.isoformat()
+
+
 class DatabaseManager:
     """Gestor centralizado de todas las operaciones de base de datos"""
     
@@ -15,7 +28,7 @@ class DatabaseManager:
     # OPERACIONES DE COMISIONES
     # ========================
     
-    @st.cache_data(ttl=300)
+    @cached("comisiones", ttl=300)
     def cargar_datos(_self):
         """Carga datos de la tabla comisiones con cache"""
         return _self._cargar_datos_raw()
@@ -36,6 +49,64 @@ class DatabaseManager:
             st.error(f"Error cargando datos: {str(e)}")
             return pd.DataFrame()
 
+    @cached("comisiones", ttl=300)
+    def cargar_facturas(_self, mes: Optional[str] = None, columnas: Optional[tuple] = None,
+                        solo_propios: bool = False, cliente: Optional[str] = None) -> pd.DataFrame:
+        """
+        Carga facturas filtrando en la consulta (cacheado por combinación de filtros)
+
+        Args:
+            mes: YYYY-MM; se filtra por rango de fecha_factura (None = todos los meses)
+            columnas: Columnas a traer (None = todas); id y fecha_factura siempre se incluyen
+            solo_propios: Solo facturas de clientes propios
+            cliente: Texto contenido en el nombre del cliente (sin distinguir mayúsculas)
+
+        Returns:
+            DataFrame procesado igual que cargar_datos
+        """
+        return _self._cargar_facturas_raw(mes, columnas, solo_propios, cliente)
+
+    def _cargar_facturas_raw(self, mes, columnas, solo_propios, cliente) -> pd.DataFrame:
+        try:
+            rango = rango_mes(mes) if mes else None
+        except ValueError:
+            return pd.DataFrame()
+
+        proyeccion = "*"
+        if columnas:
+            proyeccion = ", ".join(dict.fromkeys(("id", "fecha_factura") + tuple(columnas)))
+
+        def consulta():
+            query = self.supabase.table("comisiones").select(proyeccion)
+            if rango:
+                query = query.gte("fecha_factura", rango[0]).lt("fecha_factura", rango[1])
+            if solo_propios:
+                query = query.eq("cliente_propio", True)
+            if cliente:
+                query = query.ilike("cliente", f"%{cliente}%")
+            return query.order("id")
+
+        try:
+            filas = []
+            page_size = 1000
+            offset = 0
+            while True:
+                response = consulta().range(offset, offset + page_size - 1).execute()
+                if not response.data:
+                    break
+                filas.extend(response.data)
+                if len(response.data) < page_size:
+                    break
+                offset += page_size
+
+            if not filas:
+                return pd.DataFrame()
+            return self._procesar_datos_comisiones(pd.DataFrame(filas))
+
+        except Exception as e:
+            st.error(f"Error cargando facturas: {str(e)}")
+            return pd.DataFrame()
+
     def _procesar_datos_comisiones(self, df: pd.DataFrame) -> pd.DataFrame:
         """Procesa y limpia los datos de comisiones"""
         if df.empty:
@@ -129,6 +200,9 @@ class DatabaseManager:
 
     def _calcular_dias_vencimiento(self, df: pd.DataFrame):
         """Calcula días de vencimiento solo para facturas NO PAGADAS"""
+        if 'fecha_pago_max' not in df.columns:
+            df['dias_vencimiento'] = None
+            return
         hoy = pd.Timestamp.now()
         df['dias_vencimiento'] = df.apply(lambda row:
             (row['fecha_pago_max'] - hoy).days if not row.get('pagado', False) and pd.notna(row['fecha_pago_max'])
@@ -360,12 +434,7 @@ class DatabaseManager:
             result = self.supabase.table("comisiones").insert(data_filtrada).execute()
             
             if result.data:
-                # Limpiar cache si streamlit está disponible
-                try:
-                    import streamlit as st
-                    st.cache_data.clear()
-                except:
-                    pass  # No es un problema si streamlit no está disponible
+                invalidate("comisiones")
                 return True
             return False
             
@@ -407,7 +476,7 @@ class DatabaseManager:
             result = self.supabase.table("comisiones").update(safe_updates).eq("id", factura_id).execute()
             
             if result.data:
-                st.cache_data.clear()
+                invalidate("comisiones")
                 return True
             else:
                 st.error("No se pudo actualizar la factura")
@@ -561,75 +630,14 @@ class DatabaseManager:
             return pd.DataFrame()
 
     def insertar_devolucion(self, data: Dict[str, Any]) -> bool:
-        """Inserta una nueva devolución"""
-        try:
-            data["created_at"] = datetime.now().isoformat()
-            result = self.supabase.table("devoluciones").insert(data).execute()
+        """Inserta una nueva devolución (el libro de devoluciones ajusta la comisión de la factura)"""
+        from database.return_ledger import get_return_ledger
 
-            if result.data:
-                # Si la devolución afecta la comisión, actualizar la factura
-                if data.get("afecta_comision", True):
-                    success = self._actualizar_comision_por_devolucion(data["factura_id"], data["valor_devuelto"])
-                    if not success:
-                        st.warning("Devolución registrada pero error actualizando comisión")
-                return True
-            return False
-
-        except Exception as e:
-            st.error(f"Error insertando devolución: {e}")
-            return False
-
-    def _actualizar_comision_por_devolucion(self, factura_id: int, valor_devuelto: float) -> bool:
-        """Actualiza la comisión de una factura considerando devoluciones - CORREGIDO"""
         try:
-            # Obtener datos actuales de la factura
-            factura_response = self.supabase.table("comisiones").select("*").eq("id", factura_id).execute()
-            if not factura_response.data:
-                st.error("Factura no encontrada para actualizar comisión")
-                return False
-
-            factura = factura_response.data[0]
-
-            # Obtener total de devoluciones que afectan comisión
-            devoluciones_response = self.supabase.table("devoluciones").select("valor_devuelto").eq("factura_id", factura_id).eq("afecta_comision", True).execute()
-            total_devuelto = sum([d['valor_devuelto'] for d in devoluciones_response.data]) if devoluciones_response.data else 0
-
-            # Valores originales de la factura
-            valor_original = factura.get('valor', 0)
-            valor_neto_original = factura.get('valor_neto', 0)
-            porcentaje = factura.get('porcentaje', 0)
-            
-            # CORREGIR: Calcular nuevo valor base después de devoluciones
-            valor_neto_efectivo = valor_neto_original - (total_devuelto / 1.19)
-            
-            # Recalcular base comisión considerando descuentos múltiples
-            if factura.get('descuentos_multiples', False):
-                # Si tiene descuentos múltiples, restar el valor en pesos
-                valor_descuento_pesos = factura.get('valor_descuento_pesos', 0)
-                base_comision_efectiva = valor_neto_efectivo - valor_descuento_pesos
-            elif factura.get('descuento_pie_factura', False):
-                base_comision_efectiva = valor_neto_efectivo
-            else:
-                base_comision_efectiva = valor_neto_efectivo * 0.85
-
-            # Nueva comisión (asegurar que no sea negativa)
-            comision_efectiva = max(0, base_comision_efectiva * (porcentaje / 100))
-
-            updates = {
-                "valor_devuelto": total_devuelto,
-                "comision_ajustada": comision_efectiva,
-                "updated_at": datetime.now().isoformat()
-            }
-
-            result = self.supabase.table("comisiones").update(updates).eq("id", factura_id).execute()
-            
-            if result.data:
-                st.cache_data.clear()  # Limpiar cache
-                return True
-            return False
+            return bool(get_return_ledger(self.supabase).registrar([data]))
 
         except Exception as e:
-            st.error(f"Error actualizando comisión por devolución: {e}")
+            st.error(f"Error insertando devolución: {e}")
             return False
 
     def obtener_facturas_para_devolucion(self) -> pd.DataFrame:
@@ -698,6 +706,8 @@ class DatabaseManager:
                 data["created_at"] = datetime.now().isoformat()
                 result = self.supabase.table("metas_mensuales").insert(data).execute()
 
+            if result.data:
+                invalidate("metas_mensuales")
             return True if result.data else False
 
         except Exception as e:
@@ -766,7 +776,7 @@ class DatabaseManager:
 
     def limpiar_cache(self):
         """Limpia todos los caches de datos"""
-        st.cache_data.clear()
+        invalidate_all()
         self._columnas_cache = None  # Limpiar cache de columnas también
     
     def obtener_factura_por_id(self, factura_id: int) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,369 @@
+"""
+Libro de devoluciones: totales por factura y mes mantenidos en cada escritura
+
+La tabla `libro_devoluciones` (ver crear_tabla_libro_devoluciones.sql) guarda una
+fila por (factura_id, mes) con lo devuelto, lo que afecta comisión, el número de
+devoluciones y la última fecha. Un trigger sobre `devoluciones` la actualiza en
+la misma transacción de cada insert, update o delete, y con ella
+`comisiones.valor_devuelto` y `comision_ajustada` de la factura (sumando sus
+pocas filas del libro, sin releer sus devoluciones). Registrar un lote de
+devoluciones es un solo insert.
+
+Los lectores tienen el libro en memoria y, cuando cambia la versión de
+`devoluciones` o pasa REVISION_CAMBIOS (escrituras de otros procesos o
+instancias), traen solo las filas con `actualizado_en` posterior a la última
+carga (las filas no se borran: una factura sin devoluciones en un mes queda en
+cero); cada hora se recarga completo. Si la tabla no existe o está vacía, el
+libro se calcula desde `devoluciones` y la comisión de las facturas afectadas
+se recalcula desde Python, por lotes.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from database.cache import cache, invalidate
+
+LIBRO_TABLE = "libro_devoluciones"
+
+COLUMNAS_LIBRO = ["factura_id", "mes", "valor_devuelto", "valor_afecta_comision", "num_devoluciones", "ultima_fecha"]
+
+COLUMNAS_DEVOLUCIONES = "factura_id, valor_devuelto, fecha_devolucion, afecta_comision"
+
+IVA = 1.19
+
+# Segundos entre recargas completas (entre ellas solo se traen los cambios)
+RECARGA_COMPLETA = 3600
+
+# Segundos máximos sin consultar cambios: la versión de la caché solo cambia con
+# las escrituras de este proceso, no con las de Streamlit u otras instancias
+REVISION_CAMBIOS = 60
+
+# Facturas por consulta .in_() y devoluciones por insert
+LOTE_FACTURAS = 100
+LOTE_ESCRITURA = 500
+
+
+def comision_ajustada(factura: Dict[str, Any], total_devuelto: float) -> float:
+    """
+    Comisión de una factura descontando lo devuelto que afecta comisión (con IVA)
+
+    Misma regla que libro_devoluciones_ajustar_factura en el script SQL.
+    """
+    valor_neto_efectivo = float(factura.get('valor_neto') or 0) - total_devuelto / IVA
+    if factura.get('descuentos_multiples', False):
+        base = valor_neto_efectivo - float(factura.get('valor_descuento_pesos') or 0)
+    elif factura.get('descuento_pie_factura', False):
+        base = valor_neto_efectivo
+    else:
+        base = valor_neto_efectivo * 0.85
+    return max(0.0, base * float(factura.get('porcentaje') or 0) / 100)
+
+
+def _afecta(devoluciones: pd.DataFrame) -> pd.Series:
+    """afecta_comision con nulos como True (igual que cargar_devoluciones)"""
+    if 'afecta_comision' not in devoluciones.columns:
+        return pd.Series(True, index=devoluciones.index)
+    return devoluciones['afecta_comision'].fillna(True).astype(bool)
+
+
+def calcular_libro(devoluciones: pd.DataFrame) -> pd.DataFrame:
+    """Libro (factura_id, mes) a partir de filas de devoluciones"""
+    if devoluciones.empty or 'factura_id' not in devoluciones.columns:
+        return pd.DataFrame(columns=COLUMNAS_LIBRO)
+
+    df = devoluciones[devoluciones['factura_id'].notna()].copy()
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNAS_LIBRO)
+    df['factura_id'] = df['factura_id'].astype('int64')
+    df['ultima_fecha'] = pd.to_datetime(df.get('fecha_devolucion'), errors='coerce')
+    df['mes'] = df['ultima_fecha'].dt.strftime('%Y-%m').fillna('')
+    df['valor_devuelto'] = pd.to_numeric(df['valor_devuelto'], errors='coerce').fillna(0)
+    df['valor_afecta_comision'] = df['valor_devuelto'].where(_afecta(df), 0.0)
+    libro = df.groupby(['factura_id', 'mes'], sort=True).agg(
+        valor_devuelto=('valor_devuelto', 'sum'),
+        valor_afecta_comision=('valor_afecta_comision', 'sum'),
+        num_devoluciones=('valor_devuelto', 'size'),
+        ultima_fecha=('ultima_fecha', 'max')
+    ).reset_index()
+    return libro[COLUMNAS_LIBRO]
+
+
+def _normalizar(libro: pd.DataFrame) -> pd.DataFrame:
+    libro = libro.reindex(columns=COLUMNAS_LIBRO).copy()
+    libro['factura_id'] = pd.to_numeric(libro['factura_id'], errors='coerce').astype('int64')
+    libro['mes'] = libro['mes'].fillna('').astype(str)
+    for columna in ('valor_devuelto', 'valor_afecta_comision'):
+        libro[columna] = pd.to_numeric(libro[columna], errors='coerce').fillna(0).astype(float)
+    libro['num_devoluciones'] = pd.to_numeric(libro['num_devoluciones'], errors='coerce').fillna(0).astype('int64')
+    libro['ultima_fecha'] = pd.to_datetime(libro['ultima_fecha'], errors='coerce')
+    return libro.reset_index(drop=True)
+
+
+class _EstadoLibro:
+    """Libro en memoria, compartido por los ReturnLedger de un mismo proyecto"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.libro: Optional[pd.DataFrame] = None
+        self.version = -1
+        self.cargado_en = 0.0
+        self.revisado_en = 0.0
+        # Último actualizado_en visto (None si el libro se calculó desde devoluciones)
+        self.marca: Optional[str] = None
+        # El trigger mantiene el libro y las comisiones (None = sin confirmar)
+        self.con_trigger: Optional[bool] = None
+
+
+class ReturnLedger:
+    """Totales de devoluciones por factura y mes, en memoria y al día con cada escritura"""
+
+    def __init__(self, supabase, table_name: str = LIBRO_TABLE,
+                 devoluciones_table: str = "devoluciones", facturas_table: str = "comisiones",
+                 estado: Optional[_EstadoLibro] = None):
+        self.supabase = supabase
+        self.table_name = table_name
+        self.devoluciones_table = devoluciones_table
+        self.facturas_table = facturas_table
+        self._estado = estado or _EstadoLibro()
+
+    # ========================================
+    # CARGA EN MEMORIA
+    # ========================================
+
+    def _snapshot(self) -> pd.DataFrame:
+        version = cache.version(self.devoluciones_table)
+        if self._vigente(version):
+            return self._estado.libro
+        with self._estado.lock:
+            if self._vigente(version):
+                return self._estado.libro
+            ahora = time.monotonic()
+            reciente = ahora - self._estado.cargado_en < RECARGA_COMPLETA
+            if self._estado.libro is not None and self._estado.marca is not None and reciente:
+                self._aplicar_cambios()
+            else:
+                self._cargar_completo()
+            self._estado.version = version
+            self._estado.revisado_en = ahora
+            return self._estado.libro
+
+    def _vigente(self, version: int) -> bool:
+        """Libro cargado, sin escrituras locales ni revisión pendiente"""
+        return (
+            self._estado.libro is not None
+            and self._estado.version == version
+            and time.monotonic() - self._estado.revisado_en < cache.ttl_efectivo(REVISION_CAMBIOS)
+        )
+
+    def _cargar_completo(self):
+        try:
+            filas = self._leer_paginado(lambda: self.supabase.table(self.table_name).select("*"))
+        except Exception as e:
+            print(f"⚠️ No se pudo leer {self.table_name}, se calcula desde {self.devoluciones_table}: {e}")
+            filas = []
+
+        if filas:
+            df = pd.DataFrame(filas)
+            self._estado.marca = df['actualizado_en'].max() if 'actualizado_en' in df.columns else None
+            self._estado.libro = _normalizar(df)
+        else:
+            self._estado.marca = None
+            devoluciones = pd.DataFrame(self._leer_paginado(
+                lambda: self.supabase.table(self.devoluciones_table).select(COLUMNAS_DEVOLUCIONES)
+            ))
+            self._estado.libro = _normalizar(calcular_libro(devoluciones))
+        self._estado.cargado_en = time.monotonic()
+
+    def _aplicar_cambios(self):
+        """Reemplaza en memoria las filas (factura, mes) tocadas desde la última carga"""
+        marca = self._estado.marca
+        cambios = pd.DataFrame(self._leer_paginado(
+            lambda: self.supabase.table(self.table_name).select("*").gt("actualizado_en", marca)
+        ))
+        if cambios.empty:
+            return
+        libro = pd.concat([self._estado.libro, _normalizar(cambios)], ignore_index=True)
+        self._estado.libro = libro.drop_duplicates(['factura_id', 'mes'], keep='last').reset_index(drop=True)
+        self._estado.marca = max(marca, cambios['actualizado_en'].max())
+
+    def _filtrar(self, mes: Optional[str] = None, facturas: Optional[Iterable[Any]] = None) -> pd.DataFrame:
+        libro = self._snapshot()
+        libro = libro[libro['num_devoluciones'] > 0]
+        if mes:
+            libro = libro[libro['mes'] == mes]
+        if facturas is not None:
+            libro = libro[libro['factura_id'].isin(pd.to_numeric(pd.Series(list(facturas)), errors='coerce'))]
+        return libro
+
+    # ========================================
+    # CONSULTAS
+    # ========================================
+
+    def por_factura_y_mes(self, mes: Optional[str] = None, facturas: Optional[Iterable[Any]] = None) -> pd.DataFrame:
+        """
+        Devoluciones agregadas por factura y mes
+
+        Returns:
+            DataFrame con factura_id, mes, valor_devuelto, valor_afecta_comision,
+            num_devoluciones y fecha_devolucion (la última del mes)
+        """
+        libro = self._filtrar(mes, facturas)
+        return libro.rename(columns={'ultima_fecha': 'fecha_devolucion'}).reset_index(drop=True)
+
+    def totales_por_mes(self, facturas: Optional[Iterable[Any]] = None) -> pd.DataFrame:
+        """Totales por mes de devolución (opcionalmente solo de las facturas dadas), en orden"""
+        libro = self._filtrar(facturas=facturas)
+        columnas = ['mes', 'valor_devuelto', 'valor_afecta_comision', 'num_devoluciones', 'num_facturas']
+        if libro.empty:
+            return pd.DataFrame(columns=columnas)
+        por_mes = libro.groupby('mes', sort=True).agg(
+            valor_devuelto=('valor_devuelto', 'sum'),
+            valor_afecta_comision=('valor_afecta_comision', 'sum'),
+            num_devoluciones=('num_devoluciones', 'sum'),
+            num_facturas=('factura_id', 'nunique')
+        ).reset_index()
+        return por_mes[columnas]
+
+    def totales_factura(self, factura_id: Any) -> Dict[str, Any]:
+        """Lo devuelto en una factura (todas sus filas del libro)"""
+        libro = self._filtrar(facturas=[factura_id])
+        return {
+            "factura_id": int(factura_id),
+            "valor_devuelto": float(libro['valor_devuelto'].sum()),
+            "valor_afecta_comision": float(libro['valor_afecta_comision'].sum()),
+            "num_devoluciones": int(libro['num_devoluciones'].sum()),
+        }
+
+    # ========================================
+    # ESCRITURA
+    # ========================================
+
+    def registrar(self, devoluciones: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Registra un lote de devoluciones (un insert por cada LOTE_ESCRITURA)
+
+        Returns:
+            Filas insertadas, con su id
+        """
+        ahora = datetime.now().isoformat()
+        registros = [
+            {"afecta_comision": True, "motivo": "", **devolucion, "created_at": ahora}
+            for devolucion in devoluciones
+        ]
+        insertadas = []
+        for inicio in range(0, len(registros), LOTE_ESCRITURA):
+            resultado = self.supabase.table(self.devoluciones_table).insert(
+                registros[inicio:inicio + LOTE_ESCRITURA]
+            ).execute()
+            insertadas.extend(resultado.data or [])
+        if insertadas:
+            self._tras_escribir(d.get("factura_id") for d in insertadas)
+        return insertadas
+
+    def actualizar(self, devolucion_id: int, cambios: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Actualiza una devolución; None si no existe"""
+        resultado = self.supabase.table(self.devoluciones_table).update(
+            {**cambios, "updated_at": datetime.now().isoformat()}
+        ).eq("id", devolucion_id).execute()
+        if not resultado.data:
+            return None
+        self._tras_escribir(d.get("factura_id") for d in resultado.data)
+        return resultado.data[0]
+
+    def eliminar(self, devolucion_id: int) -> Optional[Dict[str, Any]]:
+        """Elimina una devolución; devuelve la fila borrada o None si no existía"""
+        resultado = self.supabase.table(self.devoluciones_table).delete().eq("id", devolucion_id).execute()
+        if not resultado.data:
+            return None
+        self._tras_escribir(d.get("factura_id") for d in resultado.data)
+        return resultado.data[0]
+
+    def _tras_escribir(self, factura_ids: Iterable[Any]):
+        if not self._trigger_instalado():
+            try:
+                self.recalcular_facturas(factura_ids)
+            except Exception as e:
+                print(f"⚠️ Devoluciones guardadas pero no se pudo recalcular la comisión: {e}")
+        invalidate(self.devoluciones_table, self.facturas_table)
+
+    def _trigger_instalado(self) -> bool:
+        """El trigger trg_libro_devoluciones mantiene libro y comisiones (se consulta en Postgres)"""
+        if self._estado.con_trigger is None:
+            try:
+                respuesta = self.supabase.rpc("libro_devoluciones_trigger_instalado", {}).execute()
+            except Exception:
+                # Sin la función (script sin ejecutar) o error de red: se recalcula desde Python
+                return False
+            self._estado.con_trigger = respuesta.data is True
+        return self._estado.con_trigger
+
+    def recalcular_facturas(self, factura_ids: Iterable[Any]) -> int:
+        """
+        Recalcula valor_devuelto y comision_ajustada de las facturas dadas desde sus
+        devoluciones (sin el trigger, o para reparar facturas puntuales)
+
+        Returns:
+            Número de facturas actualizadas
+        """
+        ids = sorted({int(f) for f in factura_ids if f is not None})
+        actualizadas = 0
+        for inicio in range(0, len(ids), LOTE_FACTURAS):
+            lote = ids[inicio:inicio + LOTE_FACTURAS]
+            facturas = self.supabase.table(self.facturas_table).select("*").in_("id", lote).execute().data or []
+            devoluciones = pd.DataFrame(self._leer_paginado(
+                lambda: self.supabase.table(self.devoluciones_table).select(COLUMNAS_DEVOLUCIONES).in_("factura_id", lote)
+            ))
+            devuelto = {}
+            if not devoluciones.empty:
+                valores = pd.to_numeric(devoluciones['valor_devuelto'], errors='coerce').fillna(0)
+                devuelto = valores.where(_afecta(devoluciones), 0.0).groupby(devoluciones['factura_id'].astype('int64')).sum().to_dict()
+
+            ahora = datetime.now().isoformat()
+            for factura in facturas:
+                total = float(devuelto.get(int(factura['id']), 0.0))
+                self.supabase.table(self.facturas_table).update({
+                    "valor_devuelto": total,
+                    "comision_ajustada": comision_ajustada(factura, total),
+                    "updated_at": ahora
+                }).eq("id", factura['id']).execute()
+                actualizadas += 1
+        return actualizadas
+
+    @staticmethod
+    def _leer_paginado(construir_consulta) -> List[Dict[str, Any]]:
+        all_data = []
+        page_size = 1000
+        offset = 0
+
+        while True:
+            response = construir_consulta().range(offset, offset + page_size - 1).execute()
+
+            if not response.data:
+                break
+
+            all_data.extend(response.data)
+
+            if len(response.data) < page_size:
+                break
+
+            offset += page_size
+
+        return all_data
+
+
+# Un libro en memoria por proyecto de Supabase en todo el proceso (cada request
+# de FastAPI crea su propio cliente, así que el estado se comparte por URL)
+_estados: Dict[Any, _EstadoLibro] = {}
+_estados_lock = threading.Lock()
+
+
+def get_return_ledger(supabase) -> ReturnLedger:
+    """Libro que lee y escribe con el cliente dado, sobre el estado en memoria compartido"""
+    clave = getattr(supabase, "supabase_url", None) or id(supabase)
+    with _estados_lock:
+        estado = _estados.setdefault(clave, _EstadoLibro())
+    return ReturnLedger(supabase, estado=estado)
@@ -1,16 +1,19 @@
 import pandas as pd
 from datetime import datetime, timedelta
 from supabase import Client
-import streamlit as st
 from typing import Dict, List, Any, Optional
 from difflib import SequenceMatcher
 
+from database.client_repository import get_client_repository
+from database.cache import invalidate
+
 
 class SyncManager:
     """Gestor de sincronización entre compras de clientes y facturas/comisiones"""
     
     def __init__(self, supabase: Client):
         self.supabase = supabase
+        self.clientes = get_client_repository(supabase)
     
     def analizar_sincronizacion(self) -> Dict[str, Any]:
         """Analiza qué compras pueden sincronizarse con qué facturas"""
@@ -66,8 +69,8 @@ class SyncManager:
                 fecha_compra = compra['fecha']
                 
                 # Buscar cliente por NIT en tabla de clientes B2B
-                cliente_b2b = self.supabase.table("clientes_b2b").select("nombre").eq("nit", nit).execute()
-                nombre_cliente_b2b = cliente_b2b.data[0]['nombre'] if cliente_b2b.data else None
+                cliente_b2b = self.clientes.obtener(nit)
+                nombre_cliente_b2b = cliente_b2b.get('nombre') if cliente_b2b else None
                 
                 # Buscar facturas que coincidan
                 # 1. Por número de factura exacto
@@ -336,7 +339,7 @@ class SyncManager:
                 'sincronizado_compras': True
             }).eq("id", factura_id).execute()
             
-            st.cache_data.clear()
+            invalidate("compras_clientes", "comisiones")
             
             return {"success": True, "mensaje": "Sincronización manual exitosa"}
             
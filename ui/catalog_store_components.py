@@ -5,6 +5,7 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 from database.catalog_manager import CatalogManager
 from utils.formatting import format_currency
+from database.cache import invalidate
 
 class CatalogStoreUI:
     """Interfaz tipo tienda para visualizar el catálogo de productos"""
@@ -33,7 +34,7 @@ class CatalogStoreUI:
         with col2:
             st.markdown("<br>", unsafe_allow_html=True)
             if st.button("🔄 Actualizar", use_container_width=True):
-                st.cache_data.clear()
+                invalidate("catalogo_productos")
                 st.rerun()
         
         # Filtros avanzados
@@ -261,7 +262,7 @@ class CatalogStoreUI:
                             if resultado.get('productos_desactivados', 0) > 0:
                                 st.warning(f"⚠️ {resultado['productos_desactivados']} productos desactivados (agotados)")
                             
-                        st.cache_data.clear()
+                        invalidate("catalogo_productos")
                         st.rerun()
                 else:
                     st.error(f"❌ No se encontró el archivo en: {ruta_escritorio}")
@@ -335,6 +336,6 @@ class CatalogStoreUI:
                                         st.info(f"ℹ️ Se encontró pero está inactivo:")
                                         st.dataframe(busqueda[['cod_ur', 'referencia', 'descripcion', 'precio', 'activo']], use_container_width=True)
                         
-                        st.cache_data.clear()
+                        invalidate("catalogo_productos")
                         st.rerun()
 
@@ -5,6 +5,7 @@ from datetime import datetime
 from database.client_purchases_manager import ClientPurchasesManager
 from utils.formatting import format_currency
 import os
+from database.cache import invalidate
 
 
 class ClientAnalysisUI:
@@ -76,7 +77,7 @@ class ClientAnalysisUI:
                 st.error(f"❌ {resultado['error']}")
             else:
                 st.success(f"✅ {resultado['mensaje']}")
-                st.cache_data.clear()
+                invalidate("compras_clientes")
                 st.rerun()
     
     def _render_lista_clientes(self):
@@ -196,7 +197,7 @@ class ClientAnalysisUI:
                                 else:
                                     st.success(f"✅ Cliente actualizado: {cliente['nombre']}")
                                     st.session_state.pop('cliente_editar', None)
-                                    st.cache_data.clear()
+                                    invalidate("clientes_b2b")
                                     st.rerun()
                         
                         with col_cancel:
@@ -264,7 +265,7 @@ class ClientAnalysisUI:
                         st.error(f"❌ {resultado['error']}")
                     else:
                         st.success(f"✅ {resultado['mensaje']}: {nombre}")
-                        st.cache_data.clear()
+                        invalidate("clientes_b2b")
                         st.rerun()
     
     def _render_carga_compras(self):
@@ -309,7 +310,7 @@ class ClientAnalysisUI:
                 else:
                     st.success(f"✅ Compras cargadas para {resultado['cliente']}")
                     st.json(resultado)
-                    st.cache_data.clear()
+                    invalidate("compras_clientes")
         
         st.markdown("---")
         
@@ -328,7 +329,7 @@ class ClientAnalysisUI:
                     else:
                         st.success(f"✅ Compras cargadas para {resultado['cliente']}")
                         st.json(resultado)
-                        st.cache_data.clear()
+                        invalidate("compras_clientes")
                 else:
                     st.error(f"❌ No se encontró el archivo: {ruta_archivo}")
     
@@ -511,6 +512,18 @@ class ClientAnalysisUI:
                         with col2:
                             st.metric("Precio", format_currency(rec['precio']))
             
+            # Complementarios (co-compra)
+            if recomendaciones['recomendaciones'].get('complementarios'):
+                st.markdown("#### 🔗 Clientes Similares También Compran")
+                for rec in recomendaciones['recomendaciones']['complementarios'][:5]:
+                    with st.container(border=True):
+                        col1, col2 = st.columns([3, 1])
+                        with col1:
+                            st.markdown(f"**{rec['cod_ur']}** - {rec['descripcion'][:60]}...")
+                            st.caption(f"Marca: {rec['marca']} | {rec['razon']}")
+                        with col2:
+                            st.metric("Precio", format_currency(rec['precio']))
+            
             # Recompra
             if recomendaciones['recomendaciones']['recompra']:
                 st.markdown("#### 🔄 Sugerencias de Recompra")
@@ -651,7 +664,7 @@ class ClientAnalysisUI:
                             st.success(f"✅ {resultado['eliminadas']} compras eliminadas exitosamente")
                             if resultado['errores'] > 0:
                                 st.warning(f"⚠️ {resultado['errores']} errores durante la eliminación")
-                            st.cache_data.clear()
+                            invalidate("compras_clientes")
                             # Limpiar selección
                             if 'nit_verificacion' in st.session_state:
                                 del st.session_state['nit_verificacion']
@@ -5,6 +5,7 @@ import plotly.graph_objects as go
 from typing import Dict, Any
 from business.client_analytics import ClientAnalytics
 from utils.formatting import format_currency
+from database.cache import invalidate
 
 
 class ClientAnalyticsUI:
@@ -43,7 +44,7 @@ class ClientAnalyticsUI:
         with col2:
             st.markdown("<br>", unsafe_allow_html=True)
             if st.button("🔄 Actualizar Ranking", use_container_width=True):
-                st.cache_data.clear()
+                invalidate("compras_clientes", "clientes_b2b", "comisiones")
         
         with st.spinner("Calculando ranking..."):
             ranking = self.analytics.ranking_clientes(periodo)
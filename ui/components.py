@@ -305,10 +305,14 @@ class UIComponents:
             col1, col2, col3 = st.columns(3)
             
             with col1:
+                # La factura puede traer la ciudad del cliente ("MEDELLIN"); se lleva a su zona de flete
+                from business.freight_validator import FreightValidator
                 ciudad_destino = st.selectbox(
                     "Ciudad Destino",
                     options=["Medellín", "Bogotá", "Resto"],
-                    index=["Medellín", "Bogotá", "Resto"].index(factura.get('ciudad_destino', 'Resto')),
+                    index=["Medellín", "Bogotá", "Resto"].index(
+                        FreightValidator.zona_destino(factura.get('ciudad_destino') or 'Resto')
+                    ),
                     key=f"edit_ciudad_{factura_id}"
                 )
             
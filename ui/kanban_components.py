@@ -78,7 +78,7 @@ class KanbanUI:
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            vendedores = list(set(d.vendedor for d in self.pipeline.deals))
+            vendedores = sorted(self.pipeline.get_vendedores())
             filtro_vendedor = st.selectbox(
                 "Vendedor",
                 options=["Todos"] + vendedores,
@@ -99,11 +99,13 @@ class KanbanUI:
                 key="kanban_search"
             )
         
-        # Aplicar filtros
-        deals = self.pipeline.get_active_deals()
-        
+        # Aplicar filtros (partiendo del índice más selectivo)
         if filtro_vendedor != "Todos":
-            deals = [d for d in deals if d.vendedor == filtro_vendedor]
+            deals = self.pipeline.get_deals_by_vendedor(filtro_vendedor)
+        elif filtro_prioridad != "Todas":
+            deals = self.pipeline.get_deals_by_prioridad(filtro_prioridad)
+        else:
+            deals = self.pipeline.get_active_deals()
         
         if filtro_prioridad != "Todas":
             deals = [d for d in deals if d.prioridad == filtro_prioridad]
@@ -122,10 +124,13 @@ class KanbanUI:
         
         cols = st.columns(len(stages_activas))
         
+        deals_por_etapa = {}
+        for d in deals:
+            deals_por_etapa.setdefault(d.etapa, []).append(d)
+        
         for i, stage in enumerate(stages_activas):
             with cols[i]:
-                deals_etapa = [d for d in deals if d.etapa == stage["id"]]
-                self._render_kanban_column(stage, deals_etapa)
+                self._render_kanban_column(stage, deals_por_etapa.get(stage["id"], []))
     
     def _render_kanban_column(self, stage: Dict, deals: List[Deal]):
         """Renderiza una columna del Kanban"""
@@ -791,24 +796,62 @@ class KanbanUI:
     # Modales
     
     def _render_edit_deal_modal(self, deal: Deal):
-        """Renderiza modal de edición"""
-        st.info("💡 Funcionalidad de edición disponible próximamente")
+        """Renderiza modal de edición (persiste solo este deal)"""
+        with st.form(key=f"form_edit_{deal.id}"):
+            valor = st.number_input("Valor Estimado", min_value=0.0, value=float(deal.valor_estimado), step=100000.0)
+            prioridades = ["Alta", "Media", "Baja"]
+            prioridad = st.selectbox(
+                "Prioridad",
+                options=prioridades,
+                index=prioridades.index(deal.prioridad) if deal.prioridad in prioridades else 1
+            )
+            siguiente_accion = st.text_input("Siguiente Acción", value=deal.siguiente_accion)
+            fecha_accion = st.date_input("Fecha Siguiente Acción", value=deal.fecha_siguiente_accion or date.today())
+            notas = st.text_area("Notas", value=deal.notas, height=80)
+            guardar = st.form_submit_button("💾 Guardar", type="primary")
+        
+        if guardar:
+            self.pipeline.update_deal(deal.id, {
+                "valor_estimado": valor,
+                "prioridad": prioridad,
+                "siguiente_accion": siguiente_accion,
+                "fecha_siguiente_accion": fecha_accion,
+                "notas": notas
+            })
+            del st.session_state[f"editing_{deal.id}"]
+            safe_rerun()
+        
         if st.button("Cerrar", key=f"close_edit_{deal.id}"):
             del st.session_state[f"editing_{deal.id}"]
             safe_rerun()
     
     def _render_move_deal_modal(self, deal: Deal):
-        """Renderiza modal para mover deal"""
-        st.info("💡 Funcionalidad de mover deal disponible próximamente")
-        if st.button("Cerrar", key=f"close_move_{deal.id}"):
-            del st.session_state[f"moving_{deal.id}"]
-            safe_rerun()
+        """Renderiza modal para mover deal (persiste solo este deal)"""
+        opciones = [s for s in self.pipeline.stages if s["id"] != deal.etapa]
+        nueva_etapa = st.selectbox(
+            "Nueva etapa",
+            options=[s["id"] for s in opciones],
+            format_func=lambda stage_id: next(s["nombre"] for s in opciones if s["id"] == stage_id),
+            key=f"move_stage_{deal.id}"
+        )
+        notas = st.text_input("Notas", key=f"move_notas_{deal.id}")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("➡️ Mover", key=f"confirm_move_{deal.id}", type="primary", use_container_width=True):
+                self.pipeline.move_deal(deal.id, nueva_etapa, deal.vendedor, notas)
+                del st.session_state[f"moving_{deal.id}"]
+                safe_rerun()
+        with col2:
+            if st.button("Cerrar", key=f"close_move_{deal.id}", use_container_width=True):
+                del st.session_state[f"moving_{deal.id}"]
+                safe_rerun()
     
     def _render_history_modal(self, deal: Deal):
         """Renderiza modal de historial"""
         st.markdown("#### 📜 Historial de Actividades")
         
-        for evento in reversed(deal.historial):
+        for evento in reversed(self.pipeline.get_historial(deal.id)):
             fecha = datetime.fromisoformat(evento["fecha"]).strftime("%Y-%m-%d %H:%M")
             st.markdown(f"**{fecha}** - {evento['accion']}")
             if evento.get("notas"):
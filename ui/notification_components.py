@@ -151,24 +151,23 @@ class NotificationUI:
                 elif not mensaje:
                     st.error("❌ Escribe un mensaje")
                 else:
-                    with st.spinner("Enviando..."):
-                        result = self.notification_system.send_email(
-                            to=email_to,
-                            subject=asunto,
-                            body=mensaje,
-                            html=True
-                        )
-                        
-                        if result["success"]:
-                            st.success(f"✅ {result['message']}")
-                        else:
-                            st.error(f"❌ Error: {result['error']}")
+                    result = self.notification_system.enqueue_email(
+                        to=email_to,
+                        subject=asunto,
+                        body=mensaje,
+                        html=True
+                    )
+                    
+                    if result["success"]:
+                        st.success(f"✅ {result['message']}")
+                    else:
+                        st.error(f"❌ Error: {result['error']}")
         
         with col2:
             if st.button("🧪 Enviar Email de Prueba", use_container_width=True):
                 test_result = self._send_test_email(email_to)
                 if test_result["success"]:
-                    st.success("✅ Email de prueba enviado")
+                    st.success("✅ Email de prueba en cola de envío")
                 else:
                     st.error(f"❌ {test_result['error']}")
     
@@ -208,22 +207,21 @@ class NotificationUI:
                 elif not mensaje:
                     st.error("❌ Escribe un mensaje")
                 else:
-                    with st.spinner("Enviando..."):
-                        result = self.notification_system.send_whatsapp(
-                            to=whatsapp_to,
-                            message=mensaje
-                        )
-                        
-                        if result["success"]:
-                            st.success(f"✅ {result['message']}")
-                        else:
-                            st.error(f"❌ Error: {result['error']}")
+                    result = self.notification_system.enqueue_whatsapp(
+                        to=whatsapp_to,
+                        message=mensaje
+                    )
+                    
+                    if result["success"]:
+                        st.success(f"✅ {result['message']}")
+                    else:
+                        st.error(f"❌ Error: {result['error']}")
         
         with col2:
             if st.button("🧪 Enviar WhatsApp de Prueba", use_container_width=True):
                 test_result = self._send_test_whatsapp(whatsapp_to)
                 if test_result["success"]:
-                    st.success("✅ WhatsApp de prueba enviado")
+                    st.success("✅ WhatsApp de prueba en cola de envío")
                 else:
                     st.error(f"❌ {test_result['error']}")
     
@@ -409,6 +407,7 @@ class NotificationUI:
             
             estados = {
                 "Enviadas": stats["enviados"],
+                "En cola": stats.get("pendientes", 0),
                 "Errores": stats["errores"]
             }
             
@@ -418,7 +417,7 @@ class NotificationUI:
                 go.Bar(
                     x=list(estados.keys()),
                     y=list(estados.values()),
-                    marker_color=['#10b981', '#ef4444']
+                    marker_color=['#10b981', '#f59e0b', '#ef4444']
                 )
             ])
             
@@ -455,7 +454,7 @@ class NotificationUI:
         with col2:
             filtro_estado = st.selectbox(
                 "Estado",
-                options=["Todos", "enviado", "error"],
+                options=["Todos", "enviado", "pendiente", "error"],
                 key="history_filter_estado"
             )
         
@@ -475,7 +474,9 @@ class NotificationUI:
         if filtro_tipo != "Todos":
             history_filtered = [h for h in history_filtered if h["tipo"] == filtro_tipo]
         
-        if filtro_estado != "Todos":
+        if filtro_estado == "pendiente":
+            history_filtered = [h for h in history_filtered if h["estado"] in ("pendiente", "enviando")]
+        elif filtro_estado != "Todos":
             history_filtered = [h for h in history_filtered if h["estado"] == filtro_estado]
         
         st.caption(f"Mostrando {len(history_filtered)} de {len(history)} notificaciones")
@@ -491,8 +492,12 @@ class NotificationUI:
         
         # Iconos y colores
         tipo_icon = "📧" if notif["tipo"] == "email" else "💬"
-        estado_color = theme["success"] if notif["estado"] == "enviado" else theme["error"]
-        estado_icon = "✅" if notif["estado"] == "enviado" else "❌"
+        if notif["estado"] == "enviado":
+            estado_color, estado_icon = theme["success"], "✅"
+        elif notif["estado"] in ("pendiente", "enviando"):
+            estado_color, estado_icon = theme["warning"], "⏳"
+        else:
+            estado_color, estado_icon = theme["error"], "❌"
         
         fecha = datetime.fromisoformat(notif["fecha"]).strftime("%Y-%m-%d %H:%M:%S")
         
@@ -535,7 +540,7 @@ class NotificationUI:
         </html>
         """
         
-        return self.notification_system.send_email(
+        return self.notification_system.enqueue_email(
             to=to,
             subject="🧪 Email de Prueba - CRM Inteligente",
             body=test_html,
@@ -552,7 +557,7 @@ Este es un mensaje de prueba del sistema de notificaciones.
 
 _CRM Inteligente 2.0_"""
         
-        return self.notification_system.send_whatsapp(
+        return self.notification_system.enqueue_whatsapp(
             to=to,
             message=test_message
         )
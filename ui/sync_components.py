@@ -4,6 +4,7 @@ from typing import Dict, Any, List
 from datetime import datetime
 from database.sync_manager import SyncManager
 from utils.formatting import format_currency
+from database.cache import invalidate
 
 
 class SyncUI:
@@ -91,7 +92,7 @@ class SyncUI:
                 st.success(f"✅ {facturas_sync} facturas sincronizadas con {productos_vinc} productos vinculados")
                 if resultado.get('errores', 0) > 0:
                     st.warning(f"⚠️ {resultado['errores']} errores durante la sincronización")
-                st.cache_data.clear()
+                invalidate("compras_clientes", "comisiones")
                 # Limpiar análisis para refrescar
                 if 'analisis_sincronizacion' in st.session_state:
                     del st.session_state['analisis_sincronizacion']
@@ -112,7 +113,7 @@ class SyncUI:
                     st.success(f"✅ {facturas_sync} facturas sincronizadas con {productos_vinc} productos vinculados")
                 else:
                     st.info(resultado.get('mensaje', 'Sincronización completada'))
-                st.cache_data.clear()
+                invalidate("compras_clientes", "comisiones")
                 # Limpiar análisis para refrescar
                 if 'analisis_sincronizacion' in st.session_state:
                     del st.session_state['analisis_sincronizacion']
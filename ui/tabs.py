@@ -1,57 +1,84 @@
 import streamlit as st
 import pandas as pd
 from datetime import date, datetime, timedelta
-from typing import Dict, Any
+from functools import partial
+from typing import Dict, Any, Optional
 
 from database.queries import DatabaseManager
 from ui.components import UIComponents
 from ui.executive_components import ExecutiveComponents
-from ui.notification_components import NotificationUI
-from ui.kanban_components import KanbanUI
-from ui.ml_components import MLComponentsUI
 from ui.guides_components import GuidesComponentsUI
 from business.guides_analyzer import GuidesAnalyzer
-from business.calculations import ComisionCalculator, MetricsCalculator
-from business.ai_recommendations import AIRecommendations
-from business.invoice_radication import InvoiceRadicationSystem
-from business.executive_dashboard import ExecutiveDashboard
-from business.notification_system import NotificationSystem
-from business.invoice_alerts import InvoiceAlertsSystem
-from business.sales_pipeline import SalesPipeline
-from business.ml_analytics import MLAnalytics
-from business.client_product_recommendations import ClientProductRecommendations
-from ui.client_recommendations_components import ClientRecommendationsUI
-from database.catalog_manager import CatalogManager
-from ui.catalog_store_components import CatalogStoreUI
+from database.catalog_manager import MAX_OPCIONES_SELECTOR
 from database.client_purchases_manager import ClientPurchasesManager
+from database.product_rotation import ProductRotationStore
+from database.purchase_cube import get_purchase_cube
+from database.cache import invalidate
 from ui.client_analytics_components import ClientAnalyticsUI
 from business.client_analytics import ClientAnalytics
 from utils.formatting import format_currency
 from utils.streamlit_helpers import safe_rerun
 from utils.discount_parser import DiscountParser
+from utils.exporters import ExportSheet, csv_bytes, excel_bytes, MIME_CSV, MIME_XLSX
+from utils.service_registry import ServiceRegistry, Servicio
+
+
+def _registrar_servicios(servicios: ServiceRegistry):
+    """Servicios de las pestañas; los que app.py ya declaró con el mismo nombre se comparten"""
+    declarar = partial(servicios.registrar, reemplazar=False)
+    declarar("comision_calc", "business.calculations:ComisionCalculator")
+    declarar("metrics_calc", "business.calculations:MetricsCalculator")
+    declarar("ai_recommendations", "business.ai_recommendations:AIRecommendations", "db_manager")
+    declarar("invoice_radication", "business.invoice_radication:InvoiceRadicationSystem", "db_manager")
+    declarar("executive_dashboard", "business.executive_dashboard:ExecutiveDashboard", "db_manager")
+    declarar("notification_system", "business.notification_system:NotificationSystem", "db_manager")
+    declarar("notification_ui", "ui.notification_components:NotificationUI", "notification_system")
+    declarar("invoice_alerts", "business.invoice_alerts:InvoiceAlertsSystem", "db_manager")
+    declarar("pipeline_storage", "database.pipeline_storage:get_pipeline_storage", "supabase")
+    declarar("sales_pipeline", "business.sales_pipeline:SalesPipeline", "db_manager", storage="pipeline_storage")
+    declarar("kanban_ui", "ui.kanban_components:KanbanUI", "sales_pipeline")
+    declarar("ml_analytics", "business.ml_analytics:MLAnalytics", "db_manager")
+    declarar("ml_ui", "ui.ml_components:MLComponentsUI", "ml_analytics")
+    declarar("client_recommendations", "business.client_product_recommendations:ClientProductRecommendations", "db_manager")
+    declarar("catalog_manager", "database.catalog_manager:CatalogManager", "supabase")
+    declarar("clientes_repo", "database.client_repository:get_client_repository", "supabase")
+    declarar(
+        "client_recommendations_ui", "ui.client_recommendations_components:ClientRecommendationsUI",
+        "client_recommendations", "catalog_manager"
+    )
+    declarar("catalog_store_ui", "ui.catalog_store_components:CatalogStoreUI", "catalog_manager")
+
 
 class TabRenderer:
     """Renderizador de todas las pestañas de la aplicación"""
     
-    def __init__(self, db_manager: DatabaseManager, ui_components: UIComponents):
+    # Sistemas de las pestañas: cada uno se construye la primera vez que una pestaña lo usa
+    comision_calc = Servicio()
+    metrics_calc = Servicio()
+    ai_recommendations = Servicio()
+    invoice_radication = Servicio()
+    executive_dashboard = Servicio()
+    notification_system = Servicio()
+    notification_ui = Servicio()
+    invoice_alerts = Servicio()
+    sales_pipeline = Servicio()
+    kanban_ui = Servicio()
+    ml_analytics = Servicio()
+    ml_ui = Servicio()
+    client_recommendations = Servicio()
+    catalog_manager = Servicio()
+    clientes_repo = Servicio()
+    client_recommendations_ui = Servicio()
+    catalog_store_ui = Servicio()
+    
+    def __init__(self, db_manager: DatabaseManager, ui_components: UIComponents, servicios: Optional[ServiceRegistry] = None):
         self.db_manager = db_manager
         self.ui_components = ui_components
-        self.comision_calc = ComisionCalculator()
-        self.metrics_calc = MetricsCalculator()
-        self.ai_recommendations = AIRecommendations(db_manager)
-        self.invoice_radication = InvoiceRadicationSystem(db_manager)
-        self.executive_dashboard = ExecutiveDashboard(db_manager)
-        self.notification_system = NotificationSystem(db_manager)
-        self.notification_ui = NotificationUI(self.notification_system)
-        self.invoice_alerts = InvoiceAlertsSystem(db_manager)
-        self.sales_pipeline = SalesPipeline(db_manager)
-        self.kanban_ui = KanbanUI(self.sales_pipeline)
-        self.ml_analytics = MLAnalytics(db_manager)
-        self.ml_ui = MLComponentsUI(self.ml_analytics)
-        self.client_recommendations = ClientProductRecommendations(db_manager)
-        self.catalog_manager = CatalogManager(db_manager.supabase)
-        self.client_recommendations_ui = ClientRecommendationsUI(self.client_recommendations, self.catalog_manager)
-        self.catalog_store_ui = CatalogStoreUI(self.catalog_manager)
+        # Registro compartido con app.py (un solo CatalogManager, InvoiceAlertsSystem, ...)
+        self.servicios = servicios if servicios is not None else ServiceRegistry()
+        self.servicios.agregar("db_manager", db_manager, reemplazar=False)
+        self.servicios.agregar("supabase", db_manager.supabase, reemplazar=False)
+        _registrar_servicios(self.servicios)
         
         # Limpiar flags de procesamiento al inicio
         self._clear_processing_flags()
@@ -81,12 +108,7 @@ class TabRenderer:
         
         # Obtener clientes activos
         try:
-            from database.client_purchases_manager import ClientPurchasesManager
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select(
-                "nit, nombre, activo"
-            ).eq("activo", True).execute()
-            clientes_activos = len(clientes_b2b_response.data) if clientes_b2b_response.data else 0
+            clientes_activos = self.clientes_repo.contar(solo_activos=True)
         except:
             clientes_activos = 0
         
@@ -359,17 +381,14 @@ class TabRenderer:
         """Tabla de Ventas en Curso con clientes activos"""
         try:
             # Obtener clientes B2B con crédito activo
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select(
-                "nit, nombre, cupo_total, cupo_utilizado, ciudad"
-            ).eq("activo", True).execute()
+            df_clientes_b2b = self.clientes_repo.listar(
+                columnas=["nit", "nombre", "cupo_total", "cupo_utilizado", "ciudad"], solo_activos=True
+            )
             
-            if not clientes_b2b_response.data:
+            if df_clientes_b2b.empty:
                 st.info("No hay clientes activos")
                 return
             
-            df_clientes_b2b = pd.DataFrame(clientes_b2b_response.data)
-            
             # Obtener promedio de pago por cliente desde facturas
             df['fecha_factura'] = pd.to_datetime(df['fecha_factura'])
             df['fecha_pago_real'] = pd.to_datetime(df['fecha_pago_real'])
@@ -438,9 +457,7 @@ class TabRenderer:
             
             # Obtener ciudades desde clientes B2B
             try:
-                clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-                clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("nit, nombre, ciudad").execute()
-                df_clientes_b2b = pd.DataFrame(clientes_b2b_response.data) if clientes_b2b_response.data else pd.DataFrame()
+                df_clientes_b2b = self.clientes_repo.listar(columnas=["nit", "nombre", "ciudad"])
                 
                 if not df_clientes_b2b.empty:
                     clientes_stats = clientes_stats.merge(df_clientes_b2b, left_on='cliente', right_on='nombre', how='left')
@@ -813,17 +830,11 @@ class TabRenderer:
         
         # Obtener cliente B2B si existe
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
             cliente_b2b = None
             # Buscar NIT en compras o facturas
             if not df_cliente.empty:
-                # Intentar buscar por nombre
-                todos_clientes = clientes_manager.supabase.table("clientes_b2b").select("*").execute()
-                if todos_clientes.data:
-                    for c in todos_clientes.data:
-                        if c['nombre'].upper() == cliente_encontrado.upper():
-                            cliente_b2b = c
-                            break
+                # Buscar por nombre normalizado en el índice de clientes
+                cliente_b2b = self.clientes_repo.obtener_por_nombre(cliente_encontrado)
         except:
             cliente_b2b = None
         
@@ -970,15 +981,9 @@ class TabRenderer:
         """Muestra productos frecuentes del cliente con navegación jerárquica en tarjetas"""
         try:
             clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            # Obtener NIT del cliente (búsqueda aproximada)
-            todos_clientes = clientes_manager.supabase.table("clientes_b2b").select("*").execute()
-            nit_cliente = None
-            
-            if todos_clientes.data:
-                for c in todos_clientes.data:
-                    if c['nombre'].upper() == cliente.upper():
-                        nit_cliente = c['nit']
-                        break
+            # Obtener NIT del cliente (búsqueda por nombre normalizado)
+            cliente_b2b = self.clientes_repo.obtener_por_nombre(cliente)
+            nit_cliente = cliente_b2b['nit'] if cliente_b2b else None
             
             if not nit_cliente:
                 st.info("Cliente no encontrado en sistema B2B. No se pueden mostrar productos frecuentes.")
@@ -1060,14 +1065,8 @@ class TabRenderer:
             clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
             
             # Buscar NIT
-            todos_clientes = clientes_manager.supabase.table("clientes_b2b").select("*").execute()
-            nit_cliente = None
-            
-            if todos_clientes.data:
-                for c in todos_clientes.data:
-                    if c['nombre'].upper() == cliente.upper():
-                        nit_cliente = c['nit']
-                        break
+            cliente_b2b = self.clientes_repo.obtener_por_nombre(cliente)
+            nit_cliente = cliente_b2b['nit'] if cliente_b2b else None
             
             if not nit_cliente:
                 st.info("Cliente no encontrado. Las recomendaciones requieren que el cliente esté registrado en B2B.")
@@ -1080,6 +1079,9 @@ class TabRenderer:
                 st.warning(recomendaciones['error'])
                 return
             
+            # Las listas vienen agrupadas bajo 'recomendaciones'
+            recomendaciones = recomendaciones.get('recomendaciones', {})
+            
             # Mostrar recomendaciones
             if recomendaciones.get('por_marca'):
                 st.markdown("#### Recomendaciones por Marca Preferida")
@@ -1367,8 +1369,7 @@ class TabRenderer:
         # Obtener lista de clientes B2B
         try:
             clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            todos_clientes = clientes_manager.supabase.table("clientes_b2b").select("*").execute()
-            df_clientes = pd.DataFrame(todos_clientes.data) if todos_clientes.data else pd.DataFrame()
+            df_clientes = self.clientes_repo.listar()
             
             if not df_clientes.empty:
                 # Aplicar filtro según tab activo
@@ -1672,6 +1673,9 @@ class TabRenderer:
             st.warning(recomendaciones['error'])
             return
         
+        # Las listas vienen agrupadas bajo 'recomendaciones'
+        recomendaciones = recomendaciones.get('recomendaciones', {})
+        
         # Mostrar recomendaciones por categoría
         if recomendaciones.get('por_marca'):
             st.markdown("#### Por Marca Preferida")
@@ -1907,7 +1911,23 @@ class TabRenderer:
                                 
                                 with col3:
                                     if st.button("Enviar", key=f"enviar_{recordatorio['factura']}_{tipo}", use_container_width=True):
-                                        st.info("Funcionalidad de envío automático en desarrollo")
+                                        email_dest = self.notification_system.email_config["email_to_default"]
+                                        if not email_dest:
+                                            st.warning("⚠️ Configura EMAIL_TO_DEFAULT en el archivo .env")
+                                        else:
+                                            template = self.notification_system.get_template_factura_por_vencer(
+                                                {**recordatorio, 'fecha_pago_max': recordatorio['fecha_vencimiento']},
+                                                recordatorio['dias_restantes']
+                                            )
+                                            resultado = self.notification_system.enqueue_email(
+                                                email_dest,
+                                                template['email_subject'],
+                                                template['email_html']
+                                            )
+                                            if resultado.get('success'):
+                                                st.success("📤 En cola")
+                                            else:
+                                                st.error(f"❌ {resultado.get('error')}")
         else:
             st.success("✅ No hay recordatorios pendientes en este momento")
         
@@ -1940,9 +1960,7 @@ class TabRenderer:
         
         # Obtener datos de clientes B2B para contacto
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            todos_clientes_b2b = clientes_manager.supabase.table("clientes_b2b").select("*").eq("activo", True).execute()
-            df_clientes_b2b = pd.DataFrame(todos_clientes_b2b.data) if todos_clientes_b2b.data else pd.DataFrame()
+            df_clientes_b2b = self.clientes_repo.listar(solo_activos=True)
         except:
             df_clientes_b2b = pd.DataFrame()
         
@@ -2068,35 +2086,33 @@ class TabRenderer:
                 if not email_cliente:
                     st.warning("⚠️ El cliente no tiene email registrado")
                 else:
-                    with st.spinner(f"Enviando email a {email_cliente}..."):
-                        if tipo_mensaje in ["Factura Vencida", "Factura por Vencer"] and factura_seleccionada:
-                            template = self.notification_system.get_template_factura_vencida(factura_seleccionada) if tipo_mensaje == "Factura Vencida" else self.notification_system.get_template_factura_por_vencer(factura_seleccionada, 5)
-                            resultado = self.notification_system.send_email(
-                                email_cliente,
-                                template['email_subject'],
-                                template['email_html']
-                            )
-                        else:
-                            resultado = self.notification_system.send_email(
-                                email_cliente,
-                                f"Mensaje de {cliente_seleccionado}",
-                                f"<p>{mensaje_preview}</p>"
-                            )
-                        resultados.append(("Email", resultado))
+                    if tipo_mensaje in ["Factura Vencida", "Factura por Vencer"] and factura_seleccionada:
+                        template = self.notification_system.get_template_factura_vencida(factura_seleccionada) if tipo_mensaje == "Factura Vencida" else self.notification_system.get_template_factura_por_vencer(factura_seleccionada, 5)
+                        resultado = self.notification_system.enqueue_email(
+                            email_cliente,
+                            template['email_subject'],
+                            template['email_html']
+                        )
+                    else:
+                        resultado = self.notification_system.enqueue_email(
+                            email_cliente,
+                            f"Mensaje de {cliente_seleccionado}",
+                            f"<p>{mensaje_preview}</p>"
+                        )
+                    resultados.append(("Email", resultado))
             
             if "WhatsApp" in canal:
                 if not telefono_cliente:
                     st.warning("⚠️ El cliente no tiene teléfono registrado")
                 else:
-                    with st.spinner(f"Enviando WhatsApp a {telefono_cliente}..."):
-                        if tipo_mensaje in ["Factura Vencida", "Factura por Vencer"] and factura_seleccionada:
-                            template = self.notification_system.get_template_factura_vencida(factura_seleccionada) if tipo_mensaje == "Factura Vencida" else self.notification_system.get_template_factura_por_vencer(factura_seleccionada, 5)
-                            mensaje_whatsapp = template.get('whatsapp_text', mensaje_preview)
-                        else:
-                            mensaje_whatsapp = mensaje_preview
-                        
-                        resultado = self.notification_system.send_whatsapp(telefono_cliente, mensaje_whatsapp)
-                        resultados.append(("WhatsApp", resultado))
+                    if tipo_mensaje in ["Factura Vencida", "Factura por Vencer"] and factura_seleccionada:
+                        template = self.notification_system.get_template_factura_vencida(factura_seleccionada) if tipo_mensaje == "Factura Vencida" else self.notification_system.get_template_factura_por_vencer(factura_seleccionada, 5)
+                        mensaje_whatsapp = template.get('whatsapp_text', mensaje_preview)
+                    else:
+                        mensaje_whatsapp = mensaje_preview
+                    
+                    resultado = self.notification_system.enqueue_whatsapp(telefono_cliente, mensaje_whatsapp)
+                    resultados.append(("WhatsApp", resultado))
             
             # Mostrar resultados
             st.markdown("---")
@@ -2321,43 +2337,13 @@ class TabRenderer:
         
         with st.spinner(f"Analizando productos sin rotación en los últimos {dias_sin_rotacion} días..."):
             try:
-                clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-                
-                # Obtener todas las compras (no devoluciones)
-                compras_response = clientes_manager.supabase.table("compras_clientes").select(
-                    "cod_articulo, detalle, marca, grupo, subgrupo, nit_cliente, fecha, total, cantidad"
-                ).eq("es_devolucion", False).execute()
-                
-                if not compras_response.data:
+                # Resumen precalculado por producto (tabla rotacion_productos)
+                rotacion_store = ProductRotationStore(self.db_manager.supabase)
+                if rotacion_store.cargar().empty:
                     st.info("No hay datos de compras disponibles")
                     return
                 
-                df_compras = pd.DataFrame(compras_response.data)
-                df_compras['fecha'] = pd.to_datetime(df_compras['fecha'])
-                
-                # Calcular última venta por producto
-                fecha_limite = pd.Timestamp.now() - pd.Timedelta(days=dias_sin_rotacion)
-                
-                productos_stats = df_compras.groupby('cod_articulo').agg({
-                    'fecha': 'max',
-                    'nit_cliente': lambda x: list(x.unique()),
-                    'total': ['sum', 'count'],
-                    'detalle': 'first',
-                    'marca': 'first',
-                    'grupo': 'first',
-                    'subgrupo': 'first'
-                }).reset_index()
-                
-                productos_stats.columns = ['cod_articulo', 'ultima_venta', 'clientes_que_compraron', 'total_vendido', 'veces_vendido', 'detalle', 'marca', 'grupo', 'subgrupo']
-                
-                # Filtrar productos quietos (sin ventas en el período)
-                productos_quietos = productos_stats[
-                    (productos_stats['ultima_venta'] < fecha_limite) | 
-                    (productos_stats['ultima_venta'].isna())
-                ].copy()
-                
-                productos_quietos['dias_sin_venta'] = (pd.Timestamp.now() - productos_quietos['ultima_venta']).dt.days
-                productos_quietos = productos_quietos.sort_values('dias_sin_venta', ascending=False)
+                productos_quietos = rotacion_store.quietos(dias_sin_rotacion)
                 
                 if productos_quietos.empty:
                     st.success(f"✅ No hay productos sin rotación en los últimos {dias_sin_rotacion} días")
@@ -2372,7 +2358,7 @@ class TabRenderer:
                 with col3:
                     st.metric("Veces Vendido Total", int(productos_quietos['veces_vendido'].sum()))
                 with col4:
-                    st.metric("Clientes Únicos", productos_quietos['clientes_que_compraron'].apply(len).sum())
+                    st.metric("Clientes Únicos", int(productos_quietos['num_clientes'].sum()))
                 
                 st.markdown("---")
                 
@@ -2382,7 +2368,6 @@ class TabRenderer:
                 # Preparar datos para mostrar
                 productos_display = productos_quietos.head(50).copy()  # Limitar a top 50
                 productos_display['total_vendido'] = productos_display['total_vendido'].apply(format_currency)
-                productos_display['num_clientes'] = productos_display['clientes_que_compraron'].apply(len)
                 productos_display['ultima_venta'] = productos_display['ultima_venta'].dt.strftime('%Y-%m-%d')
                 
                 # Mostrar tabla
@@ -2424,22 +2409,21 @@ class TabRenderer:
                             st.caption(f"**Total Vendido Histórico:** {format_currency(producto_info['total_vendido'])} | **Veces Vendido:** {int(producto_info['veces_vendido'])}")
                         
                         with col2:
-                            num_clientes = len(producto_info['clientes_que_compraron'])
+                            num_clientes = int(producto_info['num_clientes'])
                             st.metric("Clientes a Contactar", num_clientes)
                         
                         st.markdown("---")
                         st.markdown("### Clientes que Compraron Este Producto")
                         
                         # Obtener nombres de clientes
-                        clientes_nits = producto_info['clientes_que_compraron']
+                        clientes_nits = producto_info['clientes']
                         if clientes_nits:
                             try:
-                                clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select(
-                                    "nit, nombre, ciudad, telefono, email"
-                                ).in_("nit", clientes_nits).execute()
+                                df_clientes = self.clientes_repo.obtener_varios(
+                                    clientes_nits, columnas=["nit", "nombre", "ciudad", "telefono", "email"]
+                                )
                                 
-                                if clientes_b2b_response.data:
-                                    df_clientes = pd.DataFrame(clientes_b2b_response.data)
+                                if not df_clientes.empty:
                                     st.dataframe(
                                         df_clientes[['nombre', 'nit', 'ciudad', 'telefono', 'email']],
                                         use_container_width=True,
@@ -2470,37 +2454,13 @@ class TabRenderer:
         st.caption("Productos más y menos vendidos con tendencias por marca/grupo")
         
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
+            # Resumen precalculado por producto (tabla rotacion_productos)
+            productos_rotacion = ProductRotationStore(self.db_manager.supabase).cargar()
             
-            # Obtener todas las compras
-            compras_response = clientes_manager.supabase.table("compras_clientes").select(
-                "cod_articulo, detalle, marca, grupo, subgrupo, fecha, total, cantidad"
-            ).eq("es_devolucion", False).execute()
-            
-            if not compras_response.data:
+            if productos_rotacion.empty:
                 st.info("No hay datos de compras disponibles")
                 return
             
-            df_compras = pd.DataFrame(compras_response.data)
-            df_compras['fecha'] = pd.to_datetime(df_compras['fecha'])
-            
-            # Análisis por producto
-            productos_rotacion = df_compras.groupby('cod_articulo').agg({
-                'detalle': 'first',
-                'marca': 'first',
-                'grupo': 'first',
-                'subgrupo': 'first',
-                'total': ['sum', 'count'],
-                'cantidad': 'sum',
-                'fecha': ['min', 'max']
-            }).reset_index()
-            
-            productos_rotacion.columns = ['cod_articulo', 'detalle', 'marca', 'grupo', 'subgrupo', 'total_vendido', 'veces_vendido', 'cantidad_total', 'primera_venta', 'ultima_venta']
-            
-            # Calcular días de análisis
-            productos_rotacion['dias_activo'] = (productos_rotacion['ultima_venta'] - productos_rotacion['primera_venta']).dt.days
-            productos_rotacion['rotacion_mensual'] = productos_rotacion['veces_vendido'] / ((productos_rotacion['dias_activo'] / 30).replace(0, 1))
-            
             # Top 50 productos más vendidos
             st.markdown("### Top 50 Productos Más Vendidos")
             top_productos = productos_rotacion.nlargest(50, 'total_vendido')
@@ -2547,12 +2507,11 @@ class TabRenderer:
             
             # Tendencias por marca
             st.markdown("### Rotación por Marca")
-            rotacion_marca = df_compras.groupby('marca').agg({
-                'total': 'sum',
-                'cod_articulo': 'nunique',
-                'cantidad': 'sum'
-            }).reset_index()
-            rotacion_marca.columns = ['marca', 'total_vendido', 'productos_unicos', 'cantidad_total']
+            rotacion_marca = productos_rotacion.groupby('marca').agg(
+                total_vendido=('total_vendido', 'sum'),
+                productos_unicos=('cod_articulo', 'size'),
+                cantidad_total=('cantidad_total', 'sum')
+            ).reset_index()
             rotacion_marca = rotacion_marca.sort_values('total_vendido', ascending=False)
             rotacion_marca['total_vendido'] = rotacion_marca['total_vendido'].apply(format_currency)
             
@@ -2566,12 +2525,11 @@ class TabRenderer:
             
             # Tendencias por grupo
             st.markdown("### Rotación por Grupo")
-            rotacion_grupo = df_compras.groupby('grupo').agg({
-                'total': 'sum',
-                'cod_articulo': 'nunique',
-                'cantidad': 'sum'
-            }).reset_index()
-            rotacion_grupo.columns = ['grupo', 'total_vendido', 'productos_unicos', 'cantidad_total']
+            rotacion_grupo = productos_rotacion.groupby('grupo').agg(
+                total_vendido=('total_vendido', 'sum'),
+                productos_unicos=('cod_articulo', 'size'),
+                cantidad_total=('cantidad_total', 'sum')
+            ).reset_index()
             rotacion_grupo = rotacion_grupo.sort_values('total_vendido', ascending=False).head(20)
             rotacion_grupo['total_vendido'] = rotacion_grupo['total_vendido'].apply(format_currency)
             
@@ -2590,7 +2548,6 @@ class TabRenderer:
         st.caption("Clientes candidatos para descuentos por volumen, negociaciones especiales o campañas promocionales")
         
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
             df = self.db_manager.cargar_datos()
             
             if df.empty:
@@ -2598,8 +2555,7 @@ class TabRenderer:
                 return
             
             # Obtener clientes B2B
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("*").eq("activo", True).execute()
-            df_clientes_b2b = pd.DataFrame(clientes_b2b_response.data) if clientes_b2b_response.data else pd.DataFrame()
+            df_clientes_b2b = self.clientes_repo.listar(solo_activos=True)
             
             if df_clientes_b2b.empty:
                 st.info("No hay clientes B2B registrados")
@@ -2942,8 +2898,7 @@ class TabRenderer:
             
             # Obtener nombres de clientes
             try:
-                clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("nit, nombre").execute()
-                df_clientes_b2b = pd.DataFrame(clientes_b2b_response.data) if clientes_b2b_response.data else pd.DataFrame()
+                df_clientes_b2b = self.clientes_repo.listar(columnas=["nit", "nombre"])
                 
                 if not df_clientes_b2b.empty:
                     df_compras = df_compras.merge(df_clientes_b2b, left_on='nit_cliente', right_on='nit', how='left')
@@ -3022,8 +2977,7 @@ class TabRenderer:
             clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
             
             # Seleccionar cliente
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("nit, nombre").eq("activo", True).execute()
-            df_clientes = pd.DataFrame(clientes_b2b_response.data) if clientes_b2b_response.data else pd.DataFrame()
+            df_clientes = self.clientes_repo.listar(columnas=["nit", "nombre"], solo_activos=True)
             
             if df_clientes.empty:
                 st.info("No hay clientes disponibles")
@@ -3270,8 +3224,9 @@ class TabRenderer:
             # Obtener nombres de clientes
             clientes_nits = producto_info['clientes']
             try:
-                clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("nit, nombre, ciudad, telefono, email").in_("nit", list(clientes_nits)).execute()
-                df_clientes = pd.DataFrame(clientes_b2b_response.data) if clientes_b2b_response.data else pd.DataFrame()
+                df_clientes = self.clientes_repo.obtener_varios(
+                    clientes_nits, columnas=["nit", "nombre", "ciudad", "telefono", "email"]
+                )
                 
                 if not df_clientes.empty:
                     # Agregar estadísticas de compra del producto
@@ -3384,7 +3339,7 @@ class TabRenderer:
                                     st.dataframe(df_nuevos, use_container_width=True, hide_index=True)
                             
                             # Limpiar cache y recargar
-                            st.cache_data.clear()
+                            invalidate("catalogo_productos")
                             st.rerun()
                     
                     # Limpiar archivo temporal
@@ -3479,12 +3434,11 @@ class TabRenderer:
                             
                             if st.session_state.get(f'mostrar_clientes_{idx}', False):
                                 try:
-                                    clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select(
-                                        "nit, nombre, ciudad, telefono, email"
-                                    ).in_("nit", list(clientes_marca[:20])).execute()
+                                    df_clientes = self.clientes_repo.obtener_varios(
+                                        list(clientes_marca[:20]), columnas=["nit", "nombre", "ciudad", "telefono", "email"]
+                                    )
                                     
-                                    if clientes_b2b_response.data:
-                                        df_clientes = pd.DataFrame(clientes_b2b_response.data)
+                                    if not df_clientes.empty:
                                         st.dataframe(df_clientes[['nombre', 'ciudad', 'telefono']], use_container_width=True, hide_index=True)
                                 except:
                                     st.info("No se pudieron cargar los datos de clientes")
@@ -3754,15 +3708,12 @@ class TabRenderer:
         
         # Obtener información de ciudades desde clientes B2B
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("nit, nombre, ciudad").execute()
+            df_clientes_b2b = self.clientes_repo.listar(columnas=["nit", "nombre", "ciudad"])
             
-            if not clientes_b2b_response.data:
+            if df_clientes_b2b.empty:
                 st.info("No hay datos de clientes B2B disponibles")
                 return
             
-            df_clientes_b2b = pd.DataFrame(clientes_b2b_response.data)
-            
             # Agrupar ventas por cliente
             ventas_cliente = df.groupby('cliente').agg({
                 'valor': 'sum',
@@ -3829,15 +3780,12 @@ class TabRenderer:
         st.markdown("### 💳 Reporte de Análisis de Crédito")
         
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("*").eq("activo", True).execute()
+            df_clientes_b2b = self.clientes_repo.listar(solo_activos=True)
             
-            if not clientes_b2b_response.data:
+            if df_clientes_b2b.empty:
                 st.info("No hay clientes B2B activos disponibles")
                 return
             
-            df_clientes_b2b = pd.DataFrame(clientes_b2b_response.data)
-            
             # Calcular uso de crédito para cada cliente
             analisis_credito = []
             for _, cliente in df_clientes_b2b.iterrows():
@@ -3990,45 +3938,23 @@ class TabRenderer:
             st.dataframe(df_export.head(10), use_container_width=True, hide_index=True)
             
             # Botones de exportación
-            col1, col2 = st.columns(2)
-            with col1:
-                csv = df_export.to_csv(index=False).encode('utf-8-sig')
-                st.download_button(
-                    "📥 Exportar CSV",
-                    data=csv,
-                    file_name=f"facturas_{fecha_inicio}_{fecha_fin}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-            with col2:
-                # Exportar a Excel
-                from io import BytesIO
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df_export.to_excel(writer, index=False, sheet_name='Facturas')
-                output.seek(0)
-                st.download_button(
-                    "📊 Exportar Excel",
-                    data=output.getvalue(),
-                    file_name=f"facturas_{fecha_inicio}_{fecha_fin}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
+            self._botones_descarga(
+                [ExportSheet('Facturas', df_export)],
+                f"facturas_{fecha_inicio}_{fecha_fin}",
+                etiquetas=("📥 Exportar CSV", "📊 Exportar Excel")
+            )
     
     def _exportar_clientes(self):
         """Exportar clientes B2B"""
         st.markdown("#### Exportar Clienters B2B")
         
         try:
-            clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select("*").execute()
+            df_clientes = self.clientes_repo.listar()
             
-            if not clientes_b2b_response.data:
+            if df_clientes.empty:
                 st.info("No hay clientes B2B disponibles")
                 return
             
-            df_clientes = pd.DataFrame(clientes_b2b_response.data)
-            
             # Filtro de activos
             solo_activos = st.checkbox("Solo Clientes Activos", value=True, key="solo_activos_export")
             if solo_activos:
@@ -4038,29 +3964,11 @@ class TabRenderer:
             st.dataframe(df_clientes.head(10), use_container_width=True, hide_index=True)
             
             # Botones de exportación
-            col1, col2 = st.columns(2)
-            with col1:
-                csv = df_clientes.to_csv(index=False).encode('utf-8-sig')
-                st.download_button(
-                    "📥 Exportar CSV",
-                    data=csv,
-                    file_name=f"clientes_b2b_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-            with col2:
-                from io import BytesIO
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df_clientes.to_excel(writer, index=False, sheet_name='Clientes')
-                output.seek(0)
-                st.download_button(
-                    "📊 Exportar Excel",
-                    data=output.getvalue(),
-                    file_name=f"clientes_b2b_{pd.Timestamp.now().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
+            self._botones_descarga(
+                [ExportSheet('Clientes', df_clientes)],
+                f"clientes_b2b_{pd.Timestamp.now().strftime('%Y%m%d')}",
+                etiquetas=("📥 Exportar CSV", "📊 Exportar Excel")
+            )
         
         except Exception as e:
             st.error(f"Error exportando clientes: {str(e)}")
@@ -4086,61 +3994,47 @@ class TabRenderer:
         st.dataframe(df_catalogo.head(10), use_container_width=True, hide_index=True)
         
         # Botones de exportación
-        col1, col2 = st.columns(2)
-        with col1:
-            csv = df_catalogo.to_csv(index=False).encode('utf-8-sig')
-            st.download_button(
-                "📥 Exportar CSV",
-                data=csv,
-                file_name=f"catalogo_{pd.Timestamp.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
-        with col2:
-            from io import BytesIO
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_catalogo.to_excel(writer, index=False, sheet_name='Catálogo')
-            output.seek(0)
-            st.download_button(
-                "📊 Exportar Excel",
-                data=output.getvalue(),
-                file_name=f"catalogo_{pd.Timestamp.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
-            )
+        self._botones_descarga(
+            [ExportSheet('Catálogo', df_catalogo)],
+            f"catalogo_{pd.Timestamp.now().strftime('%Y%m%d')}",
+            etiquetas=("📥 Exportar CSV", "📊 Exportar Excel")
+        )
     
-    def _boton_exportar_reporte(self, df: pd.DataFrame, nombre_base: str):
-        """Botón genérico para exportar reportes"""
+    def _boton_exportar_reporte(self, df: pd.DataFrame, nombre_base: str,
+                                hojas_adicionales: Dict[str, pd.DataFrame] = None):
+        """Botón genérico para exportar reportes (hojas adicionales solo en Excel)"""
         st.markdown("---")
+        hojas = [ExportSheet('Reporte', df)]
+        for nombre, df_hoja in (hojas_adicionales or {}).items():
+            hojas.append(ExportSheet(nombre, df_hoja))
+        self._botones_descarga(hojas, nombre_base)
+    
+    def _botones_descarga(self, hojas: list, nombre_base: str,
+                          etiquetas: tuple = ("📥 Exportar a CSV", "📊 Exportar a Excel")):
+        """Botones CSV/Excel generados por bloques con el motor de utils.exporters"""
         col1, col2 = st.columns(2)
         
         with col1:
-            csv = df.to_csv(index=False).encode('utf-8-sig')
+            # El CSV lleva solo la primera hoja
             st.download_button(
-                "📥 Exportar a CSV",
-                data=csv,
+                etiquetas[0],
+                data=csv_bytes(hojas[0].datos, hojas[0].columnas),
                 file_name=f"{nombre_base}.csv",
-                mime="text/csv",
+                mime=MIME_CSV,
                 use_container_width=True
             )
         
         with col2:
             try:
-                from io import BytesIO
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Reporte')
-                output.seek(0)
                 st.download_button(
-                    "📊 Exportar a Excel",
-                    data=output.getvalue(),
+                    etiquetas[1],
+                    data=excel_bytes(hojas),
                     file_name=f"{nombre_base}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    mime=MIME_XLSX,
                     use_container_width=True
                 )
             except ImportError:
-                st.info("Excel export requiere la librería 'openpyxl'. Instálala con: pip install openpyxl")
+                st.info("Excel export requiere la librería 'xlsxwriter'. Instálala con: pip install xlsxwriter")
     
     # ========================
     # TAB DASHBOARD EJECUTIVO
@@ -4348,10 +4242,18 @@ class TabRenderer:
                 col1, col2, col3 = st.columns(3)
                 
                 with col1:
+                    if proyecciones.get('metodo') == 'holt_winters':
+                        rango_inf, rango_sup = proyecciones.get('rango_revenue', (0, 0))
+                        ayuda_revenue = (
+                            f"Acumulado del mes + pronóstico Holt-Winters de los días restantes. "
+                            f"Rango: {format_currency(rango_inf)} - {format_currency(rango_sup)}"
+                        )
+                    else:
+                        ayuda_revenue = f"Basado en {proyecciones.get('dias_transcurridos', 0)} días de datos"
                     st.metric(
                         "Revenue Proyectado",
                         format_currency(proyecciones.get('proyeccion_revenue', 0)),
-                        help=f"Basado en {proyecciones.get('dias_transcurridos', 0)} días de datos"
+                        help=ayuda_revenue
                     )
                 
                 with col2:
@@ -5140,7 +5042,11 @@ class TabRenderer:
         
         # Mostrar facturas
         if not df_filtrado.empty:
-            self._render_facturas_detalladas(df_filtrado)
+            firma_filtros = (
+                estado_filter, cliente_filter, monto_min,
+                st.session_state.get("mes_filter_sidebar", "Todos"), len(df_filtrado)
+            )
+            self._render_facturas_detalladas(df_filtrado, firma_filtros)
         else:
             st.info("No hay facturas que coincidan con los filtros aplicados")
             if df.empty:
@@ -5187,30 +5093,83 @@ class TabRenderer:
                 pendientes = len(df_filtrado[df_filtrado["pagado"] == False])
                 st.metric("Pendientes", pendientes)
     
-    def _render_facturas_detalladas(self, df_filtrado: pd.DataFrame):
-        """Renderiza las facturas con detalles y acciones"""
+    # Tamaños de página disponibles para el listado de facturas
+    FACTURAS_PAGE_SIZES = [10, 20, 50]
+    
+    @staticmethod
+    def _ordenar_facturas_por_prioridad(df: pd.DataFrame) -> pd.DataFrame:
+        """Ordena por prioridad (vencidas, por vencer, pendientes, pagadas) y fecha, vectorizado"""
+        pagado = df['pagado'].fillna(False).astype(bool)
+        if 'dias_vencimiento' in df.columns:
+            dias = pd.to_numeric(df['dias_vencimiento'], errors='coerce')
+        else:
+            dias = pd.Series(float('nan'), index=df.index)
+        
+        prioridad = pd.Series(2, index=df.index)
+        prioridad[~pagado & (dias <= 5)] = 1
+        prioridad[~pagado & (dias < 0)] = 0
+        prioridad[pagado] = 3
+        
+        return df.assign(prioridad=prioridad).sort_values(['prioridad', 'fecha_factura'], ascending=[True, False])
+    
+    def _render_paginador_facturas(self, total: int, firma_filtros: tuple) -> tuple:
+        """Controles de paginación; devuelve (inicio, fin) de la ventana visible"""
+        # Volver a la primera página cuando cambian los filtros
+        if st.session_state.get("comisiones_firma_filtros") != firma_filtros:
+            st.session_state["comisiones_firma_filtros"] = firma_filtros
+            st.session_state["comisiones_pagina"] = 0
+        
+        col_size, col_prev, col_info, col_next = st.columns([1, 1, 2, 1])
+        
+        with col_size:
+            page_size = st.selectbox(
+                "Por página",
+                self.FACTURAS_PAGE_SIZES,
+                index=0,
+                key="comisiones_page_size"
+            )
+        
+        total_paginas = max(1, -(-total // page_size))
+        pagina = min(st.session_state.get("comisiones_pagina", 0), total_paginas - 1)
+        
+        with col_prev:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("◀ Anterior", key="comisiones_pagina_prev", disabled=pagina == 0, use_container_width=True):
+                st.session_state["comisiones_pagina"] = pagina - 1
+                safe_rerun()
+        
+        with col_info:
+            st.markdown("<br>", unsafe_allow_html=True)
+            inicio = pagina * page_size
+            fin = min(inicio + page_size, total)
+            st.caption(f"Página {pagina + 1} de {total_paginas} · Facturas {inicio + 1}-{fin} de {total}")
+        
+        with col_next:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("Siguiente ▶", key="comisiones_pagina_next", disabled=pagina >= total_paginas - 1, use_container_width=True):
+                st.session_state["comisiones_pagina"] = pagina + 1
+                safe_rerun()
+        
+        st.session_state["comisiones_pagina"] = pagina
+        return inicio, fin
+    
+    def _render_facturas_detalladas(self, df_filtrado: pd.DataFrame, firma_filtros: tuple = ()):
+        """Renderiza las facturas con detalles y acciones (solo la página visible)"""
         st.markdown("### Facturas Detalladas")
         
         # Ordenar por prioridad
-        def calcular_prioridad(row):
-            if row['pagado']:
-                return 3
-            elif row.get('dias_vencimiento') is not None:
-                if row['dias_vencimiento'] < 0:
-                    return 0
-                elif row['dias_vencimiento'] <= 5:
-                    return 1
-                else:
-                    return 2
-            return 2
+        df_filtrado = self._ordenar_facturas_por_prioridad(df_filtrado)
         
-        df_filtrado['prioridad'] = df_filtrado.apply(calcular_prioridad, axis=1)
-        df_filtrado = df_filtrado.sort_values(['prioridad', 'fecha_factura'], ascending=[True, False])
+        # Solo se crean widgets para la ventana visible; el costo del rerun no
+        # crece con el número de facturas
+        inicio, fin = self._render_paginador_facturas(len(df_filtrado), firma_filtros)
+        df_pagina = df_filtrado.iloc[inicio:fin]
         
-        for index, (_, factura) in enumerate(df_filtrado.iterrows()):
+        for offset, (_, factura) in enumerate(df_pagina.iterrows()):
             factura_id = factura.get('id')
             if not factura_id:
                 continue
+            index = inicio + offset
             
             # Renderizar card de factura
             self.ui_components.render_factura_card(factura, index)
@@ -5218,7 +5177,7 @@ class TabRenderer:
             # Renderizar botones de acción
             actions = self.ui_components.render_factura_action_buttons(factura, index)
             
-            # Procesar acciones
+            # Procesar acciones (los detalles solo se construyen al abrirlos)
             self._procesar_acciones_factura(factura, actions)
             
             st.markdown("---")
@@ -5386,49 +5345,40 @@ class TabRenderer:
         # Selector de productos del catálogo
         st.markdown("### 📦 Seleccionar Productos del Catálogo")
         
-        # Cargar catálogo
-        df_catalogo = self.catalog_manager.cargar_catalogo()
+        # Índice de opciones del catálogo (se construye una vez por versión del catálogo)
+        indice_catalogo = self.catalog_manager.obtener_indice_opciones()
         
-        if df_catalogo.empty:
+        if len(indice_catalogo) == 0:
             st.warning("⚠️ El catálogo está vacío. Ve a '🛒 Catálogo' para cargar productos.")
         else:
-            # Debug: mostrar columnas disponibles (temporal)
-            # st.write(f"Columnas disponibles: {df_catalogo.columns.tolist()}")
-            # st.write(f"Primera fila: {df_catalogo.iloc[0].to_dict() if not df_catalogo.empty else 'N/A'}")
             col1, col2, col3 = st.columns([2, 1, 1])
             
             with col1:
-                # Crear lista de productos para el selectbox
-                productos_opciones = []
-                for _, prod in df_catalogo.iterrows():
-                    # Usar nombres de columnas en minúsculas (como están en la BD)
-                    cod_ur = prod.get('cod_ur', '') or prod.get('Cod_UR', '') or ''
-                    descripcion = prod.get('descripcion', '') or prod.get('Descripcion', '') or 'Sin descripción'
-                    referencia = prod.get('referencia', '') or prod.get('Referencia', '') or ''
-                    
-                    # Crear nombre display más descriptivo
-                    if cod_ur and descripcion:
-                        nombre_display = f"{cod_ur} - {descripcion[:60]}"
-                    elif cod_ur:
-                        nombre_display = f"{cod_ur} - {referencia[:40] if referencia else 'Sin descripción'}"
-                    elif descripcion:
-                        nombre_display = f"{descripcion[:60]}"
-                    else:
-                        nombre_display = "Producto sin información"
-                    
-                    productos_opciones.append((cod_ur, nombre_display, prod))
-                
-                if productos_opciones:
-                    producto_seleccionado_idx = st.selectbox(
-                        "Buscar Producto",
-                        options=range(len(productos_opciones)),
-                        format_func=lambda x: productos_opciones[x][1],
+                # Filtrar en el servidor y enviar al selectbox solo las primeras coincidencias
+                termino_producto = st.text_input(
+                    "Buscar Producto",
+                    key="buscar_producto_catalogo",
+                    placeholder="Código, referencia, descripción o marca"
+                )
+                coincidencias = indice_catalogo.filtrar(termino_producto)
+                opciones_producto = coincidencias[:MAX_OPCIONES_SELECTOR].tolist()
+                
+                if opciones_producto:
+                    producto_seleccionado_pos = st.selectbox(
+                        "Producto",
+                        options=opciones_producto,
+                        format_func=lambda pos: indice_catalogo.labels[pos],
                         key="select_producto_catalogo"
                     )
+                    if len(coincidencias) > len(opciones_producto):
+                        st.caption(
+                            f"Mostrando {len(opciones_producto)} de {len(coincidencias):,} productos. "
+                            "Escribe para acotar la búsqueda."
+                        )
                     
-                    producto_seleccionado = productos_opciones[producto_seleccionado_idx][2]
+                    producto_seleccionado = indice_catalogo.fila(producto_seleccionado_pos)
                 else:
-                    st.warning("No hay productos disponibles en el catálogo")
+                    st.warning("No hay productos que coincidan con la búsqueda")
                     producto_seleccionado = None
             
             with col2:
@@ -6078,6 +6028,13 @@ class TabRenderer:
                                     if compra_result.data:
                                         compras_ids.append(compra_result.data[0]['id'])
                                 
+                                if compras_ids:
+                                    ProductRotationStore(self.db_manager.supabase).actualizar_productos_seguro(
+                                        [p['cod_articulo'] for p in productos_venta]
+                                    )
+                                    get_purchase_cube(self.db_manager.supabase).actualizar_clientes_seguro([cliente_nit])
+                                    invalidate("compras_clientes")
+                                
                                 # Si hay factura_id y las columnas existen, actualizar la factura
                                 if factura_id and compras_ids:
                                     try:
@@ -6097,6 +6054,7 @@ class TabRenderer:
                                     'cupo_utilizado': nuevo_cupo_utilizado,
                                     'fecha_actualizacion': datetime.now().isoformat()
                                 }).eq('id', cliente_b2b['id']).execute()
+                                self.clientes_repo.invalidar()
                                 
                                 st.success(f"✅ Venta registrada y enlazada completamente")
                                 st.info(f"📦 {len(productos_venta)} producto(s) guardado(s) en historial. Cupo actualizado. Descuento: {descuento_adicional}%")
@@ -6169,9 +6127,7 @@ class TabRenderer:
         
         # Cargar catálogo de productos para búsqueda automática
         try:
-            from database.catalog_manager import CatalogManager
-            catalog_manager = CatalogManager(self.db_manager.supabase)
-            df_catalogo = catalog_manager.cargar_catalogo()
+            df_catalogo = self.catalog_manager.cargar_catalogo()
         except:
             df_catalogo = pd.DataFrame()
         
@@ -6226,32 +6182,10 @@ class TabRenderer:
                     
                     # También intentar obtener clientes de la tabla clientes_b2b para complementar
                     try:
-                        from database.client_purchases_manager import ClientPurchasesManager
-                        clientes_manager = ClientPurchasesManager(self.db_manager.supabase)
-                        
-                        # Obtener clientes B2B con paginación
-                        all_clientes_b2b_data = []
-                        page_size = 1000
-                        offset = 0
-                        
-                        while True:
-                            clientes_b2b_response = clientes_manager.supabase.table("clientes_b2b").select(
-                                "nombre"
-                            ).range(offset, offset + page_size - 1).execute()
-                            
-                            if not clientes_b2b_response.data:
-                                break
-                            
-                            all_clientes_b2b_data.extend(clientes_b2b_response.data)
-                            
-                            if len(clientes_b2b_response.data) < page_size:
-                                break
-                            
-                            offset += page_size
+                        df_clientes_b2b = self.clientes_repo.listar(columnas=["nombre"])
                         
                         # Combinar clientes de comisiones con clientes B2B
-                        if all_clientes_b2b_data:
-                            df_clientes_b2b = pd.DataFrame(all_clientes_b2b_data)
+                        if not df_clientes_b2b.empty:
                             nombres_clientes_b2b = df_clientes_b2b['nombre'].dropna().unique().tolist()
                             # Combinar ambas listas y eliminar duplicados
                             todos_los_clientes = list(set(nombres_clientes_comisiones + nombres_clientes_b2b))
@@ -7022,7 +6956,7 @@ class TabRenderer:
                             st.error(f"❌ {resultado['error']}")
                     else:
                         st.session_state['catalogo_cargado_automatico'] = True
-                        st.cache_data.clear()
+                        invalidate("catalogo_productos")
                         # Mostrar mensaje de éxito solo una vez
                         if resultado.get('productos_nuevos', 0) > 0 or resultado.get('productos_actualizados', 0) > 0:
                             st.success(f"✅ Catálogo cargado: {resultado.get('total_productos', 0)} productos disponibles")
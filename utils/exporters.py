@@ -0,0 +1,274 @@
+"""
+Exportación de datos a CSV y Excel por bloques (memoria acotada)
+
+- CSV: generador de bytes por bloques de filas; se puede enviar tal cual en un
+  `StreamingResponse` y la descarga empieza con el primer bloque.
+- Excel: xlsxwriter en modo `constant_memory` (cada fila se escribe y se libera)
+  sobre un archivo temporal, con varias hojas y formato por columna. Un .xlsx es
+  un zip que solo es válido al cerrarse, así que se transmite al terminar de
+  escribirse, pero sin tener el libro completo en memoria.
+
+Los datos de cada hoja pueden ser un DataFrame, un iterable de DataFrames
+(bloques ya paginados) o un iterable de dicts.
+"""
+
+import csv
+import io
+import math
+import tempfile
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 5000
+READ_BLOCK = 64 * 1024
+
+MIME_CSV = "text/csv"
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Formatos de columna con nombre (o un dict de formato xlsxwriter)
+FORMATOS = {
+    "moneda": {"num_format": "$#,##0"},
+    "decimal": {"num_format": "#,##0.00"},
+    "entero": {"num_format": "#,##0"},
+    "porcentaje": {"num_format": "0.0%"},
+    "fecha": {"num_format": "yyyy-mm-dd"},
+    "fecha_hora": {"num_format": "yyyy-mm-dd hh:mm"},
+    "texto": {},
+}
+
+# Prefijos de columnas que se exportan como moneda si no se indica formato
+_PREFIJOS_MONEDA = ("valor", "comision", "precio", "total", "cupo", "monto")
+
+Datos = Union[pd.DataFrame, Iterable[pd.DataFrame], Iterable[Dict[str, Any]]]
+
+
+@dataclass
+class ExportSheet:
+    """Una hoja del libro: nombre, datos y formato opcional por columna"""
+    nombre: str
+    datos: Datos
+    columnas: Optional[List[str]] = None
+    formatos: Dict[str, Union[str, Dict[str, Any]]] = field(default_factory=dict)
+
+
+def iter_chunks(datos: Datos, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Normaliza cualquier fuente de datos a bloques de DataFrame"""
+    if isinstance(datos, pd.DataFrame):
+        for inicio in range(0, len(datos), chunk_size):
+            yield datos.iloc[inicio:inicio + chunk_size]
+        return
+
+    registros = []
+    for item in datos:
+        if isinstance(item, pd.DataFrame):
+            if registros:
+                yield pd.DataFrame(registros)
+                registros = []
+            if not item.empty:
+                yield item
+            continue
+        registros.append(item)
+        if len(registros) >= chunk_size:
+            yield pd.DataFrame(registros)
+            registros = []
+    if registros:
+        yield pd.DataFrame(registros)
+
+
+# ========================================
+# CSV
+# ========================================
+
+def iter_csv(
+    datos: Datos,
+    columnas: Optional[List[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    encoding: str = "utf-8-sig",
+    sep: str = ","
+) -> Iterator[bytes]:
+    """Genera el CSV por bloques; el encabezado (y BOM) sale con el primer bloque"""
+    if columnas is None and isinstance(datos, pd.DataFrame):
+        columnas = list(datos.columns)
+    encabezado_escrito = False
+    for chunk in iter_chunks(datos, chunk_size):
+        if columnas is None:
+            columnas = list(chunk.columns)
+        buffer = io.StringIO()
+        chunk.reindex(columns=columnas).to_csv(
+            buffer, index=False, header=not encabezado_escrito, sep=sep, quoting=csv.QUOTE_MINIMAL
+        )
+        texto = buffer.getvalue()
+        # El BOM solo va al inicio del archivo
+        yield texto.encode(encoding if not encabezado_escrito else encoding.replace("-sig", ""))
+        encabezado_escrito = True
+
+    if not encabezado_escrito and columnas:
+        yield (sep.join(columnas) + "\n").encode(encoding)
+
+
+def csv_bytes(datos: Datos, columnas: Optional[List[str]] = None, **kwargs) -> bytes:
+    """CSV completo como bytes (para st.download_button)"""
+    return b"".join(iter_csv(datos, columnas, **kwargs))
+
+
+# ========================================
+# EXCEL
+# ========================================
+
+def _formato_columna(nombre: str, serie: pd.Series, formatos: Dict[str, Any]) -> Optional[Union[str, Dict]]:
+    if nombre in formatos:
+        return formatos[nombre]
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return "fecha"
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        if str(nombre).lower().startswith(_PREFIJOS_MONEDA):
+            return "moneda"
+        if pd.api.types.is_float_dtype(serie):
+            return "decimal"
+    return None
+
+
+def _escribir_hoja(workbook, sheet: ExportSheet, chunk_size: int):
+    worksheet = workbook.add_worksheet(sheet.nombre[:31])
+    encabezado = workbook.add_format({"bold": True, "bg_color": "#DDEBF7", "border": 1})
+    cache_formatos: Dict[Any, Any] = {}
+
+    def resolver(formato):
+        if formato is None:
+            return None
+        clave = formato if isinstance(formato, str) else tuple(sorted(formato.items()))
+        if clave not in cache_formatos:
+            spec = FORMATOS.get(formato, {}) if isinstance(formato, str) else formato
+            cache_formatos[clave] = workbook.add_format(spec) if spec else None
+        return cache_formatos[clave]
+
+    formato_fecha = resolver("fecha")
+    columnas = sheet.columnas
+    if columnas is None and isinstance(sheet.datos, pd.DataFrame):
+        columnas = list(sheet.datos.columns)
+    formatos_columna: List[Any] = []
+    fila = 0
+    for chunk in iter_chunks(sheet.datos, chunk_size):
+        if fila == 0:
+            # En constant_memory las filas se escriben en orden: encabezado primero
+            columnas = columnas if columnas is not None else list(chunk.columns)
+            for col, nombre in enumerate(columnas):
+                serie = chunk[nombre] if nombre in chunk.columns else pd.Series(dtype=object)
+                formato = resolver(_formato_columna(nombre, serie, sheet.formatos))
+                formatos_columna.append(formato)
+                worksheet.set_column(col, col, max(10, min(40, len(str(nombre)) + 4)), formato)
+            worksheet.write_row(0, 0, [str(c) for c in columnas], encabezado)
+            worksheet.freeze_panes(1, 0)
+            fila = 1
+
+        # Escritor por columna según el dtype (evita inspeccionar el tipo de cada celda)
+        chunk = chunk.reindex(columns=columnas)
+        escritores = []
+        valores = []
+        for col, nombre in enumerate(columnas):
+            serie = chunk[nombre]
+            formato = formatos_columna[col]
+            if pd.api.types.is_bool_dtype(serie):
+                escritores.append(lambda f, c, v, fmt=formato: worksheet.write_boolean(f, c, v, fmt))
+                valores.append(serie.tolist())
+            elif pd.api.types.is_numeric_dtype(serie):
+                escritores.append(lambda f, c, v, fmt=formato: math.isfinite(v) and worksheet.write_number(f, c, v, fmt))
+                valores.append(serie.astype(float).tolist())
+            else:
+                escritores.append(
+                    lambda f, c, v, fmt=formato: _escribir_celda(worksheet, f, c, v, fmt, formato_fecha)
+                )
+                valores.append(serie.astype(object).tolist())
+
+        for registro in zip(*valores):
+            for col, valor in enumerate(registro):
+                escritores[col](fila, col, valor)
+            fila += 1
+
+    if fila == 0 and columnas:
+        worksheet.write_row(0, 0, [str(c) for c in columnas], encabezado)
+
+
+def _escribir_celda(worksheet, fila: int, col: int, valor: Any, formato, formato_fecha):
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)) or valor is pd.NaT:
+        return
+    if isinstance(valor, (bool, np.bool_)):
+        worksheet.write_boolean(fila, col, bool(valor), formato)
+    elif isinstance(valor, (int, float, np.integer, np.floating)):
+        if isinstance(valor, (float, np.floating)) and not math.isfinite(valor):
+            return
+        worksheet.write_number(fila, col, float(valor), formato)
+    elif isinstance(valor, (datetime, date)):
+        # pd.Timestamp es subclase de datetime; la zona horaria la quita el libro
+        if isinstance(valor, pd.Timestamp):
+            valor = valor.to_pydatetime()
+        worksheet.write_datetime(fila, col, valor, formato or formato_fecha)
+    else:
+        worksheet.write_string(fila, col, str(valor))
+
+
+def write_excel(sheets: List[ExportSheet], output, chunk_size: int = CHUNK_SIZE):
+    """Escribe el libro en `output` (ruta o archivo binario) en modo de memoria constante"""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "remove_timezone": True})
+    try:
+        for sheet in sheets:
+            _escribir_hoja(workbook, sheet, chunk_size)
+    finally:
+        workbook.close()
+
+
+def iter_excel(sheets: List[ExportSheet], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Escribe el libro en un archivo temporal y lo devuelve por bloques"""
+    with tempfile.TemporaryFile(suffix=".xlsx") as tmp:
+        write_excel(sheets, tmp, chunk_size)
+        tmp.seek(0)
+        while True:
+            bloque = tmp.read(READ_BLOCK)
+            if not bloque:
+                break
+            yield bloque
+
+
+def excel_bytes(sheets: Union[ExportSheet, List[ExportSheet]], chunk_size: int = CHUNK_SIZE) -> bytes:
+    """Libro completo como bytes (para st.download_button)"""
+    if isinstance(sheets, ExportSheet):
+        sheets = [sheets]
+    return b"".join(iter_excel(sheets, chunk_size))
+
+
+# ========================================
+# FASTAPI
+# ========================================
+
+def _content_disposition(filename: str) -> Dict[str, str]:
+    return {"Content-Disposition": f"attachment; filename={filename}"}
+
+
+def streaming_csv_response(datos: Datos, filename: str, columnas: Optional[List[str]] = None, **kwargs):
+    """`StreamingResponse` de FastAPI que envía el CSV a medida que se genera"""
+    from fastapi.responses import StreamingResponse
+
+    return StreamingResponse(
+        iter_csv(datos, columnas, **kwargs),
+        media_type=f"{MIME_CSV}; charset=utf-8",
+        headers=_content_disposition(filename)
+    )
+
+
+def streaming_excel_response(sheets: Union[ExportSheet, List[ExportSheet]], filename: str, **kwargs):
+    """`StreamingResponse` de FastAPI con el libro Excel generado en memoria constante"""
+    from fastapi.responses import StreamingResponse
+
+    if isinstance(sheets, ExportSheet):
+        sheets = [sheets]
+    return StreamingResponse(
+        iter_excel(sheets, **kwargs),
+        media_type=MIME_XLSX,
+        headers=_content_disposition(filename)
+    )
@@ -0,0 +1,37 @@
+"""
+Importación diferida de módulos pesados
+
+Los módulos de database/ y business/ los comparten Streamlit y el backend de
+FastAPI. Ahí `streamlit` solo se usa para mostrar mensajes (st.error,
+st.warning), y en el backend importarlo costaba cerca de 0,4 s en la primera
+petición de cada instancia. `modulo_diferido("streamlit")` lo importa recién al
+usar el primer atributo; en la app de Streamlit ya está cargado y no cambia nada.
+"""
+
+import importlib
+from types import ModuleType
+
+
+class ModuloDiferido:
+    """Reenvía los atributos al módulo real, que se importa en el primer acceso"""
+
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+
+    def _modulo(self) -> ModuleType:
+        return importlib.import_module(self._nombre)
+
+    def __getattr__(self, atributo: str):
+        return getattr(self._modulo(), atributo)
+
+    def __repr__(self) -> str:
+        return f"<módulo diferido '{self._nombre}'>"
+
+
+def modulo_diferido(nombre: str) -> ModuloDiferido:
+    """
+    Ejemplo:
+        st = modulo_diferido("streamlit")
+        st.error("...")  # aquí se importa streamlit
+    """
+    return ModuloDiferido(nombre)
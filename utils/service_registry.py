@@ -0,0 +1,131 @@
+"""
+Registro de servicios con inicialización diferida
+
+Cada servicio se declara con su fábrica, que puede ser una ruta
+"modulo:atributo" o un callable, y con los nombres de los servicios que recibe
+como argumentos. El módulo se importa y el objeto se construye la primera vez
+que alguien lo pide (`servicios["ml_analytics"]`); desde ahí se reutiliza.
+
+Por cada servicio se guarda su tiempo de inicialización, incluida la
+importación del módulo y sin contar el de sus dependencias (ver `tiempos()`).
+
+Ejemplo:
+    servicios = ServiceRegistry(supabase=supabase)
+    servicios.registrar("db_manager", "database.queries:DatabaseManager", "supabase")
+    servicios.registrar("monthly_calc", "business.monthly_commission_calculator:MonthlyCommissionCalculator", "db_manager")
+    servicios["monthly_calc"]  # importa y construye db_manager y monthly_calc
+"""
+
+import importlib
+import threading
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+Fabrica = Union[str, Callable[..., Any]]
+
+
+class ServiceRegistry:
+    """Servicios construidos en el primer acceso y compartidos desde entonces"""
+
+    def __init__(self, **instancias):
+        self._fabricas: Dict[str, Tuple[Fabrica, Tuple[str, ...], Dict[str, str]]] = {}
+        self._instancias: Dict[str, Any] = dict(instancias)
+        self._tiempos: Dict[str, float] = {}
+        # Reentrante: al construir un servicio se piden sus dependencias con el lock tomado
+        self._lock = threading.RLock()
+        # Servicios en construcción: [nombre, inicio, segundos de sus dependencias]
+        self._pila: List[list] = []
+
+    def registrar(self, nombre: str, fabrica: Fabrica, *dependencias: str, reemplazar: bool = True, **dependencias_nombradas: str):
+        """
+        Declara un servicio sin construirlo
+
+        Args:
+            nombre: Nombre con el que se pide el servicio
+            fabrica: "modulo:atributo" (clase o función) o callable
+            dependencias: Servicios que se pasan como argumentos posicionales
+            reemplazar: Si es False y el nombre ya existe, se conserva el anterior
+            dependencias_nombradas: Argumento -> servicio que se pasa por nombre
+        """
+        with self._lock:
+            if not reemplazar and nombre in self:
+                return
+            self._instancias.pop(nombre, None)
+            self._fabricas[nombre] = (fabrica, dependencias, dependencias_nombradas)
+
+    def agregar(self, nombre: str, instancia: Any, reemplazar: bool = True):
+        """Agrega un servicio ya construido"""
+        with self._lock:
+            if not reemplazar and nombre in self:
+                return
+            self._instancias[nombre] = instancia
+
+    def __contains__(self, nombre: str) -> bool:
+        return nombre in self._instancias or nombre in self._fabricas
+
+    def __getitem__(self, nombre: str) -> Any:
+        try:
+            return self._instancias[nombre]
+        except KeyError:
+            pass
+        with self._lock:
+            if nombre not in self._instancias:
+                self._instancias[nombre] = self._construir(nombre)
+            return self._instancias[nombre]
+
+    def construido(self, nombre: str) -> bool:
+        return nombre in self._instancias
+
+    def tiempos(self) -> Dict[str, float]:
+        """Segundos de inicialización de cada servicio construido, en orden de construcción"""
+        return dict(self._tiempos)
+
+    def _construir(self, nombre: str) -> Any:
+        if nombre not in self._fabricas:
+            raise KeyError(f"Servicio no registrado: '{nombre}'")
+        if any(marco[0] == nombre for marco in self._pila):
+            ruta = " -> ".join(marco[0] for marco in self._pila)
+            raise RuntimeError(f"Dependencia circular entre servicios: {ruta} -> {nombre}")
+
+        fabrica, dependencias, dependencias_nombradas = self._fabricas[nombre]
+        marco = [nombre, perf_counter(), 0.0]
+        self._pila.append(marco)
+        try:
+            if isinstance(fabrica, str):
+                modulo, atributo = fabrica.split(":")
+                fabrica = getattr(importlib.import_module(modulo), atributo)
+            args = [self[dependencia] for dependencia in dependencias]
+            kwargs = {argumento: self[dependencia] for argumento, dependencia in dependencias_nombradas.items()}
+            instancia = fabrica(*args, **kwargs)
+        finally:
+            self._pila.pop()
+            total = perf_counter() - marco[1]
+            if self._pila:
+                self._pila[-1][2] += total
+
+        propio = total - marco[2]
+        self._tiempos[nombre] = propio
+        print(f"⚙️ Servicio '{nombre}' inicializado en {propio * 1000:.0f} ms")
+        return instancia
+
+
+class Servicio:
+    """
+    Atributo de clase que resuelve un servicio de `self.servicios`
+
+    Ejemplo:
+        class TabRenderer:
+            ml_analytics = Servicio()  # self.servicios["ml_analytics"]
+    """
+
+    def __init__(self, nombre: Optional[str] = None):
+        self.nombre = nombre
+
+    def __set_name__(self, propietario, nombre: str):
+        if self.nombre is None:
+            self.nombre = nombre
+
+    def __get__(self, instancia, propietario=None):
+        if instancia is None:
+            return self
+        return instancia.servicios[self.nombre]